@@ -1,3 +1,5 @@
 import langbot.__main__
 
-langbot.__main__.main()
+# guarded so that spawned worker processes (e.g. the RAG parser pool) do not start another instance
+if __name__ == '__main__':
+    langbot.__main__.main()
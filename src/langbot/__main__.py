@@ -28,8 +28,29 @@ async def main_entry(loop: asyncio.AbstractEventLoop):
         default=False,
     )
     parser.add_argument('--debug', action='store_true', help='Debug mode / 调试模式', default=False)
+    parser.add_argument(
+        '--import-report',
+        action='store_true',
+        help='Print the slowest module imports at startup and exit / 输出启动时最慢的模块导入并退出',
+        default=False,
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        help='Run pipelines on this many worker processes / 在指定数量的工作进程中运行流水线',
+        default=0,
+    )
+    parser.add_argument('--cluster-worker', help=argparse.SUPPRESS, default='')
     args = parser.parse_args()
 
+    if args.import_report:
+        from langbot.pkg.utils import importutil
+
+        print(f'{"cumulative ms":>14} {"self ms":>9}  module')
+        for entry in importutil.import_time_report(['langbot.pkg.core.boot']):
+            print(f'{entry["cumulative_us"] / 1000:>14.1f} {entry["self_us"] / 1000:>9.1f}  {entry["module"]}')
+        return
+
     if args.standalone_runtime:
         from langbot.pkg.utils import platform
 
@@ -40,7 +61,8 @@ async def main_entry(loop: asyncio.AbstractEventLoop):
 
         constants.debug_mode = True
 
-    print(asciiart)
+    if not args.cluster_worker:
+        print(asciiart)
 
     # Check dependencies
     from langbot.pkg.core.bootutils import deps
@@ -70,6 +92,12 @@ async def main_entry(loop: asyncio.AbstractEventLoop):
         for file in generated_files:
             print('-', file)
 
+    if args.workers > 0:
+        from langbot.pkg.cluster import supervisor
+
+        supervisor.local_workers = args.workers
+        supervisor.local_worker_id = args.cluster_worker
+
     from langbot.pkg.core import boot
 
     await boot.main(loop)
@@ -1,6 +1,5 @@
 import base64
 import json
-import time
 from typing import Callable
 import dingtalk_stream  # type: ignore
 from .EchoHandler import EchoTextHandler
@@ -8,6 +7,8 @@ from .dingtalkevent import DingTalkEvent
 import httpx
 import traceback
 
+from langbot.pkg.platform import tokens
+
 
 class DingTalkClient:
     def __init__(
@@ -30,52 +31,53 @@ class DingTalkClient:
         self._message_handlers = {
             'example': [],
         }
-        self.access_token = ''
         self.robot_name = robot_name
         self.robot_code = robot_code
-        self.access_token_expiry_time = ''
         self.markdown_card = markdown_card
         self.logger = logger
 
-    async def get_access_token(self):
+    def _token_key(self) -> str:
+        return tokens.credential_key('dingtalk', self.key, self.secret)
+
+    async def get_access_token(self) -> str:
+        """从共享缓存获取 access_token，临近过期时后台刷新，同一凭据同时只请求一次"""
+        return await tokens.cache.get(self._token_key(), self._fetch_access_token)
+
+    async def _fetch_access_token(self) -> tuple[str, float]:
         url = 'https://api.dingtalk.com/v1.0/oauth2/accessToken'
         headers = {'Content-Type': 'application/json'}
         data = {'appKey': self.key, 'appSecret': self.secret}
         async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(url, json=data, headers=headers)
-                if response.status_code == 200:
-                    response_data = response.json()
-                    self.access_token = response_data.get('accessToken')
-                    expires_in = int(response_data.get('expireIn', 7200))
-                    self.access_token_expiry_time = time.time() + expires_in - 60
-            except Exception:
-                await self.logger.error('failed to get access token in dingtalk')
-
-    async def is_token_expired(self):
-        """检查token是否过期"""
-        if self.access_token_expiry_time is None:
-            return True
-        return time.time() > self.access_token_expiry_time
-
-    async def check_access_token(self):
-        if not self.access_token or await self.is_token_expired():
-            return False
-        return bool(self.access_token and self.access_token.strip())
+            response = await client.post(url, json=data, headers=headers)
+            if response.status_code != 200:
+                await self.logger.error(f'failed to get access token in dingtalk: {response.text}')
+                raise Exception(f'failed to get access token in dingtalk: {response.text}')
+            response_data = response.json()
+            return response_data.get('accessToken'), int(response_data.get('expireIn', 7200))
+
+    async def _post_with_token(self, url: str, json_data: dict, headers: dict | None = None) -> httpx.Response:
+        """携带 access_token 发送请求，token 被拒绝时换新 token 重试一次"""
+
+        async def post(access_token: str) -> httpx.Response:
+            async with httpx.AsyncClient() as client:
+                return await client.post(
+                    url, headers={**(headers or {}), 'x-acs-dingtalk-access-token': access_token}, json=json_data
+                )
+
+        def is_token_invalid(response: httpx.Response) -> bool:
+            return response.status_code == 401
+
+        return await tokens.cache.call(self._token_key(), self._fetch_access_token, post, is_token_invalid)
 
     async def download_image(self, download_code: str):
-        if not await self.check_access_token():
-            await self.get_access_token()
         url = 'https://api.dingtalk.com/v1.0/robot/messageFiles/download'
         params = {'downloadCode': download_code, 'robotCode': self.robot_code}
-        headers = {'x-acs-dingtalk-access-token': self.access_token}
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, headers=headers, json=params)
-            if response.status_code == 200:
-                result = response.json()
-                download_url = result.get('downloadUrl')
-            else:
-                await self.logger.error(f'failed to get download url: {response.json()}')
+        response = await self._post_with_token(url, params)
+        if response.status_code == 200:
+            result = response.json()
+            download_url = result.get('downloadUrl')
+        else:
+            await self.logger.error(f'failed to get download url: {response.json()}')
 
         if download_url:
             return await self.download_url_to_base64(download_url)
@@ -93,40 +95,32 @@ class DingTalkClient:
                 await self.logger.error(f'failed to get files: {response.json()}')
 
     async def get_audio_url(self, download_code: str):
-        if not await self.check_access_token():
-            await self.get_access_token()
         url = 'https://api.dingtalk.com/v1.0/robot/messageFiles/download'
         params = {'downloadCode': download_code, 'robotCode': self.robot_code}
-        headers = {'x-acs-dingtalk-access-token': self.access_token}
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, headers=headers, json=params)
-            if response.status_code == 200:
-                result = response.json()
-                download_url = result.get('downloadUrl')
-                if download_url:
-                    return await self.download_url_to_base64(download_url)
-                else:
-                    await self.logger.error(f'failed to get audio: {response.json()}')
+        response = await self._post_with_token(url, params)
+        if response.status_code == 200:
+            result = response.json()
+            download_url = result.get('downloadUrl')
+            if download_url:
+                return await self.download_url_to_base64(download_url)
             else:
-                raise Exception(f'Error: {response.status_code}, {response.text}')
+                await self.logger.error(f'failed to get audio: {response.json()}')
+        else:
+            raise Exception(f'Error: {response.status_code}, {response.text}')
 
     async def get_file_url(self, download_code: str):
-        if not await self.check_access_token():
-            await self.get_access_token()
         url = 'https://api.dingtalk.com/v1.0/robot/messageFiles/download'
         params = {'downloadCode': download_code, 'robotCode': self.robot_code}
-        headers = {'x-acs-dingtalk-access-token': self.access_token}
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, headers=headers, json=params)
-            if response.status_code == 200:
-                result = response.json()
-                download_url = result.get('downloadUrl')
-                if download_url:
-                    return download_url
-                else:
-                    await self.logger.error(f'failed to get file: {response.json()}')
+        response = await self._post_with_token(url, params)
+        if response.status_code == 200:
+            result = response.json()
+            download_url = result.get('downloadUrl')
+            if download_url:
+                return download_url
             else:
-                raise Exception(f'Error: {response.status_code}, {response.text}')
+                await self.logger.error(f'failed to get file: {response.json()}')
+        else:
+            raise Exception(f'Error: {response.status_code}, {response.text}')
 
     async def update_incoming_message(self, message):
         """异步更新 DingTalkClient 中的 incoming_message"""
@@ -288,13 +282,9 @@ class DingTalkClient:
         return message_data
 
     async def send_proactive_message_to_one(self, target_id: str, content: str):
-        if not await self.check_access_token():
-            await self.get_access_token()
-
         url = 'https://api.dingtalk.com/v1.0/robot/oToMessages/batchSend'
 
         headers = {
-            'x-acs-dingtalk-access-token': self.access_token,
             'Content-Type': 'application/json',
         }
 
@@ -305,22 +295,17 @@ class DingTalkClient:
             'msgParam': json.dumps({'content': content}),
         }
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, headers=headers, json=data)
-                if response.status_code == 200:
-                    return
+            response = await self._post_with_token(url, data, headers)
+            if response.status_code == 200:
+                return
         except Exception:
             await self.logger.error(f'failed to send proactive massage to person: {traceback.format_exc()}')
             raise Exception(f'failed to send proactive massage to person: {traceback.format_exc()}')
 
     async def send_proactive_message_to_group(self, target_id: str, content: str):
-        if not await self.check_access_token():
-            await self.get_access_token()
-
         url = 'https://api.dingtalk.com/v1.0/robot/groupMessages/send'
 
         headers = {
-            'x-acs-dingtalk-access-token': self.access_token,
             'Content-Type': 'application/json',
         }
 
@@ -331,10 +316,9 @@ class DingTalkClient:
             'msgParam': json.dumps({'content': content}),
         }
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, headers=headers, json=data)
-                if response.status_code == 200:
-                    return
+            response = await self._post_with_token(url, data, headers)
+            if response.status_code == 200:
+                return
         except Exception:
             await self.logger.error(f'failed to send proactive massage to group: {traceback.format_exc()}')
             raise Exception(f'failed to send proactive massage to group: {traceback.format_exc()}')
@@ -7,8 +7,7 @@ from quart import Quart, request
 import hashlib
 from typing import Callable
 from langbot.libs.official_account_api.oaevent import OAEvent
-
-import asyncio
+from langbot.pkg.utils.pending import PendingReplies
 
 
 xml_template = """
@@ -30,6 +29,7 @@ class OAClient:
         self.appsecret = Appsecret
         self.base_url = 'https://api.weixin.qq.com'
         self.access_token = ''
+        self.wxcpt = None
         self.app = Quart(__name__)
         self.app.add_url_rule(
             '/callback/command',
@@ -41,13 +41,11 @@ class OAClient:
             'example': [],
         }
         self.access_token_expiry_time = None
-        self.msg_id_map = {}
-        self.generated_content = {}
+        self.replies: PendingReplies[str] = PendingReplies()
         self.logger = logger
 
     async def handle_callback_request(self):
         try:
-            # 每隔100毫秒查询是否生成ai回答
             start_time = time.time()
             signature = request.args.get('signature', '')
             timestamp = request.args.get('timestamp', '')
@@ -70,8 +68,9 @@ class OAClient:
                     raise Exception('拒绝请求')
             elif request.method == 'POST':
                 encryt_msg = await request.data
-                wxcpt = WXBizMsgCrypt(self.token, self.aes, self.appid)
-                ret, xml_msg = wxcpt.DecryptMsg(encryt_msg, msg_signature, timestamp, nonce)
+                if self.wxcpt is None:
+                    self.wxcpt = WXBizMsgCrypt(self.token, self.aes, self.appid)
+                ret, xml_msg = self.wxcpt.DecryptMsg(encryt_msg, msg_signature, timestamp, nonce)
                 xml_msg = xml_msg.decode('utf-8')
 
                 if ret != 0:
@@ -88,26 +87,20 @@ class OAClient:
                 from_user = root.find('FromUserName').text  # 发送者
                 to_user = root.find('ToUserName').text  # 机器人
 
+                # 等待流水线生成回答，生成后立即唤醒；公众号 5 秒超时后会以同一 MsgId 重试
                 timeout = 4.80
-                interval = 0.1
-                while True:
-                    content = self.generated_content.pop(message_data['MsgId'], None)
-                    if content:
-                        response_xml = xml_template.format(
-                            to_user=from_user,
-                            from_user=to_user,
-                            create_time=int(time.time()),
-                            content=content,
-                        )
-
-                        return response_xml
-
-                    if time.time() - start_time >= timeout:
-                        break
+                content = await self.replies.wait(message_data['MsgId'], timeout - (time.time() - start_time))
+                if content:
+                    response_xml = xml_template.format(
+                        to_user=from_user,
+                        from_user=to_user,
+                        create_time=int(time.time()),
+                        content=content,
+                    )
 
-                    await asyncio.sleep(interval)
+                    return response_xml
 
-                if self.msg_id_map.get(message_data['MsgId'], 1) == 3:
+                if self.replies.attempts(message_data['MsgId']) == 3:
                     # response_xml = xml_template.format(
                     #     to_user=from_user,
                     #     from_user=to_user,
@@ -158,19 +151,16 @@ class OAClient:
         """
         处理消息事件。
         """
-        message_id = event.message_id
-        if message_id in self.msg_id_map.keys():
-            self.msg_id_map[message_id] += 1
+        if self.replies.attempt(event.message_id) > 1:
             return
 
-        self.msg_id_map[message_id] = 1
         msg_type = event.type
         if msg_type in self._message_handlers:
             for handler in self._message_handlers[msg_type]:
                 await handler(event)
 
     async def set_message(self, msg_id: int, content: str):
-        self.generated_content[msg_id] = content
+        self.replies.set_result(msg_id, content)
 
 
 class OAClientForLongerResponse:
@@ -189,6 +179,7 @@ class OAClientForLongerResponse:
         self.appsecret = Appsecret
         self.base_url = 'https://api.weixin.qq.com'
         self.access_token = ''
+        self.wxcpt = None
         self.app = Quart(__name__)
         self.app.add_url_rule(
             '/callback/command',
@@ -224,8 +215,9 @@ class OAClientForLongerResponse:
 
             elif request.method == 'POST':
                 encryt_msg = await request.data
-                wxcpt = WXBizMsgCrypt(self.token, self.aes, self.appid)
-                ret, xml_msg = wxcpt.DecryptMsg(encryt_msg, msg_signature, timestamp, nonce)
+                if self.wxcpt is None:
+                    self.wxcpt = WXBizMsgCrypt(self.token, self.aes, self.appid)
+                ret, xml_msg = self.wxcpt.DecryptMsg(encryt_msg, msg_signature, timestamp, nonce)
                 xml_msg = xml_msg.decode('utf-8')
 
                 if ret != 0:
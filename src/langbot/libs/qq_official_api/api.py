@@ -1,4 +1,3 @@
-import time
 from quart import request
 import httpx
 from quart import Quart
@@ -9,6 +8,8 @@ import json
 import traceback
 from cryptography.hazmat.primitives.asymmetric import ed25519
 
+from langbot.pkg.platform import tokens
+
 
 def handle_validation(body: dict, bot_secret: str):
     # bot正确的secert是32位的，此处仅为了适配演示demo
@@ -47,18 +48,16 @@ class QQOfficialClient:
         self.app_id = app_id
         self._message_handlers = {}
         self.base_url = 'https://api.sgroup.qq.com'
-        self.access_token = ''
-        self.access_token_expiry_time = None
         self.logger = logger
 
-    async def check_access_token(self):
-        """检查access_token是否存在"""
-        if not self.access_token or await self.is_token_expired():
-            return False
-        return bool(self.access_token and self.access_token.strip())
+    def _token_key(self) -> str:
+        return tokens.credential_key('qqofficial', self.app_id, self.secret)
+
+    async def get_access_token(self) -> str:
+        """从共享缓存获取 access_token，临近过期时后台刷新，同一凭据同时只请求一次"""
+        return await tokens.cache.get(self._token_key(), self._fetch_access_token)
 
-    async def get_access_token(self):
-        """获取access_token"""
+    async def _fetch_access_token(self) -> tuple[str, float]:
         url = 'https://bots.qq.com/app/getAppAccessToken'
         async with httpx.AsyncClient() as client:
             params = {
@@ -68,19 +67,34 @@ class QQOfficialClient:
             headers = {
                 'content-type': 'application/json',
             }
+            response_data = None
             try:
                 response = await client.post(url, json=params, headers=headers)
-                if response.status_code == 200:
-                    response_data = response.json()
+                response_data = response.json()
                 access_token = response_data.get('access_token')
-                expires_in = int(response_data.get('expires_in', 7200))
-                self.access_token_expiry_time = time.time() + expires_in - 60
-                if access_token:
-                    self.access_token = access_token
+                if not access_token:
+                    raise ValueError('no access_token in response')
+                return access_token, int(response_data.get('expires_in', 7200))
             except Exception as e:
                 await self.logger.error(f'获取access_token失败: {response_data}')
                 raise Exception(f'获取access_token失败: {e}')
 
+    async def _post_with_token(self, url: str, data: dict) -> httpx.Response:
+        """携带 access_token 发送请求，token 失效（401）时换新 token 重试一次"""
+
+        async def post(access_token: str) -> httpx.Response:
+            async with httpx.AsyncClient() as client:
+                headers = {
+                    'Authorization': f'QQBot {access_token}',
+                    'Content-Type': 'application/json',
+                }
+                return await client.post(url, headers=headers, json=data)
+
+        def is_token_invalid(response: httpx.Response) -> bool:
+            return response.status_code == 401
+
+        return await tokens.cache.call(self._token_key(), self._fetch_access_token, post, is_token_invalid)
+
     async def handle_callback_request(self):
         """处理回调请求"""
         try:
@@ -165,99 +179,61 @@ class QQOfficialClient:
 
     async def send_private_text_msg(self, user_openid: str, content: str, msg_id: str):
         """发送私聊消息"""
-        if not await self.check_access_token():
-            await self.get_access_token()
-
         url = self.base_url + '/v2/users/' + user_openid + '/messages'
-        async with httpx.AsyncClient() as client:
-            headers = {
-                'Authorization': f'QQBot {self.access_token}',
-                'Content-Type': 'application/json',
-            }
-            data = {
-                'content': content,
-                'msg_type': 0,
-                'msg_id': msg_id,
-            }
-            response = await client.post(url, headers=headers, json=data)
-            response_data = response.json()
-            if response.status_code == 200:
-                return
-            else:
-                await self.logger.error(f'发送私聊消息失败: {response_data}')
-                raise ValueError(response)
+        data = {
+            'content': content,
+            'msg_type': 0,
+            'msg_id': msg_id,
+        }
+        response = await self._post_with_token(url, data)
+        response_data = response.json()
+        if response.status_code == 200:
+            return
+        else:
+            await self.logger.error(f'发送私聊消息失败: {response_data}')
+            raise ValueError(response)
 
     async def send_group_text_msg(self, group_openid: str, content: str, msg_id: str):
         """发送群聊消息"""
-        if not await self.check_access_token():
-            await self.get_access_token()
-
         url = self.base_url + '/v2/groups/' + group_openid + '/messages'
-        async with httpx.AsyncClient() as client:
-            headers = {
-                'Authorization': f'QQBot {self.access_token}',
-                'Content-Type': 'application/json',
-            }
-            data = {
-                'content': content,
-                'msg_type': 0,
-                'msg_id': msg_id,
-            }
-            response = await client.post(url, headers=headers, json=data)
-            if response.status_code == 200:
-                return
-            else:
-                await self.logger.error(f'发送群聊消息失败:{response.json()}')
-                raise Exception(response.read().decode())
+        data = {
+            'content': content,
+            'msg_type': 0,
+            'msg_id': msg_id,
+        }
+        response = await self._post_with_token(url, data)
+        if response.status_code == 200:
+            return
+        else:
+            await self.logger.error(f'发送群聊消息失败:{response.json()}')
+            raise Exception(response.read().decode())
 
     async def send_channle_group_text_msg(self, channel_id: str, content: str, msg_id: str):
         """发送频道群聊消息"""
-        if not await self.check_access_token():
-            await self.get_access_token()
-
         url = self.base_url + '/channels/' + channel_id + '/messages'
-        async with httpx.AsyncClient() as client:
-            headers = {
-                'Authorization': f'QQBot {self.access_token}',
-                'Content-Type': 'application/json',
-            }
-            params = {
-                'content': content,
-                'msg_type': 0,
-                'msg_id': msg_id,
-            }
-            response = await client.post(url, headers=headers, json=params)
-            if response.status_code == 200:
-                return True
-            else:
-                await self.logger.error(f'发送频道群聊消息失败: {response.json()}')
-                raise Exception(response)
+        params = {
+            'content': content,
+            'msg_type': 0,
+            'msg_id': msg_id,
+        }
+        response = await self._post_with_token(url, params)
+        if response.status_code == 200:
+            return True
+        else:
+            await self.logger.error(f'发送频道群聊消息失败: {response.json()}')
+            raise Exception(response)
 
     async def send_channle_private_text_msg(self, guild_id: str, content: str, msg_id: str):
         """发送频道私聊消息"""
-        if not await self.check_access_token():
-            await self.get_access_token()
-
         url = self.base_url + '/dms/' + guild_id + '/messages'
-        async with httpx.AsyncClient() as client:
-            headers = {
-                'Authorization': f'QQBot {self.access_token}',
-                'Content-Type': 'application/json',
-            }
-            params = {
-                'content': content,
-                'msg_type': 0,
-                'msg_id': msg_id,
-            }
-            response = await client.post(url, headers=headers, json=params)
-            if response.status_code == 200:
-                return True
-            else:
-                await self.logger.error(f'发送频道私聊消息失败: {response.json()}')
-                raise Exception(response)
-
-    async def is_token_expired(self):
-        """检查token是否过期"""
-        if self.access_token_expiry_time is None:
+        params = {
+            'content': content,
+            'msg_type': 0,
+            'msg_id': msg_id,
+        }
+        response = await self._post_with_token(url, params)
+        if response.status_code == 200:
             return True
-        return time.time() > self.access_token_expiry_time
+        else:
+            await self.logger.error(f'发送频道私聊消息失败: {response.json()}')
+            raise Exception(response)
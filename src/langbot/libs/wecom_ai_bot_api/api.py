@@ -16,6 +16,7 @@ from quart import Quart, request, Response, jsonify
 from langbot.libs.wecom_ai_bot_api import wecombotevent
 from langbot.libs.wecom_ai_bot_api.WXBizMsgCrypt3 import WXBizMsgCrypt
 from langbot.pkg.platform.logger import EventLogger
+from langbot.pkg.utils.pending import PendingReplies
 
 
 @dataclass
@@ -217,6 +218,7 @@ class WecomBotClient:
         self.EnCodingAESKey = EnCodingAESKey
         self.Corpid = Corpid
         self.ReceiveId = ''
+        self.wxcpt = None
         self.app = Quart(__name__)
         self.app.add_url_rule(
             '/callback/command', 'handle_callback', self.handle_callback_request, methods=['POST', 'GET']
@@ -225,8 +227,7 @@ class WecomBotClient:
             'example': [],
         }
         self.logger = logger
-        self.generated_content: dict[str, str] = {}
-        self.msg_id_map: dict[str, int] = {}
+        self.replies: PendingReplies[str] = PendingReplies()
         self.stream_sessions = StreamSessionManager(logger=logger)
         self.stream_poll_timeout = 0.5
 
@@ -346,7 +347,7 @@ class WecomBotClient:
         if not chunk:
             cached_content = None
             if session and session.msg_id:
-                cached_content = self.generated_content.pop(session.msg_id, None)
+                cached_content = self.replies.take(session.msg_id)
             if cached_content is not None:
                 chunk = StreamChunk(content=cached_content, is_final=True)
             else:
@@ -368,7 +369,8 @@ class WecomBotClient:
             作为 Quart 路由处理函数直接注册并使用。
         """
         try:
-            self.wxcpt = WXBizMsgCrypt(self.Token, self.EnCodingAESKey, '')
+            if self.wxcpt is None:
+                self.wxcpt = WXBizMsgCrypt(self.Token, self.EnCodingAESKey, '')
             await self.logger.info(f'{request.method} {request.url} {str(request.args)}')
 
             if request.method == 'GET':
@@ -485,11 +487,8 @@ class WecomBotClient:
         处理消息事件。
         """
         try:
-            message_id = event.message_id
-            if message_id in self.msg_id_map.keys():
-                self.msg_id_map[message_id] += 1
+            if self.replies.attempt(event.message_id) > 1:
                 return
-            self.msg_id_map[message_id] = 1
             msg_type = event.type
             if msg_type in self._message_handlers:
                 for handler in self._message_handlers[msg_type]:
@@ -534,7 +533,7 @@ class WecomBotClient:
         """
         handled = await self.push_stream_chunk(msg_id, content, is_final=True)
         if not handled:
-            self.generated_content[msg_id] = content
+            self.replies.set_result(msg_id, content)
 
     def on_message(self, msg_type: str):
         def decorator(func: Callable[[wecombotevent.WecomBotEvent], None]):
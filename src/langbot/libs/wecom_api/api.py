@@ -6,11 +6,22 @@ import httpx
 import traceback
 from quart import Quart
 import xml.etree.ElementTree as ET
-from typing import Callable, Dict, Any
+from typing import Awaitable, Callable, Dict, Any
 from .wecomevent import WecomEvent
 import langbot_plugin.api.entities.builtin.platform.message as platform_message
 import aiofiles
 
+from langbot.pkg.platform import tokens
+
+
+class WecomAPIError(Exception):
+    """A WeCom API call answered with a non-zero errcode"""
+
+    def __init__(self, message: str, data: dict):
+        super().__init__(message)
+        self.errcode = data.get('errcode')
+        self.data = data
+
 
 class WecomClient:
     def __init__(
@@ -24,13 +35,12 @@ class WecomClient:
     ):
         self.corpid = corpid
         self.secret = secret
-        self.access_token_for_contacts = ''
         self.token = token
         self.aes = EncodingAESKey
         self.base_url = 'https://qyapi.weixin.qq.com/cgi-bin'
-        self.access_token = ''
         self.secret_for_contacts = contacts_secret
         self.logger = logger
+        self.wxcpt = None
         self.app = Quart(__name__)
         self.app.add_url_rule(
             '/callback/command',
@@ -43,51 +53,56 @@ class WecomClient:
         }
 
     # access——token操作
-    async def check_access_token(self):
-        return bool(self.access_token and self.access_token.strip())
+    def _token_key(self, secret: str) -> str:
+        return tokens.credential_key('wecom', self.corpid, secret)
 
-    async def check_access_token_for_contacts(self):
-        return bool(self.access_token_for_contacts and self.access_token_for_contacts.strip())
+    async def get_access_token(self, secret: str) -> str:
+        """从共享缓存获取 access_token，临近过期时后台刷新，同一凭据同时只请求一次"""
+        return await tokens.cache.get(self._token_key(secret), lambda: self._fetch_access_token(secret))
 
-    async def get_access_token(self, secret):
+    async def _fetch_access_token(self, secret: str) -> tuple[str, float]:
         url = f'https://qyapi.weixin.qq.com/cgi-bin/gettoken?corpid={self.corpid}&corpsecret={secret}'
         async with httpx.AsyncClient() as client:
             response = await client.get(url)
             data = response.json()
             if 'access_token' in data:
-                return data['access_token']
+                return data['access_token'], data.get('expires_in', 7200)
             else:
                 await self.logger.error(f'获取accesstoken失败:{response.json()}')
                 raise Exception(f'未获取access token: {data}')
 
-    async def get_users(self):
-        if not self.check_access_token_for_contacts():
-            self.access_token_for_contacts = await self.get_access_token(self.secret_for_contacts)
+    async def _call_api(self, request: Callable[[str], Awaitable[dict]], secret: str | None = None) -> dict:
+        """携带 access_token 调用接口，返回 40014/42001 时换新 token 重试一次"""
+        secret = secret or self.secret
+        return await tokens.cache.call(self._token_key(secret), lambda: self._fetch_access_token(secret), request)
 
-        url = self.base_url + '/user/list_id?access_token=' + self.access_token_for_contacts
-        async with httpx.AsyncClient() as client:
-            params = {
-                'cursor': '',
-                'limit': 10000,
-            }
-            response = await client.post(url, json=params)
-            data = response.json()
-            if data['errcode'] == 0:
-                dept_users = data['dept_user']
-                userid = []
-                for user in dept_users:
-                    userid.append(user['userid'])
-                return userid
-            else:
-                raise Exception('未获取用户')
+    async def get_users(self):
+        async def list_users(access_token: str) -> dict:
+            url = self.base_url + '/user/list_id?access_token=' + access_token
+            async with httpx.AsyncClient() as client:
+                params = {
+                    'cursor': '',
+                    'limit': 10000,
+                }
+                response = await client.post(url, json=params)
+                return response.json()
+
+        data = await self._call_api(list_users, self.secret_for_contacts)
+        if data['errcode'] == 0:
+            dept_users = data['dept_user']
+            userid = []
+            for user in dept_users:
+                userid.append(user['userid'])
+            return userid
+        else:
+            raise Exception('未获取用户')
 
     async def send_to_all(self, content: str, agent_id: int):
-        if not self.check_access_token_for_contacts():
-            self.access_token_for_contacts = await self.get_access_token(self.secret_for_contacts)
+        user_ids = await self.get_users()
+        user_ids_string = '|'.join(user_ids)
 
-            url = self.base_url + '/message/send?access_token=' + self.access_token_for_contacts
-            user_ids = await self.get_users()
-            user_ids_string = '|'.join(user_ids)
+        async def send(access_token: str) -> dict:
+            url = self.base_url + '/message/send?access_token=' + access_token
             async with httpx.AsyncClient() as client:
                 params = {
                     'touser': user_ids_string,
@@ -102,63 +117,59 @@ class WecomClient:
                     'duplicate_check_interval': 1800,
                 }
                 response = await client.post(url, json=params)
-                data = response.json()
-                if data['errcode'] != 0:
-                    raise Exception('Failed to send message: ' + str(data))
+                return response.json()
+
+        data = await self._call_api(send, self.secret_for_contacts)
+        if data['errcode'] != 0:
+            raise WecomAPIError('Failed to send message: ' + str(data), data)
 
     async def send_image(self, user_id: str, agent_id: int, media_id: str):
-        if not await self.check_access_token():
-            self.access_token = await self.get_access_token(self.secret)
+        async def send(access_token: str) -> dict:
+            url = self.base_url + '/message/send?access_token=' + access_token
+            async with httpx.AsyncClient() as client:
+                params = {
+                    'touser': user_id,
+                    'msgtype': 'image',
+                    'agentid': agent_id,
+                    'image': {
+                        'media_id': media_id,
+                    },
+                    'safe': 0,
+                    'enable_id_trans': 0,
+                    'enable_duplicate_check': 0,
+                    'duplicate_check_interval': 1800,
+                }
+                response = await client.post(url, json=params)
+                return response.json()
 
-        url = self.base_url + '/message/send?access_token=' + self.access_token
-        async with httpx.AsyncClient() as client:
-            params = {
-                'touser': user_id,
-                'msgtype': 'image',
-                'agentid': agent_id,
-                'image': {
-                    'media_id': media_id,
-                },
-                'safe': 0,
-                'enable_id_trans': 0,
-                'enable_duplicate_check': 0,
-                'duplicate_check_interval': 1800,
-            }
-            response = await client.post(url, json=params)
-            data = response.json()
-            if data['errcode'] == 40014 or data['errcode'] == 42001:
-                self.access_token = await self.get_access_token(self.secret)
-                return await self.send_image(user_id, agent_id, media_id)
-            if data['errcode'] != 0:
-                await self.logger.error(f'发送图片失败:{data}')
-                raise Exception('Failed to send image: ' + str(data))
+        data = await self._call_api(send)
+        if data['errcode'] != 0:
+            await self.logger.error(f'发送图片失败:{data}')
+            raise WecomAPIError('Failed to send image: ' + str(data), data)
 
     async def send_private_msg(self, user_id: str, agent_id: int, content: str):
-        if not await self.check_access_token():
-            self.access_token = await self.get_access_token(self.secret)
+        async def send(access_token: str) -> dict:
+            url = self.base_url + '/message/send?access_token=' + access_token
+            async with httpx.AsyncClient() as client:
+                params = {
+                    'touser': user_id,
+                    'msgtype': 'text',
+                    'agentid': agent_id,
+                    'text': {
+                        'content': content,
+                    },
+                    'safe': 0,
+                    'enable_id_trans': 0,
+                    'enable_duplicate_check': 0,
+                    'duplicate_check_interval': 1800,
+                }
+                response = await client.post(url, json=params)
+                return response.json()
 
-        url = self.base_url + '/message/send?access_token=' + self.access_token
-        async with httpx.AsyncClient() as client:
-            params = {
-                'touser': user_id,
-                'msgtype': 'text',
-                'agentid': agent_id,
-                'text': {
-                    'content': content,
-                },
-                'safe': 0,
-                'enable_id_trans': 0,
-                'enable_duplicate_check': 0,
-                'duplicate_check_interval': 1800,
-            }
-            response = await client.post(url, json=params)
-            data = response.json()
-            if data['errcode'] == 40014 or data['errcode'] == 42001:
-                self.access_token = await self.get_access_token(self.secret)
-                return await self.send_private_msg(user_id, agent_id, content)
-            if data['errcode'] != 0:
-                await self.logger.error(f'发送消息失败:{data}')
-                raise Exception('Failed to send message: ' + str(data))
+        data = await self._call_api(send)
+        if data['errcode'] != 0:
+            await self.logger.error(f'发送消息失败:{data}')
+            raise WecomAPIError('Failed to send message: ' + str(data), data)
 
     async def handle_callback_request(self):
         """
@@ -169,7 +180,9 @@ class WecomClient:
             timestamp = request.args.get('timestamp')
             nonce = request.args.get('nonce')
 
-            wxcpt = WXBizMsgCrypt(self.token, self.aes, self.corpid)
+            if self.wxcpt is None:
+                self.wxcpt = WXBizMsgCrypt(self.token, self.aes, self.corpid)
+            wxcpt = self.wxcpt
             if request.method == 'GET':
                 echostr = request.args.get('echostr')
                 ret, reply_echo_str = wxcpt.VerifyURL(msg_signature, timestamp, nonce, echostr)
@@ -267,10 +280,6 @@ class WecomClient:
         """
         获取 media_id
         """
-        if not await self.check_access_token():
-            self.access_token = await self.get_access_token(self.secret)
-
-        url = self.base_url + '/media/upload?access_token=' + self.access_token + '&type=file'
         file_bytes = None
         file_name = 'uploaded_file.txt'
 
@@ -310,18 +319,19 @@ class WecomClient:
         )
 
         # 上传文件
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, headers=headers, content=body)
-            data = response.json()
-            if data['errcode'] == 40014 or data['errcode'] == 42001:
-                self.access_token = await self.get_access_token(self.secret)
-                media_id = await self.upload_to_work(image)
-            if data.get('errcode', 0) != 0:
-                await self.logger.error(f'上传图片失败:{data}')
-                raise Exception('failed to upload file')
-
-            media_id = data.get('media_id')
-            return media_id
+        async def upload(access_token: str) -> dict:
+            url = self.base_url + '/media/upload?access_token=' + access_token + '&type=file'
+            async with httpx.AsyncClient() as client:
+                response = await client.post(url, headers=headers, content=body)
+                return response.json()
+
+        data = await self._call_api(upload)
+        if data.get('errcode', 0) != 0:
+            await self.logger.error(f'上传图片失败:{data}')
+            raise Exception('failed to upload file')
+
+        media_id = data.get('media_id')
+        return media_id
 
     async def download_image_to_bytes(self, url: str) -> bytes:
         async with httpx.AsyncClient() as client:
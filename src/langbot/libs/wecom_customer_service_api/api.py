@@ -1,27 +1,29 @@
 from quart import request
 from ..wecom_api.WXBizMsgCrypt3 import WXBizMsgCrypt
+from ..wecom_api.api import WecomAPIError
 import base64
 import binascii
 import httpx
 import traceback
 from quart import Quart
 import xml.etree.ElementTree as ET
-from typing import Callable
+from typing import Awaitable, Callable
 from .wecomcsevent import WecomCSEvent
 import langbot_plugin.api.entities.builtin.platform.message as platform_message
 import aiofiles
 
+from langbot.pkg.platform import tokens
+
 
 class WecomCSClient:
     def __init__(self, corpid: str, secret: str, token: str, EncodingAESKey: str, logger: None):
         self.corpid = corpid
         self.secret = secret
-        self.access_token_for_contacts = ''
         self.token = token
         self.aes = EncodingAESKey
         self.base_url = 'https://qyapi.weixin.qq.com/cgi-bin'
-        self.access_token = ''
         self.logger = logger
+        self.wxcpt = None
         self.app = Quart(__name__)
         self.app.add_url_rule(
             '/callback/command', 'handle_callback', self.handle_callback_request, methods=['GET', 'POST']
@@ -31,45 +33,49 @@ class WecomCSClient:
         }
 
     async def get_pic_url(self, media_id: str):
-        if not await self.check_access_token():
-            self.access_token = await self.get_access_token(self.secret)
-
-        url = f'{self.base_url}/media/get?access_token={self.access_token}&media_id={media_id}'
-
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
-            if response.headers.get('Content-Type', '').startswith('application/json'):
-                data = response.json()
-                if data.get('errcode') in [40014, 42001]:
-                    self.access_token = await self.get_access_token(self.secret)
-                    return await self.get_pic_url(media_id)
-                else:
-                    raise Exception('Failed to get image: ' + str(data))
-
-            # 否则是图片，转成 base64
-            image_bytes = response.content
-            content_type = response.headers.get('Content-Type', '')
-            base64_str = base64.b64encode(image_bytes).decode('utf-8')
-            base64_str = f'data:{content_type};base64,{base64_str}'
-            return base64_str
+        async def get_media(access_token: str) -> httpx.Response:
+            url = f'{self.base_url}/media/get?access_token={access_token}&media_id={media_id}'
+            async with httpx.AsyncClient() as client:
+                return await client.get(url)
+
+        def is_token_invalid(response: httpx.Response) -> bool:
+            if not response.headers.get('Content-Type', '').startswith('application/json'):
+                return False
+            return tokens.is_wechat_token_invalid(response.json())
+
+        response = await tokens.cache.call(self._token_key(), self._fetch_access_token, get_media, is_token_invalid)
+        if response.headers.get('Content-Type', '').startswith('application/json'):
+            raise Exception('Failed to get image: ' + str(response.json()))
+
+        # 否则是图片，转成 base64
+        image_bytes = response.content
+        content_type = response.headers.get('Content-Type', '')
+        base64_str = base64.b64encode(image_bytes).decode('utf-8')
+        base64_str = f'data:{content_type};base64,{base64_str}'
+        return base64_str
 
     # access——token操作
-    async def check_access_token(self):
-        return bool(self.access_token and self.access_token.strip())
+    def _token_key(self) -> str:
+        return tokens.credential_key('wecom', self.corpid, self.secret)
 
-    async def check_access_token_for_contacts(self):
-        return bool(self.access_token_for_contacts and self.access_token_for_contacts.strip())
+    async def get_access_token(self) -> str:
+        """从共享缓存获取 access_token，临近过期时后台刷新，同一凭据同时只请求一次"""
+        return await tokens.cache.get(self._token_key(), self._fetch_access_token)
 
-    async def get_access_token(self, secret):
-        url = f'https://qyapi.weixin.qq.com/cgi-bin/gettoken?corpid={self.corpid}&corpsecret={secret}'
+    async def _fetch_access_token(self) -> tuple[str, float]:
+        url = f'https://qyapi.weixin.qq.com/cgi-bin/gettoken?corpid={self.corpid}&corpsecret={self.secret}'
         async with httpx.AsyncClient() as client:
             response = await client.get(url)
             data = response.json()
             if 'access_token' in data:
-                return data['access_token']
+                return data['access_token'], data.get('expires_in', 7200)
             else:
                 raise Exception(f'未获取access token: {data}')
 
+    async def _call_api(self, request: Callable[[str], Awaitable[dict]]) -> dict:
+        """携带 access_token 调用接口，返回 40014/42001 时换新 token 重试一次"""
+        return await tokens.cache.call(self._token_key(), self._fetch_access_token, request)
+
     async def get_detailed_message_list(self, xml_msg: str):
         # 在本方法中解析消息，并且获得消息的具体内容
         if isinstance(xml_msg, bytes):
@@ -83,92 +89,77 @@ class WecomCSClient:
         # else:
         #     self.openkfid_list.append(open_kfid)
 
-        if not await self.check_access_token():
-            self.access_token = await self.get_access_token(self.secret)
-
-        url = self.base_url + '/kf/sync_msg?access_token=' + self.access_token
-        async with httpx.AsyncClient() as client:
-            params = {
-                'token': token,
-                'voice_format': 0,
-                'open_kfid': open_kfid,
-            }
-            response = await client.post(url, json=params)
-            data = response.json()
-            if data['errcode'] == 40014 or data['errcode'] == 42001:
-                self.access_token = await self.get_access_token(self.secret)
-                return await self.get_detailed_message_list(xml_msg)
-            if data['errcode'] != 0:
-                raise Exception('Failed to get message')
-
-            last_msg_data = data['msg_list'][-1]
-            open_kfid = last_msg_data.get('open_kfid')
-            # 进行获取图片操作
-            if last_msg_data.get('msgtype') == 'image':
-                media_id = last_msg_data.get('image').get('media_id')
-                picurl = await self.get_pic_url(media_id)
-                last_msg_data['picurl'] = picurl
-            # await self.change_service_status(userid=external_userid,openkfid=open_kfid,servicer=servicer)
-            return last_msg_data
+        async def sync_msg(access_token: str) -> dict:
+            url = self.base_url + '/kf/sync_msg?access_token=' + access_token
+            async with httpx.AsyncClient() as client:
+                params = {
+                    'token': token,
+                    'voice_format': 0,
+                    'open_kfid': open_kfid,
+                }
+                response = await client.post(url, json=params)
+                return response.json()
+
+        data = await self._call_api(sync_msg)
+        if data['errcode'] != 0:
+            raise Exception('Failed to get message')
+
+        last_msg_data = data['msg_list'][-1]
+        open_kfid = last_msg_data.get('open_kfid')
+        # 进行获取图片操作
+        if last_msg_data.get('msgtype') == 'image':
+            media_id = last_msg_data.get('image').get('media_id')
+            picurl = await self.get_pic_url(media_id)
+            last_msg_data['picurl'] = picurl
+        # await self.change_service_status(userid=external_userid,openkfid=open_kfid,servicer=servicer)
+        return last_msg_data
 
     async def change_service_status(self, userid: str, openkfid: str, servicer: str):
-        if not await self.check_access_token():
-            self.access_token = await self.get_access_token(self.secret)
-        url = self.base_url + '/kf/service_state/get?access_token=' + self.access_token
-        async with httpx.AsyncClient() as client:
-            params = {
-                'open_kfid': openkfid,
-                'external_userid': userid,
-                'service_state': 1,
-                'servicer_userid': servicer,
-            }
-            response = await client.post(url, json=params)
-            data = response.json()
-            if data['errcode'] == 40014 or data['errcode'] == 42001:
-                self.access_token = await self.get_access_token(self.secret)
-                return await self.change_service_status(userid, openkfid)
-            if data['errcode'] != 0:
-                raise Exception('Failed to change service status: ' + str(data))
-
-    async def send_image(self, user_id: str, agent_id: int, media_id: str):
-        if not await self.check_access_token():
-            self.access_token = await self.get_access_token(self.secret)
-        url = self.base_url + '/media/upload?access_token=' + self.access_token
-        async with httpx.AsyncClient() as client:
-            params = {
-                'touser': user_id,
-                'toparty': '',
-                'totag': '',
-                'agentid': agent_id,
-                'msgtype': 'image',
-                'image': {
-                    'media_id': media_id,
-                },
-                'safe': 0,
-                'enable_id_trans': 0,
-                'enable_duplicate_check': 0,
-                'duplicate_check_interval': 1800,
-            }
-            try:
+        async def change(access_token: str) -> dict:
+            url = self.base_url + '/kf/service_state/get?access_token=' + access_token
+            async with httpx.AsyncClient() as client:
+                params = {
+                    'open_kfid': openkfid,
+                    'external_userid': userid,
+                    'service_state': 1,
+                    'servicer_userid': servicer,
+                }
                 response = await client.post(url, json=params)
-                data = response.json()
-            except Exception as e:
-                raise Exception('Failed to send image: ' + str(e))
+                return response.json()
 
-            # 企业微信错误码40014和42001，代表accesstoken问题
-            if data['errcode'] == 40014 or data['errcode'] == 42001:
-                self.access_token = await self.get_access_token(self.secret)
-                return await self.send_image(user_id, agent_id, media_id)
+        data = await self._call_api(change)
+        if data['errcode'] != 0:
+            raise Exception('Failed to change service status: ' + str(data))
 
-            if data['errcode'] != 0:
-                raise Exception('Failed to send image: ' + str(data))
+    async def send_image(self, user_id: str, agent_id: int, media_id: str):
+        async def send(access_token: str) -> dict:
+            url = self.base_url + '/media/upload?access_token=' + access_token
+            async with httpx.AsyncClient() as client:
+                params = {
+                    'touser': user_id,
+                    'toparty': '',
+                    'totag': '',
+                    'agentid': agent_id,
+                    'msgtype': 'image',
+                    'image': {
+                        'media_id': media_id,
+                    },
+                    'safe': 0,
+                    'enable_id_trans': 0,
+                    'enable_duplicate_check': 0,
+                    'duplicate_check_interval': 1800,
+                }
+                try:
+                    response = await client.post(url, json=params)
+                    return response.json()
+                except Exception as e:
+                    raise Exception('Failed to send image: ' + str(e))
+
+        data = await self._call_api(send)
+        if data['errcode'] != 0:
+            raise WecomAPIError('Failed to send image: ' + str(data), data)
 
     async def send_text_msg(self, open_kfid: str, external_userid: str, msgid: str, content: str):
-        if not await self.check_access_token():
-            self.access_token = await self.get_access_token(self.secret)
-
-        url = f'https://qyapi.weixin.qq.com/cgi-bin/kf/send_msg?access_token={self.access_token}'
-
         payload = {
             'touser': external_userid,
             'open_kfid': open_kfid,
@@ -179,17 +170,17 @@ class WecomCSClient:
             },
         }
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=payload)
+        async def send(access_token: str) -> dict:
+            url = f'https://qyapi.weixin.qq.com/cgi-bin/kf/send_msg?access_token={access_token}'
+            async with httpx.AsyncClient() as client:
+                response = await client.post(url, json=payload)
+                return response.json()
 
-            data = response.json()
-            if data['errcode'] == 40014 or data['errcode'] == 42001:
-                self.access_token = await self.get_access_token(self.secret)
-                return await self.send_text_msg(open_kfid, external_userid, msgid, content)
-            if data['errcode'] != 0:
-                await self.logger.error(f'发送消息失败：{data}')
-                raise Exception('Failed to send message')
-            return data
+        data = await self._call_api(send)
+        if data['errcode'] != 0:
+            await self.logger.error(f'发送消息失败：{data}')
+            raise WecomAPIError('Failed to send message', data)
+        return data
 
     async def handle_callback_request(self):
         """
@@ -200,9 +191,11 @@ class WecomCSClient:
             timestamp = request.args.get('timestamp')
             nonce = request.args.get('nonce')
             try:
-                wxcpt = WXBizMsgCrypt(self.token, self.aes, self.corpid)
+                if self.wxcpt is None:
+                    self.wxcpt = WXBizMsgCrypt(self.token, self.aes, self.corpid)
             except Exception as e:
                 raise Exception(f'初始化失败，错误码: {e}')
+            wxcpt = self.wxcpt
 
             if request.method == 'GET':
                 echostr = request.args.get('echostr')
@@ -282,10 +275,6 @@ class WecomCSClient:
         """
         获取 media_id
         """
-        if not await self.check_access_token():
-            self.access_token = await self.get_access_token(self.secret)
-
-        url = self.base_url + '/media/upload?access_token=' + self.access_token + '&type=file'
         file_bytes = None
         file_name = 'uploaded_file.txt'
 
@@ -324,17 +313,18 @@ class WecomCSClient:
         )
 
         # 上传文件
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, headers=headers, content=body)
-            data = response.json()
-            if data['errcode'] == 40014 or data['errcode'] == 42001:
-                self.access_token = await self.get_access_token(self.secret)
-                media_id = await self.upload_to_work(image)
-            if data.get('errcode', 0) != 0:
-                raise Exception('failed to upload file')
-
-            media_id = data.get('media_id')
-            return media_id
+        async def upload(access_token: str) -> dict:
+            url = self.base_url + '/media/upload?access_token=' + access_token + '&type=file'
+            async with httpx.AsyncClient() as client:
+                response = await client.post(url, headers=headers, content=body)
+                return response.json()
+
+        data = await self._call_api(upload)
+        if data.get('errcode', 0) != 0:
+            raise Exception('failed to upload file')
+
+        media_id = data.get('media_id')
+        return media_id
 
     async def download_image_to_bytes(self, url: str) -> bytes:
         async with httpx.AsyncClient() as client:
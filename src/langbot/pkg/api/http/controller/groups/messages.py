@@ -183,7 +183,7 @@ class MessagesRouterGroup(group.RouterGroup):
                     return self.http_status(400, -1, 'message must be a string or array')
                 
                 # Send the message
-                await bot.adapter.send_message(
+                await bot.send_message(
                     target_type=target_type,
                     target_id=str(target_id),
                     message=message_chain,
@@ -0,0 +1,14 @@
+import quart
+
+from .. import group
+
+
+@group.group_class('metrics', '')
+class MetricsRouterGroup(group.RouterGroup):
+    async def initialize(self) -> None:
+        @self.route('/metrics', methods=['GET'], auth_type=group.AuthType.USER_TOKEN_OR_API_KEY)
+        async def _() -> quart.Response:
+            return quart.Response(
+                self.ap.metrics_mgr.to_prometheus(),
+                mimetype='text/plain; version=0.0.4; charset=utf-8',
+            )
@@ -0,0 +1,17 @@
+from ... import group
+from ......platform import ingress
+
+
+@group.group_class('bot-callbacks', '/bots')
+class BotCallbacksRouterGroup(group.RouterGroup):
+    async def initialize(self) -> None:
+        @self.route('/<bot_uuid>/callback', methods=['GET', 'POST'], auth_type=group.AuthType.NONE)
+        async def _(bot_uuid: str):
+            runtime_bot = await self.ap.platform_mgr.get_bot_by_uuid(bot_uuid)
+            if runtime_bot is None or not runtime_bot.enable or not runtime_bot.accepts_unified_webhook():
+                return self.http_status(404, -1, 'Bot not found or does not receive callbacks')
+
+            try:
+                return await runtime_bot.handle_unified_webhook()
+            except ingress.CallbackBusyError:
+                return self.http_status(503, -1, 'Too many callbacks in progress')
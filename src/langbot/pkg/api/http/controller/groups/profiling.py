@@ -0,0 +1,53 @@
+import quart
+
+from .. import group
+
+
+@group.group_class('profiling', '/api/v1/profiling')
+class ProfilingRouterGroup(group.RouterGroup):
+    async def initialize(self) -> None:
+        @self.route('', methods=['GET'], auth_type=group.AuthType.USER_TOKEN_OR_API_KEY)
+        async def _() -> str:
+            return self.success(data=self.ap.query_profiler.to_dict())
+
+        @self.route('/arm', methods=['POST', 'DELETE'], auth_type=group.AuthType.USER_TOKEN_OR_API_KEY)
+        async def _() -> str:
+            if quart.request.method == 'DELETE':
+                self.ap.query_profiler.disarm()
+                return self.success()
+
+            json_data = await quart.request.json or {}
+            try:
+                request = self.ap.query_profiler.arm(
+                    count=int(json_data.get('count', 1)),
+                    bot_uuid=json_data.get('bot_uuid'),
+                    pipeline_uuid=json_data.get('pipeline_uuid'),
+                    memory=bool(json_data.get('memory', True)),
+                )
+            except ValueError as e:
+                return self.http_status(400, -1, str(e))
+            return self.success(data={'request': request.to_dict()})
+
+        @self.route('/arm/<request_id>', methods=['DELETE'], auth_type=group.AuthType.USER_TOKEN_OR_API_KEY)
+        async def _(request_id: str) -> str:
+            self.ap.query_profiler.disarm(request_id)
+            return self.success()
+
+        @self.route('/profiles/<profile_id>', methods=['DELETE'], auth_type=group.AuthType.USER_TOKEN_OR_API_KEY)
+        async def _(profile_id: str) -> str:
+            if not await self.ap.query_profiler.delete(profile_id):
+                return self.http_status(404, -1, 'Profile not found')
+            return self.success()
+
+        @self.route('/profiles/<profile_id>/<kind>', methods=['GET'], auth_type=group.AuthType.USER_TOKEN_OR_API_KEY)
+        async def _(profile_id: str, kind: str) -> quart.Response:
+            data = await self.ap.query_profiler.load(profile_id, kind)
+            if data is None:
+                return self.http_status(404, -1, 'Profile not found')
+
+            mimetype = 'text/plain; charset=utf-8' if kind == 'txt' else 'application/octet-stream'
+            return quart.Response(
+                data,
+                mimetype=mimetype,
+                headers={'Content-Disposition': f'attachment; filename="profile-{profile_id}.{kind}"'},
+            )
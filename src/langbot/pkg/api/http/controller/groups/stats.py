@@ -1,4 +1,6 @@
 from .. import group
+from .....utils import imageref, blobstore
+from .....platform import tokens, ingress
 
 
 @group.group_class('stats', '/api/v1/stats')
@@ -17,3 +19,56 @@ class StatsRouterGroup(group.RouterGroup):
                     'query_count': self.ap.query_pool.query_id_counter,
                 }
             )
+
+        @self.route('/pipeline', methods=['GET'], auth_type=group.AuthType.USER_TOKEN_OR_API_KEY)
+        async def _() -> str:
+            return self.success(data=self.ap.metrics_mgr.to_dict())
+
+        @self.route('/loop', methods=['GET'], auth_type=group.AuthType.USER_TOKEN_OR_API_KEY)
+        async def _() -> str:
+            return self.success(data=self.ap.loop_monitor.to_dict())
+
+        @self.route('/images', methods=['GET'], auth_type=group.AuthType.USER_TOKEN_OR_API_KEY)
+        async def _() -> str:
+            return self.success(data=imageref.cache.to_dict())
+
+        @self.route('/blobs', methods=['GET'], auth_type=group.AuthType.USER_TOKEN_OR_API_KEY)
+        async def _() -> str:
+            return self.success(data=blobstore.store.to_dict())
+
+        @self.route('/callbacks', methods=['GET'], auth_type=group.AuthType.USER_TOKEN_OR_API_KEY)
+        async def _() -> str:
+            return self.success(
+                data={
+                    bot.bot_entity.uuid: bot.callback_limiter.to_dict()
+                    for bot in self.ap.platform_mgr.bots
+                    if bot.accepts_unified_webhook()
+                }
+            )
+
+        @self.route('/dedup', methods=['GET'], auth_type=group.AuthType.USER_TOKEN_OR_API_KEY)
+        async def _() -> str:
+            return self.success(data=ingress.dedup.to_dict())
+
+        @self.route('/tokens', methods=['GET'], auth_type=group.AuthType.USER_TOKEN_OR_API_KEY)
+        async def _() -> str:
+            return self.success(data=tokens.cache.to_dict())
+
+        @self.route('/outbound', methods=['GET'], auth_type=group.AuthType.USER_TOKEN_OR_API_KEY)
+        async def _() -> str:
+            return self.success(
+                data={
+                    bot.bot_entity.uuid: bot.outbound.to_dict()
+                    for bot in self.ap.platform_mgr.bots
+                    if bot.outbound is not None
+                }
+            )
+
+        @self.route('/cluster', methods=['GET'], auth_type=group.AuthType.USER_TOKEN_OR_API_KEY)
+        async def _() -> str:
+            if self.ap.cluster is None:
+                return self.success(data={'enable': False})
+            data = self.ap.cluster.to_dict()
+            if self.ap.cluster_workers is not None:
+                data['worker_processes'] = self.ap.cluster_workers.to_dict()
+            return self.success(data=data)
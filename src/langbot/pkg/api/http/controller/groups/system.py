@@ -33,7 +33,10 @@ class SystemRouterGroup(group.RouterGroup):
             if task_type == '':
                 task_type = None
 
-            return self.success(data=self.ap.task_mgr.get_tasks_dict(task_type))
+            page = quart.request.args.get('page', 1, type=int)
+            page_size = quart.request.args.get('page_size', None, type=int)
+
+            return self.success(data=self.ap.task_mgr.get_tasks_dict(task_type, page=page, page_size=page_size))
 
         @self.route('/tasks/<task_id>', methods=['GET'], auth_type=group.AuthType.USER_TOKEN)
         async def _(task_id: str) -> str:
@@ -7,6 +7,7 @@ import typing
 from ....core import app
 from ....entity.persistence import bot as persistence_bot
 from ....entity.persistence import pipeline as persistence_pipeline
+from ....platform import ingress
 
 
 class BotService:
@@ -57,6 +58,8 @@ class BotService:
         runtime_bot = await self.ap.platform_mgr.get_bot_by_uuid(bot_uuid)
         if runtime_bot is not None:
             adapter_runtime_values['bot_account_id'] = runtime_bot.adapter.bot_account_id
+            if runtime_bot.accepts_unified_webhook():
+                adapter_runtime_values['webhook_path'] = ingress.CALLBACK_PATH.format(bot_uuid=bot_uuid)
 
         persistence_bot['adapter_runtime_values'] = adapter_runtime_values
 
@@ -0,0 +1,191 @@
+"""
+Queues carrying queries and replies between the nodes of a cluster.
+
+Every topic is a FIFO queue and each message in it is taken by exactly one consumer.
+"""
+
+from __future__ import annotations
+
+import abc
+import asyncio
+import collections
+import math
+import time
+
+import sqlalchemy
+import sqlalchemy.ext.asyncio as sqlalchemy_asyncio
+
+from . import resp
+
+
+preregistered_backends: dict[str, type[QueueBackend]] = {}
+
+
+def backend_class(name: str):
+    """Register a queue backend class"""
+
+    def decorator(cls: type[QueueBackend]) -> type[QueueBackend]:
+        cls.name = name
+        preregistered_backends[name] = cls
+        return cls
+
+    return decorator
+
+
+class QueueBackend(abc.ABC):
+    """Base queue backend class"""
+
+    name: str
+
+    async def initialize(self):
+        pass
+
+    @abc.abstractmethod
+    async def publish(self, topic: str, payload: bytes):
+        pass
+
+    @abc.abstractmethod
+    async def consume(self, topic: str, timeout: float) -> bytes | None:
+        """Take the oldest message of a topic, waiting up to `timeout` seconds for one, None if none came"""
+        pass
+
+    async def close(self):
+        pass
+
+
+@backend_class('memory')
+class MemoryQueueBackend(QueueBackend):
+    """Queues in this process, for nodes sharing one event loop"""
+
+    def __init__(self, url: str = ''):
+        self.topics: dict[str, asyncio.Queue[bytes]] = collections.defaultdict(asyncio.Queue)
+
+    async def publish(self, topic: str, payload: bytes):
+        self.topics[topic].put_nowait(payload)
+
+    async def consume(self, topic: str, timeout: float) -> bytes | None:
+        try:
+            return await asyncio.wait_for(self.topics[topic].get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+metadata = sqlalchemy.MetaData()
+
+messages_table = sqlalchemy.Table(
+    'cluster_messages',
+    metadata,
+    sqlalchemy.Column('id', sqlalchemy.Integer, primary_key=True, autoincrement=True),
+    sqlalchemy.Column('topic', sqlalchemy.String(255), nullable=False, index=True),
+    sqlalchemy.Column('payload', sqlalchemy.LargeBinary, nullable=False),
+    sqlalchemy.Column('created_at', sqlalchemy.Float, nullable=False),
+)
+
+
+@backend_class('sql')
+class SQLQueueBackend(QueueBackend):
+    """Queues in a table of a SQLite or PostgreSQL database shared by the nodes.
+
+    Consumers poll the table, backing off from `poll_interval` to `max_poll_interval` while it is empty.
+    A message is taken by deleting its row, on PostgreSQL skipping rows other consumers have locked.
+    """
+
+    url: str
+
+    def __init__(self, url: str, poll_interval: float = 0.01, max_poll_interval: float = 0.2):
+        self.url = url
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.engine: sqlalchemy_asyncio.AsyncEngine | None = None
+
+    async def initialize(self):
+        if self.url.startswith('sqlite'):
+            self.engine = sqlalchemy_asyncio.create_async_engine(self.url, connect_args={'timeout': 30})
+
+            @sqlalchemy.event.listens_for(self.engine.sync_engine, 'connect')
+            def _on_connect(dbapi_connection, connection_record):
+                # readers of other processes do not block writers
+                cursor = dbapi_connection.cursor()
+                cursor.execute('PRAGMA journal_mode=WAL')
+                cursor.close()
+        else:
+            self.engine = sqlalchemy_asyncio.create_async_engine(self.url)
+
+        try:
+            async with self.engine.begin() as conn:
+                await conn.run_sync(metadata.create_all)
+        except sqlalchemy.exc.DBAPIError:
+            # another node created the table at the same time
+            async with self.engine.begin() as conn:
+                await conn.run_sync(metadata.create_all)
+
+    async def publish(self, topic: str, payload: bytes):
+        async with self.engine.begin() as conn:
+            await conn.execute(
+                sqlalchemy.insert(messages_table).values(topic=topic, payload=payload, created_at=time.time())
+            )
+
+    async def _take(self, topic: str) -> bytes | None:
+        oldest = (
+            sqlalchemy.select(messages_table.c.id)
+            .where(messages_table.c.topic == topic)
+            .order_by(messages_table.c.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        async with self.engine.begin() as conn:
+            result = await conn.execute(
+                sqlalchemy.delete(messages_table)
+                .where(messages_table.c.id == oldest)
+                .returning(messages_table.c.payload)
+            )
+            return result.scalar()
+
+    async def consume(self, topic: str, timeout: float) -> bytes | None:
+        deadline = time.monotonic() + timeout
+        interval = self.poll_interval
+        while True:
+            payload = await self._take(topic)
+            if payload is not None:
+                return payload
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            await asyncio.sleep(min(interval, remaining))
+            interval = min(interval * 2, self.max_poll_interval)
+
+    async def close(self):
+        if self.engine is not None:
+            await self.engine.dispose()
+
+
+@backend_class('redis')
+class RESPQueueBackend(QueueBackend):
+    """Queues as lists of a Redis compatible server, or of a `resp.LocalBroker`"""
+
+    url: str
+
+    def __init__(self, url: str):
+        self.url = url
+        self._publisher = resp.RESPConnection(url)
+        # a blocking pop holds its connection until a message comes
+        self._consumers: dict[str, resp.RESPConnection] = {}
+
+    async def initialize(self):
+        await self._publisher.execute('PING')
+
+    async def publish(self, topic: str, payload: bytes):
+        await self._publisher.execute('RPUSH', topic, payload)
+
+    async def consume(self, topic: str, timeout: float) -> bytes | None:
+        if topic not in self._consumers:
+            self._consumers[topic] = resp.RESPConnection(self.url)
+        # Redis before 6.0 only takes whole seconds, and 0 would block forever
+        reply = await self._consumers[topic].execute('BLPOP', topic, max(math.ceil(timeout), 1))
+        return reply[1] if reply else None
+
+    async def close(self):
+        await self._publisher.close()
+        for connection in self._consumers.values():
+            await connection.close()
@@ -0,0 +1,68 @@
+"""
+Messages between cluster nodes, JSON objects with a `kind`:
+
+- query: a query for a worker, with the message event, references to its images not downloaded yet and what
+  the worker needs to know of the adapter
+- reply, chunk, card, send: a call a worker's pipeline made on the adapter, for the ingress node to make
+- fetch: a worker asks the ingress node for an image of a query
+- image: the ingress node's answer to a fetch, on the worker's reply topic
+- done: the worker finished the query
+"""
+
+from __future__ import annotations
+
+import json
+import typing
+
+import pydantic_core
+
+import langbot_plugin.api.entities.builtin.platform.events as platform_events
+import langbot_plugin.api.entities.builtin.platform.message as platform_message
+import langbot_plugin.api.entities.builtin.provider.message as provider_message
+
+
+def encode(data: dict) -> bytes:
+    return pydantic_core.to_json(data, serialize_unknown=True)
+
+
+def decode(payload: bytes) -> dict:
+    return json.loads(payload)
+
+
+_event_classes: dict[str, type[platform_events.MessageEvent]] = {
+    'FriendMessage': platform_events.FriendMessage,
+    'GroupMessage': platform_events.GroupMessage,
+}
+
+
+def dump_event(event: platform_events.MessageEvent) -> dict:
+    """The event without its platform object, which stays on the node that received it"""
+    return event.model_dump()
+
+
+def load_event(data: dict) -> platform_events.MessageEvent:
+    data = dict(data)
+    message_chain = platform_message.MessageChain.model_validate(data.pop('message_chain'))
+    return _event_classes[data['type']].model_validate({**data, 'message_chain': message_chain})
+
+
+def dump_bot_message(
+    message: provider_message.Message | provider_message.MessageChunk | platform_message.MessageChain,
+) -> dict:
+    if isinstance(message, platform_message.MessageChain):
+        return {'type': 'MessageChain', 'message_chain': message.model_dump()}
+    return {'type': type(message).__name__, 'message': message.model_dump()}
+
+
+def load_bot_message(
+    data: dict,
+) -> provider_message.Message | provider_message.MessageChunk | platform_message.MessageChain:
+    if data['type'] == 'MessageChain':
+        return platform_message.MessageChain.model_validate(data['message_chain'])
+    if data['type'] == 'MessageChunk':
+        return provider_message.MessageChunk.model_validate(data['message'])
+    return provider_message.Message.model_validate(data['message'])
+
+
+def load_chain(data: list[dict[str, typing.Any]]) -> platform_message.MessageChain:
+    return platform_message.MessageChain.model_validate(data)
@@ -0,0 +1,547 @@
+"""
+Pipelines run by several processes.
+
+The ingress node keeps the platform connections and the HTTP API. Instead of queueing a query locally it
+publishes it to the queue of the worker its session hashes to, and makes the adapter calls the worker
+publishes back, through the bot that received the query. A worker puts the queries it takes into its own
+`QueryPool`, and its `Controller` runs them. All queries of a session go to the same worker, so the order
+of a session's queries, the session concurrency limit and the conversations kept in memory hold as they do
+in a single process.
+
+Images stay lazy: the query carries references to the images the ingress node has not downloaded, and a
+worker whose pipeline needs one asks the ingress node for it, which downloads it with the adapter's
+credentials.
+
+Delivery is at most once. A worker takes queries off its queue before running them, the queries it held
+when it crashed are lost, and the ingress node gives up waiting for them after `pending_ttl`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import collections
+import dataclasses
+import functools
+import time
+import typing
+import uuid
+
+import pydantic
+
+from ..core import app
+from ..pipeline import pool
+from ..platform.logger import EventLogger
+from ..utils import imageref
+from . import backends, codec, resp, ring
+
+import langbot_plugin.api.entities.builtin.provider.session as provider_session
+import langbot_plugin.api.entities.builtin.pipeline.query as pipeline_query
+import langbot_plugin.api.entities.builtin.platform.events as platform_events
+import langbot_plugin.api.entities.builtin.platform.message as platform_message
+import langbot_plugin.api.definition.abstract.platform.adapter as abstract_platform_adapter
+
+
+ROLE_INGRESS = 'ingress'
+
+ROLE_WORKER = 'worker'
+
+IMAGE_FETCH_TIMEOUT = 60.0
+"""Seconds a worker waits for the ingress node to send an image"""
+
+
+def query_topic(node_id: str) -> str:
+    return f'langbot:queries:{node_id}'
+
+
+def reply_topic(node_id: str) -> str:
+    return f'langbot:replies:{node_id}'
+
+
+def session_key(launcher_type: provider_session.LauncherTypes, launcher_id: typing.Union[int, str]) -> str:
+    """Key the session of a query is hashed by, the same launcher `SessionManager` tells sessions apart by"""
+    return f'{launcher_type.value}_{launcher_id}'
+
+
+def worker_ids(count: int) -> list[str]:
+    return [f'worker-{index}' for index in range(1, count + 1)]
+
+
+def _image_slots(
+    message_chain: platform_message.MessageChain,
+) -> typing.Iterator[typing.Tuple[platform_message.MessageChain, int]]:
+    """Positions of the images of a message chain, including quoted messages, in the same order on every node"""
+    for index, component in enumerate(message_chain):
+        if isinstance(component, platform_message.Image):
+            yield message_chain, index
+        elif isinstance(component, platform_message.Quote) and component.origin:
+            yield from _image_slots(component.origin)
+        elif isinstance(component, platform_message.Forward):
+            for node in component.node_list or []:
+                if node.message_chain:
+                    yield from _image_slots(node.message_chain)
+
+
+class RemoteAdapter(abstract_platform_adapter.AbstractMessagePlatformAdapter):
+    """Adapter of a query on a worker, calls on it are published to the ingress node that received the query"""
+
+    node: typing.Any = pydantic.Field(exclude=True)
+
+    origin: str
+
+    ticket: str
+
+    bot_uuid: str
+
+    stream: bool = False
+
+    async def _publish(self, kind: str, data: dict):
+        await self.node.send_back(self.origin, {'kind': kind, 'ticket': self.ticket, 'bot_uuid': self.bot_uuid, **data})
+
+    async def reply_message(
+        self,
+        message_source: platform_events.MessageEvent,
+        message: platform_message.MessageChain,
+        quote_origin: bool = False,
+    ):
+        await self._publish('reply', {'message': message.model_dump(), 'quote_origin': quote_origin})
+
+    async def reply_message_chunk(
+        self,
+        message_source: platform_events.MessageEvent,
+        bot_message: typing.Any,
+        message: platform_message.MessageChain,
+        quote_origin: bool = False,
+        is_final: bool = False,
+    ):
+        await self._publish(
+            'chunk',
+            {
+                'bot_message': codec.dump_bot_message(bot_message),
+                'message': message.model_dump(),
+                'quote_origin': quote_origin,
+                'is_final': is_final,
+            },
+        )
+
+    async def create_message_card(
+        self, message_id: typing.Union[str, int], event: platform_events.MessageEvent
+    ) -> bool:
+        await self._publish('card', {'message_id': str(message_id)})
+        return True
+
+    async def send_message(self, target_type: str, target_id: str, message: platform_message.MessageChain):
+        await self._publish(
+            'send', {'target_type': target_type, 'target_id': target_id, 'message': message.model_dump()}
+        )
+
+    async def is_stream_output_supported(self) -> bool:
+        return self.stream
+
+    def register_listener(self, event_type, callback):
+        pass
+
+    def unregister_listener(self, event_type, callback):
+        pass
+
+    async def run_async(self):
+        pass
+
+    async def kill(self) -> bool:
+        return True
+
+
+class DispatchingQueryPool(pool.QueryPool):
+    """Query pool of the ingress node, queries are published to the workers instead of queued here"""
+
+    node: ClusterNode
+
+    def __init__(self, node: ClusterNode):
+        super().__init__()
+        self.node = node
+
+    async def add_query(self, *args, **kwargs) -> pipeline_query.Query:
+        query = self.new_query(*args, **kwargs)
+        await self.node.dispatch(query)
+        return query
+
+
+@dataclasses.dataclass
+class PendingQuery:
+    query: pipeline_query.Query
+
+    worker: str
+
+    dispatched_at: float
+
+    last: asyncio.Task | None = None
+    """Delivery of the latest adapter call, each one waits for the previous so replies keep their order"""
+
+    images: list[imageref.LazyImage] = dataclasses.field(default_factory=list)
+    """Images of the query not downloaded yet, the worker asks for them by index"""
+
+
+class ClusterNode:
+    """One process of a cluster, see the module docstring"""
+
+    ap: app.Application
+
+    node_id: str
+
+    role: str
+
+    backend: backends.QueueBackend
+
+    ring: ring.HashRing
+
+    broker: resp.LocalBroker | None
+    """Broker the ingress node serves the queues from, None if they are served elsewhere"""
+
+    def __init__(
+        self,
+        ap: app.Application,
+        node_id: str,
+        role: str,
+        backend: backends.QueueBackend,
+        workers: list[str],
+        broker_url: str = '',
+        prefetch: int = 100,
+        pending_ttl: float = 600.0,
+    ):
+        if role not in (ROLE_INGRESS, ROLE_WORKER):
+            raise ValueError(f'unknown cluster role: {role}')
+        self.ap = ap
+        self.node_id = node_id
+        self.role = role
+        self.backend = backend
+        self.ring = ring.HashRing(workers)
+        self.broker = resp.LocalBroker() if broker_url else None
+        self.broker_url = broker_url
+        self.prefetch = prefetch
+        self.pending_ttl = pending_ttl
+
+        # tickets of an earlier run of this node must not match queries of this one
+        self.incarnation = uuid.uuid4().hex[:8]
+        self.pending: dict[str, PendingQuery] = {}
+        self.origins: dict[str, str] = {}
+        """Ingress node each bot's queries came from, for messages plugins on a worker send"""
+        self.dispatched: collections.Counter[str] = collections.Counter()
+        self.counts = {'queries': 0, 'replies': 0, 'done': 0, 'expired': 0, 'orphaned': 0, 'failed': 0}
+        self._expired_at = time.monotonic()
+        self._deliveries: set[asyncio.Task] = set()
+        self._logger: EventLogger | None = None
+        self._image_requests: dict[str, asyncio.Future] = {}
+        """Images a worker asked the ingress node for, by request id"""
+
+    @classmethod
+    def from_config(cls, ap: app.Application, cluster_cfg: dict) -> ClusterNode | None:
+        """The node configured by the `cluster` section, None if the cluster mode is disabled"""
+        if not cluster_cfg.get('enable', False):
+            return None
+        backend_name = cluster_cfg.get('backend', 'sql')
+        if backend_name not in backends.preregistered_backends:
+            raise ValueError(f'unknown cluster queue backend: {backend_name}')
+        url = cluster_cfg.get('url', '')
+        role = cluster_cfg.get('role', ROLE_INGRESS)
+        serve_broker = backend_name == 'redis' and role == ROLE_INGRESS and cluster_cfg.get('local_broker', False)
+        return cls(
+            ap,
+            node_id=cluster_cfg.get('node_id', '') or role,
+            role=role,
+            backend=backends.preregistered_backends[backend_name](url),
+            workers=worker_ids(int(cluster_cfg.get('workers', 1))),
+            broker_url=url if serve_broker else '',
+            prefetch=int(cluster_cfg.get('prefetch', 100)),
+            pending_ttl=float(cluster_cfg.get('pending_ttl', 600)),
+        )
+
+    @property
+    def is_worker(self) -> bool:
+        return self.role == ROLE_WORKER
+
+    async def initialize(self):
+        if self.broker is not None:
+            await self.broker.start(self.broker_url)
+        await self.backend.initialize()
+        self.ap.logger.info(f'Cluster node {self.node_id} ({self.role}) using the {self.backend.name} queue backend')
+
+    async def run(self):
+        """Take the node's messages off its queues and handle them"""
+        if self.is_worker:
+            # images the worker asked for come back on the reply topic, not behind the queued queries
+            await asyncio.gather(
+                self._consume(query_topic(self.node_id), self._handle_query),
+                self._consume(reply_topic(self.node_id), self._handle_image),
+            )
+        else:
+            await self._consume(reply_topic(self.node_id), self._handle_reply)
+
+    async def _consume(self, topic: str, handle: typing.Callable[[dict], typing.Awaitable[None]]):
+        is_query_topic = topic == query_topic(self.node_id)
+        while True:
+            if is_query_topic:
+                while len(self.ap.query_pool.queries) >= self.prefetch:
+                    await asyncio.sleep(0.05)
+            elif not self.is_worker:
+                self._expire()
+
+            try:
+                payload = await self.backend.consume(topic, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.ap.logger.error(f'Failed to take a message off the cluster queue: {e}')
+                await asyncio.sleep(1)
+                continue
+            if payload is None:
+                continue
+
+            try:
+                await handle(codec.decode(payload))
+            except Exception as e:
+                self.counts['failed'] += 1
+                self.ap.logger.error(f'Failed to handle a cluster message: {e}')
+
+    async def close(self):
+        await self.backend.close()
+        if self.broker is not None:
+            await self.broker.stop()
+
+    # ====== ingress ======
+
+    async def dispatch(self, query: pipeline_query.Query):
+        """Publish a query to the worker its session belongs to"""
+        worker = self.ring.node_for(session_key(query.launcher_type, query.launcher_id))
+        ticket = f'{self.incarnation}-{query.query_id}'
+
+        # the worker can not download images with the adapter's credentials, it asks this node for them
+        images: list[imageref.LazyImage] = []
+        image_refs = []
+        for slot, (chain, index) in enumerate(_image_slots(query.message_event.message_chain)):
+            image = chain[index]
+            if isinstance(image, imageref.LazyImage) and not image.resolved:
+                image_refs.append({'slot': slot, 'key': image.key, 'index': len(images)})
+                images.append(image)
+        data = {
+            'kind': 'query',
+            'origin': self.node_id,
+            'ticket': ticket,
+            'bot_uuid': query.bot_uuid,
+            'pipeline_uuid': query.pipeline_uuid,
+            'launcher_type': query.launcher_type.value,
+            'launcher_id': query.launcher_id,
+            'sender_id': query.sender_id,
+            'variables': query.variables,
+            'event': codec.dump_event(query.message_event),
+            'images': image_refs,
+            'bot_account_id': query.adapter.bot_account_id,
+            'stream': await query.adapter.is_stream_output_supported(),
+        }
+        self.pending[ticket] = PendingQuery(query=query, worker=worker, dispatched_at=time.monotonic(), images=images)
+        try:
+            await self.backend.publish(query_topic(worker), codec.encode(data))
+        except Exception:
+            del self.pending[ticket]
+            raise
+        self.dispatched[worker] += 1
+        self.counts['queries'] += 1
+
+    async def _handle_reply(self, data: dict):
+        if data['kind'] in ('send', 'fetch'):
+            # not ordered with the replies, and plugins may send messages after the query finished
+            self._start_delivery(None, None, data)
+            return
+
+        pending = self.pending.get(data['ticket'])
+        if pending is None:
+            self.counts['orphaned'] += 1
+            return
+        if data['kind'] == 'done':
+            self.pending.pop(data['ticket'])
+        pending.last = self._start_delivery(pending, pending.last, data)
+
+    def _start_delivery(self, pending: PendingQuery | None, previous: asyncio.Task | None, data: dict) -> asyncio.Task:
+        task = asyncio.create_task(self._deliver(pending, previous, data))
+        self._deliveries.add(task)
+        task.add_done_callback(self._deliveries.discard)
+        return task
+
+    async def _deliver(self, pending: PendingQuery | None, previous: asyncio.Task | None, data: dict):
+        if previous is not None:
+            await asyncio.wait({previous})
+
+        kind = data['kind']
+        try:
+            if kind == 'fetch':
+                await self._send_image(data)
+                return
+            if kind == 'send':
+                bot = await self.ap.platform_mgr.get_bot_by_uuid(data['bot_uuid'])
+                if bot is None:
+                    raise LookupError(f'bot {data["bot_uuid"]} not found')
+                await bot.send_message(data['target_type'], data['target_id'], codec.load_chain(data['message']))
+                return
+
+            query = pending.query
+            if kind == 'reply':
+                self.counts['replies'] += 1
+                await self.ap.platform_mgr.reply_to_query(
+                    query, codec.load_chain(data['message']), data['quote_origin']
+                )
+            elif kind == 'chunk':
+                self.counts['replies'] += 1
+                await query.adapter.reply_message_chunk(
+                    message_source=query.message_event,
+                    bot_message=codec.load_bot_message(data['bot_message']),
+                    message=codec.load_chain(data['message']),
+                    quote_origin=data['quote_origin'],
+                    is_final=data['is_final'],
+                )
+            elif kind == 'card':
+                await query.adapter.create_message_card(data['message_id'], query.message_event)
+            elif kind == 'done':
+                self.counts['done'] += 1
+                self.ap.trace_mgr.finish_trace(query, data.get('error'))
+        except Exception as e:
+            self.counts['failed'] += 1
+            self.ap.logger.error(f'Failed to deliver a {kind} message from the cluster: {e}')
+
+    async def _send_image(self, data: dict):
+        """Download an image of a pending query for the worker that asked for it"""
+        reply = {'kind': 'image', 'request': data['request']}
+        pending = self.pending.get(data['ticket'])
+        try:
+            if pending is None or data['index'] >= len(pending.images):
+                raise LookupError(f'image of query {data["ticket"]} is not available anymore')
+            image_bytes, mime_type = await pending.images[data['index']].get_bytes()
+            reply.update(data=base64.b64encode(image_bytes).decode(), mime_type=mime_type)
+        except Exception as e:
+            reply['error'] = str(e)
+        await self.backend.publish(reply_topic(data['worker']), codec.encode(reply))
+
+    def _expire(self):
+        now = time.monotonic()
+        if now - self._expired_at < 1:
+            return
+        self._expired_at = now
+        for ticket in [t for t, p in self.pending.items() if now - p.dispatched_at > self.pending_ttl]:
+            pending = self.pending.pop(ticket)
+            self.counts['expired'] += 1
+            self.ap.logger.warning(f'Query {pending.query.query_id} was not finished by {pending.worker}, giving up')
+            self.ap.trace_mgr.finish_trace(pending.query, 'not finished by its worker')
+
+    # ====== worker ======
+
+    async def _handle_query(self, data: dict):
+        if self._logger is None:
+            self._logger = EventLogger(name=f'cluster-{self.node_id}', ap=self.ap)
+
+        event = codec.load_event(data['event'])
+        # images the ingress node has not downloaded, fetched from it when the pipeline needs them
+        slots = list(_image_slots(event.message_chain))
+        for image_ref in data.get('images', []):
+            chain, index = slots[image_ref['slot']]
+            image = chain[index]
+            chain[index] = imageref.LazyImage.create(
+                f'cluster:{data["origin"]}:{image_ref["key"]}',
+                functools.partial(self._fetch_image, data['origin'], data['ticket'], image_ref['index']),
+                url=image.url or '',
+                image_id=image.image_id or '',
+            )
+
+        adapter = RemoteAdapter(
+            config={},
+            logger=self._logger,
+            bot_account_id=data['bot_account_id'],
+            node=self,
+            origin=data['origin'],
+            ticket=data['ticket'],
+            bot_uuid=data['bot_uuid'],
+            stream=data['stream'],
+        )
+        self.origins[data['bot_uuid']] = data['origin']
+        self.counts['queries'] += 1
+
+        await self.ap.query_pool.add_query(
+            bot_uuid=data['bot_uuid'],
+            launcher_type=provider_session.LauncherTypes(data['launcher_type']),
+            launcher_id=data['launcher_id'],
+            sender_id=data['sender_id'],
+            message_event=event,
+            message_chain=event.message_chain,
+            adapter=adapter,
+            pipeline_uuid=data['pipeline_uuid'],
+            variables=data['variables'],
+        )
+
+    async def _fetch_image(self, origin: str, ticket: str, index: int) -> typing.Tuple[bytes, str]:
+        """Fetcher of an image of a query, downloaded by the ingress node the query came from"""
+        request = uuid.uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+        self._image_requests[request] = future
+        try:
+            await self.backend.publish(
+                reply_topic(origin),
+                codec.encode(
+                    {'kind': 'fetch', 'ticket': ticket, 'index': index, 'request': request, 'worker': self.node_id}
+                ),
+            )
+            reply = await asyncio.wait_for(future, IMAGE_FETCH_TIMEOUT)
+        finally:
+            self._image_requests.pop(request, None)
+        if 'error' in reply:
+            raise ConnectionError(f'ingress node {origin} could not fetch the image: {reply["error"]}')
+        return base64.b64decode(reply['data']), reply['mime_type']
+
+    async def _handle_image(self, data: dict):
+        future = self._image_requests.get(data['request'])
+        if future is not None and not future.done():
+            future.set_result(data)
+
+    async def send_back(self, origin: str, data: dict):
+        if data['kind'] in ('reply', 'chunk'):
+            self.counts['replies'] += 1
+        await self.backend.publish(reply_topic(origin), codec.encode(data))
+
+    async def finish_query(self, query: pipeline_query.Query, error: str | None = None):
+        """Tell the ingress node the query is finished, called by the `Controller` for every query it ran"""
+        if not isinstance(query.adapter, RemoteAdapter):
+            return
+        self.counts['done'] += 1
+        try:
+            await query.adapter._publish('done', {'error': error})
+        except Exception as e:
+            self.ap.logger.error(f'Failed to report query {query.query_id} as finished: {e}')
+
+    async def send_message(
+        self, bot_uuid: str, target_type: str, target_id: str, message: platform_message.MessageChain
+    ):
+        """Send a proactive message through the ingress node the bot's queries came from"""
+        if bot_uuid not in self.origins:
+            raise LookupError(f'no ingress node known for bot {bot_uuid}')
+        await self.send_back(
+            self.origins[bot_uuid],
+            {
+                'kind': 'send',
+                'ticket': '',
+                'bot_uuid': bot_uuid,
+                'target_type': target_type,
+                'target_id': target_id,
+                'message': message.model_dump(),
+            },
+        )
+
+    def to_dict(self) -> dict:
+        data = {
+            'node_id': self.node_id,
+            'role': self.role,
+            'backend': self.backend.name,
+            'workers': list(self.ring.nodes),
+            **self.counts,
+        }
+        if self.is_worker:
+            data['queued'] = len(self.ap.query_pool.queries)
+        else:
+            data['pending'] = len(self.pending)
+            data['dispatched'] = dict(self.dispatched)
+        return data
@@ -0,0 +1,247 @@
+"""
+The part of the Redis protocol the cluster queues need: a client for lists, and a broker serving them from
+memory, so a host without a Redis server can still run several processes on one queue.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import typing
+import urllib.parse
+
+
+class RESPError(Exception):
+    """Error reply of the server"""
+
+
+def encode_command(*args: typing.Any) -> bytes:
+    parts = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode()
+        elif not isinstance(arg, (bytes, bytearray)):
+            arg = str(arg).encode()
+        parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+    return b''.join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader) -> typing.Any:
+    line = await reader.readline()
+    if not line.endswith(b'\r\n'):
+        raise ConnectionError('connection closed')
+    kind, rest = line[:1], line[1:-2]
+    if kind == b'+':
+        return rest.decode()
+    if kind == b'-':
+        raise RESPError(rest.decode())
+    if kind == b':':
+        return int(rest)
+    if kind == b'$':
+        length = int(rest)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if kind == b'*':
+        length = int(rest)
+        if length < 0:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise RESPError(f'unexpected reply {line!r}')
+
+
+async def open_connection(url: str) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """Connect to `redis://host:port/db` or `unix:///path/to/socket`"""
+    parsed = urllib.parse.urlparse(url)
+    if parsed.scheme == 'unix':
+        return await asyncio.open_unix_connection(parsed.path)
+    return await asyncio.open_connection(parsed.hostname or '127.0.0.1', parsed.port or 6379)
+
+
+class RESPConnection:
+    """One connection, commands on it run one at a time"""
+
+    url: str
+
+    def __init__(self, url: str):
+        self.url = url
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._lock = asyncio.Lock()
+
+    async def _connect(self):
+        self._reader, self._writer = await open_connection(self.url)
+        parsed = urllib.parse.urlparse(self.url)
+        if parsed.password:
+            await self._call('AUTH', *([parsed.username] if parsed.username else []), parsed.password)
+        database = parsed.path.strip('/') if parsed.scheme != 'unix' else ''
+        if database:
+            await self._call('SELECT', database)
+
+    async def _call(self, *args: typing.Any) -> typing.Any:
+        self._writer.write(encode_command(*args))
+        await self._writer.drain()
+        return await read_reply(self._reader)
+
+    async def execute(self, *args: typing.Any) -> typing.Any:
+        async with self._lock:
+            try:
+                if self._writer is None:
+                    await self._connect()
+                return await self._call(*args)
+            except (OSError, ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+                # the reply of an interrupted command could still arrive, start over on a new connection
+                self._close()
+                raise
+
+    def _close(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def close(self):
+        async with self._lock:
+            self._close()
+
+
+class LocalBroker:
+    """In-memory lists served over the Redis protocol.
+
+    Supports PING, RPUSH, LPUSH, LPOP, BLPOP, LLEN and DEL, enough for `RESPQueueBackend`. Nothing is
+    persisted, queued messages are lost when the process hosting the broker exits.
+    """
+
+    def __init__(self):
+        self.lists: dict[bytes, collections.deque[bytes]] = {}
+        self.waiters: dict[bytes, collections.deque[asyncio.Future]] = {}
+        self.server: asyncio.AbstractServer | None = None
+
+    async def start(self, url: str):
+        """Listen at `redis://host:port` or `unix:///path/to/socket`"""
+        parsed = urllib.parse.urlparse(url)
+        if parsed.scheme == 'unix':
+            self.server = await asyncio.start_unix_server(self._serve, parsed.path)
+        else:
+            self.server = await asyncio.start_server(self._serve, parsed.hostname or '127.0.0.1', parsed.port or 6379)
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def push(self, key: bytes, value: bytes, left: bool = False):
+        waiters = self.waiters.get(key)
+        while waiters:
+            waiter = waiters.popleft()
+            if not waiter.done():
+                waiter.set_result((key, value))
+                return
+        values = self.lists.setdefault(key, collections.deque())
+        if left:
+            values.appendleft(value)
+        else:
+            values.append(value)
+
+    def pop(self, key: bytes) -> bytes | None:
+        values = self.lists.get(key)
+        if not values:
+            return None
+        value = values.popleft()
+        if not values:
+            del self.lists[key]
+        return value
+
+    async def _blpop(self, reader: asyncio.StreamReader, keys: list[bytes], timeout: float) -> list | None:
+        for key in keys:
+            value = self.pop(key)
+            if value is not None:
+                return [key, value]
+
+        waiter = asyncio.get_running_loop().create_future()
+        for key in keys:
+            self.waiters.setdefault(key, collections.deque()).append(waiter)
+        # the client sends nothing while it waits, so a read only returns once it disconnected
+        closed = asyncio.ensure_future(reader.read(1))
+        try:
+            await asyncio.wait({waiter, closed}, timeout=timeout or None, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            closed.cancel()
+            # the reader accepts the next read only once this one has finished
+            await asyncio.wait({closed})
+            waiter.cancel()
+            for key in keys:
+                waiters = self.waiters.get(key)
+                if waiters is not None and waiter in waiters:
+                    waiters.remove(waiter)
+                    if not waiters:
+                        del self.waiters[key]
+
+        disconnected = not closed.cancelled() and (closed.exception() is not None or closed.result() == b'')
+        if not waiter.cancelled():
+            key, value = waiter.result()
+            if disconnected:
+                # handed over just as the client went away
+                self.push(key, value, left=True)
+                raise ConnectionError('client disconnected')
+            return [key, value]
+        if disconnected:
+            raise ConnectionError('client disconnected')
+        return None
+
+    async def _execute(self, reader: asyncio.StreamReader, command: list[bytes]) -> typing.Any:
+        name = command[0].upper()
+        args = command[1:]
+        if name == b'PING':
+            return 'PONG'
+        if name in (b'RPUSH', b'LPUSH'):
+            for value in args[1:]:
+                self.push(args[0], value, left=name == b'LPUSH')
+            return len(self.lists.get(args[0], ()))
+        if name == b'LPOP':
+            return self.pop(args[0])
+        if name == b'BLPOP':
+            return await self._blpop(reader, args[:-1], float(args[-1]))
+        if name == b'LLEN':
+            return len(self.lists.get(args[0], ()))
+        if name == b'DEL':
+            return sum(self.lists.pop(key, None) is not None for key in args)
+        if name in (b'SELECT', b'AUTH'):
+            return 'OK'
+        return RESPError(f"ERR unknown command '{name.decode(errors='replace')}'")
+
+    @staticmethod
+    def _encode_reply(reply: typing.Any) -> bytes:
+        if isinstance(reply, RESPError):
+            return b'-%s\r\n' % str(reply).encode()
+        if isinstance(reply, str):
+            return b'+%s\r\n' % reply.encode()
+        if isinstance(reply, int):
+            return b':%d\r\n' % reply
+        if reply is None:
+            return b'$-1\r\n'
+        if isinstance(reply, list):
+            return b'*%d\r\n' % len(reply) + b''.join(LocalBroker._encode_reply(item) for item in reply)
+        return b'$%d\r\n%s\r\n' % (len(reply), reply)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    command = await read_reply(reader)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    return
+                if not isinstance(command, list) or not command:
+                    writer.write(b'-ERR expected an array of bulk strings\r\n')
+                else:
+                    try:
+                        reply = await self._execute(reader, command)
+                    except ConnectionError:
+                        return
+                    except (IndexError, ValueError) as e:
+                        reply = RESPError(f'ERR wrong arguments: {e}')
+                    writer.write(self._encode_reply(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import bisect
+import hashlib
+
+
+def _point(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Consistent hashing of keys onto nodes.
+
+    Every node owns `replicas` points on the ring and a key belongs to the node owning the first point
+    after the key's hash, so adding or removing one of n nodes only moves about 1/n of the keys.
+    """
+
+    replicas: int
+
+    nodes: list[str]
+
+    def __init__(self, nodes: list[str], replicas: int = 160):
+        self.replicas = replicas
+        self.nodes = []
+        self._points: list[int] = []
+        self._owners: list[str] = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: str):
+        if node in self.nodes:
+            return
+        self.nodes.append(node)
+        for replica in range(self.replicas):
+            point = _point(f'{node}#{replica}')
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node: str):
+        if node not in self.nodes:
+            return
+        self.nodes.remove(node)
+        kept = [(point, owner) for point, owner in zip(self._points, self._owners) if owner != node]
+        self._points = [point for point, _ in kept]
+        self._owners = [owner for _, owner in kept]
+
+    def node_for(self, key: str) -> str:
+        if not self._points:
+            raise LookupError('the hash ring has no nodes')
+        index = bisect.bisect(self._points, _point(key)) % len(self._points)
+        return self._owners[index]
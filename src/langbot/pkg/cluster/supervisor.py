@@ -0,0 +1,143 @@
+"""
+Worker processes of `langbot --workers N`, a cluster on one host.
+
+The process the user started is the ingress node. It keeps the platform connections and the HTTP API, serves
+the queue broker on a Unix socket in the data directory and runs N worker processes, `langbot` again with
+`--cluster-worker`, which run the pipelines on their own event loops and CPU cores.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+import time
+
+from ..core import app
+from ..utils import constants, platform
+from . import node
+
+
+local_workers: int = 0
+"""Worker processes of this host asked for by `--workers`, 0 when the cluster is configured by the config file"""
+
+local_worker_id: str = ''
+"""Node id of this process when it is one of the worker processes"""
+
+SOCKET_PATH = 'data/cluster.sock'
+
+
+def local_cluster_config(cluster_cfg: dict) -> dict:
+    """The `cluster` section for this process, `cluster_cfg` unless `--workers` was given"""
+    if local_workers <= 0:
+        return cluster_cfg
+    return {
+        **cluster_cfg,
+        'enable': True,
+        'role': node.ROLE_WORKER if local_worker_id else node.ROLE_INGRESS,
+        'node_id': local_worker_id or node.ROLE_INGRESS,
+        'workers': local_workers,
+        'backend': 'redis',
+        'url': f'unix://{os.path.abspath(SOCKET_PATH)}',
+        'local_broker': True,
+    }
+
+
+def check_plugin_runtime(ap: app.Application):
+    """Every process of `--workers` starts its own plugin runtime over stdio, N workers make N + 1 runtimes.
+
+    A plugin runtime serves a single LangBot process, so the processes cannot share a standalone runtime
+    connected over WebSocket, nor the one started on Windows.
+    """
+    if not ap.instance_config.data.get('plugin', {}).get('enable', True):
+        return
+    if platform.get_platform() in ('docker', 'win32') or platform.use_websocket_to_connect_plugin_runtime():
+        raise ValueError(
+            '--workers needs a plugin runtime per process started over stdio, '
+            'it cannot be used with a standalone plugin runtime, in Docker or on Windows unless plugin.enable is false'
+        )
+
+
+class WorkerSupervisor:
+    """Runs the worker processes and starts again the ones that exit.
+
+    A worker exiting again within `max_restart_delay` of its start waits twice as long as the last time.
+    """
+
+    ap: app.Application
+
+    def __init__(self, ap: app.Application, workers: int, restart_delay: float = 1.0, max_restart_delay: float = 30.0):
+        self.ap = ap
+        self.node_ids = node.worker_ids(workers)
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.processes: dict[str, asyncio.subprocess.Process] = {}
+        self.restarts: dict[str, int] = {node_id: 0 for node_id in self.node_ids}
+
+    def command(self, node_id: str) -> list[str]:
+        command = [sys.executable, '-m', 'langbot', '--workers', str(len(self.node_ids)), '--cluster-worker', node_id]
+        if platform.standalone_runtime:
+            command.append('--standalone-runtime')
+        if constants.debug_mode:
+            command.append('--debug')
+        return command
+
+    async def run(self):
+        try:
+            await asyncio.gather(*(self._keep_running(node_id) for node_id in self.node_ids))
+        finally:
+            await self.stop()
+
+    async def _keep_running(self, node_id: str):
+        delay = self.restart_delay
+        while True:
+            started_at = time.monotonic()
+            process = await asyncio.create_subprocess_exec(*self.command(node_id))
+            self.processes[node_id] = process
+            self.ap.logger.info(f'Started worker process {node_id} (pid {process.pid})')
+            returncode = await process.wait()
+
+            if time.monotonic() - started_at > self.max_restart_delay:
+                delay = self.restart_delay
+            self.restarts[node_id] += 1
+            self.ap.logger.warning(
+                f'Worker process {node_id} exited with code {returncode}, starting it again in {delay:.0f}s'
+            )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_restart_delay)
+
+    def kill(self):
+        """Stop the worker processes without waiting, for the exit of this process"""
+        for process in self.processes.values():
+            if process.returncode is None:
+                process.terminate()
+
+    async def stop(self, timeout: float = 10.0):
+        self.kill()
+        for process in self.processes.values():
+            try:
+                await asyncio.wait_for(process.wait(), timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+
+    def to_dict(self) -> dict:
+        return {
+            node_id: {
+                'pid': process.pid,
+                'running': process.returncode is None,
+                'restarts': self.restarts[node_id],
+            }
+            for node_id, process in self.processes.items()
+        }
+
+
+async def exit_with_parent(ap: app.Application, interval: float = 2.0):
+    """Exit a worker process whose ingress process is gone without stopping it"""
+    parent_pid = os.getppid()
+    while True:
+        await asyncio.sleep(interval)
+        if os.getppid() != parent_pid:
+            ap.logger.warning(f'The ingress process {parent_pid} exited, exiting worker process {local_worker_id}')
+            ap.dispose()
+            os._exit(0)
@@ -30,9 +30,16 @@ from ..discover import engine as discover_engine
 from ..storage import mgr as storagemgr
 from ..utils import logcache
 from . import taskmgr
+from .bootutils import log as log_util
 from . import entities as core_entities
 from ..rag.knowledge import kbmgr as rag_mgr
 from ..vector import mgr as vectordb_mgr
+from ..telemetry import metrics
+from ..telemetry import tracing
+from ..telemetry import loopmon
+from ..telemetry import profiler
+from ..cluster import node as cluster_node
+from ..cluster import supervisor as cluster_supervisor
 
 
 class Application:
@@ -43,6 +50,20 @@ class Application:
     # asyncio_tasks: list[asyncio.Task] = []
     task_mgr: taskmgr.AsyncTaskManager = None
 
+    metrics_mgr: metrics.MetricsManager = None
+
+    trace_mgr: tracing.TraceManager = None
+
+    loop_monitor: loopmon.LoopMonitor = None
+
+    query_profiler: profiler.QueryProfiler = None
+
+    cluster: cluster_node.ClusterNode | None = None
+    """This process' node of the cluster, None when pipelines run in this process only"""
+
+    cluster_workers: cluster_supervisor.WorkerSupervisor | None = None
+    """Worker processes of `--workers` run by this process"""
+
     discover: discover_engine.ComponentDiscoveryEngine = None
 
     platform_mgr: im_mgr.PlatformManager = None
@@ -145,22 +166,56 @@ class Application:
                 while True:
                     await asyncio.sleep(1)
 
-            self.task_mgr.create_task(
-                self.platform_mgr.run(),
-                name='platform-manager',
-                scopes=[
-                    core_entities.LifecycleControlScope.APPLICATION,
-                    core_entities.LifecycleControlScope.PLATFORM,
-                ],
-            )
+            # workers of a cluster leave the platform connections and the HTTP API to the ingress node
+            is_worker = self.cluster is not None and self.cluster.is_worker
+
+            if not is_worker:
+                self.task_mgr.create_task(
+                    self.platform_mgr.run(),
+                    name='platform-manager',
+                    scopes=[
+                        core_entities.LifecycleControlScope.APPLICATION,
+                        core_entities.LifecycleControlScope.PLATFORM,
+                    ],
+                )
             self.task_mgr.create_task(
                 self.ctrl.run(),
                 name='query-controller',
                 scopes=[core_entities.LifecycleControlScope.APPLICATION],
             )
+            if not is_worker:
+                self.task_mgr.create_task(
+                    self.http_ctrl.run(),
+                    name='http-api-controller',
+                    scopes=[core_entities.LifecycleControlScope.APPLICATION],
+                )
+            if self.cluster is not None:
+                self.task_mgr.create_task(
+                    self.cluster.run(),
+                    name='cluster-node',
+                    scopes=[core_entities.LifecycleControlScope.APPLICATION],
+                )
+            # the broker is listening now, the workers can connect
+            if self.cluster_workers is not None:
+                self.task_mgr.create_task(
+                    self.cluster_workers.run(),
+                    name='cluster-workers',
+                    scopes=[core_entities.LifecycleControlScope.APPLICATION],
+                )
+            elif cluster_supervisor.local_worker_id:
+                self.task_mgr.create_task(
+                    cluster_supervisor.exit_with_parent(self),
+                    name='cluster-exit-with-parent',
+                    scopes=[core_entities.LifecycleControlScope.APPLICATION],
+                )
+            self.task_mgr.create_task(
+                self.trace_mgr.run(),
+                name='trace-exporter',
+                scopes=[core_entities.LifecycleControlScope.APPLICATION],
+            )
             self.task_mgr.create_task(
-                self.http_ctrl.run(),
-                name='http-api-controller',
+                self.loop_monitor.run(),
+                name='loop-monitor',
                 scopes=[core_entities.LifecycleControlScope.APPLICATION],
             )
 
@@ -170,7 +225,8 @@ class Application:
                 scopes=[core_entities.LifecycleControlScope.APPLICATION],
             )
 
-            await self.print_web_access_info()
+            if not is_worker:
+                await self.print_web_access_info()
             await self.task_mgr.wait_all()
         except asyncio.CancelledError:
             pass
@@ -179,7 +235,12 @@ class Application:
             self.logger.debug(f'Traceback: {traceback.format_exc()}')
 
     def dispose(self):
+        if self.cluster_workers is not None:
+            self.cluster_workers.kill()
         self.plugin_connector.dispose()
+        if self.rag_mgr is not None:
+            self.rag_mgr.dispose()
+        log_util.shutdown_logging()
 
     async def print_web_access_info(self):
         """Print access webui tips"""
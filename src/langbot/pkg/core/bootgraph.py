@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import asyncio
+import time
+import typing
+
+
+class BootStep:
+    """One component initialisation in the boot graph"""
+
+    name: str
+
+    deps: tuple[str, ...]
+    """Steps that must finish before this one starts"""
+
+    func: typing.Callable[[], typing.Awaitable[None]]
+
+    started_at: float | None
+    """Seconds since the graph started running"""
+
+    finished_at: float | None
+
+    def __init__(self, name: str, func: typing.Callable[[], typing.Awaitable[None]], deps: typing.Iterable[str]):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def duration(self) -> float:
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+        return self.finished_at - self.started_at
+
+
+class BootGraph:
+    """Initialise components concurrently, each one as soon as its dependencies are ready.
+
+    If a step fails, the steps still running are cancelled and the error is raised from `run()`.
+    """
+
+    steps: dict[str, BootStep]
+
+    total: float
+    """Wall time of the last `run()`, in seconds"""
+
+    def __init__(self):
+        self.steps = {}
+        self.total = 0.0
+
+    def add(
+        self, name: str, func: typing.Callable[[], typing.Awaitable[None]], deps: typing.Iterable[str] = ()
+    ) -> BootStep:
+        if name in self.steps:
+            raise ValueError(f'Boot step {name} is already defined')
+        step = self.steps[name] = BootStep(name, func, deps)
+        return step
+
+    def check(self):
+        """Raise ValueError on unknown dependencies or dependency cycles"""
+        for step in self.steps.values():
+            for dep in step.deps:
+                if dep not in self.steps:
+                    raise ValueError(f'Boot step {step.name} depends on unknown step {dep}')
+
+        done: set[str] = set()
+        visiting: list[str] = []
+
+        def visit(name: str):
+            if name in done:
+                return
+            if name in visiting:
+                cycle = visiting[visiting.index(name) :] + [name]
+                raise ValueError(f'Boot steps have a dependency cycle: {" -> ".join(cycle)}')
+            visiting.append(name)
+            for dep in self.steps[name].deps:
+                visit(dep)
+            visiting.pop()
+            done.add(name)
+
+        for name in self.steps:
+            visit(name)
+
+    async def run(self):
+        self.check()
+
+        graph_started_at = time.perf_counter()
+        tasks: dict[str, asyncio.Task] = {}
+
+        async def run_step(step: BootStep):
+            if step.deps:
+                await asyncio.gather(*[tasks[dep] for dep in step.deps])
+            step.started_at = time.perf_counter() - graph_started_at
+            await step.func()
+            step.finished_at = time.perf_counter() - graph_started_at
+
+        # all tasks exist before any of them runs, so run_step can look up its dependencies
+        for step in self.steps.values():
+            tasks[step.name] = asyncio.create_task(run_step(step), name=f'boot-{step.name}')
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        finally:
+            self.total = time.perf_counter() - graph_started_at
+
+    def critical_path(self) -> list[str]:
+        """The chain of steps that determined the total boot time"""
+        finished = [step for step in self.steps.values() if step.finished_at is not None]
+        if not finished:
+            return []
+        step = max(finished, key=lambda step: step.finished_at)
+        path = [step.name]
+        while step.deps:
+            step = max((self.steps[dep] for dep in step.deps), key=lambda dep: dep.finished_at or 0.0)
+            path.append(step.name)
+        return path[::-1]
+
+    def report(self) -> str:
+        """Per-step timing table, in start order"""
+        steps = sorted(self.steps.values(), key=lambda step: (step.started_at is None, step.started_at or 0.0))
+        width = max([len(step.name) for step in steps] + [4])
+        lines = [f'{"step":<{width}}  {"start ms":>9}  {"took ms":>9}  after']
+        for step in steps:
+            start = f'{step.started_at * 1000:9.1f}' if step.started_at is not None else f'{"-":>9}'
+            lines.append(f'{step.name:<{width}}  {start}  {step.duration * 1000:9.1f}  {", ".join(step.deps) or "-"}')
+        lines.append(f'total {self.total * 1000:.1f} ms, critical path: {" -> ".join(self.critical_path())}')
+        return '\n'.join(lines)
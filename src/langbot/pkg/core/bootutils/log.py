@@ -1,5 +1,11 @@
+import atexit
+import datetime
+import json
 import logging
+import logging.handlers
+import queue
 import sys
+import threading
 import time
 
 import colorlog
@@ -15,8 +21,143 @@ log_colors_config = {
     'CRITICAL': 'cyan',
 }
 
+_RECORD_ATTRS = frozenset(logging.LogRecord('', 0, '', 0, '', None, None).__dict__) | {'message', 'asctime'}
+"""Attributes every LogRecord has, anything else was passed through `extra=`"""
+
+_listener: 'QueueListener | None' = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, fields passed through `extra=` are kept as top-level keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'ts': datetime.datetime.fromtimestamp(record.created).astimezone().isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'file': record.filename,
+            'line': record.lineno,
+            'msg': record.getMessage(),
+        }
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and key not in data:
+                data[key] = value
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per call site, so a line logged in a hot loop cannot flood the output.
+
+    Records at WARNING and above always pass. When a call site is allowed again, its message
+    tells how many records were suppressed in between.
+    """
+
+    rate: float
+    """Records per second allowed from one call site"""
+
+    burst: int
+
+    buckets: dict[tuple[str, str, int], list]
+    """(logger, path, line) -> [tokens, last refill time, suppressed count]"""
+
+    def __init__(self, rate: float, burst: int):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+
+        key = (record.name, record.pathname, record.lineno)
+        now = record.created
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = [float(self.burst), now, 0]
+            else:
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+
+        if suppressed:
+            record.msg = f'{record.getMessage()} ({suppressed} similar messages suppressed)'
+            record.args = None
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue records for the listener thread, dropping them instead of blocking when the queue is full"""
+
+    dropped: int
+    """Records dropped since the last notice"""
+
+    notice_interval: float = 1.0
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self.last_notice = 0.0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+
+        if self.dropped and record.created - self.last_notice >= self.notice_interval:
+            notice = logging.LogRecord(
+                record.name,
+                logging.WARNING,
+                __file__,
+                0,
+                f'{self.dropped} log records dropped, log queue full',
+                None,
+                None,
+            )
+            try:
+                self.queue.put_nowait(notice)
+            except queue.Full:
+                return
+            self.dropped = 0
+            self.last_notice = record.created
+
+
+class QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # wait for room instead of failing when stopped with a full queue
+        self.queue.put(self._sentinel)
+
+
+def shutdown_logging():
+    """Stop the listener thread after it has written all queued records"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+async def init_logging(extra_handlers: list[logging.Handler] = None, log_cfg: dict | None = None) -> logging.Logger:
+    """Set up the `langbot` logger.
+
+    With `logging.async` (the default), records are put on a queue and formatted and written to
+    console, file and the extra handlers by a listener thread, so the event loop never blocks on I/O.
+    """
+    global _listener
+
+    log_cfg = log_cfg or {}
 
-async def init_logging(extra_handlers: list[logging.Handler] = None) -> logging.Logger:
     # Remove all existing loggers
     for handler in logging.root.handlers[:]:
         logging.root.removeHandler(handler)
@@ -32,6 +173,12 @@ async def init_logging(extra_handlers: list[logging.Handler] = None) -> logging.
 
     qcg_logger.setLevel(level)
 
+    shutdown_logging()
+    for handler in qcg_logger.handlers[:]:
+        qcg_logger.removeHandler(handler)
+    for log_filter in qcg_logger.filters[:]:
+        qcg_logger.removeFilter(log_filter)
+
     color_formatter = colorlog.ColoredFormatter(
         fmt='%(log_color)s[%(asctime)s.%(msecs)03d] %(filename)s (%(lineno)d) - [%(levelname)s] : %(message)s',
         datefmt='%m-%d %H:%M:%S',
@@ -41,18 +188,35 @@ async def init_logging(extra_handlers: list[logging.Handler] = None) -> logging.
     stream_handler = logging.StreamHandler(sys.stdout)
     # stream_handler.setLevel(level)
     # stream_handler.setFormatter(color_formatter)
-    stream_handler.stream = open(sys.stdout.fileno(), mode='w', encoding='utf-8', buffering=1)
+    stream_handler.stream = open(sys.stdout.fileno(), mode='w', encoding='utf-8', buffering=1, closefd=False)
+
+    file_handler = logging.FileHandler(log_file_name, encoding='utf-8')
 
     log_handlers: list[logging.Handler] = [
         stream_handler,
-        logging.FileHandler(log_file_name, encoding='utf-8'),
+        file_handler,
     ]
     log_handlers += extra_handlers if extra_handlers is not None else []
 
     for handler in log_handlers:
         handler.setLevel(level)
         handler.setFormatter(color_formatter)
-        qcg_logger.addHandler(handler)
+
+    if log_cfg.get('file_format', 'text') == 'json':
+        file_handler.setFormatter(JsonFormatter())
+
+    rate_limit_cfg = log_cfg.get('rate_limit', {})
+    if rate_limit_cfg.get('enable', True):
+        qcg_logger.addFilter(RateLimitFilter(rate_limit_cfg.get('rate', 20), rate_limit_cfg.get('burst', 50)))
+
+    if log_cfg.get('async', True):
+        log_queue = queue.Queue(maxsize=log_cfg.get('queue_size', 10000))
+        qcg_logger.addHandler(DroppingQueueHandler(log_queue))
+        _listener = QueueListener(log_queue, *log_handlers, respect_handler_level=True)
+        _listener.start()
+    else:
+        for handler in log_handlers:
+            qcg_logger.addHandler(handler)
 
     qcg_logger.debug('Logging initialized, log level: %s' % level)
     logging.basicConfig(
@@ -65,3 +229,6 @@ async def init_logging(extra_handlers: list[logging.Handler] = None) -> logging.
     )
 
     return qcg_logger
+
+
+atexit.register(shutdown_logging)
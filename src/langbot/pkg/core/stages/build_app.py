@@ -13,6 +13,7 @@ from ...provider.tools import toolmgr as llm_tool_mgr
 from ...rag.knowledge import kbmgr as rag_mgr
 from ...platform import botmgr as im_mgr
 from ...platform.webhook_pusher import WebhookPusher
+from ...platform import tokens as platform_tokens, ingress as platform_ingress
 from ...persistence import mgr as persistencemgr
 from ...api.http.controller import main as http_controller
 from ...api.http.service import user as user_service
@@ -25,19 +26,59 @@ from ...api.http.service import apikey as apikey_service
 from ...api.http.service import webhook as webhook_service
 from ...discover import engine as discover_engine
 from ...storage import mgr as storagemgr
-from ...utils import logcache
+from ...utils import logcache, imageref, blobstore
 from ...vector import mgr as vectordb_mgr
-from .. import taskmgr
+from .. import taskmgr, bootgraph
+from ...telemetry import metrics
+from ...telemetry import tracing
+from ...telemetry import loopmon
+from ...telemetry import profiler
+from ...cluster import node as cluster_node
+from ...cluster import supervisor as cluster_supervisor
 
 
 @stage.stage_class('BuildAppStage')
 class BuildAppStage(stage.BootingStage):
     """Build LangBot application"""
 
+    def init_cluster(self, ap: app.Application):
+        """Set up the cluster node and the query pool, which dispatches the queries to workers on an ingress node"""
+        ap.cluster = cluster_node.ClusterNode.from_config(
+            ap, cluster_supervisor.local_cluster_config(ap.instance_config.data.get('cluster', {}))
+        )
+        if ap.cluster is not None and not ap.cluster.is_worker:
+            ap.query_pool = cluster_node.DispatchingQueryPool(ap.cluster)
+            if cluster_supervisor.local_workers > 0:
+                ap.cluster_workers = cluster_supervisor.WorkerSupervisor(ap, cluster_supervisor.local_workers)
+        else:
+            ap.query_pool = pool.QueryPool()
+
+        if cluster_supervisor.local_workers > 0:
+            cluster_supervisor.check_plugin_runtime(ap)
+
     async def run(self, ap: app.Application):
         """Build LangBot application"""
         ap.task_mgr = taskmgr.AsyncTaskManager(ap)
 
+        ap.metrics_mgr = metrics.MetricsManager(ap)
+        ap.trace_mgr = tracing.TraceManager(ap)
+        ap.loop_monitor = loopmon.LoopMonitor(ap)
+        ap.query_profiler = profiler.QueryProfiler(ap)
+
+        image_cache_cfg = ap.instance_config.data.get('image_cache', {})
+        imageref.cache.max_bytes = int(image_cache_cfg.get('max_mb', 64) * 1024 * 1024)
+
+        blob_store_cfg = ap.instance_config.data.get('blob_store', {})
+        blobstore.store.max_bytes = int(blob_store_cfg.get('max_mb', 128) * 1024 * 1024)
+        blobstore.store.max_spilled_bytes = int(blob_store_cfg.get('spill_max_mb', 1024) * 1024 * 1024)
+
+        platform_ingress.dedup.configure(ap.instance_config.data.get('ingress_dedup', {}))
+
+        token_cache_cfg = ap.instance_config.data.get('access_token_cache', {})
+        platform_tokens.cache.refresh_before = float(token_cache_cfg.get('refresh_before', 300))
+        if token_cache_cfg.get('persist', False):
+            platform_tokens.cache.store = platform_tokens.BinaryStorageTokenStore(ap)
+
         discover = discover_engine.ComponentDiscoveryEngine(ap)
         discover.discover_blueprint('templates/components.yaml')
         ap.discover = discover
@@ -50,67 +91,119 @@ class BuildAppStage(stage.BootingStage):
         await ver_mgr.initialize()
         ap.ver_mgr = ver_mgr
 
-        ap.query_pool = pool.QueryPool()
+        self.init_cluster(ap)
 
         log_cache = logcache.LogCache()
         ap.log_cache = log_cache
 
-        storage_mgr_inst = storagemgr.StorageMgr(ap)
-        await storage_mgr_inst.initialize()
-        ap.storage_mgr = storage_mgr_inst
+        # Initialize webhook pusher
+        webhook_pusher_inst = WebhookPusher(ap)
+        ap.webhook_pusher = webhook_pusher_inst
+
+        # managers are initialised concurrently, each one once the managers it needs are ready
+        boot_graph = bootgraph.BootGraph()
+
+        async def init_storage_mgr():
+            storage_mgr_inst = storagemgr.StorageMgr(ap)
+            await storage_mgr_inst.initialize()
+            ap.storage_mgr = storage_mgr_inst
+
+            if blob_store_cfg.get('spill', True):
+                # blobs spilled by the last run are not referred to anymore, unless this is a worker sharing the
+                # data directory with the ingress node and the other workers
+                if ap.cluster is None or not ap.cluster.is_worker:
+                    await storage_mgr_inst.storage_provider.delete_dir_recursive(blobstore.SPILL_DIR)
+                blobstore.store.storage = storage_mgr_inst.storage_provider
+
+        boot_graph.add('storage', init_storage_mgr)
+
+        async def init_persistence_mgr():
+            persistence_mgr_inst = persistencemgr.PersistenceManager(ap)
+            ap.persistence_mgr = persistence_mgr_inst
+            await persistence_mgr_inst.initialize()
 
-        persistence_mgr_inst = persistencemgr.PersistenceManager(ap)
-        ap.persistence_mgr = persistence_mgr_inst
-        await persistence_mgr_inst.initialize()
+        boot_graph.add('persistence', init_persistence_mgr)
 
-        async def runtime_disconnect_callback(connector: plugin_connector.PluginRuntimeConnector) -> None:
-            await asyncio.sleep(3)
+        async def init_plugin_connector():
+            async def runtime_disconnect_callback(connector: plugin_connector.PluginRuntimeConnector) -> None:
+                await asyncio.sleep(3)
+                await plugin_connector_inst.initialize()
+
+            plugin_connector_inst = plugin_connector.PluginRuntimeConnector(ap, runtime_disconnect_callback)
             await plugin_connector_inst.initialize()
+            ap.plugin_connector = plugin_connector_inst
 
-        plugin_connector_inst = plugin_connector.PluginRuntimeConnector(ap, runtime_disconnect_callback)
-        await plugin_connector_inst.initialize()
-        ap.plugin_connector = plugin_connector_inst
+        boot_graph.add('plugin_connector', init_plugin_connector, deps=['storage', 'persistence'])
 
-        cmd_mgr_inst = cmdmgr.CommandManager(ap)
-        await cmd_mgr_inst.initialize()
-        ap.cmd_mgr = cmd_mgr_inst
+        async def init_cmd_mgr():
+            cmd_mgr_inst = cmdmgr.CommandManager(ap)
+            await cmd_mgr_inst.initialize()
+            ap.cmd_mgr = cmd_mgr_inst
 
-        llm_model_mgr_inst = llm_model_mgr.ModelManager(ap)
-        await llm_model_mgr_inst.initialize()
-        ap.model_mgr = llm_model_mgr_inst
+        boot_graph.add('cmd_mgr', init_cmd_mgr, deps=['plugin_connector'])
 
-        llm_session_mgr_inst = llm_session_mgr.SessionManager(ap)
-        await llm_session_mgr_inst.initialize()
-        ap.sess_mgr = llm_session_mgr_inst
+        async def init_model_mgr():
+            llm_model_mgr_inst = llm_model_mgr.ModelManager(ap)
+            await llm_model_mgr_inst.initialize()
+            ap.model_mgr = llm_model_mgr_inst
 
-        llm_tool_mgr_inst = llm_tool_mgr.ToolManager(ap)
-        await llm_tool_mgr_inst.initialize()
-        ap.tool_mgr = llm_tool_mgr_inst
+        boot_graph.add('model_mgr', init_model_mgr, deps=['persistence'])
 
-        im_mgr_inst = im_mgr.PlatformManager(ap=ap)
-        await im_mgr_inst.initialize()
-        ap.platform_mgr = im_mgr_inst
+        async def init_sess_mgr():
+            llm_session_mgr_inst = llm_session_mgr.SessionManager(ap)
+            await llm_session_mgr_inst.initialize()
+            ap.sess_mgr = llm_session_mgr_inst
 
-        # Initialize webhook pusher
-        webhook_pusher_inst = WebhookPusher(ap)
-        ap.webhook_pusher = webhook_pusher_inst
+        boot_graph.add('sess_mgr', init_sess_mgr)
+
+        async def init_tool_mgr():
+            llm_tool_mgr_inst = llm_tool_mgr.ToolManager(ap)
+            await llm_tool_mgr_inst.initialize()
+            ap.tool_mgr = llm_tool_mgr_inst
+
+        boot_graph.add('tool_mgr', init_tool_mgr, deps=['persistence', 'plugin_connector'])
+
+        async def init_platform_mgr():
+            im_mgr_inst = im_mgr.PlatformManager(ap=ap)
+            await im_mgr_inst.initialize()
+            ap.platform_mgr = im_mgr_inst
 
-        pipeline_mgr = pipelinemgr.PipelineManager(ap)
-        await pipeline_mgr.initialize()
-        ap.pipeline_mgr = pipeline_mgr
+        boot_graph.add('platform_mgr', init_platform_mgr, deps=['storage', 'persistence'])
 
-        rag_mgr_inst = rag_mgr.RAGManager(ap)
-        await rag_mgr_inst.initialize()
-        ap.rag_mgr = rag_mgr_inst
+        async def init_pipeline_mgr():
+            pipeline_mgr = pipelinemgr.PipelineManager(ap)
+            await pipeline_mgr.initialize()
+            ap.pipeline_mgr = pipeline_mgr
+
+        boot_graph.add('pipeline_mgr', init_pipeline_mgr, deps=['persistence'])
+
+        async def init_rag_mgr():
+            rag_mgr_inst = rag_mgr.RAGManager(ap)
+            await rag_mgr_inst.initialize()
+            ap.rag_mgr = rag_mgr_inst
+
+        boot_graph.add('rag_mgr', init_rag_mgr, deps=['persistence', 'storage', 'model_mgr'])
 
         # 初始化向量数据库管理器
-        vectordb_mgr_inst = vectordb_mgr.VectorDBManager(ap)
-        await vectordb_mgr_inst.initialize()
-        ap.vector_db_mgr = vectordb_mgr_inst
+        async def init_vector_db_mgr():
+            vectordb_mgr_inst = vectordb_mgr.VectorDBManager(ap)
+            await vectordb_mgr_inst.initialize()
+            ap.vector_db_mgr = vectordb_mgr_inst
+
+        boot_graph.add('vector_db_mgr', init_vector_db_mgr)
+
+        async def init_http_ctrl():
+            http_ctrl = http_controller.HTTPController(ap)
+            await http_ctrl.initialize()
+            ap.http_ctrl = http_ctrl
+
+        boot_graph.add('http_ctrl', init_http_ctrl)
+
+        if ap.cluster is not None:
+            boot_graph.add('cluster', ap.cluster.initialize)
 
-        http_ctrl = http_controller.HTTPController(ap)
-        await http_ctrl.initialize()
-        ap.http_ctrl = http_ctrl
+        await boot_graph.run()
+        ap.logger.info(f'Components initialized, boot timing:\n{boot_graph.report()}')
 
         user_service_inst = user_service.UserService(ap)
         ap.user_service = user_service_inst
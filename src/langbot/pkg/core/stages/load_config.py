@@ -7,6 +7,7 @@ import importlib.resources as resources
 
 from .. import stage, app
 from ..bootutils import config
+from ...cluster import supervisor as cluster_supervisor
 
 
 def _apply_env_overrides_to_config(cfg: dict) -> dict:
@@ -140,13 +141,18 @@ class LoadConfigStage(stage.BootingStage):
         # Apply environment variable overrides to data/config.yaml
         ap.instance_config.data = _apply_env_overrides_to_config(ap.instance_config.data)
 
-        await ap.instance_config.dump_config()
+        # worker processes of `--workers` start together, the ingress process has written the files already
+        is_local_worker = bool(cluster_supervisor.local_worker_id)
+
+        if not is_local_worker:
+            await ap.instance_config.dump_config()
 
         ap.sensitive_meta = await config.load_json_config(
             'data/metadata/sensitive-words.json',
             'metadata/sensitive-words.json',
         )
-        await ap.sensitive_meta.dump_config()
+        if not is_local_worker:
+            await ap.sensitive_meta.dump_config()
 
         async def load_resource_yaml_template_data(resource_name: str) -> dict:
             with resources.files('langbot.templates').joinpath(resource_name).open('r', encoding='utf-8') as f:
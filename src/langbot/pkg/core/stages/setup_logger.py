@@ -43,4 +43,4 @@ class SetupLoggerStage(stage.BootingStage):
         extra_handlers = []
         extra_handlers = [persistence_handler]
 
-        ap.logger = await log.init_logging(extra_handlers)
+        ap.logger = await log.init_logging(extra_handlers, ap.instance_config.data.get('logging', {}))
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import asyncio
+import collections
 import typing
 import datetime
 
@@ -122,13 +123,13 @@ class TaskWrapper:
             if self.task_stack is None:
                 self.task_stack = self.task.get_stack()
             return exception
-        except Exception:
+        except (Exception, asyncio.CancelledError):
             return None
 
     def assume_result(self):
         try:
             return self.task.result()
-        except Exception:
+        except (Exception, asyncio.CancelledError):
             return None
 
     def to_dict(self) -> dict:
@@ -166,16 +167,39 @@ class TaskWrapper:
 
 class AsyncTaskManager:
     """Save all asynchronous tasks in the app
-    Include system-level and user-level (plugin installation, update, etc. initiated by users directly)"""
+    Include system-level and user-level (plugin installation, update, etc. initiated by users directly)
+
+    Running tasks are indexed by id and by scope. Finished tasks are kept in a bounded ring
+    buffer per kind, except tasks of `ephemeral_kinds` (one per message), which are dropped
+    as soon as they complete unless they failed."""
 
     ap: app.Application
 
-    tasks: list[TaskWrapper]
-    """All tasks"""
+    tasks: dict[int, TaskWrapper]
+    """Running tasks by id"""
+
+    scope_index: dict[core_entities.LifecycleControlScope, dict[int, TaskWrapper]]
+    """Running tasks by scope"""
+
+    finished_tasks: dict[str, collections.deque[TaskWrapper]]
+    """Recently finished tasks, per kind"""
+
+    finished_index: dict[int, TaskWrapper]
+    """Recently finished tasks by id"""
+
+    history_size: int
+    """Maximum number of finished tasks kept per kind"""
 
-    def __init__(self, ap: app.Application):
+    ephemeral_kinds: set[str] = {'query'}
+    """Kinds whose tasks are not kept after completing successfully"""
+
+    def __init__(self, ap: app.Application, history_size: int = 100):
         self.ap = ap
-        self.tasks = []
+        self.tasks = {}
+        self.scope_index = {}
+        self.finished_tasks = {}
+        self.finished_index = {}
+        self.history_size = history_size
 
     def create_task(
         self,
@@ -188,7 +212,10 @@ class AsyncTaskManager:
         scopes: list[core_entities.LifecycleControlScope] = [core_entities.LifecycleControlScope.APPLICATION],
     ) -> TaskWrapper:
         wrapper = TaskWrapper(self.ap, coro, task_type, kind, name, label, context, scopes)
-        self.tasks.append(wrapper)
+        self.tasks[wrapper.id] = wrapper
+        for scope in wrapper.scopes:
+            self.scope_index.setdefault(scope, {})[wrapper.id] = wrapper
+        wrapper.task.add_done_callback(lambda _: self._on_task_done(wrapper))
         return wrapper
 
     def create_user_task(
@@ -202,35 +229,57 @@ class AsyncTaskManager:
     ) -> TaskWrapper:
         return self.create_task(coro, 'user', kind, name, label, context, scopes)
 
+    def _on_task_done(self, wrapper: TaskWrapper):
+        self.tasks.pop(wrapper.id, None)
+        for scope in wrapper.scopes:
+            self.scope_index.get(scope, {}).pop(wrapper.id, None)
+
+        if wrapper.kind in self.ephemeral_kinds and wrapper.assume_exception() is None:
+            return
+
+        history = self.finished_tasks.setdefault(wrapper.kind, collections.deque())
+        if len(history) >= self.history_size:
+            evicted = history.popleft()
+            self.finished_index.pop(evicted.id, None)
+        history.append(wrapper)
+        self.finished_index[wrapper.id] = wrapper
+
     async def wait_all(self):
-        await asyncio.gather(*[t.task for t in self.tasks], return_exceptions=True)
+        await asyncio.gather(*[t.task for t in list(self.tasks.values())], return_exceptions=True)
 
     def get_all_tasks(self) -> list[TaskWrapper]:
-        return self.tasks
+        return sorted([*self.tasks.values(), *self.finished_index.values()], key=lambda t: t.id)
 
     def get_tasks_dict(
         self,
         type: str = None,
+        page: int = 1,
+        page_size: int = None,
     ) -> dict:
+        """Tasks newest first, `page_size` None returns all of them"""
+        tasks = [t for t in reversed(self.get_all_tasks()) if type is None or t.task_type == type]
+        total = len(tasks)
+        if page_size is not None:
+            start = (max(page, 1) - 1) * page_size
+            tasks = tasks[start : start + page_size]
+
         return {
-            'tasks': [t.to_dict() for t in self.tasks if type is None or t.task_type == type],
+            'tasks': [t.to_dict() for t in tasks],
+            'total': total,
+            'page': page,
+            'page_size': page_size,
             'id_index': TaskWrapper._id_index,
         }
 
     def get_task_by_id(self, id: int) -> TaskWrapper | None:
-        for t in self.tasks:
-            if t.id == id:
-                return t
-        return None
+        return self.tasks.get(id) or self.finished_index.get(id)
 
     def cancel_by_scope(self, scope: core_entities.LifecycleControlScope):
-        for wrapper in self.tasks:
-            if not wrapper.task.done() and scope in wrapper.scopes:
+        for wrapper in list(self.scope_index.get(scope, {}).values()):
+            if not wrapper.task.done():
                 wrapper.task.cancel()
 
     def cancel_task(self, task_id: int):
-        for wrapper in self.tasks:
-            if wrapper.id == task_id:
-                if not wrapper.task.done():
-                    wrapper.task.cancel()
-                return
+        wrapper = self.tasks.get(task_id)
+        if wrapper is not None and not wrapper.task.done():
+            wrapper.task.cancel()
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import typing
+import collections.abc
 import importlib
 import os
 import yaml
@@ -180,6 +181,40 @@ class Component(pydantic.BaseModel):
         }
 
 
+class LazyComponentClassDict(collections.abc.Mapping):
+    """Component classes by component name, a component's module is imported on first access.
+
+    Adapters and requesters pull in large SDKs, this keeps the ones no bot or model uses out of the process.
+    """
+
+    components: dict[str, Component]
+
+    _classes: dict[str, typing.Type[typing.Any]]
+
+    def __init__(self, components: typing.Iterable[Component]):
+        self.components = {component.metadata.name: component for component in components}
+        self._classes = {}
+
+    def __getitem__(self, name: str) -> typing.Type[typing.Any]:
+        cls = self._classes.get(name)
+        if cls is None:
+            cls = self._classes[name] = self.components[name].get_python_component_class()
+        return cls
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.components
+
+    def __iter__(self) -> typing.Iterator[str]:
+        return iter(self.components)
+
+    def __len__(self) -> int:
+        return len(self.components)
+
+    def is_loaded(self, name: str) -> bool:
+        """Whether the component's module has been imported through this dict"""
+        return name in self._classes
+
+
 class ComponentDiscoveryEngine:
     """组件发现引擎"""
 
@@ -24,6 +24,10 @@ class KnowledgeBase(Base):
     created_at = sqlalchemy.Column(sqlalchemy.DateTime, default=sqlalchemy.func.now())
     embedding_model_uuid = sqlalchemy.Column(sqlalchemy.String, default='')
     top_k = sqlalchemy.Column(sqlalchemy.Integer, default=5)
+    chunk_size = sqlalchemy.Column(sqlalchemy.Integer, nullable=False, default=256)
+    """Maximum chunk size, in tokens"""
+    chunk_overlap = sqlalchemy.Column(sqlalchemy.Integer, nullable=False, default=32)
+    """Overlap between consecutive chunks, in tokens"""
 
 
 class File(Base):
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import datetime
+import time
 import typing
 import json
 import uuid
@@ -126,10 +127,18 @@ class PersistenceManager:
         # =================================
 
     async def execute_async(self, *args, **kwargs) -> sqlalchemy.engine.cursor.CursorResult:
+        statement = args[0] if args else kwargs.get('statement')
+        timed = isinstance(statement, sqlalchemy.sql.dml.UpdateBase) and self.ap.metrics_mgr.should_sample()
+        if timed:
+            started_at = time.perf_counter()
+
         async with self.get_db_engine().connect() as conn:
             result = await conn.execute(*args, **kwargs)
             await conn.commit()
-            return result
+
+        if timed:
+            self.ap.metrics_mgr.db_write_duration.observe(time.perf_counter() - started_at, statement.table.name)
+        return result
 
     def get_db_engine(self) -> sqlalchemy_asyncio.AsyncEngine:
         return self.db.get_engine()
@@ -0,0 +1,38 @@
+import sqlalchemy
+from .. import migration
+
+
+@migration.migration_class(13)
+class DBMigrateKnowledgeBaseChunkSettings(migration.DBMigration):
+    """Per knowledge base chunk size and overlap, measured in tokens"""
+
+    async def upgrade(self):
+        """Upgrade"""
+        columns = []
+
+        if self.ap.persistence_mgr.db.name == 'postgresql':
+            result = await self.ap.persistence_mgr.execute_async(
+                sqlalchemy.text(
+                    "SELECT column_name FROM information_schema.columns WHERE table_name = 'knowledge_bases';"
+                )
+            )
+            all_result = result.fetchall()
+            columns = [row[0] for row in all_result]
+        else:
+            result = await self.ap.persistence_mgr.execute_async(sqlalchemy.text('PRAGMA table_info(knowledge_bases);'))
+            all_result = result.fetchall()
+            columns = [row[1] for row in all_result]
+
+        if 'chunk_size' not in columns:
+            await self.ap.persistence_mgr.execute_async(
+                sqlalchemy.text('ALTER TABLE knowledge_bases ADD COLUMN chunk_size INTEGER NOT NULL DEFAULT 256')
+            )
+
+        if 'chunk_overlap' not in columns:
+            await self.ap.persistence_mgr.execute_async(
+                sqlalchemy.text('ALTER TABLE knowledge_bases ADD COLUMN chunk_overlap INTEGER NOT NULL DEFAULT 32')
+            )
+
+    async def downgrade(self):
+        """Downgrade"""
+        pass
@@ -50,16 +50,30 @@ class Controller:
                 if selected_query:
 
                     async def _process_query(selected_query: pipeline_query.Query):
-                        async with self.semaphore:  # 总并发上限
-                            # find pipeline
-                            # Here firstly find the bot, then find the pipeline, in case the bot adapter's config is not the latest one.
-                            # Like aiocqhttp, once a client is connected, even the adapter was updated and restarted, the existing client connection will not be affected.
-                            pipeline_uuid = selected_query.pipeline_uuid
-
-                            if pipeline_uuid:
-                                pipeline = await self.ap.pipeline_mgr.get_pipeline_by_uuid(pipeline_uuid)
-                                if pipeline:
-                                    await pipeline.run(selected_query)
+                        trace = self.ap.trace_mgr.get_trace(selected_query)
+                        error = None
+                        try:
+                            async with self.semaphore:  # 总并发上限
+                                if trace is not None:
+                                    # time spent waiting for the session and the global concurrency limit
+                                    self.ap.trace_mgr.record_span(trace, 'query.queue', trace.enqueued_ns)
+
+                                # find pipeline
+                                # Here firstly find the bot, then find the pipeline, in case the bot adapter's config is not the latest one.
+                                # Like aiocqhttp, once a client is connected, even the adapter was updated and restarted, the existing client connection will not be affected.
+                                pipeline_uuid = selected_query.pipeline_uuid
+
+                                if pipeline_uuid:
+                                    pipeline = await self.ap.pipeline_mgr.get_pipeline_by_uuid(pipeline_uuid)
+                                    if pipeline:
+                                        await pipeline.run(selected_query)
+                        except Exception as e:
+                            error = str(e)
+                            raise
+                        finally:
+                            self.ap.trace_mgr.finish_trace(selected_query, error)
+                            if self.ap.cluster is not None:
+                                await self.ap.cluster.finish_query(selected_query, error)
 
                         async with self.ap.query_pool:
                             (await self.ap.sess_mgr.get_session(selected_query))._semaphore.release()
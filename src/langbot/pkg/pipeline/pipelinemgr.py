@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import asyncio
+import time
 import typing
 import traceback
 
@@ -13,6 +15,7 @@ import langbot_plugin.api.entities.builtin.platform.message as platform_message
 import langbot_plugin.api.entities.builtin.platform.events as platform_events
 import langbot_plugin.api.entities.events as events
 from ..utils import importutil
+from .resprule import prefilter
 
 import langbot_plugin.api.entities.builtin.provider.session as provider_session
 import langbot_plugin.api.entities.builtin.pipeline.query as pipeline_query
@@ -75,6 +78,9 @@ class RuntimePipeline:
     bound_mcp_servers: list[str]
     """绑定到此流水线的MCP服务器列表（格式：uuid）"""
 
+    ingress_filter: prefilter.IngressFilter | None
+    """群响应规则的预过滤器，在消息入队前检查"""
+
     def __init__(
         self,
         ap: app.Application,
@@ -93,12 +99,22 @@ class RuntimePipeline:
         mcp_server_list = extensions_prefs.get('mcp_servers', [])
         self.bound_mcp_servers = mcp_server_list if mcp_server_list else []
 
+        self.ingress_filter = prefilter.IngressFilter.from_pipeline_config(pipeline_entity.config)
+
     async def run(self, query: pipeline_query.Query):
         query.pipeline_config = self.pipeline_entity.config
         # Store bound plugins and MCP servers in query for filtering
         query.variables['_pipeline_bound_plugins'] = self.bound_plugins
         query.variables['_pipeline_bound_mcp_servers'] = self.bound_mcp_servers
-        await self.process_query(query)
+
+        span = self.ap.trace_mgr.start_span(query, 'pipeline', {'pipeline.uuid': self.pipeline_entity.uuid})
+        try:
+            if self.ap.query_profiler.armed:
+                await self.ap.query_profiler.profile(query, self.pipeline_entity.uuid, self.process_query(query))
+            else:
+                await self.process_query(query)
+        finally:
+            self.ap.trace_mgr.end_span(query, span)
 
     async def _check_output(self, query: pipeline_query.Query, result: pipeline_entities.StageProcessResult):
         """检查输出"""
@@ -123,9 +139,9 @@ class RuntimePipeline:
                     is_final=[msg.is_final for msg in query.resp_messages][0],
                 )
             else:
-                await query.adapter.reply_message(
-                    message_source=query.message_event,
-                    message=result.user_notice,
+                await self.ap.platform_mgr.reply_to_query(
+                    query,
+                    result.user_notice,
                     quote_origin=query.pipeline_config['output']['misc']['quote-origin'],
                 )
         if result.debug_notice:
@@ -162,43 +178,81 @@ class RuntimePipeline:
         """
         i = stage_index
 
+        metrics_mgr = self.ap.metrics_mgr
+        trace_mgr = self.ap.trace_mgr
+        timed = metrics_mgr.should_sample(query.query_id)
+
         while i < len(self.stage_containers):
             stage_container = self.stage_containers[i]
 
             query.current_stage_name = stage_container.inst_name  # 标记到 Query 对象里
 
-            result = stage_container.inst.process(query, stage_container.inst_name)
-
-            if isinstance(result, typing.Coroutine):
-                result = await result
-
-            if isinstance(result, pipeline_entities.StageProcessResult):  # 直接返回结果
-                self.ap.logger.debug(
-                    f'Stage {stage_container.inst_name} processed query {query.query_id} res {result.result_type}'
-                )
-                await self._check_output(query, result)
-
-                if result.result_type == pipeline_entities.ResultType.INTERRUPT:
-                    self.ap.logger.debug(f'Stage {stage_container.inst_name} interrupted query {query.query_id}')
-                    break
-                elif result.result_type == pipeline_entities.ResultType.CONTINUE:
-                    query = result.new_query
-            elif isinstance(result, typing.AsyncGenerator):  # 生成器
-                self.ap.logger.debug(f'Stage {stage_container.inst_name} processed query {query.query_id} gen')
-
-                async for sub_result in result:
+            if timed:
+                started_at = time.perf_counter()
+            span = trace_mgr.start_span(query, f'stage {stage_container.inst_name}')
+
+            try:
+                result = stage_container.inst.process(query, stage_container.inst_name)
+
+                if isinstance(result, typing.Coroutine):
+                    result = await result
+
+                if isinstance(result, pipeline_entities.StageProcessResult):  # 直接返回结果
+                    if timed:
+                        metrics_mgr.stage_duration.observe(
+                            time.perf_counter() - started_at,
+                            query.pipeline_uuid,
+                            stage_container.inst_name,
+                            query.bot_uuid,
+                        )
+                    trace_mgr.end_span(query, span)
                     self.ap.logger.debug(
-                        f'Stage {stage_container.inst_name} processed query {query.query_id} res {sub_result.result_type}'
+                        f'Stage {stage_container.inst_name} processed query {query.query_id} res {result.result_type}'
                     )
-                    await self._check_output(query, sub_result)
+                    await self._check_output(query, result)
 
-                    if sub_result.result_type == pipeline_entities.ResultType.INTERRUPT:
+                    if result.result_type == pipeline_entities.ResultType.INTERRUPT:
                         self.ap.logger.debug(f'Stage {stage_container.inst_name} interrupted query {query.query_id}')
                         break
-                    elif sub_result.result_type == pipeline_entities.ResultType.CONTINUE:
-                        query = sub_result.new_query
-                        await self._execute_from_stage(i + 1, query)
-                break
+                    elif result.result_type == pipeline_entities.ResultType.CONTINUE:
+                        query = result.new_query
+                elif isinstance(result, typing.AsyncGenerator):  # 生成器
+                    self.ap.logger.debug(f'Stage {stage_container.inst_name} processed query {query.query_id} gen')
+
+                    async for sub_result in result:
+                        if timed:
+                            # only the time spent producing this result, later stages are timed on their own
+                            metrics_mgr.stage_duration.observe(
+                                time.perf_counter() - started_at,
+                                query.pipeline_uuid,
+                                stage_container.inst_name,
+                                query.bot_uuid,
+                            )
+                        trace_mgr.end_span(query, span)
+                        self.ap.logger.debug(
+                            f'Stage {stage_container.inst_name} processed query {query.query_id} res {sub_result.result_type}'
+                        )
+                        await self._check_output(query, sub_result)
+
+                        if sub_result.result_type == pipeline_entities.ResultType.INTERRUPT:
+                            self.ap.logger.debug(
+                                f'Stage {stage_container.inst_name} interrupted query {query.query_id}'
+                            )
+                            break
+                        elif sub_result.result_type == pipeline_entities.ResultType.CONTINUE:
+                            query = sub_result.new_query
+                            await self._execute_from_stage(i + 1, query)
+
+                        if timed:
+                            started_at = time.perf_counter()
+                        span = trace_mgr.start_span(query, f'stage {stage_container.inst_name}')
+                    # the span opened for the result that never came
+                    trace_mgr.end_span(query, span)
+                    break
+            except Exception as e:
+                # a stage that fails is exported as failed, spans it already ended are left as they are
+                trace_mgr.end_span(query, span, str(e))
+                raise
 
             i += 1
 
@@ -233,6 +287,7 @@ class RuntimePipeline:
             await self._execute_from_stage(0, query)
         except Exception as e:
             inst_name = query.current_stage_name if query.current_stage_name else 'unknown'
+            self.ap.trace_mgr.set_error(query, f'stage={inst_name}: {e}')
             self.ap.logger.error(f'Error processing query {query.query_id} stage={inst_name} : {e}')
             self.ap.logger.error(f'Traceback: {traceback.format_exc()}')
         finally:
@@ -268,8 +323,7 @@ class PipelineManager:
         pipelines = result.all()
 
         # load pipelines
-        for pipeline in pipelines:
-            await self.load_pipeline(pipeline)
+        await asyncio.gather(*[self.load_pipeline(pipeline) for pipeline in pipelines])
 
     async def load_pipeline(
         self,
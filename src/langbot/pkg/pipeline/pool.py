@@ -31,6 +31,36 @@ class QueryPool:
         self.cached_queries = {}
         self.condition = asyncio.Condition(self.pool_lock)
 
+    def new_query(
+        self,
+        bot_uuid: str,
+        launcher_type: provider_session.LauncherTypes,
+        launcher_id: typing.Union[int, str],
+        sender_id: typing.Union[int, str],
+        message_event: platform_events.MessageEvent,
+        message_chain: platform_message.MessageChain,
+        adapter: abstract_platform_adapter.AbstractMessagePlatformAdapter,
+        pipeline_uuid: typing.Optional[str] = None,
+        variables: typing.Optional[dict[str, typing.Any]] = None,
+    ) -> pipeline_query.Query:
+        """Create a query with the next id, without queueing it"""
+        query_id = self.query_id_counter
+        self.query_id_counter += 1
+        return pipeline_query.Query(
+            bot_uuid=bot_uuid,
+            query_id=query_id,
+            launcher_type=launcher_type,
+            launcher_id=launcher_id,
+            sender_id=sender_id,
+            message_event=message_event,
+            message_chain=message_chain,
+            variables=variables or {},
+            resp_messages=[],
+            resp_message_chain=[],
+            adapter=adapter,
+            pipeline_uuid=pipeline_uuid,
+        )
+
     async def add_query(
         self,
         bot_uuid: str,
@@ -41,27 +71,24 @@ class QueryPool:
         message_chain: platform_message.MessageChain,
         adapter: abstract_platform_adapter.AbstractMessagePlatformAdapter,
         pipeline_uuid: typing.Optional[str] = None,
+        variables: typing.Optional[dict[str, typing.Any]] = None,
     ) -> pipeline_query.Query:
         async with self.condition:
-            query_id = self.query_id_counter
-            query = pipeline_query.Query(
-                bot_uuid=bot_uuid,
-                query_id=query_id,
-                launcher_type=launcher_type,
-                launcher_id=launcher_id,
-                sender_id=sender_id,
-                message_event=message_event,
-                message_chain=message_chain,
-                variables={},
-                resp_messages=[],
-                resp_message_chain=[],
-                adapter=adapter,
-                pipeline_uuid=pipeline_uuid,
+            query = self.new_query(
+                bot_uuid,
+                launcher_type,
+                launcher_id,
+                sender_id,
+                message_event,
+                message_chain,
+                adapter,
+                pipeline_uuid,
+                variables,
             )
             self.queries.append(query)
-            self.cached_queries[query_id] = query
-            self.query_id_counter += 1
+            self.cached_queries[query.query_id] = query
             self.condition.notify_all()
+            return query
 
     async def __aenter__(self):
         await self.pool_lock.acquire()
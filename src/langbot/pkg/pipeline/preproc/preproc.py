@@ -3,6 +3,7 @@ from __future__ import annotations
 import datetime
 
 from .. import stage, entities
+from ...utils import imageref
 from langbot_plugin.api.entities.builtin.provider import message as provider_message
 import langbot_plugin.api.entities.events as events
 import langbot_plugin.api.entities.builtin.platform.message as platform_message
@@ -101,6 +102,12 @@ class PreProcessor(stage.PipelineStage):
         plain_text = ''
         qoute_msg = query.pipeline_config['trigger'].get('misc', '').get('combine-quote-message')
 
+        if selected_runner != 'local-agent' or (llm_model and llm_model.model_entity.abilities.__contains__('vision')):
+            # images received from platforms are only downloaded here, once we know they are needed,
+            # and kept as bytes in the blob store, the prompt carries their handles
+            for e in await imageref.store_chain(query.message_chain):
+                self.ap.logger.warning(f'Failed to download image of query {query.query_id}: {e}')
+
         for me in query.message_chain:
             if isinstance(me, platform_message.Plain):
                 content_list.append(provider_message.ContentElement.from_text(me.text))
@@ -109,8 +116,8 @@ class PreProcessor(stage.PipelineStage):
                 if selected_runner != 'local-agent' or (
                     llm_model and llm_model.model_entity.abilities.__contains__('vision')
                 ):
-                    if me.base64 is not None:
-                        content_list.append(provider_message.ContentElement.from_image_base64(me.base64))
+                    if image_content := imageref.image_content(me):
+                        content_list.append(provider_message.ContentElement.from_image_base64(image_content))
             elif isinstance(me, platform_message.File):
                 # if me.url is not None:
                 content_list.append(provider_message.ContentElement.from_file_url(me.url, me.name))
@@ -122,8 +129,8 @@ class PreProcessor(stage.PipelineStage):
                         if selected_runner != 'local-agent' or (
                             llm_model and llm_model.model_entity.abilities.__contains__('vision')
                         ):
-                            if msg.base64 is not None:
-                                content_list.append(provider_message.ContentElement.from_image_base64(msg.base64))
+                            if image_content := imageref.image_content(msg):
+                                content_list.append(provider_message.ContentElement.from_image_base64(image_content))
 
         query.variables['user_message_text'] = plain_text
 
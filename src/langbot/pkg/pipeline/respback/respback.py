@@ -69,9 +69,9 @@ class SendResponseBackStage(stage.PipelineStage):
                 is_final=is_final,
             )
         else:
-            await query.adapter.reply_message(
-                message_source=query.message_event,
-                message=query.resp_message_chain[-1],
+            await self.ap.platform_mgr.reply_to_query(
+                query,
+                query.resp_message_chain[-1],
                 quote_origin=quote_origin,
             )
 
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import random
+import re
+import typing
+
+import langbot_plugin.api.entities.builtin.platform.message as platform_message
+
+
+RANDOM_ACCEPTED_VAR = '_ingress_random_accepted'
+"""Query variable set when a group message only passed the ingress filter by the random rule,
+`RandomRespRule` honours it instead of drawing a second time"""
+
+
+class IngressFilter:
+    """The group respond rules of a pipeline, checked in the adapter callback before a group message
+    is logged and queued.
+
+    Mirrors `GroupRespondRuleCheckStage`: a message passes if it mentions the bot, starts with one
+    of the prefixes, matches one of the regexps or wins the random draw. Messages rejected here
+    never become queries. Only the decision is made here, the stage still strips the mention and
+    prefix from the messages that pass.
+    """
+
+    prefixes: tuple[str, ...]
+
+    regexps: list[re.Pattern]
+
+    random_rate: float
+
+    def __init__(self, prefixes: typing.Iterable[str], regexps: typing.Iterable[re.Pattern], random_rate: float):
+        self.prefixes = tuple(prefixes)
+        self.regexps = list(regexps)
+        self.random_rate = random_rate
+
+    @classmethod
+    def from_pipeline_config(cls, pipeline_config: dict) -> IngressFilter | None:
+        """Compile the filter of a pipeline, None if its rules cannot be checked ahead of the pipeline"""
+        try:
+            rules = pipeline_config['trigger']['group-respond-rules']
+            return cls(
+                prefixes=rules.get('prefix', []),
+                regexps=[re.compile(regexp) for regexp in rules.get('regexp', [])],
+                random_rate=float(rules.get('random', 0)),
+            )
+        except (KeyError, TypeError, ValueError, re.error):
+            # leave broken configs to the stage, which reports them per query as before
+            return None
+
+    def check(self, message_chain: platform_message.MessageChain, bot_account_id: typing.Any) -> bool | None:
+        """Whether the message passes: True by a deterministic rule, None by the random draw, False if rejected"""
+        bot_account_id = str(bot_account_id)
+        for component in message_chain:
+            if isinstance(component, platform_message.At) and str(component.target) == bot_account_id:
+                return True
+
+        if self.prefixes or self.regexps:
+            message_text = str(message_chain)
+            if message_text.startswith(self.prefixes):
+                return True
+            for regexp in self.regexps:
+                if regexp.match(message_text):
+                    return True
+
+        if self.random_rate > 0 and random.random() < self.random_rate:
+            return None
+        return False
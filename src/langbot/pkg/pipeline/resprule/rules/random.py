@@ -3,6 +3,7 @@ import random
 
 from .. import rule as rule_model
 from .. import entities
+from .. import prefilter
 import langbot_plugin.api.entities.builtin.platform.message as platform_message
 import langbot_plugin.api.entities.builtin.pipeline.query as pipeline_query
 
@@ -16,6 +17,10 @@ class RandomRespRule(rule_model.GroupRespondRule):
         rule_dict: dict,
         query: pipeline_query.Query,
     ) -> entities.RuleJudgeResult:
+        if query.variables and query.variables.get(prefilter.RANDOM_ACCEPTED_VAR):
+            # already drawn when the message arrived
+            return entities.RuleJudgeResult(matching=True, replacement=message_chain)
+
         random_rate = rule_dict['random']
 
         return entities.RuleJudgeResult(matching=random.random() < random_rate, replacement=message_chain)
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import asyncio
 import traceback
+import typing
 import sqlalchemy
 
 from ..core import app, entities as core_entities, taskmgr
@@ -12,9 +13,16 @@ from ..entity.persistence import bot as persistence_bot
 
 from ..entity.errors import platform as platform_errors
 
-from .logger import EventLogger
+from .logger import EventLogger, SPILL_DIR, remove_spilled_segments
+
+from . import ingress, outbound
+
+from ..telemetry import tracing
+
+from ..pipeline.resprule import prefilter
 
 import langbot_plugin.api.entities.builtin.provider.session as provider_session
+import langbot_plugin.api.entities.builtin.pipeline.query as pipeline_query
 import langbot_plugin.api.entities.builtin.platform.events as platform_events
 import langbot_plugin.api.entities.builtin.platform.message as platform_message
 import langbot_plugin.api.definition.abstract.platform.adapter as abstract_platform_adapter
@@ -37,6 +45,20 @@ class RuntimeBot:
 
     logger: EventLogger
 
+    ingress_filter_enabled: bool
+
+    ingress_filter_with_plugins: bool
+    """Also filter when plugins of the pipeline could handle GroupMessageReceived"""
+
+    callback_limiter: ingress.CallbackLimiter
+    """Bounds the platform callbacks handled at once on the main HTTP server"""
+
+    serve_own_port: bool
+    """Whether callback adapters also start their own server on the port in their config"""
+
+    outbound: outbound.OutboundDispatcher | None
+    """Send queue shaping messages to the platform's rate limits, None if messages are sent directly"""
+
     def __init__(
         self,
         ap: app.Application,
@@ -51,11 +73,97 @@ class RuntimeBot:
         self.task_context = taskmgr.TaskContext()
         self.logger = logger
 
+        ingress_filter_cfg = ap.instance_config.data.get('ingress_filter', {})
+        self.ingress_filter_enabled = ingress_filter_cfg.get('enable', True)
+        self.ingress_filter_with_plugins = ingress_filter_cfg.get('with_plugins', False)
+
+        webhook_ingress_cfg = ap.instance_config.data.get('webhook_ingress', {})
+        self.callback_limiter = ingress.CallbackLimiter(
+            max_concurrency=webhook_ingress_cfg.get('max_concurrency', 32),
+            max_pending=webhook_ingress_cfg.get('max_pending', 128),
+        )
+        self.serve_own_port = webhook_ingress_cfg.get('legacy_ports', True)
+
+        self.outbound = outbound.OutboundDispatcher.from_config(
+            adapter,
+            bot_entity.adapter,
+            ap.instance_config.data.get('outbound', {}),
+            bot_uuid=bot_entity.uuid,
+            metrics_mgr=getattr(ap, 'metrics_mgr', None),
+        )
+
+    def accepts_unified_webhook(self) -> bool:
+        return isinstance(self.adapter, ingress.WebhookAdapter) and self.adapter.is_webhook_enabled()
+
+    async def handle_unified_webhook(self) -> typing.Any:
+        """Handle a platform callback received on the main HTTP server, raises `CallbackBusyError` when overloaded"""
+        return await self.callback_limiter.run(self.adapter.handle_unified_webhook)
+
+    async def reply_message(
+        self,
+        message_source: platform_events.MessageEvent,
+        message: platform_message.MessageChain,
+        quote_origin: bool = False,
+    ):
+        """Reply through the send queue, or the adapter directly if the bot has none"""
+        if self.outbound is None:
+            return await self.adapter.reply_message(message_source, message, quote_origin)
+        await self.outbound.reply(message_source, message, quote_origin)
+
+    async def send_message(self, target_type: str, target_id: str, message: platform_message.MessageChain):
+        """Send a proactive message through the send queue, or the adapter directly if the bot has none"""
+        if self.outbound is None:
+            return await self.adapter.send_message(target_type, target_id, message)
+        await self.outbound.send(target_type, target_id, message)
+
+    def is_duplicate(self, event: platform_events.MessageEvent) -> bool:
+        """Whether the platform delivered the message before, duplicates are counted and dropped"""
+        if self.bot_entity.adapter in ingress.SYNTHETIC_ID_ADAPTERS:
+            return False
+        if not ingress.dedup.is_duplicate(self.bot_entity.uuid, event):
+            return False
+        self.ap.metrics_mgr.ingress_duplicates.inc(self.bot_entity.uuid)
+        return True
+
+    async def check_ingress_filter(self, event: platform_events.GroupMessage) -> bool | None:
+        """Check a group message against the respond rules of the bot's pipeline before it is queued.
+
+        Returns the result of `IngressFilter.check`, or True when the filter does not apply: it is
+        disabled, or plugins bound to the pipeline receive GroupMessageReceived and may answer
+        messages the rules would drop.
+        """
+        if not self.ingress_filter_enabled or not self.bot_entity.use_pipeline_uuid:
+            return True
+
+        pipeline = await self.ap.pipeline_mgr.get_pipeline_by_uuid(self.bot_entity.use_pipeline_uuid)
+        if pipeline is None or pipeline.ingress_filter is None:
+            return True
+        if (
+            not self.ingress_filter_with_plugins
+            and self.ap.plugin_connector.is_enable_plugin
+            and pipeline.bound_plugins
+        ):
+            return True
+
+        return pipeline.ingress_filter.check(event.message_chain, self.adapter.bot_account_id)
+
     async def initialize(self):
         async def on_friend_message(
             event: platform_events.FriendMessage,
             adapter: abstract_platform_adapter.AbstractMessagePlatformAdapter,
         ):
+            if self.is_duplicate(event):
+                return
+
+            trace = self.ap.trace_mgr.start_trace(
+                'query',
+                {
+                    'bot.uuid': self.bot_entity.uuid,
+                    'bot.adapter': adapter.__class__.__name__,
+                    'launcher.type': 'person',
+                },
+            )
+
             image_components = [
                 component for component in event.message_chain if isinstance(component, platform_message.Image)
             ]
@@ -72,7 +180,7 @@ class RuntimeBot:
                     self.ap.webhook_pusher.push_person_message(event, self.bot_entity.uuid, adapter.__class__.__name__)
                 )
 
-            await self.ap.query_pool.add_query(
+            query = await self.ap.query_pool.add_query(
                 bot_uuid=self.bot_entity.uuid,
                 launcher_type=provider_session.LauncherTypes.PERSON,
                 launcher_id=event.sender.id,
@@ -81,12 +189,35 @@ class RuntimeBot:
                 message_chain=event.message_chain,
                 adapter=adapter,
                 pipeline_uuid=self.bot_entity.use_pipeline_uuid,
+                variables={tracing.TRACE_ID_VAR: trace.trace_id} if trace is not None else None,
             )
 
+            if trace is not None:
+                trace.root.attributes['query.id'] = query.query_id
+                trace.enqueued_ns = self.ap.trace_mgr.record_span(trace, 'bot.receive', trace.root.start_ns).end_ns
+
         async def on_group_message(
             event: platform_events.GroupMessage,
             adapter: abstract_platform_adapter.AbstractMessagePlatformAdapter,
         ):
+            if self.is_duplicate(event):
+                return
+
+            # most group messages are not for the bot, drop them before logging and queueing
+            passed = await self.check_ingress_filter(event)
+            if passed is False:
+                self.ap.metrics_mgr.ingress_prefiltered.inc(self.bot_entity.uuid)
+                return
+
+            trace = self.ap.trace_mgr.start_trace(
+                'query',
+                {
+                    'bot.uuid': self.bot_entity.uuid,
+                    'bot.adapter': adapter.__class__.__name__,
+                    'launcher.type': 'group',
+                },
+            )
+
             image_components = [
                 component for component in event.message_chain if isinstance(component, platform_message.Image)
             ]
@@ -103,7 +234,13 @@ class RuntimeBot:
                     self.ap.webhook_pusher.push_group_message(event, self.bot_entity.uuid, adapter.__class__.__name__)
                 )
 
-            await self.ap.query_pool.add_query(
+            variables = {}
+            if trace is not None:
+                variables[tracing.TRACE_ID_VAR] = trace.trace_id
+            if passed is None:
+                variables[prefilter.RANDOM_ACCEPTED_VAR] = True
+
+            query = await self.ap.query_pool.add_query(
                 bot_uuid=self.bot_entity.uuid,
                 launcher_type=provider_session.LauncherTypes.GROUP,
                 launcher_id=event.group.id,
@@ -112,8 +249,13 @@ class RuntimeBot:
                 message_chain=event.message_chain,
                 adapter=adapter,
                 pipeline_uuid=self.bot_entity.use_pipeline_uuid,
+                variables=variables or None,
             )
 
+            if trace is not None:
+                trace.root.attributes['query.id'] = query.query_id
+                trace.enqueued_ns = self.ap.trace_mgr.record_span(trace, 'bot.receive', trace.root.start_ns).end_ns
+
         self.adapter.register_listener(platform_events.FriendMessage, on_friend_message)
         self.adapter.register_listener(platform_events.GroupMessage, on_group_message)
 
@@ -121,7 +263,11 @@ class RuntimeBot:
         async def exception_wrapper():
             try:
                 self.task_context.set_current_action('Running...')
-                await self.adapter.run_async()
+                if self.accepts_unified_webhook() and not self.serve_own_port:
+                    # callbacks arrive through the main HTTP server, there is nothing else to run
+                    await asyncio.Event().wait()
+                else:
+                    await self.adapter.run_async()
                 self.task_context.set_current_action('Exited.')
             except Exception as e:
                 if isinstance(e, asyncio.CancelledError):
@@ -144,6 +290,8 @@ class RuntimeBot:
         )
 
     async def shutdown(self):
+        if self.outbound is not None:
+            await self.outbound.shutdown()
         await self.adapter.kill()
 
         self.ap.task_mgr.cancel_task(self.task_wrapper.id)
@@ -160,7 +308,7 @@ class PlatformManager:
 
     adapter_components: list[engine.Component]
 
-    adapter_dict: dict[str, type[abstract_platform_adapter.AbstractMessagePlatformAdapter]]
+    adapter_dict: typing.Mapping[str, type[abstract_platform_adapter.AbstractMessagePlatformAdapter]]
 
     def __init__(self, ap: app.Application = None):
         self.ap = ap
@@ -169,14 +317,20 @@ class PlatformManager:
         self.adapter_dict = {}
 
     async def initialize(self):
-        # delete all bot log images
-        await self.ap.storage_mgr.storage_provider.delete_dir_recursive('bot_log_images')
+        is_worker = self.ap.cluster is not None and self.ap.cluster.is_worker
+
+        # the data directory of a worker may be the ingress node's, whose logs are still in use
+        if not is_worker:
+            # delete all bot log images
+            await self.ap.storage_mgr.storage_provider.delete_dir_recursive('bot_log_images')
+            # and event logs spilled to disk by the last run, only the segment files as the directory is configurable
+            spill_cfg = self.ap.instance_config.data.get('event_log', {}).get('spill', {})
+            if spill_cfg.get('enable', False):
+                await asyncio.to_thread(remove_spilled_segments, spill_cfg.get('path', SPILL_DIR))
 
         self.adapter_components = self.ap.discover.get_components_by_kind('MessagePlatformAdapter')
-        adapter_dict: dict[str, type[abstract_platform_adapter.AbstractMessagePlatformAdapter]] = {}
-        for component in self.adapter_components:
-            adapter_dict[component.metadata.name] = component.get_python_component_class()
-        self.adapter_dict = adapter_dict
+        # adapter modules are imported when the first bot using them is loaded
+        self.adapter_dict = engine.LazyComponentClassDict(self.adapter_components)
 
         webchat_adapter_class = self.adapter_dict['webchat']
 
@@ -204,6 +358,10 @@ class PlatformManager:
         )
         await self.webchat_proxy_bot.initialize()
 
+        if is_worker:
+            # replies of workers are sent by the bots of the ingress node
+            return
+
         await self.load_bots_from_db()
 
     def get_running_adapters(self) -> list[abstract_platform_adapter.AbstractMessagePlatformAdapter]:
@@ -218,7 +376,7 @@ class PlatformManager:
 
         bots = result.all()
 
-        for bot in bots:
+        async def load_bot(bot: sqlalchemy.Row[persistence_bot.Bot]):
             # load all bots here, enable or disable will be handled in runtime
             try:
                 await self.load_bot(bot)
@@ -227,6 +385,8 @@ class PlatformManager:
             except Exception as e:
                 self.ap.logger.error(f'Failed to load bot {bot.uuid}: {e}\n{traceback.format_exc()}')
 
+        await asyncio.gather(*[load_bot(bot) for bot in bots])
+
     async def load_bot(
         self,
         bot_entity: persistence_bot.Bot | sqlalchemy.Row[persistence_bot.Bot] | dict,
@@ -261,11 +421,24 @@ class PlatformManager:
                 return bot
         return None
 
+    async def reply_to_query(
+        self,
+        query: pipeline_query.Query,
+        message: platform_message.MessageChain,
+        quote_origin: bool = False,
+    ):
+        """Reply to the message of a query, through the send queue of its bot if it has one"""
+        bot = await self.get_bot_by_uuid(query.bot_uuid) if query.bot_uuid else None
+        if bot is not None and bot.adapter is query.adapter:
+            return await bot.reply_message(query.message_event, message, quote_origin)
+        return await query.adapter.reply_message(query.message_event, message, quote_origin)
+
     async def remove_bot(self, bot_uuid: str):
         for bot in self.bots:
             if bot.bot_entity.uuid == bot_uuid:
                 if bot.enable:
                     await bot.shutdown()
+                bot.logger.close()
                 self.bots.remove(bot)
                 return
 
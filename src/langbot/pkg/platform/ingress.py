@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import abc
+import asyncio
+import typing
+
+import langbot_plugin.api.entities.builtin.platform.events as platform_events
+
+from ..utils import bloom
+
+
+CALLBACK_PATH = '/bots/{bot_uuid}/callback'
+"""Path on the main HTTP server where platforms deliver the callbacks of a bot"""
+
+
+class WebhookAdapter(abc.ABC):
+    """Mixin of adapters that receive messages as HTTP callbacks from their platform.
+
+    Besides the server an adapter starts on its own port, the main HTTP server routes
+    `/bots/{bot_uuid}/callback` to `handle_unified_webhook`, so many bots can share one port.
+    The handler reads the request from the `quart.request` context like the adapter's own routes.
+    """
+
+    def is_webhook_enabled(self) -> bool:
+        """Whether the adapter currently receives messages by callbacks"""
+        return True
+
+    @abc.abstractmethod
+    async def handle_unified_webhook(self) -> typing.Any:
+        """Handle the callback request in the current request context, returns a Quart response value"""
+        pass
+
+
+class CallbackBusyError(Exception):
+    """The bot is already handling as many callbacks as it is allowed to queue"""
+
+
+class CallbackLimiter:
+    """Bounds the callbacks of one bot handled at the same time.
+
+    Up to `max_concurrency` run at once and up to `max_pending` more wait for a slot, callbacks beyond
+    that are refused right away so a flood on one bot cannot hold the connections of the others.
+    Platforms retry refused callbacks.
+    """
+
+    max_concurrency: int
+
+    max_pending: int
+
+    active: int
+    """Callbacks running or waiting"""
+
+    handled: int
+
+    rejected: int
+
+    _semaphore: asyncio.Semaphore
+
+    def __init__(self, max_concurrency: int, max_pending: int):
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.active = 0
+        self.handled = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(self, handler: typing.Callable[[], typing.Awaitable[typing.Any]]) -> typing.Any:
+        if self.active >= self.max_concurrency + self.max_pending:
+            self.rejected += 1
+            raise CallbackBusyError()
+
+        self.active += 1
+        try:
+            async with self._semaphore:
+                self.handled += 1
+                return await handler()
+        finally:
+            self.active -= 1
+
+    def to_dict(self) -> dict:
+        return {
+            'max_concurrency': self.max_concurrency,
+            'max_pending': self.max_pending,
+            'active': self.active,
+            'handled': self.handled,
+            'rejected': self.rejected,
+        }
+
+
+SYNTHETIC_ID_ADAPTERS = frozenset({'webchat'})
+"""Adapters numbering the messages themselves, their ids repeat (WebChat counts per pipeline) and are never
+delivered twice, so they are not deduplicated"""
+
+
+class MessageDeduplicator:
+    """Recognises messages a platform delivered more than once, e.g. callbacks retried after a slow answer,
+    events replayed after a reconnect or updates fetched again after polling restarts.
+
+    Messages are identified by bot, chat and the platform's message id (the `Source` component), which
+    some platforms only keep unique per chat. Messages without an id are never treated as duplicates.
+    Ids are remembered for at least `window` seconds in a rotating Bloom filter, so memory stays fixed
+    however many messages arrive; a false positive drops a new message with probability `error_rate`.
+    """
+
+    enabled: bool
+
+    seen: bloom.RotatingBloomFilter
+
+    def __init__(self, window: float = 600, capacity: int = 200_000, error_rate: float = 1e-6):
+        self.enabled = True
+        self.seen = bloom.RotatingBloomFilter(window, capacity, error_rate)
+        self.checked = 0
+        self.duplicates = 0
+
+    def configure(self, cfg: dict):
+        self.enabled = cfg.get('enable', True)
+        self.seen = bloom.RotatingBloomFilter(
+            float(cfg.get('window', 600)),
+            int(cfg.get('capacity', 200_000)),
+            float(cfg.get('error_rate', 1e-6)),
+        )
+
+    def is_duplicate(self, bot_uuid: str, event: platform_events.MessageEvent) -> bool:
+        if not self.enabled:
+            return False
+        message_id = event.message_chain.message_id
+        if message_id is None or message_id == -1 or message_id == '':
+            return False
+
+        if isinstance(event, platform_events.GroupMessage):
+            chat = f'group_{event.group.id}'
+        else:
+            chat = f'person_{event.sender.id}'
+        self.checked += 1
+        if self.seen.check_and_add(f'{bot_uuid}:{chat}:{message_id}'):
+            self.duplicates += 1
+            return True
+        return False
+
+    def to_dict(self) -> dict:
+        return {
+            'enabled': self.enabled,
+            'checked': self.checked,
+            'duplicates': self.duplicates,
+            **self.seen.to_dict(),
+        }
+
+
+dedup = MessageDeduplicator()
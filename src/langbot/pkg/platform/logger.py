@@ -1,18 +1,31 @@
 from __future__ import annotations
 
+import array
+import asyncio
+import collections
+import functools
+import json
+import os
+import re
 import typing
 import mimetypes
 import time
 import enum
-import pydantic
-import traceback
 import uuid
 
 from ..core import app
+from ..utils import imageref
 import langbot_plugin.api.entities.builtin.platform.message as platform_message
 import langbot_plugin.api.definition.abstract.platform.event_logger as abstract_platform_event_logger
 
 
+SPILL_DIR = os.path.join('data', 'logs', 'bot_events')
+"""Default directory of spilled event logs, their segment files are deleted on startup"""
+
+SEGMENT_FILE_PATTERN = re.compile(r'^[\w.-]+-[0-9a-f]{8}\.\d+\.jsonl$')
+"""Names of the segment files written by `EventLogSpill`, `<bot name>-<hex8>.<n>.jsonl`"""
+
+
 class EventLogLevel(enum.Enum):
     """日志级别"""
 
@@ -22,7 +35,9 @@ class EventLogLevel(enum.Enum):
     ERROR = 'error'
 
 
-class EventLog(pydantic.BaseModel):
+class EventLog:
+    __slots__ = ('seq_id', 'timestamp', 'level', 'text', 'images', 'message_session_id')
+
     seq_id: int
     """日志序号"""
 
@@ -35,12 +50,28 @@ class EventLog(pydantic.BaseModel):
     text: str
     """日志文本"""
 
-    images: typing.Optional[list[str]] = None
-    """日志图片 URL 列表，需要通过 /api/v1/image/{uuid} 获取图片"""
+    images: list[str]
+    """日志图片 URL 列表，需要通过 /api/v1/image/{uuid} 获取图片。图片在后台保存，保存完成后才会出现在列表中"""
 
-    message_session_id: typing.Optional[str] = None
+    message_session_id: str
     """消息会话ID，仅收发消息事件有值"""
 
+    def __init__(
+        self,
+        seq_id: int,
+        timestamp: int,
+        level: EventLogLevel,
+        text: str,
+        images: typing.Optional[list[str]] = None,
+        message_session_id: typing.Optional[str] = None,
+    ):
+        self.seq_id = seq_id
+        self.timestamp = timestamp
+        self.level = level
+        self.text = text
+        self.images = images if images is not None else []
+        self.message_session_id = message_session_id if message_session_id is not None else ''
+
     def to_json(self) -> dict:
         return {
             'seq_id': self.seq_id,
@@ -51,19 +82,181 @@ class EventLog(pydantic.BaseModel):
             'message_session_id': self.message_session_id,
         }
 
+    @classmethod
+    def from_json(cls, data: dict) -> EventLog:
+        return cls(
+            seq_id=data['seq_id'],
+            timestamp=data['timestamp'],
+            level=EventLogLevel(data['level']),
+            text=data['text'],
+            images=data['images'],
+            message_session_id=data['message_session_id'],
+        )
+
 
 MAX_LOG_COUNT = 200
-DELETE_COUNT_PER_TIME = 50
+"""Default number of logs kept in memory per bot"""
+
+IMAGE_QUEUE_SIZE = 256
+"""Default number of pending image saves per bot, images beyond this are not logged"""
+
+
+class EventLogSegment:
+    """One append-only JSON lines file of spilled logs"""
+
+    __slots__ = ('path', 'first_seq_id', 'offsets', 'size', 'file')
+
+    def __init__(self, path: str, first_seq_id: int):
+        self.path = path
+        self.first_seq_id = first_seq_id
+        self.offsets = array.array('q')
+        """Byte offset of each log in the file, the log with seq_id `first_seq_id + i` starts at `offsets[i]`"""
+        self.size = 0
+        self.file = open(path, 'wb')
+
+    def read(self, start_seq_id: int, end_seq_id: int) -> list[EventLog]:
+        """Logs from start_seq_id to end_seq_id inclusive, both must be in this segment"""
+        if not self.file.closed:
+            self.file.flush()
+        start = self.offsets[start_seq_id - self.first_seq_id]
+        end_index = end_seq_id - self.first_seq_id + 1
+        end = self.offsets[end_index] if end_index < len(self.offsets) else self.size
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            data = f.read(end - start)
+        return [EventLog.from_json(json.loads(line)) for line in data.splitlines()]
+
+
+class EventLogSpill:
+    """Append-only on-disk history of logs evicted from an EventLogger's memory.
+
+    Logs are written as JSON lines into segment files of at most `max_segment_bytes`,
+    the oldest segment is deleted once there are more than `max_segments`. The methods
+    do blocking file I/O, the EventLogger calls them in a thread one at a time.
+    """
+
+    path: str
+
+    max_segment_bytes: int
+
+    max_segments: int
+
+    segments: collections.deque[EventLogSegment]
+
+    def __init__(self, path: str, max_segment_bytes: int = 4 * 1024 * 1024, max_segments: int = 4):
+        self.path = path
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segments = max_segments
+        self.segments = collections.deque()
+        self._segment_no = 0
+        self._closed = False
+
+    @property
+    def first_seq_id(self) -> int | None:
+        return self.segments[0].first_seq_id if self.segments else None
+
+    @property
+    def count(self) -> int:
+        return sum(len(segment.offsets) for segment in self.segments)
+
+    def extend(self, logs: list[EventLog]):
+        for log in logs:
+            self.append(log)
+
+    def append(self, log: EventLog):
+        if self._closed:
+            return
+        line = json.dumps(log.to_json(), ensure_ascii=False).encode('utf-8') + b'\n'
+
+        segment = self.segments[-1] if self.segments else None
+        if segment is None or (segment.offsets and segment.size + len(line) > self.max_segment_bytes):
+            if segment is not None:
+                segment.file.close()
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            segment = EventLogSegment(f'{self.path}.{self._segment_no}.jsonl', log.seq_id)
+            self._segment_no += 1
+            self.segments.append(segment)
+            while len(self.segments) > self.max_segments:
+                self._remove(self.segments.popleft())
+
+        segment.offsets.append(segment.size)
+        segment.file.write(line)
+        segment.size += len(line)
+
+    def read(self, start_seq_id: int, end_seq_id: int) -> list[EventLog]:
+        logs = []
+        for segment in self.segments:
+            last_seq_id = segment.first_seq_id + len(segment.offsets) - 1
+            start = max(start_seq_id, segment.first_seq_id)
+            end = min(end_seq_id, last_seq_id)
+            if start <= end:
+                logs.extend(segment.read(start, end))
+        return logs
+
+    def close(self):
+        self._closed = True
+        while self.segments:
+            self._remove(self.segments.popleft())
+
+    def _remove(self, segment: EventLogSegment):
+        segment.file.close()
+        try:
+            os.remove(segment.path)
+        except FileNotFoundError:
+            pass
+
+
+def remove_spilled_segments(path: str) -> int:
+    """Delete the segment files left in `path` by a previous run, other files are kept. Returns the count"""
+    try:
+        names = os.listdir(path)
+    except FileNotFoundError:
+        return 0
+    removed = 0
+    for name in names:
+        if SEGMENT_FILE_PATTERN.match(name):
+            try:
+                os.remove(os.path.join(path, name))
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
 
 
 class EventLogger(abstract_platform_event_logger.AbstractEventLogger):
-    """used for logging bot events"""
+    """used for logging bot events
+
+    Logs are kept in a fixed-capacity ring buffer, the log with a given seq_id lives at
+    `seq_id % capacity`. Images are saved to storage and evicted logs written to the spill
+    by background tasks, so logging a message never waits on downloads or file writes.
+    """
 
     ap: app.Application
 
     seq_id_inc: int
+    """seq_id of the next log"""
+
+    capacity: int
+
+    _ring: list[EventLog | None]
+
+    spill: EventLogSpill | None
+    """Disk history of logs evicted from the ring, if enabled"""
+
+    _spill_pending: list[EventLog]
+    """Logs evicted from the ring and not written to the spill yet"""
+
+    _spill_task: asyncio.Task | None
 
-    logs: list[EventLog]
+    _spill_lock: asyncio.Lock
+    """Held while the spill is written or read in a thread"""
+
+    fetch_images: bool
+    """Download images received by reference just to log them, otherwise only images already downloaded are saved"""
+
+    _image_queue: asyncio.Queue[typing.Callable[[], typing.Awaitable[None]]]
+
+    _image_task: asyncio.Task | None
 
     def __init__(
         self,
@@ -72,9 +265,39 @@ class EventLogger(abstract_platform_event_logger.AbstractEventLogger):
     ):
         self.name = name
         self.ap = ap
-        self.logs = []
         self.seq_id_inc = 0
 
+        event_log_cfg = ap.instance_config.data.get('event_log', {})
+        self.capacity = max(event_log_cfg.get('capacity', MAX_LOG_COUNT), 1)
+        self._ring = [None] * self.capacity
+
+        self.spill = None
+        spill_cfg = event_log_cfg.get('spill', {})
+        if spill_cfg.get('enable', False):
+            file_name = re.sub(r'[^\w.-]', '_', name) + '-' + uuid.uuid4().hex[:8]
+            self.spill = EventLogSpill(
+                os.path.join(spill_cfg.get('path', SPILL_DIR), file_name),
+                spill_cfg.get('max_segment_bytes', 4 * 1024 * 1024),
+                spill_cfg.get('max_segments', 4),
+            )
+        self._spill_pending = []
+        self._spill_task = None
+        self._spill_lock = asyncio.Lock()
+
+        self.fetch_images = event_log_cfg.get('fetch_images', False)
+        self._image_queue = asyncio.Queue(maxsize=event_log_cfg.get('image_queue_size', IMAGE_QUEUE_SIZE))
+        self._image_task = None
+
+    @property
+    def min_seq_id(self) -> int:
+        """seq_id of the oldest log in memory"""
+        return max(0, self.seq_id_inc - self.capacity)
+
+    @property
+    def logs(self) -> list[EventLog]:
+        """Logs in memory, oldest first"""
+        return [self._ring[seq_id % self.capacity] for seq_id in range(self.min_seq_id, self.seq_id_inc)]
+
     async def get_logs(self, from_seq_id: int, max_count: int) -> typing.Tuple[list[EventLog], int]:
         """
         获取日志，从 from_seq_id 开始获取 max_count 条历史日志
@@ -86,43 +309,107 @@ class EventLogger(abstract_platform_event_logger.AbstractEventLogger):
         Returns:
             Tuple[list[EventLog], int]: 日志列表，日志总数
         """
-        if len(self.logs) == 0:
+        if self.spill is not None:
+            await self._flush_spill()
+
+        spilled_count = self.spill.count if self.spill is not None else 0
+        total = self.seq_id_inc - self.min_seq_id + spilled_count
+
+        if self.seq_id_inc == 0:
             return [], 0
 
-        if from_seq_id <= -1:
-            from_seq_id = self.logs[-1].seq_id
+        max_seq_id = self.seq_id_inc - 1
+        oldest_seq_id = self.spill.first_seq_id if spilled_count else self.min_seq_id
 
-        min_seq_id_in_logs = self.logs[0].seq_id
-        max_seq_id_in_logs = self.logs[-1].seq_id
+        if from_seq_id <= -1:
+            from_seq_id = max_seq_id
 
-        if from_seq_id < min_seq_id_in_logs:  # 需要的整个范围都已经被删除
-            return [], len(self.logs)
+        if from_seq_id < oldest_seq_id:  # 需要的整个范围都已经被删除
+            return [], total
 
-        if (
-            from_seq_id > max_seq_id_in_logs and from_seq_id - max_count > max_seq_id_in_logs
-        ):  # 需要的整个范围都还没生成
-            return [], len(self.logs)
+        if from_seq_id > max_seq_id and from_seq_id - max_count > max_seq_id:  # 需要的整个范围都还没生成
+            return [], total
 
-        end_index = 1
+        if max_count <= 0:
+            return [], total
 
-        for i, log in enumerate(self.logs):
-            if log.seq_id >= from_seq_id:
-                end_index = i + 1
-                break
+        end_seq_id = min(from_seq_id, max_seq_id)
+        start_seq_id = max(oldest_seq_id, end_seq_id - max_count + 1)
 
-        start_index = max(0, end_index - max_count)
+        min_seq_id = self.min_seq_id
+        logs = [self._ring[seq_id % self.capacity] for seq_id in range(max(start_seq_id, min_seq_id), end_seq_id + 1)]
+        if start_seq_id < min_seq_id:
+            async with self._spill_lock:
+                spilled = await asyncio.to_thread(self.spill.read, start_seq_id, min(end_seq_id, min_seq_id - 1))
+            logs = spilled + logs
+        return logs, total
 
-        if max_count > 0:
-            return self.logs[start_index:end_index], len(self.logs)
+    def _submit_image_job(self, job: typing.Callable[[], typing.Awaitable[None]]) -> bool:
+        try:
+            self._image_queue.put_nowait(job)
+        except asyncio.QueueFull:
+            return False
+        if self._image_task is None or self._image_task.done():
+            self._image_task = asyncio.create_task(self._run_image_jobs())
+        return True
+
+    async def _run_image_jobs(self):
+        """Drain the image queue, the task ends once the queue is empty"""
+        while not self._image_queue.empty():
+            job = self._image_queue.get_nowait()
+            try:
+                await job()
+            except Exception:
+                self.ap.logger.exception(f'Failed to save or delete an event log image of {self.name}')
+
+    def _spill_log(self, log: EventLog):
+        self._spill_pending.append(log)
+        if self._spill_task is None or self._spill_task.done():
+            self._spill_task = asyncio.create_task(self._write_spill())
+
+    async def _write_spill(self):
+        """Write the evicted logs to the spill in a thread, the task ends once none are left"""
+        while self._spill_pending:
+            logs, self._spill_pending = self._spill_pending, []
+            async with self._spill_lock:
+                try:
+                    await asyncio.to_thread(self.spill.extend, logs)
+                except Exception:
+                    self.ap.logger.exception(f'Failed to spill the event logs of {self.name}')
+
+    async def _flush_spill(self):
+        while self._spill_task is not None and not self._spill_task.done():
+            await self._spill_task
+
+    async def _save_image(self, log: EventLog, img: platform_message.Image):
+        img_bytes, mime_type = await img.get_bytes()
+        extension = mimetypes.guess_extension(mime_type) if mime_type else None
+        if extension is None:
+            extension = '.jpg'
+        image_key = f'bot_log_images/{log.message_session_id}-{uuid.uuid4()}{extension}'
+        await self.ap.storage_mgr.storage_provider.save(image_key, img_bytes)
+
+        if log.seq_id < self.min_seq_id:  # evicted while the image was being saved
+            await self.ap.storage_mgr.storage_provider.delete(image_key)
         else:
-            return [], len(self.logs)
+            log.images.append(image_key)
+
+    async def _delete_images(self, image_keys: list[str]):
+        for image_key in image_keys:
+            await self.ap.storage_mgr.storage_provider.delete(image_key)
+
+    async def flush(self):
+        """Wait until the queued images are saved and the evicted logs are written"""
+        while self._image_task is not None and not self._image_task.done():
+            await self._image_task
+        await self._flush_spill()
 
-    async def _truncate_logs(self):
-        if len(self.logs) > MAX_LOG_COUNT:
-            for i in range(DELETE_COUNT_PER_TIME):
-                for image_key in self.logs[i].images:  # type: ignore
-                    await self.ap.storage_mgr.storage_provider.delete(image_key)
-            self.logs = self.logs[DELETE_COUNT_PER_TIME:]
+    def close(self):
+        if self.spill is not None:
+            self._spill_pending = []
+            if self._spill_task is not None:
+                self._spill_task.cancel()
+            self.spill.close()
 
     async def _add_log(
         self,
@@ -133,45 +420,45 @@ class EventLogger(abstract_platform_event_logger.AbstractEventLogger):
         no_throw: bool = True,
     ):
         try:
-            image_keys = []
-
-            if images is None:
-                images = []
-
             if message_session_id is None:
                 message_session_id = ''
 
             if not isinstance(message_session_id, str):
                 message_session_id = str(message_session_id)
 
-            for img in images:
-                img_bytes, mime_type = await img.get_bytes()
-                extension = mimetypes.guess_extension(mime_type)
-                if extension is None:
-                    extension = '.jpg'
-                image_key = f'bot_log_images/{message_session_id}-{uuid.uuid4()}{extension}'
-                await self.ap.storage_mgr.storage_provider.save(image_key, img_bytes)
-                image_keys.append(image_key)
-
-            self.logs.append(
-                EventLog(
-                    seq_id=self.seq_id_inc,
-                    timestamp=int(time.time()),
-                    level=level,
-                    text=text,
-                    images=image_keys,
-                    message_session_id=message_session_id,
-                )
+            log = EventLog(
+                seq_id=self.seq_id_inc,
+                timestamp=int(time.time()),
+                level=level,
+                text=text,
+                images=[],
+                message_session_id=message_session_id,
             )
+
+            slot = self.seq_id_inc % self.capacity
+            evicted = self._ring[slot]
+            self._ring[slot] = log
             self.seq_id_inc += 1
 
-            await self._truncate_logs()
+            if evicted is not None:
+                if evicted.images:
+                    self._submit_image_job(functools.partial(self._delete_images, evicted.images))
+                    evicted.images = []
+                if self.spill is not None:
+                    self._spill_log(evicted)
+
+            for img in images or []:
+                if not self.fetch_images and isinstance(img, imageref.LazyImage) and not img.resolved:
+                    continue
+                if not self._submit_image_job(functools.partial(self._save_image, log, img)):
+                    self.ap.logger.warning(f'Event log image queue of {self.name} is full, image not saved')
+                    break
 
         except Exception as e:
             if not no_throw:
                 raise e
             else:
-                traceback.print_exc()
+                self.ap.logger.exception(f'Failed to add an event log to {self.name}')
 
     async def info(
         self,
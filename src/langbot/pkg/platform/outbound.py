@@ -0,0 +1,460 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import datetime
+import itertools
+import time
+import typing
+
+import langbot_plugin.api.entities.builtin.platform.events as platform_events
+import langbot_plugin.api.entities.builtin.platform.message as platform_message
+import langbot_plugin.api.definition.abstract.platform.adapter as abstract_platform_adapter
+
+if typing.TYPE_CHECKING:
+    from ..telemetry import metrics
+
+
+PRIORITY_REPLY = 0
+"""Replies to a message someone is waiting for"""
+
+PRIORITY_SEND = 1
+"""Proactive messages, e.g. sent by plugins or the API"""
+
+RATE_LIMIT_ERRCODES = (45009, 45033, 45047)
+"""WeCom errcodes of exceeded API frequency limits"""
+
+
+class OutboundQueueFullError(Exception):
+    """The bot already has as many messages waiting to be sent as it may queue"""
+
+
+def rate_limit_delay(exc: Exception) -> float | None:
+    """Seconds the platform asked to wait if `exc` is a rate limit error, 0 if it did not say, None otherwise"""
+    retry_after = getattr(exc, 'retry_after', None)  # telegram.error.RetryAfter
+    if retry_after is not None:
+        if isinstance(retry_after, datetime.timedelta):
+            return retry_after.total_seconds()
+        return float(retry_after)
+
+    # HTTP errors carry the response, some clients raise with the response as the argument
+    for candidate in (getattr(exc, 'response', None), *exc.args):
+        status = getattr(candidate, 'status_code', None) or getattr(candidate, 'status', None)
+        if status == 429:
+            headers = getattr(candidate, 'headers', None) or {}
+            try:
+                return float(headers.get('Retry-After', 0))
+            except (TypeError, ValueError):
+                return 0.0
+
+    # API errors answered with an errcode, e.g. `WecomAPIError`
+    if getattr(exc, 'errcode', None) in RATE_LIMIT_ERRCODES:
+        return 0.0
+    return None
+
+
+class TokenBucket:
+    """Allows `rate` sends per second on average and bursts of up to `burst`"""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated_at', 'paused_until')
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+        self.updated_at = now
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        if now > self.updated_at:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a send is allowed, 0 if it is now"""
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float('inf')
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, until: float):
+        self.paused_until = max(self.paused_until, until)
+
+    def idle(self, now: float) -> bool:
+        """Whether the bucket is full again, so forgetting it changes nothing"""
+        self._refill(now)
+        return self.tokens >= self.burst and now >= self.paused_until
+
+
+class PlatformLimits:
+    """Send limits of one platform, from `outbound.platforms.<adapter>` in the config"""
+
+    rate: float
+    """Messages per second of the whole bot"""
+
+    burst: float
+
+    chat_rate: float
+    """Messages per second to one chat"""
+
+    chat_burst: float
+
+    coalesce: bool
+    """Merge consecutive short text messages to the same chat into one"""
+
+    coalesce_max_chars: int
+
+    def __init__(self, cfg: dict):
+        self.rate = float(cfg.get('rate', 20))
+        self.burst = float(cfg.get('burst', self.rate))
+        self.chat_rate = float(cfg.get('chat_rate', 1))
+        self.chat_burst = float(cfg.get('chat_burst', 5))
+        self.coalesce = bool(cfg.get('coalesce', False))
+        self.coalesce_max_chars = int(cfg.get('coalesce_max_chars', 1000))
+
+
+class _Outgoing:
+    __slots__ = (
+        'priority',
+        'seq',
+        'chat',
+        'kind',
+        'message',
+        'message_source',
+        'quote_origin',
+        'futures',
+        'attempts',
+        'enqueued_at',
+    )
+
+    def __init__(
+        self,
+        priority: int,
+        seq: int,
+        chat: typing.Tuple[str, str],
+        kind: str,
+        message: platform_message.MessageChain,
+        message_source: platform_events.MessageEvent | None = None,
+        quote_origin: bool = False,
+    ):
+        self.priority = priority
+        self.seq = seq
+        self.chat = chat
+        self.kind = kind
+        self.message = message
+        self.message_source = message_source
+        self.quote_origin = quote_origin
+
+        self.futures: list[asyncio.Future] = [asyncio.get_running_loop().create_future()]
+        self.attempts = 0
+        self.enqueued_at = time.monotonic()
+
+    def text(self) -> str | None:
+        """The text of the message if it is plain text only"""
+        if not all(isinstance(component, platform_message.Plain) for component in self.message):
+            return None
+        return ''.join(component.text for component in self.message)
+
+
+class OutboundDispatcher:
+    """Send queue of one bot, shapes replies and proactive messages to the platform's limits.
+
+    Messages wait in one FIFO per chat and are sent when both the bot's and the chat's token buckets
+    allow it, replies before proactive messages when several chats are ready. At most one message per
+    chat is in flight, so a chat's messages arrive in order. A send the platform rejects as rate limited
+    is retried after the delay it asked for, or with exponential backoff. When the platform allows it,
+    consecutive short text messages waiting for the same chat are merged into one.
+
+    `reply` and `send` return once the message is delivered and raise what the adapter raised if it
+    could not be, or `OutboundQueueFullError` when too many messages are waiting.
+    """
+
+    adapter: abstract_platform_adapter.AbstractMessagePlatformAdapter
+
+    limits: PlatformLimits
+
+    max_pending: int
+
+    max_concurrency: int
+
+    max_retries: int
+
+    backoff_base: float
+
+    _chats: dict[typing.Tuple[str, str], collections.deque[_Outgoing]]
+    """Waiting messages per chat"""
+
+    _chat_buckets: dict[typing.Tuple[str, str], TokenBucket]
+
+    _in_flight: set[typing.Tuple[str, str]]
+    """Chats with a send in progress"""
+
+    _sending: set[asyncio.Task]
+    """Tasks of the sends in progress"""
+
+    def __init__(
+        self,
+        adapter: abstract_platform_adapter.AbstractMessagePlatformAdapter,
+        limits: PlatformLimits,
+        bot_uuid: str = '',
+        metrics_mgr: metrics.MetricsManager | None = None,
+        max_pending: int = 1000,
+        max_concurrency: int = 8,
+        max_retries: int = 3,
+        backoff_base: float = 1.0,
+    ):
+        self.adapter = adapter
+        self.limits = limits
+        self.bot_uuid = bot_uuid
+        self.metrics_mgr = metrics_mgr
+        self.max_pending = max_pending
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+
+        self._bucket = TokenBucket(limits.rate, limits.burst, time.monotonic())
+        self._chats = {}
+        self._chat_buckets = {}
+        self._in_flight = set()
+        self._sending = set()
+        self._closed = False
+        self._seq = itertools.count()
+        self._depth = 0
+        self._wakeup: asyncio.Event | None = None
+        self._worker: asyncio.Task | None = None
+
+        self.counts: dict[str, int] = {'sent': 0, 'coalesced': 0, 'retried': 0, 'dropped': 0, 'failed': 0}
+
+    @classmethod
+    def from_config(
+        cls,
+        adapter: abstract_platform_adapter.AbstractMessagePlatformAdapter,
+        adapter_name: str,
+        outbound_cfg: dict,
+        bot_uuid: str = '',
+        metrics_mgr: metrics.MetricsManager | None = None,
+    ) -> OutboundDispatcher | None:
+        """None if the queue is disabled or the platform has no limits configured, messages are sent directly then"""
+        platform_cfg = outbound_cfg.get('platforms', {}).get(adapter_name)
+        if not outbound_cfg.get('enable', True) or not platform_cfg:
+            return None
+        return cls(
+            adapter,
+            PlatformLimits(platform_cfg),
+            bot_uuid=bot_uuid,
+            metrics_mgr=metrics_mgr,
+            max_pending=outbound_cfg.get('max_pending', 1000),
+            max_concurrency=outbound_cfg.get('max_concurrency', 8),
+            max_retries=outbound_cfg.get('max_retries', 3),
+        )
+
+    @property
+    def depth(self) -> int:
+        """Messages waiting, not counting those being sent"""
+        return self._depth
+
+    async def reply(
+        self,
+        message_source: platform_events.MessageEvent,
+        message: platform_message.MessageChain,
+        quote_origin: bool = False,
+    ):
+        if isinstance(message_source, platform_events.GroupMessage):
+            chat = ('group', str(message_source.group.id))
+        else:
+            chat = ('person', str(message_source.sender.id))
+        item = _Outgoing(
+            PRIORITY_REPLY,
+            next(self._seq),
+            chat,
+            'reply',
+            message,
+            message_source=message_source,
+            quote_origin=quote_origin,
+        )
+        await self._submit(item)
+
+    async def send(self, target_type: str, target_id: str, message: platform_message.MessageChain):
+        item = _Outgoing(PRIORITY_SEND, next(self._seq), (target_type, str(target_id)), 'send', message)
+        await self._submit(item)
+
+    async def _submit(self, item: _Outgoing):
+        if self._closed:
+            raise RuntimeError('The outbound queue is shut down')
+        if self._depth >= self.max_pending:
+            self._count('dropped')
+            raise OutboundQueueFullError(f'{self._depth} messages are already waiting to be sent')
+
+        self._chats.setdefault(item.chat, collections.deque()).append(item)
+        self._set_depth(self._depth + 1)
+        self._wake()
+        await item.futures[0]
+
+    def _wake(self):
+        if self._closed:
+            return
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    def _set_depth(self, depth: int):
+        self._depth = depth
+        if self.metrics_mgr is not None:
+            self.metrics_mgr.outbound_queue_depth.set(self.bot_uuid, value=depth)
+
+    def _count(self, outcome: str, amount: int = 1):
+        self.counts[outcome] += amount
+        if self.metrics_mgr is not None:
+            self.metrics_mgr.outbound_messages.inc(self.bot_uuid, outcome, amount=amount)
+
+    def _chat_bucket(self, chat: typing.Tuple[str, str], now: float) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat)
+        if bucket is None:
+            bucket = self._chat_buckets[chat] = TokenBucket(self.limits.chat_rate, self.limits.chat_burst, now)
+        return bucket
+
+    def _next(self, now: float) -> typing.Tuple[_Outgoing | None, float | None]:
+        """The message to send now, or None and how long to wait before one may be ready (None: until woken)"""
+        if not self._chats or len(self._in_flight) >= self.max_concurrency:
+            return None, None
+        wait = self._bucket.delay(now)
+        if wait > 0:
+            return None, wait
+
+        best = None
+        for chat, queue in self._chats.items():
+            if chat in self._in_flight:
+                continue
+            chat_wait = self._chat_bucket(chat, now).delay(now)
+            if chat_wait > 0:
+                wait = chat_wait if wait <= 0 else min(wait, chat_wait)
+                continue
+            head = queue[0]
+            if best is None or (head.priority, head.seq) < (best.priority, best.seq):
+                best = head
+        return best, (wait if wait > 0 else None)
+
+    def _pop(self, item: _Outgoing, now: float) -> _Outgoing:
+        """Take `item` off its chat's queue, merged with the short text messages queued behind it"""
+        queue = self._chats[item.chat]
+        queue.popleft()
+        taken = 1
+
+        text = item.text() if self.limits.coalesce and not item.quote_origin else None
+        while text is not None and queue:
+            following = queue[0]
+            following_text = following.text()
+            if (
+                following.kind != item.kind
+                or following.quote_origin
+                or following_text is None
+                or len(text) + 1 + len(following_text) > self.limits.coalesce_max_chars
+            ):
+                break
+            queue.popleft()
+            taken += 1
+            text = f'{text}\n{following_text}'
+            item.message = platform_message.MessageChain([platform_message.Plain(text=text)])
+            item.futures.extend(following.futures)
+            self._count('coalesced')
+
+        if not queue:
+            del self._chats[item.chat]
+        self._set_depth(self._depth - taken)
+        self._bucket.take(now)
+        self._chat_bucket(item.chat, now).take(now)
+        return item
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            item, wait = self._next(now)
+            if item is None:
+                if not self._chats and not self._in_flight:
+                    self._forget_idle_buckets(now)
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            item = self._pop(item, now)
+            self._in_flight.add(item.chat)
+            task = asyncio.create_task(self._send(item))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    def _forget_idle_buckets(self, now: float):
+        for chat in [chat for chat, bucket in self._chat_buckets.items() if bucket.idle(now)]:
+            del self._chat_buckets[chat]
+
+    async def _send(self, item: _Outgoing):
+        try:
+            if item.kind == 'reply':
+                await self.adapter.reply_message(item.message_source, item.message, item.quote_origin)
+            else:
+                await self.adapter.send_message(item.chat[0], item.chat[1], item.message)
+        except asyncio.CancelledError:
+            for future in item.futures:
+                if not future.done():
+                    future.set_exception(asyncio.CancelledError())
+            raise
+        except Exception as e:
+            delay = rate_limit_delay(e)
+            if delay is not None and item.attempts < self.max_retries:
+                item.attempts += 1
+                self._count('retried')
+                delay = delay or self.backoff_base * 2 ** (item.attempts - 1)
+                self._chat_bucket(item.chat, time.monotonic()).pause(time.monotonic() + delay)
+                self._chats.setdefault(item.chat, collections.deque()).appendleft(item)
+                self._set_depth(self._depth + 1)
+            else:
+                self._count('failed', len(item.futures))
+                for future in item.futures:
+                    if not future.done():
+                        future.set_exception(e)
+        else:
+            self._count('sent', len(item.futures))
+            for future in item.futures:
+                if not future.done():
+                    future.set_result(None)
+        finally:
+            self._in_flight.discard(item.chat)
+            self._wake()
+
+    async def shutdown(self):
+        """Stop sending, messages still waiting or being sent fail"""
+        self._closed = True
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        sending = list(self._sending)
+        for task in sending:
+            task.cancel()
+        await asyncio.gather(*sending, return_exceptions=True)
+        for queue in self._chats.values():
+            for item in queue:
+                for future in item.futures:
+                    if not future.done():
+                        future.set_exception(asyncio.CancelledError())
+        self._chats.clear()
+        self._set_depth(0)
+
+    def to_dict(self) -> dict:
+        now = time.monotonic()
+        oldest = min((queue[0].enqueued_at for queue in self._chats.values()), default=None)
+        return {
+            'depth': self._depth,
+            'in_flight': len(self._in_flight),
+            'chats_waiting': len(self._chats),
+            'oldest_wait_s': round(now - oldest, 3) if oldest is not None else 0.0,
+            **self.counts,
+        }
@@ -3,6 +3,7 @@ import typing
 import asyncio
 import traceback
 import datetime
+import functools
 
 import aiocqhttp
 import pydantic
@@ -11,10 +12,15 @@ import langbot_plugin.api.definition.abstract.platform.adapter as abstract_platf
 import langbot_plugin.api.entities.builtin.platform.message as platform_message
 import langbot_plugin.api.entities.builtin.platform.events as platform_events
 import langbot_plugin.api.entities.builtin.platform.entities as platform_entities
-from ...utils import image
+from ...utils import image, imageref
 import langbot_plugin.api.definition.abstract.platform.event_logger as abstract_platform_logger
 
 
+def qq_lazy_image(url: str) -> imageref.LazyImage:
+    """Image of a received message, downloaded when first needed"""
+    return imageref.LazyImage.create(url, functools.partial(image.qq_image_url_to_bytes, url), url=url)
+
+
 class AiocqhttpMessageConverter(abstract_platform_adapter.AbstractMessageConverter):
     @staticmethod
     async def yiri2target(
@@ -203,8 +209,7 @@ class AiocqhttpMessageConverter(abstract_platform_adapter.AbstractMessageConvert
 
         async def process_message_data(msg_data, reply_list):
             if msg_data['type'] == 'image':
-                image_base64, image_format = await image.qq_image_url_to_base64(msg_data['data']['url'])
-                reply_list.append(platform_message.Image(base64=f'data:image/{image_format};base64,{image_base64}'))
+                reply_list.append(qq_lazy_image(msg_data['data']['url']))
 
             elif msg_data['type'] == 'text':
                 reply_list.append(platform_message.Plain(text=msg_data['data']['text']))
@@ -248,8 +253,7 @@ class AiocqhttpMessageConverter(abstract_platform_adapter.AbstractMessageConvert
                     face_name = msg.data.get('summary', '')
                     image_msg = platform_message.Face(face_id=face_id, face_name=face_name)
                 else:
-                    image_base64, image_format = await image.qq_image_url_to_base64(msg.data['url'])
-                    image_msg = platform_message.Image(base64=f'data:image/{image_format};base64,{image_base64}')
+                    image_msg = qq_lazy_image(msg.data['url'])
                 yiri_msg_list.append(image_msg)
             elif msg.type == 'forward':
                 # 暂时不太合理
@@ -9,6 +9,7 @@ import uuid
 import os
 import datetime
 import asyncio
+import functools
 from enum import Enum
 
 import aiohttp
@@ -20,6 +21,7 @@ import langbot_plugin.api.entities.builtin.platform.events as platform_events
 import langbot_plugin.api.entities.builtin.platform.entities as platform_entities
 import langbot_plugin.api.definition.abstract.platform.event_logger as abstract_platform_logger
 from ..logger import EventLogger
+from ...utils import imageref
 
 
 # 语音功能相关异常定义
@@ -727,15 +729,22 @@ class DiscordMessageConverter(abstract_platform_adapter.AbstractMessageConverter
 
         # attachments
         for attachment in message.attachments:
-            async with aiohttp.ClientSession(trust_env=True) as session:
-                async with session.get(attachment.url) as response:
-                    image_data = await response.read()
-                    image_base64 = base64.b64encode(image_data).decode('utf-8')
-                    image_format = response.headers['Content-Type']
-                    element_list.append(platform_message.Image(base64=f'data:{image_format};base64,{image_base64}'))
+            element_list.append(
+                imageref.LazyImage.create(
+                    attachment.url,
+                    functools.partial(DiscordMessageConverter.download_attachment, attachment.url),
+                    url=attachment.url,
+                )
+            )
 
         return platform_message.MessageChain(element_list)
 
+    @staticmethod
+    async def download_attachment(url: str) -> tuple[bytes, str]:
+        async with aiohttp.ClientSession(trust_env=True) as session:
+            async with session.get(url) as response:
+                return await response.read(), response.headers['Content-Type']
+
 
 class DiscordEventConverter(abstract_platform_adapter.AbstractEventConverter):
     @staticmethod
@@ -10,6 +10,7 @@ import base64
 import uuid
 import json
 import datetime
+import functools
 import hashlib
 from Crypto.Cipher import AES
 
@@ -25,6 +26,8 @@ import langbot_plugin.api.entities.builtin.platform.message as platform_message
 import langbot_plugin.api.entities.builtin.platform.events as platform_events
 import langbot_plugin.api.entities.builtin.platform.entities as platform_entities
 import langbot_plugin.api.definition.abstract.platform.event_logger as abstract_platform_logger
+from ...utils import imageref
+from .. import ingress
 
 
 class AESCipher(object):
@@ -251,30 +254,32 @@ class LarkMessageConverter(abstract_platform_adapter.AbstractMessageConverter):
                 lb_msg_list.append(platform_message.At(target=ele['user_name']))
             elif ele['tag'] == 'img':
                 image_key = ele['image_key']
-
-                request: GetMessageResourceRequest = (
-                    GetMessageResourceRequest.builder()
-                    .message_id(message.message_id)
-                    .file_key(image_key)
-                    .type('image')
-                    .build()
+                lb_msg_list.append(
+                    imageref.LazyImage.create(
+                        f'lark:{image_key}',
+                        functools.partial(
+                            LarkMessageConverter.download_image, api_client, message.message_id, image_key
+                        ),
+                        image_id=image_key,
+                    )
                 )
 
-                response: GetMessageResourceResponse = await api_client.im.v1.message_resource.aget(request)
-
-                if not response.success():
-                    raise Exception(
-                        f'client.im.v1.message_resource.get failed, code: {response.code}, msg: {response.msg}, log_id: {response.get_log_id()}, resp: \n{json.dumps(json.loads(response.raw.content), indent=4, ensure_ascii=False)}'
-                    )
+        return platform_message.MessageChain(lb_msg_list)
 
-                image_bytes = response.file.read()
-                image_base64 = base64.b64encode(image_bytes).decode()
+    @staticmethod
+    async def download_image(api_client: lark_oapi.Client, message_id: str, image_key: str) -> tuple[bytes, str]:
+        request: GetMessageResourceRequest = (
+            GetMessageResourceRequest.builder().message_id(message_id).file_key(image_key).type('image').build()
+        )
 
-                image_format = response.raw.headers['content-type']
+        response: GetMessageResourceResponse = await api_client.im.v1.message_resource.aget(request)
 
-                lb_msg_list.append(platform_message.Image(base64=f'data:{image_format};base64,{image_base64}'))
+        if not response.success():
+            raise Exception(
+                f'client.im.v1.message_resource.get failed, code: {response.code}, msg: {response.msg}, log_id: {response.get_log_id()}, resp: \n{json.dumps(json.loads(response.raw.content), indent=4, ensure_ascii=False)}'
+            )
 
-        return platform_message.MessageChain(lb_msg_list)
+        return response.file.read(), response.raw.headers['content-type']
 
 
 class LarkEventConverter(abstract_platform_adapter.AbstractEventConverter):
@@ -325,7 +330,7 @@ CARD_ID_CACHE_SIZE = 500
 CARD_ID_CACHE_MAX_LIFETIME = 20 * 60  # 20分钟
 
 
-class LarkAdapter(abstract_platform_adapter.AbstractMessagePlatformAdapter):
+class LarkAdapter(ingress.WebhookAdapter, abstract_platform_adapter.AbstractMessagePlatformAdapter):
     bot: lark_oapi.ws.Client = pydantic.Field(exclude=True)
     api_client: lark_oapi.Client = pydantic.Field(exclude=True)
 
@@ -342,6 +347,8 @@ class LarkAdapter(abstract_platform_adapter.AbstractMessagePlatformAdapter):
 
     quart_app: quart.Quart = pydantic.Field(exclude=True)
 
+    cipher: AESCipher | None = pydantic.Field(exclude=True, default=None)  # 回调解密器，首次收到加密回调时创建
+
     card_id_dict: dict[str, str]  # 消息id到卡片id的映射，便于创建卡片后的发送消息到指定卡片
 
     seq: int  # 用于在发送卡片消息中识别消息顺序，直接以seq作为标识
@@ -351,44 +358,7 @@ class LarkAdapter(abstract_platform_adapter.AbstractMessagePlatformAdapter):
 
         @quart_app.route('/lark/callback', methods=['POST'])
         async def lark_callback():
-            try:
-                data = await quart.request.json
-
-                if 'encrypt' in data:
-                    cipher = AESCipher(config['encrypt-key'])
-                    data = cipher.decrypt_string(data['encrypt'])
-                    data = json.loads(data)
-
-                type = data.get('type')
-                if type is None:
-                    context = EventContext(data)
-                    type = context.header.event_type
-
-                if 'url_verification' == type:
-                    # todo 验证verification token
-                    return {'challenge': data.get('challenge')}
-                context = EventContext(data)
-                type = context.header.event_type
-                p2v1 = P2ImMessageReceiveV1()
-                p2v1.header = context.header
-                event = P2ImMessageReceiveV1Data()
-                event.message = EventMessage(context.event['message'])
-                event.sender = EventSender(context.event['sender'])
-                p2v1.event = event
-                p2v1.schema = context.schema
-                if 'im.message.receive_v1' == type:
-                    try:
-                        event = await self.event_converter.target2yiri(p2v1, self.api_client)
-                    except Exception:
-                        await self.logger.error(f'Error in lark callback: {traceback.format_exc()}')
-
-                    if event.__class__ in self.listeners:
-                        await self.listeners[event.__class__](event, self)
-
-                return {'code': 200, 'message': 'ok'}
-            except Exception:
-                await self.logger.error(f'Error in lark callback: {traceback.format_exc()}')
-                return {'code': 500, 'message': 'error'}
+            return await self.handle_unified_webhook()
 
         async def on_message(event: lark_oapi.im.v1.P2ImMessageReceiveV1):
             lb_event = await self.event_converter.target2yiri(event, self.api_client)
@@ -774,6 +744,50 @@ class LarkAdapter(abstract_platform_adapter.AbstractMessagePlatformAdapter):
     ):
         self.listeners.pop(event_type)
 
+    def is_webhook_enabled(self) -> bool:
+        return self.config['enable-webhook']
+
+    async def handle_unified_webhook(self):
+        try:
+            data = await quart.request.json
+
+            if 'encrypt' in data:
+                if self.cipher is None:
+                    self.cipher = AESCipher(self.config['encrypt-key'])
+                data = self.cipher.decrypt_string(data['encrypt'])
+                data = json.loads(data)
+
+            type = data.get('type')
+            if type is None:
+                context = EventContext(data)
+                type = context.header.event_type
+
+            if 'url_verification' == type:
+                # todo 验证verification token
+                return {'challenge': data.get('challenge')}
+            context = EventContext(data)
+            type = context.header.event_type
+            p2v1 = P2ImMessageReceiveV1()
+            p2v1.header = context.header
+            event = P2ImMessageReceiveV1Data()
+            event.message = EventMessage(context.event['message'])
+            event.sender = EventSender(context.event['sender'])
+            p2v1.event = event
+            p2v1.schema = context.schema
+            if 'im.message.receive_v1' == type:
+                try:
+                    event = await self.event_converter.target2yiri(p2v1, self.api_client)
+                except Exception:
+                    await self.logger.error(f'Error in lark callback: {traceback.format_exc()}')
+
+                if event.__class__ in self.listeners:
+                    await self.listeners[event.__class__](event, self)
+
+            return {'code': 200, 'message': 'ok'}
+        except Exception:
+            await self.logger.error(f'Error in lark callback: {traceback.format_exc()}')
+            return {'code': 500, 'message': 'error'}
+
     async def run_async(self):
         port = self.config['port']
         enable_webhook = self.config['enable-webhook']
@@ -6,6 +6,7 @@ import traceback
 import time
 import re
 import copy
+import hashlib
 import threading
 
 import quart
@@ -16,7 +17,7 @@ from ....core import app
 import langbot_plugin.api.entities.builtin.platform.message as platform_message
 import langbot_plugin.api.entities.builtin.platform.events as platform_events
 import langbot_plugin.api.entities.builtin.platform.entities as platform_entities
-from ....utils import image
+from ....utils import image, imageref
 import xml.etree.ElementTree as ET
 from typing import Optional, Tuple
 from functools import partial
@@ -157,7 +158,8 @@ class GewechatMessageConverter(abstract_platform_adapter.AbstractMessageConverte
             if not image_xml:
                 return platform_message.MessageChain([platform_message.Unknown('[图片内容为空]')])
 
-            base64_str, image_format = await image.get_gewechat_image_base64(
+            fetcher = partial(
+                image.get_gewechat_image_bytes,
                 gewechat_url=self.config['gewechat_url'],
                 gewechat_file_url=self.config['gewechat_file_url'],
                 app_id=self.config['app_id'],
@@ -167,7 +169,7 @@ class GewechatMessageConverter(abstract_platform_adapter.AbstractMessageConverte
             )
 
             elements = [
-                platform_message.Image(base64=f'data:image/{image_format};base64,{base64_str}'),
+                imageref.LazyImage.create(f'gewechat:{hashlib.sha1(image_xml.encode()).hexdigest()}', fetcher),
                 platform_message.WeChatForwardImage(xml_data=image_xml),  # 微信消息转发
             ]
             return platform_message.MessageChain(elements)
@@ -4,8 +4,8 @@ import quart
 
 import traceback
 import asyncio
-import base64
 import datetime
+import functools
 
 
 import langbot_plugin.api.definition.abstract.platform.adapter as abstract_platform_adapter
@@ -13,6 +13,8 @@ import langbot_plugin.api.entities.builtin.platform.message as platform_message
 import langbot_plugin.api.entities.builtin.platform.events as platform_events
 import langbot_plugin.api.entities.builtin.platform.entities as platform_entities
 from ..logger import EventLogger
+from ...utils import imageref
+from .. import ingress
 
 
 from linebot.v3 import WebhookHandler
@@ -64,16 +66,21 @@ class LINEMessageConverter(abstract_platform_adapter.AbstractMessageConverter):
         elif isinstance(message.message, VideoMessageContent):
             pass
         elif isinstance(message.message, ImageMessageContent):
-            message_content = MessagingApiBlob(bot_client).get_message_content(message.message.id)
-
-            base64_string = base64.b64encode(message_content).decode('utf-8')
-
-            # 如果需要Data URI格式（用于直接嵌入HTML等）
-            # 首先需要知道图片类型，LINE图片通常是JPEG
-            data_uri = f'data:image/jpeg;base64,{base64_string}'
-            lb_msg_list.append(platform_message.Image(base64=data_uri))
+            lb_msg_list.append(
+                imageref.LazyImage.create(
+                    f'line:{message.message.id}',
+                    functools.partial(LINEMessageConverter.download_image, bot_client, message.message.id),
+                    image_id=message.message.id,
+                )
+            )
         return platform_message.MessageChain(lb_msg_list)
 
+    @staticmethod
+    async def download_image(bot_client, message_id: str) -> tuple[bytes, str]:
+        message_content = await asyncio.to_thread(MessagingApiBlob(bot_client).get_message_content, message_id)
+        # LINE图片通常是JPEG
+        return message_content, 'image/jpeg'
+
 
 class LINEEventConverter(abstract_platform_adapter.AbstractEventConverter):
     @staticmethod
@@ -119,7 +126,7 @@ class LINEEventConverter(abstract_platform_adapter.AbstractEventConverter):
             )
 
 
-class LINEAdapter(abstract_platform_adapter.AbstractMessagePlatformAdapter):
+class LINEAdapter(ingress.WebhookAdapter, abstract_platform_adapter.AbstractMessagePlatformAdapter):
     bot: MessagingApi
     api_client: ApiClient
 
@@ -134,6 +141,7 @@ class LINEAdapter(abstract_platform_adapter.AbstractMessagePlatformAdapter):
 
     config: dict
     quart_app: quart.Quart
+    parser: WebhookParser
 
     card_id_dict: dict[str, str]  # 消息id到卡片id的映射，便于创建卡片后的发送消息到指定卡片
 
@@ -166,26 +174,7 @@ class LINEAdapter(abstract_platform_adapter.AbstractMessagePlatformAdapter):
 
         @self.quart_app.route('/line/callback', methods=['POST'])
         async def line_callback():
-            try:
-                signature = quart.request.headers.get('X-Line-Signature')
-                body = await quart.request.get_data(as_text=True)
-                events = parser.parse(body, signature)  # 解密解析消息
-
-                try:
-                    # print(events)
-                    lb_event = await self.event_converter.target2yiri(events[0], self.api_client)
-                    if lb_event.__class__ in self.listeners:
-                        await self.listeners[lb_event.__class__](lb_event, self)
-                except InvalidSignatureError:
-                    self.logger.info(
-                        f'Invalid signature. Please check your channel access token/channel secret.{traceback.format_exc()}'
-                    )
-                    return quart.Response('Invalid signature', status=400)
-
-                return {'code': 200, 'message': 'ok'}
-            except Exception:
-                await self.logger.error(f'Error in LINE callback: {traceback.format_exc()}')
-                return {'code': 500, 'message': 'error'}
+            return await self.handle_unified_webhook()
 
     async def send_message(self, target_type: str, target_id: str, message: platform_message.MessageChain):
         pass
@@ -235,6 +224,28 @@ class LINEAdapter(abstract_platform_adapter.AbstractMessagePlatformAdapter):
     ):
         self.listeners.pop(event_type)
 
+    async def handle_unified_webhook(self):
+        try:
+            signature = quart.request.headers.get('X-Line-Signature')
+            body = await quart.request.get_data(as_text=True)
+            events = self.parser.parse(body, signature)  # 解密解析消息
+
+            try:
+                # print(events)
+                lb_event = await self.event_converter.target2yiri(events[0], self.api_client)
+                if lb_event.__class__ in self.listeners:
+                    await self.listeners[lb_event.__class__](lb_event, self)
+            except InvalidSignatureError:
+                self.logger.info(
+                    f'Invalid signature. Please check your channel access token/channel secret.{traceback.format_exc()}'
+                )
+                return quart.Response('Invalid signature', status=400)
+
+            return {'code': 200, 'message': 'ok'}
+        except Exception:
+            await self.logger.error(f'Error in LINE callback: {traceback.format_exc()}')
+            return {'code': 500, 'message': 'error'}
+
     async def run_async(self):
         port = self.config['port']
 
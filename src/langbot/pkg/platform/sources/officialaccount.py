@@ -5,6 +5,7 @@ import traceback
 import pydantic
 import datetime
 import langbot_plugin.api.definition.abstract.platform.adapter as abstract_platform_adapter
+from .. import ingress
 from langbot.libs.official_account_api.oaevent import OAEvent
 from langbot.libs.official_account_api.api import OAClient
 from langbot.libs.official_account_api.api import OAClientForLongerResponse
@@ -54,7 +55,7 @@ class OAEventConverter(abstract_platform_adapter.AbstractEventConverter):
             return None
 
 
-class OfficialAccountAdapter(abstract_platform_adapter.AbstractMessagePlatformAdapter):
+class OfficialAccountAdapter(ingress.WebhookAdapter, abstract_platform_adapter.AbstractMessagePlatformAdapter):
     message_converter: OAMessageConverter = OAMessageConverter()
     event_converter: OAEventConverter = OAEventConverter()
     bot: typing.Union[OAClient, OAClientForLongerResponse] = pydantic.Field(exclude=True)
@@ -129,6 +130,9 @@ class OfficialAccountAdapter(abstract_platform_adapter.AbstractMessagePlatformAd
         elif event_type == platform_events.GroupMessage:
             pass
 
+    async def handle_unified_webhook(self):
+        return await self.bot.handle_callback_request()
+
     async def run_async(self):
         async def shutdown_trigger_placeholder():
             while True:
@@ -4,14 +4,16 @@ import asyncio
 import traceback
 
 import datetime
+import functools
 
 import langbot_plugin.api.definition.abstract.platform.adapter as abstract_platform_adapter
+from .. import ingress
 import langbot_plugin.api.entities.builtin.platform.message as platform_message
 import langbot_plugin.api.entities.builtin.platform.events as platform_events
 import langbot_plugin.api.entities.builtin.platform.entities as platform_entities
 from langbot.libs.qq_official_api.api import QQOfficialClient
 from langbot.libs.qq_official_api.qqofficialevent import QQOfficialEvent
-from langbot.pkg.utils import image
+from langbot.pkg.utils import image, imageref
 from langbot.pkg.platform.logger import EventLogger
 
 
@@ -36,8 +38,13 @@ class QQOfficialMessageConverter(abstract_platform_adapter.AbstractMessageConver
         yiri_msg_list = []
         yiri_msg_list.append(platform_message.Source(id=message_id, time=datetime.datetime.now()))
         if pic_url is not None:
-            base64_url = await image.get_qq_official_image_base64(pic_url=pic_url, content_type=content_type)
-            yiri_msg_list.append(platform_message.Image(base64=base64_url))
+            yiri_msg_list.append(
+                imageref.LazyImage.create(
+                    pic_url,
+                    functools.partial(image.get_qq_official_image_bytes, pic_url, content_type),
+                    url=pic_url,
+                )
+            )
 
         yiri_msg_list.append(platform_message.Plain(text=message))
         chain = platform_message.MessageChain(yiri_msg_list)
@@ -130,7 +137,7 @@ class QQOfficialEventConverter(abstract_platform_adapter.AbstractEventConverter)
             )
 
 
-class QQOfficialAdapter(abstract_platform_adapter.AbstractMessagePlatformAdapter):
+class QQOfficialAdapter(ingress.WebhookAdapter, abstract_platform_adapter.AbstractMessagePlatformAdapter):
     bot: QQOfficialClient
     config: dict
     bot_account_id: str
@@ -223,6 +230,9 @@ class QQOfficialAdapter(abstract_platform_adapter.AbstractMessagePlatformAdapter
             self.bot.on_message('GROUP_AT_MESSAGE_CREATE')(on_message)
             self.bot.on_message('AT_MESSAGE_CREATE')(on_message)
 
+    async def handle_unified_webhook(self):
+        return await self.bot.handle_callback_request()
+
     async def run_async(self):
         async def shutdown_trigger_placeholder():
             while True:
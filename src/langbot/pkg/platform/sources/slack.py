@@ -4,15 +4,17 @@ import asyncio
 import traceback
 
 import datetime
+import functools
 
 from langbot.libs.slack_api.api import SlackClient
 import langbot_plugin.api.definition.abstract.platform.adapter as abstract_platform_adapter
+from .. import ingress
 from langbot.libs.slack_api.slackevent import SlackEvent
 import langbot_plugin.api.entities.builtin.platform.events as platform_events
 import langbot_plugin.api.entities.builtin.platform.message as platform_message
 import langbot_plugin.api.entities.builtin.platform.entities as platform_entities
 from langbot_plugin.api.entities.builtin.command import errors as command_errors
-from langbot.pkg.utils import image
+from langbot.pkg.utils import image, imageref
 from langbot.pkg.platform.logger import EventLogger
 
 
@@ -35,8 +37,11 @@ class SlackMessageConverter(abstract_platform_adapter.AbstractMessageConverter):
         yiri_msg_list = []
         yiri_msg_list.append(platform_message.Source(id=message_id, time=datetime.datetime.now()))
         if pic_url is not None:
-            base64_url = await image.get_slack_image_to_base64(pic_url=pic_url, bot_token=bot.bot_token)
-            yiri_msg_list.append(platform_message.Image(base64=base64_url))
+            yiri_msg_list.append(
+                imageref.LazyImage.create(
+                    pic_url, functools.partial(image.get_slack_image_bytes, pic_url, bot.bot_token), url=pic_url
+                )
+            )
 
         yiri_msg_list.append(platform_message.Plain(text=message))
         chain = platform_message.MessageChain(yiri_msg_list)
@@ -83,7 +88,7 @@ class SlackEventConverter(abstract_platform_adapter.AbstractEventConverter):
             )
 
 
-class SlackAdapter(abstract_platform_adapter.AbstractMessagePlatformAdapter):
+class SlackAdapter(ingress.WebhookAdapter, abstract_platform_adapter.AbstractMessagePlatformAdapter):
     bot: SlackClient
     bot_account_id: str
     message_converter: SlackMessageConverter = SlackMessageConverter()
@@ -148,6 +153,9 @@ class SlackAdapter(abstract_platform_adapter.AbstractMessagePlatformAdapter):
         elif event_type == platform_events.GroupMessage:
             self.bot.on_message('channel')(on_message)
 
+    async def handle_unified_webhook(self):
+        return await self.bot.handle_callback_request()
+
     async def run_async(self):
         async def shutdown_trigger_placeholder():
             while True:
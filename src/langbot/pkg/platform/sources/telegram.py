@@ -9,6 +9,7 @@ import telegramify_markdown
 import typing
 import traceback
 import base64
+import functools
 import aiohttp
 import pydantic
 
@@ -17,6 +18,7 @@ import langbot_plugin.api.entities.builtin.platform.message as platform_message
 import langbot_plugin.api.entities.builtin.platform.events as platform_events
 import langbot_plugin.api.entities.builtin.platform.entities as platform_entities
 import langbot_plugin.api.definition.abstract.platform.event_logger as abstract_platform_logger
+from ...utils import imageref
 
 
 class TelegramMessageConverter(abstract_platform_adapter.AbstractMessageConverter):
@@ -49,7 +51,7 @@ class TelegramMessageConverter(abstract_platform_adapter.AbstractMessageConverte
 
     @staticmethod
     async def target2yiri(message: telegram.Message, bot: telegram.Bot, bot_account_id: str):
-        message_components = []
+        message_components = [platform_message.Source(id=message.message_id, time=message.date)]
 
         def parse_message_text(text: str) -> list[platform_message.MessageComponent]:
             msg_components = []
@@ -69,24 +71,25 @@ class TelegramMessageConverter(abstract_platform_adapter.AbstractMessageConverte
             if message.caption:
                 message_components.extend(parse_message_text(message.caption))
 
-            file = await message.photo[-1].get_file()
-
-            file_bytes = None
-            file_format = ''
-
-            async with aiohttp.ClientSession(trust_env=True) as session:
-                async with session.get(file.file_path) as response:
-                    file_bytes = await response.read()
-                    file_format = 'image/jpeg'
-
+            photo = message.photo[-1]
             message_components.append(
-                platform_message.Image(
-                    base64=f'data:{file_format};base64,{base64.b64encode(file_bytes).decode("utf-8")}'
+                imageref.LazyImage.create(
+                    f'telegram:{photo.file_unique_id}',
+                    functools.partial(TelegramMessageConverter.download_photo, photo),
+                    image_id=photo.file_id,
                 )
             )
 
         return platform_message.MessageChain(message_components)
 
+    @staticmethod
+    async def download_photo(photo: telegram.PhotoSize) -> tuple[bytes, str]:
+        file = await photo.get_file()
+
+        async with aiohttp.ClientSession(trust_env=True) as session:
+            async with session.get(file.file_path) as response:
+                return await response.read(), 'image/jpeg'
+
 
 class TelegramEventConverter(abstract_platform_adapter.AbstractEventConverter):
     @staticmethod
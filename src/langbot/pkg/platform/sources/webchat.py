@@ -114,11 +114,15 @@ class WebChatAdapter(abstract_platform_adapter.AbstractMessagePlatformAdapter):
             timestamp=datetime.now().isoformat(),
         )
 
-        # notify waiter
+        # notify waiter, the queue is gone once the request has taken its reply
         if isinstance(message_source, platform_events.FriendMessage):
-            await self.webchat_person_session.resp_queues[message_source.message_chain.message_id].put(message_data)
+            queue = self.webchat_person_session.resp_queues.get(message_source.message_chain.message_id)
         elif isinstance(message_source, platform_events.GroupMessage):
-            await self.webchat_group_session.resp_queues[message_source.message_chain.message_id].put(message_data)
+            queue = self.webchat_group_session.resp_queues.get(message_source.message_chain.message_id)
+        else:
+            queue = None
+        if queue is not None:
+            await queue.put(message_data)
 
         return message_data.model_dump()
 
@@ -290,6 +294,7 @@ class WebChatAdapter(abstract_platform_adapter.AbstractMessagePlatformAdapter):
 
             queue = use_session.resp_queues[message_id]
             resp_message = await queue.get()
+            use_session.resp_queues.pop(message_id)
             use_session.get_message_list(pipeline_uuid).append(resp_message)
             resp_message.id = msg_id
             resp_message.is_final = True
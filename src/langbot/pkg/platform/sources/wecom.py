@@ -4,11 +4,13 @@ import asyncio
 import traceback
 
 import datetime
+import functools
 
 from langbot.libs.wecom_api.api import WecomClient
 import langbot_plugin.api.definition.abstract.platform.adapter as abstract_platform_adapter
+from .. import ingress
 from langbot.libs.wecom_api.wecomevent import WecomEvent
-from langbot.pkg.utils import image
+from langbot.pkg.utils import image, imageref
 from langbot.pkg.platform.logger import EventLogger
 import langbot_plugin.api.entities.builtin.platform.message as platform_message
 import langbot_plugin.api.entities.builtin.platform.events as platform_events
@@ -62,8 +64,9 @@ class WecomMessageConverter(abstract_platform_adapter.AbstractMessageConverter):
     async def target2yiri_image(picurl: str, message_id: int = -1):
         yiri_msg_list = []
         yiri_msg_list.append(platform_message.Source(id=message_id, time=datetime.datetime.now()))
-        image_base64, image_format = await image.get_wecom_image_base64(pic_url=picurl)
-        yiri_msg_list.append(platform_message.Image(base64=f'data:image/{image_format};base64,{image_base64}'))
+        yiri_msg_list.append(
+            imageref.LazyImage.create(picurl, functools.partial(image.get_wecom_image_bytes, picurl), url=picurl)
+        )
         chain = platform_message.MessageChain(yiri_msg_list)
 
         return chain
@@ -125,7 +128,7 @@ class WecomEventConverter(abstract_platform_adapter.AbstractEventConverter):
             return platform_events.FriendMessage(sender=friend, message_chain=yiri_chain, time=event.timestamp)
 
 
-class WecomAdapter(abstract_platform_adapter.AbstractMessagePlatformAdapter):
+class WecomAdapter(ingress.WebhookAdapter, abstract_platform_adapter.AbstractMessagePlatformAdapter):
     bot: WecomClient
     bot_account_id: str
     message_converter: WecomMessageConverter = WecomMessageConverter()
@@ -214,6 +217,9 @@ class WecomAdapter(abstract_platform_adapter.AbstractMessagePlatformAdapter):
         elif event_type == platform_events.GroupMessage:
             pass
 
+    async def handle_unified_webhook(self):
+        return await self.bot.handle_callback_request()
+
     async def run_async(self):
         async def shutdown_trigger_placeholder():
             while True:
@@ -5,6 +5,7 @@ import traceback
 
 import datetime
 import langbot_plugin.api.definition.abstract.platform.adapter as abstract_platform_adapter
+from .. import ingress
 import langbot_plugin.api.entities.builtin.platform.message as platform_message
 import langbot_plugin.api.entities.builtin.platform.events as platform_events
 import langbot_plugin.api.entities.builtin.platform.entities as platform_entities
@@ -82,7 +83,7 @@ class WecomBotEventConverter(abstract_platform_adapter.AbstractEventConverter):
                 print(traceback.format_exc())
 
 
-class WecomBotAdapter(abstract_platform_adapter.AbstractMessagePlatformAdapter):
+class WecomBotAdapter(ingress.WebhookAdapter, abstract_platform_adapter.AbstractMessagePlatformAdapter):
     bot: WecomBotClient
     bot_account_id: str
     message_converter: WecomBotMessageConverter = WecomBotMessageConverter()
@@ -189,6 +190,9 @@ class WecomBotAdapter(abstract_platform_adapter.AbstractMessagePlatformAdapter):
         except Exception:
             print(traceback.format_exc())
 
+    async def handle_unified_webhook(self):
+        return await self.bot.handle_callback_request()
+
     async def run_async(self):
         async def shutdown_trigger_placeholder():
             while True:
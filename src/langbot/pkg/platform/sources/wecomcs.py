@@ -8,6 +8,7 @@ import pydantic
 
 from langbot.libs.wecom_customer_service_api.api import WecomCSClient
 import langbot_plugin.api.definition.abstract.platform.adapter as abstract_platform_adapter
+from .. import ingress
 from langbot.libs.wecom_customer_service_api.wecomcsevent import WecomCSEvent
 import langbot_plugin.api.entities.builtin.platform.entities as platform_entities
 import langbot_plugin.api.entities.builtin.platform.message as platform_message
@@ -117,7 +118,7 @@ class WecomEventConverter(abstract_platform_adapter.AbstractEventConverter):
             )
 
 
-class WecomCSAdapter(abstract_platform_adapter.AbstractMessagePlatformAdapter):
+class WecomCSAdapter(ingress.WebhookAdapter, abstract_platform_adapter.AbstractMessagePlatformAdapter):
     bot: WecomCSClient = pydantic.Field(exclude=True)
     message_converter: WecomMessageConverter = WecomMessageConverter()
     event_converter: WecomEventConverter = WecomEventConverter()
@@ -190,6 +191,9 @@ class WecomCSAdapter(abstract_platform_adapter.AbstractMessagePlatformAdapter):
         elif event_type == platform_events.GroupMessage:
             pass
 
+    async def handle_unified_webhook(self):
+        return await self.bot.handle_callback_request()
+
     async def run_async(self):
         async def shutdown_trigger_placeholder():
             while True:
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import time
+import typing
+
+import sqlalchemy
+
+from ..entity.persistence import bstorage as persistence_bstorage
+
+if typing.TYPE_CHECKING:
+    from ..core import app
+
+
+DEFAULT_REFRESH_BEFORE = 300.0
+"""Seconds before a token expires that it is refreshed in the background"""
+
+EXPIRY_MARGIN = 60.0
+"""Tokens are treated as expired this many seconds early (at most a tenth of their lifetime),
+for clock skew and requests in flight"""
+
+WECHAT_INVALID_TOKEN_ERRCODES = (40014, 42001)
+"""WeChat and WeCom errcodes of an invalid and an expired access_token"""
+
+T = typing.TypeVar('T')
+
+Fetcher = typing.Callable[[], typing.Awaitable[typing.Tuple[str, float]]]
+"""Requests a new token from the platform, returns it and its lifetime in seconds"""
+
+
+def credential_key(platform: str, app_id: str, secret: str) -> str:
+    """Identifies the token of a credential, bots using the same credential share it. The secret is hashed."""
+    return f'{platform}:{app_id}:{hashlib.sha256(secret.encode()).hexdigest()[:16]}'
+
+
+def is_wechat_token_invalid(data: dict) -> bool:
+    return isinstance(data, dict) and data.get('errcode') in WECHAT_INVALID_TOKEN_ERRCODES
+
+
+class _Token:
+    __slots__ = ('value', 'expires_at', 'refresh_at')
+
+    def __init__(self, value: str, expires_at: float, refresh_before: float, lifetime: float):
+        self.value = value
+        self.expires_at = expires_at
+        self.refresh_at = expires_at - min(refresh_before, lifetime / 2)
+
+
+class BinaryStorageTokenStore:
+    """Keeps tokens in the binary storage table, so a restart reuses them instead of requesting new ones"""
+
+    OWNER_TYPE = 'platform'
+
+    OWNER = 'access_token'
+
+    def __init__(self, ap: app.Application):
+        self.ap = ap
+
+    def _where(self, query, storage_key: str):
+        return (
+            query.where(persistence_bstorage.BinaryStorage.key == storage_key)
+            .where(persistence_bstorage.BinaryStorage.owner_type == self.OWNER_TYPE)
+            .where(persistence_bstorage.BinaryStorage.owner == self.OWNER)
+        )
+
+    async def load(self, key: str) -> typing.Tuple[str, float] | None:
+        """Returns the token and when it expires, None if none is stored"""
+        storage_key = hashlib.sha256(key.encode()).hexdigest()
+        try:
+            result = await self.ap.persistence_mgr.execute_async(
+                self._where(sqlalchemy.select(persistence_bstorage.BinaryStorage), storage_key)
+            )
+            storage = result.first()
+            if storage is None:
+                return None
+            data = json.loads(storage.value)
+            return data['token'], float(data['expires_at'])
+        except Exception as e:
+            self.ap.logger.warning(f'Failed to load access token of {key.split(":")[0]}: {e}')
+            return None
+
+    async def save(self, key: str, token: str, expires_at: float):
+        storage_key = hashlib.sha256(key.encode()).hexdigest()
+        value = json.dumps({'token': token, 'expires_at': expires_at}).encode()
+        try:
+            result = await self.ap.persistence_mgr.execute_async(
+                self._where(sqlalchemy.select(persistence_bstorage.BinaryStorage), storage_key)
+            )
+            if result.first() is not None:
+                await self.ap.persistence_mgr.execute_async(
+                    self._where(sqlalchemy.update(persistence_bstorage.BinaryStorage), storage_key).values(value=value)
+                )
+            else:
+                await self.ap.persistence_mgr.execute_async(
+                    sqlalchemy.insert(persistence_bstorage.BinaryStorage).values(
+                        unique_key=f'{self.OWNER_TYPE}:{self.OWNER}:{storage_key}',
+                        key=storage_key,
+                        owner_type=self.OWNER_TYPE,
+                        owner=self.OWNER,
+                        value=value,
+                    )
+                )
+        except Exception as e:
+            self.ap.logger.warning(f'Failed to save access token of {key.split(":")[0]}: {e}')
+
+
+class TokenCache:
+    """Access tokens of platform APIs, shared by every client in the process.
+
+    There is at most one request for a new token per credential at a time, concurrent callers wait for it.
+    A token is refreshed in the background once it is within `refresh_before` seconds of expiring, callers
+    keep using the current one meanwhile. A token the platform rejected is dropped with `invalidate`, `call`
+    does that and retries once.
+    """
+
+    refresh_before: float
+
+    store: BinaryStorageTokenStore | None
+    """Persists tokens across restarts when set"""
+
+    _tokens: dict[str, _Token]
+
+    _refreshing: dict[str, asyncio.Task]
+
+    _restored: set[str]
+    """Keys already looked up in the store"""
+
+    def __init__(self, refresh_before: float = DEFAULT_REFRESH_BEFORE):
+        self.refresh_before = refresh_before
+        self.store = None
+        self._tokens = {}
+        self._refreshing = {}
+        self._restored = set()
+
+        self.fetches: dict[str, int] = {}
+        """Requests to the token endpoint per credential"""
+        self.hits = 0
+        self.invalidations = 0
+
+    async def get(self, key: str, fetcher: Fetcher) -> str:
+        token = self._tokens.get(key)
+        now = time.time()
+        if token is not None and now < token.expires_at:
+            self.hits += 1
+            if now >= token.refresh_at:
+                self._refresh(key, fetcher)
+            return token.value
+
+        return await asyncio.shield(self._refresh(key, fetcher))
+
+    def invalidate(self, key: str, value: str):
+        """Drop the token after the platform rejected it, unless it has been replaced already"""
+        token = self._tokens.get(key)
+        if token is not None and token.value == value:
+            del self._tokens[key]
+            self.invalidations += 1
+
+    async def call(
+        self,
+        key: str,
+        fetcher: Fetcher,
+        request: typing.Callable[[str], typing.Awaitable[T]],
+        is_invalid: typing.Callable[[T], bool] = is_wechat_token_invalid,
+    ) -> T:
+        """Run `request` with the token, once more with a new token if `is_invalid` says the result rejected it"""
+        value = await self.get(key, fetcher)
+        result = await request(value)
+        if is_invalid(result):
+            self.invalidate(key, value)
+            result = await request(await self.get(key, fetcher))
+        return result
+
+    def _refresh(self, key: str, fetcher: Fetcher) -> asyncio.Task:
+        task = self._refreshing.get(key)
+        if task is None:
+            task = self._refreshing[key] = asyncio.create_task(self._fetch(key, fetcher))
+            task.add_done_callback(lambda task: self._on_refreshed(key, task))
+        return task
+
+    def _on_refreshed(self, key: str, task: asyncio.Task):
+        if self._refreshing.get(key) is task:
+            del self._refreshing[key]
+        if not task.cancelled():
+            task.exception()  # background refreshes have no waiter, the next get raises again
+
+    async def _fetch(self, key: str, fetcher: Fetcher) -> str:
+        if self.store is not None and key not in self._restored:
+            self._restored.add(key)
+            stored = await self.store.load(key)
+            if stored is not None:
+                value, expires_at = stored
+                lifetime = expires_at - time.time()
+                if lifetime > self.refresh_before:
+                    self._tokens[key] = _Token(value, expires_at, self.refresh_before, lifetime)
+                    return value
+
+        value, lifetime = await fetcher()
+        self.fetches[key] = self.fetches.get(key, 0) + 1
+        lifetime = float(lifetime)
+        lifetime -= min(EXPIRY_MARGIN, lifetime / 10)
+        expires_at = time.time() + lifetime
+        self._tokens[key] = _Token(value, expires_at, self.refresh_before, lifetime)
+        if self.store is not None:
+            await self.store.save(key, value, expires_at)
+        return value
+
+    def to_dict(self) -> dict:
+        now = time.time()
+        return {
+            'refresh_before': self.refresh_before,
+            'persist': self.store is not None,
+            'fetches': sum(self.fetches.values()),
+            'hits': self.hits,
+            'invalidations': self.invalidations,
+            'tokens': {
+                key: {'fetches': self.fetches.get(key, 0), 'expires_in': round(token.expires_at - now)}
+                for key, token in self._tokens.items()
+            },
+        }
+
+
+cache = TokenCache()
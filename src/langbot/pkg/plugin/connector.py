@@ -2,6 +2,7 @@
 from __future__ import annotations
 
 import asyncio
+import time
 from typing import Any
 import typing
 import os
@@ -11,7 +12,7 @@ from async_lru import alru_cache
 
 from ..core import app
 from . import handler
-from ..utils import platform
+from ..utils import platform, imageref, blobstore
 from langbot_plugin.runtime.io.controllers.stdio import (
     client as stdio_client_controller,
 )
@@ -300,10 +301,33 @@ class PluginRuntimeConnector:
         if not self.is_enable_plugin:
             return event_ctx
 
+        query = getattr(event, 'query', None)
+        # MessageReceived is emitted before the respond rules, it carries image references (url / image_id)
+        # so that messages dropped by the rules never download their images; later events carry the bytes
+        if query is not None and not isinstance(event, (events.PersonMessageReceived, events.GroupMessageReceived)):
+            for e in await imageref.resolve_chain(query.message_chain):
+                self.ap.logger.warning(f'Failed to download image of query {query.query_id}: {e}')
+
+        timed = self.ap.metrics_mgr.should_sample()
+        if timed:
+            started_at = time.perf_counter()
+        # opened before dumping the event, so the query variables carry this span's traceparent to the runtime
+        span = self.ap.trace_mgr.start_span(query, f'plugin.event {event_ctx.event_name}')
+
         # Pass include_plugins to runtime for filtering
-        event_ctx_result = await self.handler.emit_event(
-            event_ctx.model_dump(serialize_as_any=False), include_plugins=bound_plugins
-        )
+        try:
+            # the prompt carries blob handles of images, plugins get the data URIs
+            event_ctx_result = await self.handler.emit_event(
+                await blobstore.encode_dump(event_ctx.model_dump(serialize_as_any=False)),
+                include_plugins=bound_plugins,
+            )
+        except Exception as e:
+            self.ap.trace_mgr.end_span(query, span, str(e))
+            raise
+        self.ap.trace_mgr.end_span(query, span)
+
+        if timed:
+            self.ap.metrics_mgr.plugin_event_duration.observe(time.perf_counter() - started_at, event_ctx.event_name)
 
         event_ctx = context.EventContext.model_validate(event_ctx_result['event_context'])
 
@@ -139,8 +139,8 @@ class RuntimeConnectionHandler(handler.Handler):
 
             message_chain_obj = platform_message.MessageChain.model_validate(message_chain)
 
-            await query.adapter.reply_message(
-                query.message_event,
+            await self.ap.platform_mgr.reply_to_query(
+                query,
                 message_chain_obj,
                 quote_origin,
             )
@@ -280,12 +280,18 @@ class RuntimeConnectionHandler(handler.Handler):
             message_chain_obj = platform_message.MessageChain.model_validate(message_chain)
 
             bot = await self.ap.platform_mgr.get_bot_by_uuid(bot_uuid)
+            if bot is None and self.ap.cluster is not None and self.ap.cluster.is_worker:
+                try:
+                    await self.ap.cluster.send_message(bot_uuid, target_type, target_id, message_chain_obj)
+                except LookupError as e:
+                    return handler.ActionResponse.error(message=str(e))
+                return handler.ActionResponse.success(data={})
             if bot is None:
                 return handler.ActionResponse.error(
                     message=f'Bot with bot_uuid {bot_uuid} not found',
                 )
 
-            await bot.adapter.send_message(
+            await bot.send_message(
                 target_type,
                 target_id,
                 message_chain_obj,
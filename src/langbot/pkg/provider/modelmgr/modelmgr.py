@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import asyncio
+import typing
 import sqlalchemy
 import traceback
 
@@ -24,7 +26,7 @@ class ModelManager:
 
     requester_components: list[engine.Component]
 
-    requester_dict: dict[str, type[requester.ProviderAPIRequester]]  # cache
+    requester_dict: typing.Mapping[str, type[requester.ProviderAPIRequester]]  # cache
 
     def __init__(self, ap: app.Application):
         self.ap = ap
@@ -36,12 +38,8 @@ class ModelManager:
     async def initialize(self):
         self.requester_components = self.ap.discover.get_components_by_kind('LLMAPIRequester')
 
-        # forge requester class dict
-        requester_dict: dict[str, type[requester.ProviderAPIRequester]] = {}
-        for component in self.requester_components:
-            requester_dict[component.metadata.name] = component.get_python_component_class()
-
-        self.requester_dict = requester_dict
+        # forge requester class dict, requester modules are imported when the first model using them is loaded
+        self.requester_dict = engine.LazyComponentClassDict(self.requester_components)
 
         await self.load_models_from_db()
 
@@ -52,10 +50,8 @@ class ModelManager:
         self.llm_models = []
         self.embedding_models = []
 
-        # llm models
-        result = await self.ap.persistence_mgr.execute_async(sqlalchemy.select(persistence_model.LLMModel))
-        llm_models = result.all()
-        for llm_model in llm_models:
+        # models are loaded concurrently, requester initialize() may wait on the network
+        async def load_llm_model(llm_model: sqlalchemy.Row[persistence_model.LLMModel]):
             try:
                 await self.load_llm_model(llm_model)
             except provider_errors.RequesterNotFoundError as e:
@@ -63,10 +59,7 @@ class ModelManager:
             except Exception as e:
                 self.ap.logger.error(f'Failed to load model {llm_model.uuid}: {e}\n{traceback.format_exc()}')
 
-        # embedding models
-        result = await self.ap.persistence_mgr.execute_async(sqlalchemy.select(persistence_model.EmbeddingModel))
-        embedding_models = result.all()
-        for embedding_model in embedding_models:
+        async def load_embedding_model(embedding_model: sqlalchemy.Row[persistence_model.EmbeddingModel]):
             try:
                 await self.load_embedding_model(embedding_model)
             except provider_errors.RequesterNotFoundError as e:
@@ -76,6 +69,19 @@ class ModelManager:
             except Exception as e:
                 self.ap.logger.error(f'Failed to load model {embedding_model.uuid}: {e}\n{traceback.format_exc()}')
 
+        # llm models
+        result = await self.ap.persistence_mgr.execute_async(sqlalchemy.select(persistence_model.LLMModel))
+        llm_models = result.all()
+
+        # embedding models
+        result = await self.ap.persistence_mgr.execute_async(sqlalchemy.select(persistence_model.EmbeddingModel))
+        embedding_models = result.all()
+
+        await asyncio.gather(
+            *[load_llm_model(llm_model) for llm_model in llm_models],
+            *[load_embedding_model(embedding_model) for embedding_model in embedding_models],
+        )
+
     async def init_runtime_llm_model(
         self,
         model_info: persistence_model.LLMModel | sqlalchemy.Row[persistence_model.LLMModel] | dict,
@@ -2,12 +2,11 @@ from __future__ import annotations
 
 import typing
 import json
-import base64
 
 from langbot.pkg.provider import runner
 from langbot.pkg.core import app
 import langbot_plugin.api.entities.builtin.provider.message as provider_message
-from langbot.pkg.utils import image
+from langbot.pkg.utils import blobstore
 import langbot_plugin.api.entities.builtin.pipeline.query as pipeline_query
 from langbot.libs.coze_server_api.client import AsyncCozeAPIClient
 
@@ -76,8 +75,7 @@ class CozeAPIRunner(runner.RequestRunner):
                 if ce.type == 'text':
                     content_parts.append({'type': 'text', 'text': ce.text})
                 elif ce.type == 'image_base64':
-                    image_b64, image_format = await image.extract_b64_and_format(ce.image_base64)
-                    file_bytes = base64.b64decode(image_b64)
+                    file_bytes, _ = await blobstore.read_image(ce.image_base64)
                     file_id = await self._get_file_id(file_bytes)
                     content_parts.append({'type': 'image', 'file_id': file_id})
                 elif ce.type == 'file':
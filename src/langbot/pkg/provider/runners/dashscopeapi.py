@@ -3,8 +3,6 @@ from __future__ import annotations
 import typing
 import re
 
-import dashscope
-
 from .. import runner
 from ...core import app
 import langbot_plugin.api.entities.builtin.pipeline.query as pipeline_query
@@ -111,6 +109,8 @@ class DashScopeAPIRunner(runner.RequestRunner):
         if remove_think:
             has_thoughts = False
         # 发送对话请求
+        import dashscope  # imported on first use, it is slow to import
+
         response = dashscope.Application.call(
             api_key=self.api_key,  # 智能体应用的API Key
             app_id=self.app_id,  # 智能体应用的ID
@@ -239,6 +239,8 @@ class DashScopeAPIRunner(runner.RequestRunner):
         biz_params.update(query.variables)
 
         # 发送对话请求
+        import dashscope
+
         response = dashscope.Application.call(
             api_key=self.api_key,  # 智能体应用的API Key
             app_id=self.app_id,  # 智能体应用的ID
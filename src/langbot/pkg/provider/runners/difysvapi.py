@@ -3,13 +3,12 @@ from __future__ import annotations
 import typing
 import json
 import uuid
-import base64
 
 
 from langbot.pkg.provider import runner
 from langbot.pkg.core import app
 import langbot_plugin.api.entities.builtin.provider.message as provider_message
-from langbot.pkg.utils import image
+from langbot.pkg.utils import blobstore
 import langbot_plugin.api.entities.builtin.pipeline.query as pipeline_query
 from langbot.libs.dify_service_api.v1 import client, errors
 
@@ -84,9 +83,8 @@ class DifyServiceAPIRunner(runner.RequestRunner):
                 if ce.type == 'text':
                     plain_text += ce.text
                 elif ce.type == 'image_base64':
-                    image_b64, image_format = await image.extract_b64_and_format(ce.image_base64)
-                    file_bytes = base64.b64decode(image_b64)
-                    file = ('img.png', file_bytes, f'image/{image_format}')
+                    file_bytes, mime_type = await blobstore.read_image(ce.image_base64)
+                    file = ('img.png', file_bytes, mime_type)
                     file_upload_resp = await self.dify_client.upload_file(
                         file,
                         f'{query.session.launcher_type.value}_{query.session.launcher_id}',
@@ -2,8 +2,11 @@ from __future__ import annotations
 
 import json
 import copy
+import time
 import typing
 from .. import runner
+from ..modelmgr import requester
+from ...utils import blobstore
 import langbot_plugin.api.entities.builtin.pipeline.query as pipeline_query
 import langbot_plugin.api.entities.builtin.provider.message as provider_message
 
@@ -34,6 +37,90 @@ class LocalAgentRunner(runner.RequestRunner):
             self.active_calls: dict[str, dict] = {}
             self.completed_calls: list[provider_message.ToolCall] = []
 
+    async def _invoke_llm(
+        self,
+        query: pipeline_query.Query,
+        model: requester.RuntimeLLMModel,
+        req_messages: list[provider_message.Message],
+        remove_think: bool,
+    ) -> provider_message.Message:
+        timed = self.ap.metrics_mgr.should_sample(query.query_id)
+        if timed:
+            started_at = time.perf_counter()
+        span = self.ap.trace_mgr.start_span(query, 'llm', {'llm.model': model.model_entity.name, 'llm.stream': False})
+
+        try:
+            msg = await model.requester.invoke_llm(
+                query,
+                model,
+                req_messages,
+                query.use_funcs,
+                extra_args=model.model_entity.extra_args,
+                remove_think=remove_think,
+            )
+        except Exception as e:
+            self.ap.trace_mgr.end_span(query, span, str(e))
+            raise
+
+        self.ap.trace_mgr.end_span(query, span)
+        if timed:
+            self.ap.metrics_mgr.llm_duration.observe(time.perf_counter() - started_at, model.model_entity.name, 'false')
+        return msg
+
+    def _invoke_llm_stream(
+        self,
+        query: pipeline_query.Query,
+        model: requester.RuntimeLLMModel,
+        req_messages: list[provider_message.Message],
+        remove_think: bool,
+    ) -> typing.AsyncIterator[provider_message.MessageChunk]:
+        stream = model.requester.invoke_llm_stream(
+            query,
+            model,
+            req_messages,
+            query.use_funcs,
+            extra_args=model.model_entity.extra_args,
+            remove_think=remove_think,
+        )
+        timed = self.ap.metrics_mgr.should_sample(query.query_id)
+        if not timed and self.ap.trace_mgr.get_trace(query) is None:
+            return stream
+        return self._timed_stream(query, stream, model, timed)
+
+    async def _timed_stream(
+        self,
+        query: pipeline_query.Query,
+        stream: typing.AsyncIterator[provider_message.MessageChunk],
+        model: requester.RuntimeLLMModel,
+        timed: bool,
+    ) -> typing.AsyncGenerator[provider_message.MessageChunk, None]:
+        """Record time to first chunk and total time spent waiting on the model,
+        the time the consumer holds each chunk is not counted"""
+        span = self.ap.trace_mgr.start_span(query, 'llm', {'llm.model': model.model_entity.name, 'llm.stream': True})
+        error = None
+        elapsed = 0.0
+        first = True
+        started_at = time.perf_counter()
+        try:
+            async for chunk in stream:
+                elapsed += time.perf_counter() - started_at
+                if first:
+                    if timed:
+                        self.ap.metrics_mgr.llm_ttft.observe(elapsed, model.model_entity.name)
+                    if span is not None:
+                        span.attributes['llm.ttft_ms'] = elapsed * 1000
+                    first = False
+                yield chunk
+                started_at = time.perf_counter()
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            self.ap.trace_mgr.end_span(query, span, error)
+        elapsed += time.perf_counter() - started_at
+        if timed:
+            self.ap.metrics_mgr.llm_duration.observe(elapsed, model.model_entity.name, 'true')
+
     async def run(
         self, query: pipeline_query.Query
     ) -> typing.AsyncGenerator[provider_message.Message | provider_message.MessageChunk, None]:
@@ -99,6 +186,8 @@ class LocalAgentRunner(runner.RequestRunner):
                     break
 
         req_messages = query.prompt.messages.copy() + query.messages.copy() + [user_message]
+        # images are kept in the blob store, the request carries them as data URIs
+        req_messages = await blobstore.encode_messages(req_messages)
 
         try:
             is_stream = await query.adapter.is_stream_output_supported()
@@ -112,14 +201,7 @@ class LocalAgentRunner(runner.RequestRunner):
         if not is_stream:
             # 非流式输出，直接请求
 
-            msg = await use_llm_model.requester.invoke_llm(
-                query,
-                use_llm_model,
-                req_messages,
-                query.use_funcs,
-                extra_args=use_llm_model.model_entity.extra_args,
-                remove_think=remove_think,
-            )
+            msg = await self._invoke_llm(query, use_llm_model, req_messages, remove_think)
             yield msg
             final_msg = msg
         else:
@@ -129,14 +211,7 @@ class LocalAgentRunner(runner.RequestRunner):
             accumulated_content = ''  # 从开始累积的所有内容
             last_role = 'assistant'
             msg_sequence = 1
-            async for msg in use_llm_model.requester.invoke_llm_stream(
-                query,
-                use_llm_model,
-                req_messages,
-                query.use_funcs,
-                extra_args=use_llm_model.model_entity.extra_args,
-                remove_think=remove_think,
-            ):
+            async for msg in self._invoke_llm_stream(query, use_llm_model, req_messages, remove_think):
                 msg_idx = msg_idx + 1
 
                 # 记录角色
@@ -228,14 +303,7 @@ class LocalAgentRunner(runner.RequestRunner):
                 last_role = 'assistant'
                 msg_sequence = first_end_sequence
 
-                async for msg in use_llm_model.requester.invoke_llm_stream(
-                    query,
-                    use_llm_model,
-                    req_messages,
-                    query.use_funcs,
-                    extra_args=use_llm_model.model_entity.extra_args,
-                    remove_think=remove_think,
-                ):
+                async for msg in self._invoke_llm_stream(query, use_llm_model, req_messages, remove_think):
                     msg_idx += 1
 
                     # 记录角色
@@ -284,14 +352,7 @@ class LocalAgentRunner(runner.RequestRunner):
                 )
             else:
                 # 处理完所有调用，再次请求
-                msg = await use_llm_model.requester.invoke_llm(
-                    query,
-                    use_llm_model,
-                    req_messages,
-                    query.use_funcs,
-                    extra_args=use_llm_model.model_entity.extra_args,
-                    remove_think=remove_think,
-                )
+                msg = await self._invoke_llm(query, use_llm_model, req_messages, remove_think)
 
                 yield msg
                 final_msg = msg
@@ -2,7 +2,6 @@ from __future__ import annotations
 
 import typing
 import json
-import base64
 import tempfile
 import os
 
@@ -11,7 +10,7 @@ from tboxsdk.model.file import File, FileType
 
 from .. import runner
 from ...core import app
-from ...utils import image
+from ...utils import blobstore
 import langbot_plugin.api.entities.builtin.pipeline.query as pipeline_query
 import langbot_plugin.api.entities.builtin.provider.message as provider_message
 
@@ -58,9 +57,9 @@ class TboxAPIRunner(runner.RequestRunner):
                 if ce.type == 'text':
                     plain_text += ce.text
                 elif ce.type == 'image_base64':
-                    image_b64, image_format = await image.extract_b64_and_format(ce.image_base64)
+                    file_bytes, mime_type = await blobstore.read_image(ce.image_base64)
+                    image_format = mime_type.split('/')[-1]
                     # 创建临时文件
-                    file_bytes = base64.b64decode(image_b64)
                     try:
                         with tempfile.NamedTemporaryFile(suffix=f'.{image_format}', delete=False) as tmp_file:
                             tmp_file.write(file_bytes)
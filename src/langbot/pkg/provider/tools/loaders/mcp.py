@@ -7,9 +7,8 @@ import traceback
 import sqlalchemy
 import asyncio
 
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
-from mcp.client.sse import sse_client
+if typing.TYPE_CHECKING:
+    from mcp import ClientSession
 
 from .. import loader
 from ....core import app
@@ -69,6 +68,10 @@ class RuntimeMCPSession:
         self._ready_event = asyncio.Event()
 
     async def _init_stdio_python_server(self):
+        # mcp is imported on first connection, it is slow to import and most deployments have no MCP servers
+        from mcp import ClientSession, StdioServerParameters
+        from mcp.client.stdio import stdio_client
+
         server_params = StdioServerParameters(
             command=self.server_config['command'],
             args=self.server_config['args'],
@@ -84,6 +87,9 @@ class RuntimeMCPSession:
         await self.session.initialize()
 
     async def _init_sse_server(self):
+        from mcp import ClientSession
+        from mcp.client.sse import sse_client
+
         sse_transport = await self.exit_stack.enter_async_context(
             sse_client(
                 self.server_config['url'],
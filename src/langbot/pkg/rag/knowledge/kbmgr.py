@@ -1,4 +1,5 @@
 from __future__ import annotations
+import asyncio
 import traceback
 import uuid
 import zipfile
@@ -6,7 +7,8 @@ import io
 from .services import parser, chunker
 from langbot.pkg.core import app
 from langbot.pkg.rag.knowledge.services.embedder import Embedder
-from langbot.pkg.rag.knowledge.services.retriever import Retriever
+from langbot.pkg.rag.knowledge.services.retriever import Retriever, ChunkTextCache
+from langbot.pkg.rag.rerank.rerankmgr import RerankManager
 import sqlalchemy
 from langbot.pkg.entity.persistence import rag as persistence_rag
 from langbot.pkg.core import taskmgr
@@ -26,13 +28,28 @@ class RuntimeKnowledgeBase:
 
     retriever: Retriever
 
-    def __init__(self, ap: app.Application, knowledge_base_entity: persistence_rag.KnowledgeBase):
+    rerank_mgr: RerankManager | None
+
+    def __init__(
+        self,
+        ap: app.Application,
+        knowledge_base_entity: persistence_rag.KnowledgeBase,
+        chunk_cache: ChunkTextCache | None = None,
+        rerank_mgr: RerankManager | None = None,
+    ):
         self.ap = ap
         self.knowledge_base_entity = knowledge_base_entity
+        self.rerank_mgr = rerank_mgr
         self.parser = parser.FileParser(ap=self.ap)
-        self.chunker = chunker.Chunker(ap=self.ap)
+        self.chunker = chunker.Chunker(
+            ap=self.ap,
+            chunk_size=knowledge_base_entity.chunk_size or chunker.DEFAULT_CHUNK_SIZE,
+            chunk_overlap=knowledge_base_entity.chunk_overlap
+            if knowledge_base_entity.chunk_overlap is not None
+            else chunker.DEFAULT_CHUNK_OVERLAP,
+        )
         self.embedder = Embedder(ap=self.ap)
-        self.retriever = Retriever(ap=self.ap)
+        self.retriever = Retriever(ap=self.ap, chunk_cache=chunk_cache)
         # 传递kb_id给retriever
         self.retriever.kb_id = knowledge_base_entity.uuid
 
@@ -48,17 +65,12 @@ class RuntimeKnowledgeBase:
                 .values(status='processing')
             )
 
-            task_context.set_current_action('Parsing file')
-            # parse file
-            text = await self.parser.parse(file.file_name, file.extension)
-            if not text:
-                raise Exception(f'No text extracted from file {file.file_name}')
-
-            task_context.set_current_action('Chunking file')
-            # chunk file
-            chunks_texts = await self.chunker.chunk(text)
+            task_context.set_current_action('Parsing and chunking file')
+            # parse file into sections and chunk them one after the other
+            sections = await self.parser.parse_sections(file.file_name, file.extension)
+            chunks_texts = await self.chunker.chunk_sections(sections)
             if not chunks_texts:
-                raise Exception(f'No chunks extracted from file {file.file_name}')
+                raise Exception(f'No text extracted from file {file.file_name}')
 
             task_context.set_current_action('Embedding chunks')
 
@@ -191,7 +203,14 @@ class RuntimeKnowledgeBase:
         embedding_model = await self.ap.model_mgr.get_embedding_model_by_uuid(
             self.knowledge_base_entity.embedding_model_uuid
         )
-        return await self.retriever.retrieve(self.knowledge_base_entity.uuid, query, embedding_model, top_k)
+        if self.rerank_mgr is None or not self.rerank_mgr.enabled:
+            return await self.retriever.retrieve(self.knowledge_base_entity.uuid, query, embedding_model, top_k)
+
+        # over-fetch candidates and let the reranker pick the best top_k
+        candidates = await self.retriever.retrieve(
+            self.knowledge_base_entity.uuid, query, embedding_model, self.rerank_mgr.fetch_count(top_k)
+        )
+        return await self.rerank_mgr.rerank(query, candidates, top_k)
 
     async def delete_file(self, file_id: str):
         # delete vector
@@ -215,11 +234,24 @@ class RAGManager:
 
     knowledge_bases: list[RuntimeKnowledgeBase]
 
+    parser_pool: parser.ParserPool
+    """Process pool shared by the file parsers of all knowledge bases"""
+
+    chunk_cache: ChunkTextCache
+    """Chunk texts shared by the retrievers of all knowledge bases"""
+
+    rerank_mgr: RerankManager
+    """Optional rerank step shared by all knowledge bases"""
+
     def __init__(self, ap: app.Application):
         self.ap = ap
         self.knowledge_bases = []
+        self.parser_pool = parser.ParserPool.from_config(ap.instance_config.data)
+        self.chunk_cache = ChunkTextCache(ap.instance_config.data.get('rag', {}).get('chunk_cache_size', 4096))
+        self.rerank_mgr = RerankManager(ap)
 
     async def initialize(self):
+        await self.rerank_mgr.initialize()
         await self.load_knowledge_bases_from_db()
 
     async def load_knowledge_bases_from_db(self):
@@ -231,7 +263,7 @@ class RAGManager:
 
         knowledge_bases = result.all()
 
-        for knowledge_base in knowledge_bases:
+        async def load_knowledge_base(knowledge_base: sqlalchemy.Row[persistence_rag.KnowledgeBase]):
             try:
                 await self.load_knowledge_base(knowledge_base)
             except Exception as e:
@@ -239,6 +271,8 @@ class RAGManager:
                     f'Error loading knowledge base {knowledge_base.uuid}: {e}\n{traceback.format_exc()}'
                 )
 
+        await asyncio.gather(*[load_knowledge_base(knowledge_base) for knowledge_base in knowledge_bases])
+
     async def load_knowledge_base(
         self,
         knowledge_base_entity: persistence_rag.KnowledgeBase | sqlalchemy.Row | dict,
@@ -248,7 +282,12 @@ class RAGManager:
         elif isinstance(knowledge_base_entity, dict):
             knowledge_base_entity = persistence_rag.KnowledgeBase(**knowledge_base_entity)
 
-        runtime_knowledge_base = RuntimeKnowledgeBase(ap=self.ap, knowledge_base_entity=knowledge_base_entity)
+        runtime_knowledge_base = RuntimeKnowledgeBase(
+            ap=self.ap,
+            knowledge_base_entity=knowledge_base_entity,
+            chunk_cache=self.chunk_cache,
+            rerank_mgr=self.rerank_mgr,
+        )
 
         await runtime_knowledge_base.initialize()
 
@@ -268,6 +307,9 @@ class RAGManager:
                 self.knowledge_bases.remove(kb)
                 return
 
+    def dispose(self):
+        self.parser_pool.shutdown()
+
     async def delete_knowledge_base(self, kb_uuid: str):
         for kb in self.knowledge_bases:
             if kb.knowledge_base_entity.uuid == kb_uuid:
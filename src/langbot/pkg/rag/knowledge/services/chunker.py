@@ -1,26 +1,304 @@
 from __future__ import annotations
 
+import abc
 import json
+import logging
+import math
+import re
+import time
+import typing
 from typing import List
 from langbot.pkg.rag.knowledge.services import base_service
 from langbot.pkg.core import app
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+
+DEFAULT_CHUNK_SIZE = 256
+"""Default chunk size, in tokens"""
+
+DEFAULT_CHUNK_OVERLAP = 32
+"""Default chunk overlap, in tokens"""
+
+DEFAULT_ENCODING = 'cl100k_base'
+
+TOKENIZER_RETRY_INTERVAL = 600
+"""Seconds before an encoding that failed to load is tried again, the approximate tokenizer is used meanwhile"""
+
+HEADING_PATTERN = re.compile(r'^#{1,6}\s')
+
+CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]')
+
+
+class Tokenizer(abc.ABC):
+    """Token counting and token-window splitting used by the chunker"""
+
+    @abc.abstractmethod
+    def count_batch(self, texts: list[str]) -> list[int]:
+        pass
+
+    @abc.abstractmethod
+    def split(self, text: str, size: int, overlap: int) -> list[str]:
+        """Split one text into windows of at most `size` tokens, `overlap` tokens apart"""
+        pass
+
+
+class TiktokenTokenizer(Tokenizer):
+    def __init__(self, encoding):
+        self.encoding = encoding
+
+    def count_batch(self, texts: list[str]) -> list[int]:
+        return [len(tokens) for tokens in self.encoding.encode_ordinary_batch(texts)]
+
+    def split(self, text: str, size: int, overlap: int) -> list[str]:
+        tokens = self.encoding.encode_ordinary(text)
+        # a character of several UTF-8 bytes may span tokens, so windows are cut at the characters the
+        # tokens start in instead of decoding partial byte sequences
+        text, offsets = self.encoding.decode_with_offsets(tokens)
+        offsets.append(len(text))
+        step = max(size - overlap, 1)
+        windows = (
+            text[offsets[i] : offsets[min(i + size, len(tokens))]]
+            for i in range(0, max(len(tokens) - overlap, 1), step)
+        )
+        return [window for window in windows if window]
+
+
+class ApproximateTokenizer(Tokenizer):
+    """Fallback used when the tiktoken encoding files cannot be loaded (e.g. offline deployments).
+    Counts one token per CJK character and one token per four other characters."""
+
+    def _count(self, text: str) -> int:
+        cjk = len(CJK_PATTERN.findall(text))
+        return cjk + math.ceil((len(text) - cjk) / 4)
+
+    def count_batch(self, texts: list[str]) -> list[int]:
+        return [self._count(text) for text in texts]
+
+    def split(self, text: str, size: int, overlap: int) -> list[str]:
+        chars_per_token = len(text) / max(self._count(text), 1)
+        window = max(int(size * chars_per_token), 1)
+        step = max(int((size - overlap) * chars_per_token), 1)
+        return [text[i : i + window] for i in range(0, max(len(text) - int(overlap * chars_per_token), 1), step)]
+
+
+_tokenizers: dict[str, Tokenizer] = {}
+"""Loaded tiktoken tokenizers by encoding name"""
+
+_failed_at: dict[str, float] = {}
+"""Monotonic time of the last failure to load an encoding, by encoding name"""
+
+
+def get_tokenizer(encoding_name: str = DEFAULT_ENCODING) -> Tokenizer:
+    tokenizer = _tokenizers.get(encoding_name)
+    if tokenizer is not None:
+        return tokenizer
+
+    failed_at = _failed_at.get(encoding_name)
+    if failed_at is not None and time.monotonic() - failed_at < TOKENIZER_RETRY_INTERVAL:
+        return ApproximateTokenizer()
+
+    try:
+        import tiktoken
+
+        tokenizer = TiktokenTokenizer(tiktoken.get_encoding(encoding_name))
+    except Exception as e:
+        _failed_at[encoding_name] = time.monotonic()
+        logging.getLogger('langbot').warning(
+            f'Failed to load tiktoken encoding {encoding_name}, falling back to approximate token counting '
+            f'for {TOKENIZER_RETRY_INTERVAL}s: {e}'
+        )
+        return ApproximateTokenizer()
+
+    _failed_at.pop(encoding_name, None)
+    _tokenizers[encoding_name] = tokenizer
+    return tokenizer
+
+
+def iter_blocks(text: str) -> typing.Iterator[tuple[str, str]]:
+    """
+    Split text produced by `FileParser` into structural blocks in one pass.
+    Yields (kind, text) where kind is one of 'heading', 'code', 'table' or 'text'.
+    Code fences and tables are always kept together as one block.
+    """
+    buffer: list[str] = []
+    kind = 'text'
+
+    def flush():
+        nonlocal kind
+        block = '\n'.join(buffer).strip('\n')
+        buffer.clear()
+        block_kind, kind = kind, 'text'
+        if block.strip():
+            return block_kind, block
+        return None
+
+    for line in text.split('\n'):
+        if kind == 'code':
+            buffer.append(line)
+            if line.lstrip().startswith('```'):
+                item = flush()
+                if item:
+                    yield item
+            continue
+
+        if line.lstrip().startswith('```'):
+            item = flush()
+            if item:
+                yield item
+            kind = 'code'
+            buffer.append(line)
+        elif HEADING_PATTERN.match(line):
+            item = flush()
+            if item:
+                yield item
+            yield 'heading', line.strip()
+        elif ' | ' in line or line.lstrip().startswith('|'):
+            if kind != 'table':
+                item = flush()
+                if item:
+                    yield item
+                kind = 'table'
+            buffer.append(line)
+        elif not line.strip():
+            item = flush()
+            if item:
+                yield item
+        else:
+            if kind == 'table':
+                item = flush()
+                if item:
+                    yield item
+            buffer.append(line)
+
+    item = flush()
+    if item:
+        yield item
+
+
+class ChunkBuilder:
+    """
+    Packs structural blocks into chunks of at most `chunk_size` tokens.
+    State is kept between `feed` calls, so sections of one document can be fed one at a time.
+    A heading always starts a new chunk; a chunk never ends inside a code fence or table
+    unless that block alone exceeds the chunk size.
+    """
+
+    SEPARATOR = '\n\n'
+
+    def __init__(self, tokenizer: Tokenizer, chunk_size: int, chunk_overlap: int):
+        self.tokenizer = tokenizer
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.pending: list[tuple[str, int]] = []
+        self.pending_tokens = 0
+        self.carried = 0
+        """Number of leading pending blocks that were carried over as overlap"""
+
+    def _add(self, text: str, tokens: int):
+        if self.pending:
+            self.pending_tokens += 1  # separator
+        self.pending.append((text, tokens))
+        self.pending_tokens += tokens
+
+    def _flush(self, chunks: list[str], keep_overlap: bool = True):
+        if len(self.pending) > self.carried:
+            chunks.append(self.SEPARATOR.join(text for text, _ in self.pending))
+
+        tail: list[tuple[str, int]] = []
+        if keep_overlap and len(self.pending) > self.carried:
+            tail_tokens = 0
+            for text, tokens in reversed(self.pending[1:]):
+                if tail_tokens + tokens > self.chunk_overlap:
+                    break
+                tail.insert(0, (text, tokens))
+                tail_tokens += tokens
+
+        self.pending = []
+        self.pending_tokens = 0
+        for text, tokens in tail:
+            self._add(text, tokens)
+        self.carried = len(tail)
+
+    def _split_oversized(self, text: str) -> list[str]:
+        lines = text.split('\n')
+        pieces: list[str] = []
+        current: list[str] = []
+        current_tokens = 0
+        for line, tokens in zip(lines, self.tokenizer.count_batch(lines)):
+            if tokens > self.chunk_size:
+                if current:
+                    pieces.append('\n'.join(current))
+                    current, current_tokens = [], 0
+                pieces.extend(self.tokenizer.split(line, self.chunk_size, self.chunk_overlap))
+            elif current_tokens + tokens + 1 > self.chunk_size:
+                pieces.append('\n'.join(current))
+                current, current_tokens = [line], tokens
+            else:
+                current.append(line)
+                current_tokens += tokens + 1
+        if current:
+            pieces.append('\n'.join(current))
+        return [piece for piece in pieces if piece.strip()]
+
+    def feed(self, text: str) -> list[str]:
+        """Feed one section of text, returns the chunks completed by it"""
+        chunks: list[str] = []
+        blocks = list(iter_blocks(text))
+        if not blocks:
+            return chunks
+
+        counts = self.tokenizer.count_batch([block for _, block in blocks])
+
+        for (kind, block), tokens in zip(blocks, counts):
+            if kind == 'heading':
+                self._flush(chunks, keep_overlap=False)
+
+            if tokens > self.chunk_size:
+                self._flush(chunks, keep_overlap=False)
+                chunks.extend(self._split_oversized(block))
+            elif self.pending_tokens + tokens + 1 > self.chunk_size:
+                self._flush(chunks)
+                if self.pending_tokens + tokens + 1 > self.chunk_size:
+                    self.pending, self.pending_tokens, self.carried = [], 0, 0
+                self._add(block, tokens)
+            else:
+                self._add(block, tokens)
+
+        return chunks
+
+    def finish(self) -> list[str]:
+        chunks: list[str] = []
+        self._flush(chunks, keep_overlap=False)
+        return chunks
 
 
 class Chunker(base_service.BaseService):
     """
     A class for splitting long texts into smaller, overlapping chunks.
+    Sizes are measured in tokens and the markdown structure produced by `FileParser`
+    (headings, code fences, tables) is respected.
     """
 
-    def __init__(self, ap: app.Application, chunk_size: int = 500, chunk_overlap: int = 50):
+    def __init__(
+        self,
+        ap: app.Application,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+        encoding_name: str = DEFAULT_ENCODING,
+    ):
         self.ap = ap
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.encoding_name = encoding_name
         if self.chunk_overlap >= self.chunk_size:
             self.ap.logger.warning(
                 'Chunk overlap is greater than or equal to chunk size. This may lead to empty or malformed chunks.'
             )
 
+    async def _new_builder(self) -> ChunkBuilder:
+        # loading the encoding may download it on first use, keep that off the event loop
+        tokenizer = await self._run_sync(get_tokenizer, self.encoding_name)
+        return ChunkBuilder(tokenizer, self.chunk_size, self.chunk_overlap)
+
     def _split_text_sync(self, text: str) -> List[str]:
         """
         Synchronously splits a long text into chunks with specified overlap.
@@ -29,13 +307,8 @@ class Chunker(base_service.BaseService):
         if not text:
             return []
 
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.chunk_size,
-            chunk_overlap=self.chunk_overlap,
-            length_function=len,
-            is_separator_regex=False,
-        )
-        return text_splitter.split_text(text)
+        builder = ChunkBuilder(get_tokenizer(self.encoding_name), self.chunk_size, self.chunk_overlap)
+        return builder.feed(text) + builder.finish()
 
     async def chunk(self, text: str) -> List[str]:
         """
@@ -47,3 +320,24 @@ class Chunker(base_service.BaseService):
         self.ap.logger.info(f'Text chunked into {len(chunks)} pieces.')
         self.ap.logger.debug(f'Chunks: {json.dumps(chunks, indent=4, ensure_ascii=False)}')
         return chunks
+
+    async def chunk_sections(self, sections: list[str]) -> List[str]:
+        """
+        Chunks the sections of a document (e.g. PDF pages) one after the other.
+        Blocks that do not fill a chunk yet are carried over to the next section, so chunks
+        can still span section boundaries. The list is emptied, each section is freed once chunked.
+        """
+        builder = await self._new_builder()
+        chunks: List[str] = []
+        total_length = 0
+
+        sections.reverse()
+        while sections:
+            section = sections.pop()
+            total_length += len(section)
+            chunks.extend(await self._run_sync(builder.feed, section))
+
+        chunks.extend(builder.finish())
+
+        self.ap.logger.info(f'Text (length: {total_length}) chunked into {len(chunks)} pieces.')
+        return chunks
@@ -40,7 +40,13 @@ class Embedder(BaseService):
         )
 
         # save embeddings to vdb
-        await self.ap.vector_db_mgr.vector_db.add_embeddings(kb_id, chunk_ids, embeddings_list, chunk_dicts)
+        if self.ap.instance_config.data.get('rag', {}).get('vector_payload', 'full') == 'lean':
+            # text stays in knowledge_base_chunks only, retriever hydrates it after search
+            metadatas = [{'uuid': chunk.uuid, 'file_id': file_id} for chunk in chunk_entities]
+        else:
+            metadatas = chunk_dicts
+
+        await self.ap.vector_db_mgr.vector_db.add_embeddings(kb_id, chunk_ids, embeddings_list, metadatas)
 
         self.ap.logger.info(f'Successfully saved {len(chunk_entities)} embeddings to Knowledge Base.')
 
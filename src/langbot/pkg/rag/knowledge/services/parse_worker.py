@@ -0,0 +1,205 @@
+"""Document parsing functions executed inside the parser process pool.
+
+Everything in this module must stay importable without the application context and every
+public function must be picklable, because it is shipped to worker processes spawned by
+``ParserPool``. Each parser returns a list of sections (pages for PDF, heading-delimited blocks
+for Markdown / HTML, paragraph groups for DOCX) instead of one concatenated string, so the
+caller can feed them to the chunker one by one.
+"""
+
+from __future__ import annotations
+
+import io
+import re
+import signal
+import typing
+
+import chardet
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class ParseLimitExceeded(Exception):
+    """Raised in a worker when a single file exceeds its CPU time budget"""
+
+
+# paragraphs of a DOCX file are grouped into sections of roughly this many characters
+DOCX_SECTION_SIZE = 4000
+
+
+def _on_cpu_limit(signum, frame):
+    raise ParseLimitExceeded('CPU time limit exceeded while parsing file')
+
+
+def worker_initializer():
+    """Process pool initializer, installs the SIGXCPU handler used by the per-file CPU limit"""
+    if resource is not None and hasattr(signal, 'SIGXCPU'):
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+
+
+def run_limited(func: typing.Callable[[bytes], list[str]], data: bytes, max_cpu_seconds: int) -> list[str]:
+    """Run a parser with a CPU time budget for this file only.
+
+    RLIMIT_CPU counts the whole process lifetime, so the soft limit is set relative to the
+    CPU time already consumed by this worker and restored after the file is done.
+    """
+    if resource is None or max_cpu_seconds <= 0:
+        return func(data)
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = int(usage.ru_utime + usage.ru_stime)
+    new_soft = used + max_cpu_seconds
+    if hard != resource.RLIM_INFINITY:
+        new_soft = min(new_soft, hard)
+
+    resource.setrlimit(resource.RLIMIT_CPU, (new_soft, hard))
+    try:
+        return func(data)
+    finally:
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def decode_text(data: bytes) -> str:
+    detected = chardet.detect(data)
+    encoding = detected['encoding'] or 'utf-8'
+    return data.decode(encoding, errors='ignore')
+
+
+def parse_txt(data: bytes) -> list[str]:
+    text = decode_text(data)
+    return [text] if text else []
+
+
+def parse_pdf(data: bytes) -> list[str]:
+    import PyPDF2
+
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(data))
+    pages = []
+    for page in pdf_reader.pages:
+        text = page.extract_text()
+        if text:
+            pages.append(text)
+    return pages
+
+
+def parse_docx(data: bytes) -> list[str]:
+    from docx import Document
+
+    doc = Document(io.BytesIO(data))
+    sections = []
+    current: list[str] = []
+    current_size = 0
+    for paragraph in doc.paragraphs:
+        if not paragraph.text.strip():
+            continue
+        current.append(paragraph.text)
+        current_size += len(paragraph.text) + 1
+        if current_size >= DOCX_SECTION_SIZE:
+            sections.append('\n'.join(current))
+            current = []
+            current_size = 0
+    if current:
+        sections.append('\n'.join(current))
+    return sections
+
+
+def extract_table_to_markdown(table_element) -> str:
+    """Convert a BeautifulSoup table element into a Markdown table string"""
+    headers = [th.get_text().strip() for th in table_element.find_all('th')]
+    rows = []
+    for tr in table_element.find_all('tr'):
+        cells = [td.get_text().strip() for td in tr.find_all('td')]
+        if cells:
+            rows.append(cells)
+
+    if not headers and not rows:
+        return ''
+
+    table_lines = []
+    if headers:
+        table_lines.append(' | '.join(headers))
+        table_lines.append(' | '.join(['---'] * len(headers)))
+
+    for row_cells in rows:
+        padded_cells = row_cells + [''] * (len(headers) - len(row_cells)) if headers else row_cells
+        table_lines.append(' | '.join(padded_cells))
+
+    return '\n'.join(table_lines)
+
+
+def _html_elements_to_sections(elements: typing.Iterable, keep_code: bool) -> list[str]:
+    """Convert top-level HTML elements to text, starting a new section at every heading"""
+    sections: list[str] = []
+    text_parts: list[str] = []
+
+    def flush():
+        if text_parts:
+            section = re.sub(r'\n\s*\n', '\n\n', '\n'.join(text_parts)).strip()
+            if section:
+                sections.append(section)
+            text_parts.clear()
+
+    for element in elements:
+        if element.name in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
+            flush()
+            level = int(element.name[1])
+            text_parts.append('#' * level + ' ' + element.get_text().strip())
+        elif element.name == 'p':
+            text = element.get_text().strip()
+            if text:
+                text_parts.append(text)
+        elif element.name in ['ul', 'ol']:
+            for li in element.find_all('li'):
+                text = li.get_text().strip()
+                if text:
+                    text_parts.append(f'* {text}')
+        elif keep_code and (element.name == 'pre' or (element.name == 'div' and element.find('pre') is not None)):
+            # the codehilite extension wraps fenced code in <div class="codehilite"><pre>
+            code_block = element.get_text().strip()
+            if code_block:
+                text_parts.append(f'```\n{code_block}\n```')
+        elif element.name == 'table':
+            table_str = extract_table_to_markdown(element)
+            if table_str:
+                text_parts.append(table_str)
+        elif element.name:
+            text = element.get_text(separator=' ', strip=True)
+            if text:
+                text_parts.append(text)
+
+    flush()
+    return sections
+
+
+def parse_md(data: bytes) -> list[str]:
+    import markdown
+    from bs4 import BeautifulSoup
+
+    md_content = data.decode('utf-8', errors='ignore')
+    html_content = markdown.markdown(md_content, extensions=['extra', 'codehilite', 'tables', 'toc', 'fenced_code'])
+    soup = BeautifulSoup(html_content, 'html.parser')
+    return _html_elements_to_sections(soup.children, keep_code=True)
+
+
+def parse_html(data: bytes) -> list[str]:
+    from bs4 import BeautifulSoup
+
+    html_content = data.decode('utf-8', errors='ignore')
+    soup = BeautifulSoup(html_content, 'html.parser')
+    for script_or_style in soup(['script', 'style']):
+        script_or_style.decompose()
+    return _html_elements_to_sections(soup.body.children if soup.body else soup.children, keep_code=False)
+
+
+parsers: dict[str, typing.Callable[[bytes], list[str]]] = {
+    'txt': parse_txt,
+    'pdf': parse_pdf,
+    'docx': parse_docx,
+    'md': parse_md,
+    'html': parse_html,
+}
+"""Parsers by lower-case file extension"""
@@ -1,23 +1,118 @@
 from __future__ import annotations
 
-import PyPDF2
-import io
-from docx import Document
-import chardet
+import asyncio  # Import asyncio for async operations
+import concurrent.futures
+import multiprocessing
+from concurrent.futures.process import BrokenProcessPool
 from typing import Union, Callable, Any
-import markdown
+
 from bs4 import BeautifulSoup
-import re
-import asyncio  # Import asyncio for async operations
+
 from langbot.pkg.core import app
+from . import parse_worker
+
+
+class ParserPool:
+    """
+    A bounded pool of processes that runs the CPU-bound document parsers of `parse_worker`.
+    Pure-Python parsers hold the GIL, so running them in threads still stalls the event loop;
+    running them in separate processes does not. Each file is parsed under a CPU time limit
+    (enforced inside the worker) and a wall-clock timeout (enforced here).
+    Every worker is a single-process executor of its own, so a parse that times out only costs
+    its own process, the parses running in the other workers go on.
+    With `workers` set to 0 the parsers fall back to the default thread pool.
+    """
+
+    workers: int
+
+    max_cpu_seconds: int
+
+    timeout: float
+
+    _idle: asyncio.Queue[concurrent.futures.ProcessPoolExecutor | None] | None
+    """Workers free to take a file, None for a slot whose process is not started yet"""
+
+    _executors: set[concurrent.futures.ProcessPoolExecutor]
+
+    def __init__(self, workers: int = 2, max_cpu_seconds: int = 60, timeout: float = 120):
+        self.workers = workers
+        self.max_cpu_seconds = max_cpu_seconds
+        self.timeout = timeout
+        self._idle = None
+        self._executors = set()
+
+    @classmethod
+    def from_config(cls, instance_config: dict) -> ParserPool:
+        parser_cfg = instance_config.get('rag', {}).get('parser', {})
+        return cls(
+            workers=int(parser_cfg.get('workers', 2)),
+            max_cpu_seconds=int(parser_cfg.get('max_cpu_seconds', 60)),
+            timeout=float(parser_cfg.get('timeout', 120)),
+        )
+
+    def _new_executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        # spawn instead of fork: the main process runs an event loop and several threads
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=parse_worker.worker_initializer,
+        )
+        self._executors.add(executor)
+        return executor
+
+    def _kill(self, executor: concurrent.futures.ProcessPoolExecutor):
+        """Stop a worker, also if it is stuck in a file"""
+        self._executors.discard(executor)
+        # ProcessPoolExecutor has no public way to stop a worker that is stuck in a task
+        for process in list((getattr(executor, '_processes', None) or {}).values()):
+            process.kill()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, extension: str, data: bytes) -> list[str]:
+        """Parse `data` with the parser registered for `extension`, returning its sections."""
+        func = parse_worker.parsers[extension]
+
+        if self.workers <= 0:
+            return await asyncio.wait_for(asyncio.to_thread(func, data), timeout=self.timeout)
+
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for _ in range(self.workers):
+                self._idle.put_nowait(None)
+
+        executor = await self._idle.get()
+        if executor is None:
+            executor = self._new_executor()
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(executor, parse_worker.run_limited, func, data, self.max_cpu_seconds)
+            result = await asyncio.wait_for(future, timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self._kill(executor)
+            executor = None
+            raise TimeoutError(f'Parsing {extension} file timed out after {self.timeout}s')
+        except (BrokenProcessPool, asyncio.CancelledError):
+            # a cancelled caller leaves the worker busy with its file, the next caller would wait behind it
+            self._kill(executor)
+            executor = None
+            raise
+        finally:
+            self._idle.put_nowait(executor)
+        return result
+
+    def shutdown(self):
+        for executor in list(self._executors):
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._executors.clear()
+        self._idle = None
 
 
 class FileParser:
     """
     A robust file parser class to extract text content from various document formats.
-    It supports TXT, PDF, DOCX, XLSX, CSV, Markdown, HTML, and EPUB files.
-    All core file reading operations are designed to be run synchronously in a thread pool
-    to avoid blocking the asyncio event loop.
+    It supports TXT, PDF, DOCX, Markdown and HTML files.
+    The CPU-bound parsing itself runs in the application's `ParserPool` worker processes,
+    so large uploads do not block the asyncio event loop.
     """
 
     def __init__(self, ap: app.Application):
@@ -37,7 +132,6 @@ class FileParser:
     async def parse(self, file_name: str, extension: str) -> Union[str, None]:
         """
         Parses the file based on its extension and returns the extracted text content.
-        This is the main asynchronous entry point for parsing.
 
         Args:
             file_name (str): The name of the file to be parsed, get from ap.storage_mgr
@@ -45,96 +139,56 @@ class FileParser:
         Returns:
             Union[str, None]: The extracted text content as a single string, or None if parsing fails.
         """
+        sections = await self.parse_sections(file_name, extension)
+        return '\n'.join(sections) if sections else None
+
+    async def parse_sections(self, file_name: str, extension: str) -> list[str]:
+        """
+        Parses the file based on its extension and returns its sections (pages, heading blocks, ...),
+        so the chunker can respect their boundaries. An empty list if parsing fails.
+        This is the main asynchronous entry point for parsing.
+
+        Args:
+            file_name (str): The name of the file to be parsed, get from ap.storage_mgr
+        """
 
         file_extension = extension.lower()
         parser_method = getattr(self, f'_parse_{file_extension}', None)
 
         if parser_method is None:
             self.ap.logger.error(f'Unsupported file format: {file_extension} for file {file_name}')
-            return None
+            return []
 
         try:
             # Pass file_path to the specific parser methods
             return await parser_method(file_name)
         except Exception as e:
             self.ap.logger.error(f'Failed to parse {file_extension} file {file_name}: {e}')
-            return None
-
-    # --- Helper for reading files with encoding detection ---
-    async def _read_file_content(self, file_name: str) -> Union[str, bytes]:
-        """
-        Reads a file with automatic encoding detection, ensuring the synchronous
-        file read operation runs in a separate thread.
-        """
+            return []
 
-        # def _read_sync():
-        #     with open(file_path, 'rb') as file:
-        #         raw_data = file.read()
-        #         detected = chardet.detect(raw_data)
-        #         encoding = detected['encoding'] or 'utf-8'
-
-        #     if mode == 'r':
-        #         return raw_data.decode(encoding, errors='ignore')
-        #     return raw_data  # For binary mode
+    # --- Specific Parser Methods ---
 
-        # return await self._run_sync(_read_sync)
+    async def _run_parser(self, file_name: str, extension: str) -> list[str]:
+        """Loads the file from storage and parses it into sections in the parser process pool."""
         file_bytes = await self.ap.storage_mgr.storage_provider.load(file_name)
+        return await self.ap.rag_mgr.parser_pool.run(extension, file_bytes)
 
-        detected = chardet.detect(file_bytes)
-        encoding = detected['encoding'] or 'utf-8'
-
-        return file_bytes.decode(encoding, errors='ignore')
-
-    # --- Specific Parser Methods ---
-
-    async def _parse_txt(self, file_name: str) -> str:
+    async def _parse_txt(self, file_name: str) -> list[str]:
         """Parses a TXT file and returns its content."""
         self.ap.logger.info(f'Parsing TXT file: {file_name}')
-        return await self._read_file_content(file_name)
+        return await self._run_parser(file_name, 'txt')
 
-    async def _parse_pdf(self, file_name: str) -> str:
-        """Parses a PDF file and returns its text content."""
+    async def _parse_pdf(self, file_name: str) -> list[str]:
+        """Parses a PDF file and returns the text of each page."""
         self.ap.logger.info(f'Parsing PDF file: {file_name}')
+        return await self._run_parser(file_name, 'pdf')
 
-        # def _parse_pdf_sync():
-        #     text_content = []
-        #     with open(file_name, 'rb') as file:
-        #         pdf_reader = PyPDF2.PdfReader(file)
-        #         for page in pdf_reader.pages:
-        #             text = page.extract_text()
-        #             if text:
-        #                 text_content.append(text)
-        #     return '\n'.join(text_content)
-
-        # return await self._run_sync(_parse_pdf_sync)
-
-        pdf_bytes = await self.ap.storage_mgr.storage_provider.load(file_name)
-
-        def _parse_pdf_sync():
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
-            text_content = []
-            for page in pdf_reader.pages:
-                text = page.extract_text()
-                if text:
-                    text_content.append(text)
-            return '\n'.join(text_content)
-
-        return await self._run_sync(_parse_pdf_sync)
-
-    async def _parse_docx(self, file_name: str) -> str:
-        """Parses a DOCX file and returns its text content."""
+    async def _parse_docx(self, file_name: str) -> list[str]:
+        """Parses a DOCX file and returns its text content in paragraph groups."""
         self.ap.logger.info(f'Parsing DOCX file: {file_name}')
+        return await self._run_parser(file_name, 'docx')
 
-        docx_bytes = await self.ap.storage_mgr.storage_provider.load(file_name)
-
-        def _parse_docx_sync():
-            doc = Document(io.BytesIO(docx_bytes))
-            text_content = [paragraph.text for paragraph in doc.paragraphs if paragraph.text.strip()]
-            return '\n'.join(text_content)
-
-        return await self._run_sync(_parse_docx_sync)
-
-    async def _parse_doc(self, file_name: str) -> str:
+    async def _parse_doc(self, file_name: str) -> list[str]:
         """Handles .doc files, explicitly stating lack of direct support."""
         self.ap.logger.warning(f'Direct .doc parsing is not supported for {file_name}. Please convert to .docx first.')
         raise NotImplementedError('Direct .doc parsing not supported. Please convert to .docx first.')
@@ -177,84 +231,15 @@ class FileParser:
 
     #     return await self._run_sync(_parse_csv_sync)
 
-    async def _parse_md(self, file_name: str) -> str:
-        """Parses a Markdown file, converting it to structured plain text."""
+    async def _parse_md(self, file_name: str) -> list[str]:
+        """Parses a Markdown file, converting it to structured plain text split at headings."""
         self.ap.logger.info(f'Parsing Markdown file: {file_name}')
+        return await self._run_parser(file_name, 'md')
 
-        md_bytes = await self.ap.storage_mgr.storage_provider.load(file_name)
-
-        def _parse_markdown_sync():
-            md_content = io.BytesIO(md_bytes).read().decode('utf-8', errors='ignore')
-            html_content = markdown.markdown(
-                md_content, extensions=['extra', 'codehilite', 'tables', 'toc', 'fenced_code']
-            )
-            soup = BeautifulSoup(html_content, 'html.parser')
-            text_parts = []
-            for element in soup.children:
-                if element.name in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-                    level = int(element.name[1])
-                    text_parts.append('#' * level + ' ' + element.get_text().strip())
-                elif element.name == 'p':
-                    text = element.get_text().strip()
-                    if text:
-                        text_parts.append(text)
-                elif element.name in ['ul', 'ol']:
-                    for li in element.find_all('li'):
-                        text_parts.append(f'* {li.get_text().strip()}')
-                elif element.name == 'pre':
-                    code_block = element.get_text().strip()
-                    if code_block:
-                        text_parts.append(f'```\n{code_block}\n```')
-                elif element.name == 'table':
-                    table_str = self._extract_table_to_markdown_sync(element)  # Call sync helper
-                    if table_str:
-                        text_parts.append(table_str)
-                elif element.name:
-                    text = element.get_text(separator=' ', strip=True)
-                    if text:
-                        text_parts.append(text)
-            cleaned_text = re.sub(r'\n\s*\n', '\n\n', '\n'.join(text_parts))
-            return cleaned_text.strip()
-
-        return await self._run_sync(_parse_markdown_sync)
-
-    async def _parse_html(self, file_name: str) -> str:
-        """Parses an HTML file, extracting structured plain text."""
+    async def _parse_html(self, file_name: str) -> list[str]:
+        """Parses an HTML file, extracting structured plain text split at headings."""
         self.ap.logger.info(f'Parsing HTML file: {file_name}')
-
-        html_bytes = await self.ap.storage_mgr.storage_provider.load(file_name)
-
-        def _parse_html_sync():
-            html_content = io.BytesIO(html_bytes).read().decode('utf-8', errors='ignore')
-            soup = BeautifulSoup(html_content, 'html.parser')
-            for script_or_style in soup(['script', 'style']):
-                script_or_style.decompose()
-            text_parts = []
-            for element in soup.body.children if soup.body else soup.children:
-                if element.name in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-                    level = int(element.name[1])
-                    text_parts.append('#' * level + ' ' + element.get_text().strip())
-                elif element.name == 'p':
-                    text = element.get_text().strip()
-                    if text:
-                        text_parts.append(text)
-                elif element.name in ['ul', 'ol']:
-                    for li in element.find_all('li'):
-                        text = li.get_text().strip()
-                        if text:
-                            text_parts.append(f'* {text}')
-                elif element.name == 'table':
-                    table_str = self._extract_table_to_markdown_sync(element)  # Call sync helper
-                    if table_str:
-                        text_parts.append(table_str)
-                elif element.name:
-                    text = element.get_text(separator=' ', strip=True)
-                    if text:
-                        text_parts.append(text)
-            cleaned_text = re.sub(r'\n\s*\n', '\n\n', '\n'.join(text_parts))
-            return cleaned_text.strip()
-
-        return await self._run_sync(_parse_html_sync)
+        return await self._run_parser(file_name, 'html')
 
     def _add_toc_items_sync(self, toc_list: list, text_content: list, level: int):
         """Recursively adds TOC items to text_content (synchronous helper)."""
@@ -269,23 +254,4 @@ class FileParser:
 
     def _extract_table_to_markdown_sync(self, table_element: BeautifulSoup) -> str:
         """Helper to convert a BeautifulSoup table element into a Markdown table string (synchronous)."""
-        headers = [th.get_text().strip() for th in table_element.find_all('th')]
-        rows = []
-        for tr in table_element.find_all('tr'):
-            cells = [td.get_text().strip() for td in tr.find_all('td')]
-            if cells:
-                rows.append(cells)
-
-        if not headers and not rows:
-            return ''
-
-        table_lines = []
-        if headers:
-            table_lines.append(' | '.join(headers))
-            table_lines.append(' | '.join(['---'] * len(headers)))
-
-        for row_cells in rows:
-            padded_cells = row_cells + [''] * (len(headers) - len(row_cells)) if headers else row_cells
-            table_lines.append(' | '.join(padded_cells))
-
-        return '\n'.join(table_lines)
+        return parse_worker.extract_table_to_markdown(table_element)
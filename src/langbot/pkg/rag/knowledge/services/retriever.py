@@ -1,15 +1,74 @@
 from __future__ import annotations
 
+import collections
+import time
+
+import sqlalchemy
+
 from . import base_service
 from ....core import app
 from ....provider.modelmgr.requester import RuntimeEmbeddingModel
 from ....entity.rag import retriever as retriever_entities
+from ....entity.persistence import rag as persistence_rag
+
+
+class ChunkTextCache:
+    """LRU cache of chunk texts by chunk uuid, used to hydrate lean vector search results"""
+
+    capacity: int
+
+    _items: collections.OrderedDict[str, str]
+
+    def __init__(self, capacity: int = 4096):
+        self.capacity = capacity
+        self._items = collections.OrderedDict()
+
+    def get(self, chunk_id: str) -> str | None:
+        text = self._items.get(chunk_id)
+        if text is not None:
+            self._items.move_to_end(chunk_id)
+        return text
+
+    def put(self, chunk_id: str, text: str):
+        self._items[chunk_id] = text
+        self._items.move_to_end(chunk_id)
+        while len(self._items) > self.capacity:
+            self._items.popitem(last=False)
 
 
 class Retriever(base_service.BaseService):
-    def __init__(self, ap: app.Application):
+    def __init__(self, ap: app.Application, chunk_cache: ChunkTextCache | None = None):
         super().__init__()
         self.ap = ap
+        self.chunk_cache = chunk_cache if chunk_cache is not None else ChunkTextCache()
+
+    async def _hydrate(self, entries: list[retriever_entities.RetrieveResultEntry]):
+        """Fill in `text` for results whose vector payload does not carry it (lean layout),
+        from the chunk cache or with a single batched query for the misses."""
+        missing: dict[str, list[retriever_entities.RetrieveResultEntry]] = {}
+
+        for entry in entries:
+            if 'text' in entry.metadata:
+                continue
+            text = self.chunk_cache.get(entry.id)
+            if text is not None:
+                entry.metadata['text'] = text
+            else:
+                missing.setdefault(entry.id, []).append(entry)
+
+        if not missing:
+            return
+
+        result = await self.ap.persistence_mgr.execute_async(
+            sqlalchemy.select(persistence_rag.Chunk.uuid, persistence_rag.Chunk.text).where(
+                persistence_rag.Chunk.uuid.in_(list(missing.keys()))
+            )
+        )
+
+        for chunk_uuid, text in result.all():
+            self.chunk_cache.put(chunk_uuid, text)
+            for entry in missing[chunk_uuid]:
+                entry.metadata['text'] = text
 
     async def retrieve(
         self, kb_id: str, query: str, embedding_model: RuntimeEmbeddingModel, k: int = 5
@@ -24,8 +83,15 @@ class Retriever(base_service.BaseService):
             extra_args={},  # TODO: add extra args
         )
 
+        timed = self.ap.metrics_mgr.should_sample()
+        if timed:
+            started_at = time.perf_counter()
+
         vector_results = await self.ap.vector_db_mgr.vector_db.search(kb_id, query_embedding[0], k)
 
+        if timed:
+            self.ap.metrics_mgr.vector_search_duration.observe(time.perf_counter() - started_at, kb_id)
+
         # 'ids' shape mirrors the Chroma-style response contract for compatibility
         matched_vector_ids = vector_results.get('ids', [[]])[0]
         distances = vector_results.get('distances', [[]])[0]
@@ -40,9 +106,11 @@ class Retriever(base_service.BaseService):
         for i, id in enumerate(matched_vector_ids):
             entry = retriever_entities.RetrieveResultEntry(
                 id=id,
-                metadata=vector_metadatas[i],
+                metadata=dict(vector_metadatas[i] or {}),
                 distance=distances[i],
             )
             result.append(entry)
 
+        await self._hydrate(result)
+
         return result
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import abc
+import typing
+
+from ...core import app
+
+
+class Reranker(metaclass=abc.ABCMeta):
+    """Scores retrieved chunks against the query, used to cut over-fetched candidates down to top_k"""
+
+    name: str = None
+
+    ap: app.Application
+
+    default_config: dict[str, typing.Any] = {}
+
+    reranker_cfg: dict[str, typing.Any] = {}
+
+    def __init__(self, ap: app.Application, config: dict[str, typing.Any]):
+        self.ap = ap
+        self.reranker_cfg = {**self.default_config}
+        self.reranker_cfg.update(config)
+
+    async def initialize(self):
+        pass
+
+    @abc.abstractmethod
+    async def score(self, query: str, texts: list[str]) -> list[float]:
+        """Score one batch of texts
+
+        Args:
+            query (str): user query
+            texts (list[str]): chunk texts, at most `rag.rerank.batch_size` of them
+
+        Returns:
+            list[float]: relevance scores, higher is more relevant, in the order of `texts`
+        """
+        pass
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import asyncio
+import typing
+
+from .. import reranker
+
+
+class CrossEncoderReranker(reranker.Reranker):
+    """Local cross-encoder reranker, requires the optional `sentence-transformers` package"""
+
+    default_config: dict[str, typing.Any] = {
+        'model': 'BAAI/bge-reranker-base',
+        'device': '',
+    }
+
+    async def initialize(self):
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError as e:
+            raise ImportError(
+                'The cross-encoder reranker requires sentence-transformers, install it with `pip install sentence-transformers`'
+            ) from e
+
+        # loading the model reads weights from disk (or downloads them), keep it off the event loop
+        self.model = await asyncio.to_thread(
+            CrossEncoder,
+            self.reranker_cfg['model'],
+            device=self.reranker_cfg['device'] or None,
+        )
+
+    async def score(self, query: str, texts: list[str]) -> list[float]:
+        scores = await asyncio.to_thread(
+            self.model.predict,
+            [(query, text) for text in texts],
+            batch_size=len(texts),
+            show_progress_bar=False,
+        )
+        return [float(score) for score in scores]
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import json
+import re
+import typing
+
+import langbot_plugin.api.entities.builtin.provider.message as provider_message
+
+from .. import reranker
+
+
+rerank_prompt_template = """
+Rate how relevant each passage is to the query, on a scale from 0 (irrelevant) to 10 (directly answers it).
+Reply with a JSON array of {count} numbers only, one per passage, in the same order.
+
+<query>
+{query}
+</query>
+
+{passages}
+"""
+
+
+class LLMReranker(reranker.Reranker):
+    """Scores a whole batch of passages with one LLM call"""
+
+    default_config: dict[str, typing.Any] = {
+        'model_uuid': '',
+    }
+
+    async def initialize(self):
+        if not self.reranker_cfg['model_uuid']:
+            raise ValueError('rag.rerank.llm.model_uuid is not set')
+
+    async def score(self, query: str, texts: list[str]) -> list[float]:
+        model = await self.ap.model_mgr.get_model_by_uuid(self.reranker_cfg['model_uuid'])
+
+        passages = '\n\n'.join(f'<passage id="{i + 1}">\n{text}\n</passage>' for i, text in enumerate(texts))
+        prompt = rerank_prompt_template.format(count=len(texts), query=query, passages=passages)
+
+        msg = await model.requester.invoke_llm(
+            None,
+            model,
+            [provider_message.Message(role='user', content=prompt)],
+            extra_args=model.model_entity.extra_args,
+            remove_think=True,
+        )
+
+        content = msg.content
+        if isinstance(content, list):
+            content = ''.join(ce.text for ce in content if ce.type == 'text')
+
+        return self._parse_scores(content or '', len(texts))
+
+    def _parse_scores(self, content: str, count: int) -> list[float]:
+        match = re.search(r'\[.*?\]', content, re.DOTALL)
+        if not match:
+            raise ValueError(f'LLM reranker reply has no score array: {content[:100]}')
+
+        scores = [float(score) for score in json.loads(match.group(0))]
+        if len(scores) != count:
+            raise ValueError(f'LLM reranker returned {len(scores)} scores for {count} passages')
+
+        return scores
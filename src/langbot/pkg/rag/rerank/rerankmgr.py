@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import traceback
+import typing
+
+from ...core import app
+from ...discover import engine
+from ...entity.rag import retriever as retriever_entities
+from . import reranker
+
+
+class RerankScoreCache:
+    """LRU cache of rerank scores by (reranker, query, chunk uuid)"""
+
+    capacity: int
+
+    _items: collections.OrderedDict[tuple[str, str, str], float]
+
+    def __init__(self, capacity: int = 8192):
+        self.capacity = capacity
+        self._items = collections.OrderedDict()
+
+    def get(self, key: tuple[str, str, str]) -> float | None:
+        score = self._items.get(key)
+        if score is not None:
+            self._items.move_to_end(key)
+        return score
+
+    def put(self, key: tuple[str, str, str], score: float):
+        self._items[key] = score
+        self._items.move_to_end(key)
+        while len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+
+
+class RerankManager:
+    """Optional rerank step between vector search and prompt building.
+
+    When a reranker is configured in `rag.rerank.use`, knowledge bases over-fetch
+    `rag.rerank.candidates` results from the vector database and this manager cuts them
+    down to the knowledge base's top_k by reranker score.
+    """
+
+    ap: app.Application
+
+    reranker_components: list[engine.Component]
+
+    reranker_dict: typing.Mapping[str, type[reranker.Reranker]]
+
+    reranker: reranker.Reranker | None
+    """The configured reranker, None if reranking is disabled"""
+
+    candidates: int
+    """Number of results fetched from the vector database before reranking"""
+
+    batch_size: int
+    """Number of texts scored in one reranker call"""
+
+    score_cache: RerankScoreCache
+
+    def __init__(self, ap: app.Application):
+        self.ap = ap
+        self.reranker_components = []
+        self.reranker_dict = {}
+        self.reranker = None
+
+        rerank_cfg = ap.instance_config.data.get('rag', {}).get('rerank', {})
+        self.candidates = rerank_cfg.get('candidates', 20)
+        self.batch_size = max(rerank_cfg.get('batch_size', 16), 1)
+        self.score_cache = RerankScoreCache(rerank_cfg.get('cache_size', 8192))
+
+    async def initialize(self):
+        self.reranker_components = self.ap.discover.get_components_by_kind('Reranker')
+        self.reranker_dict = engine.LazyComponentClassDict(self.reranker_components)
+
+        rerank_cfg = self.ap.instance_config.data.get('rag', {}).get('rerank', {})
+        use = rerank_cfg.get('use', '')
+        if not use:
+            return
+
+        if use not in self.reranker_dict:
+            self.ap.logger.warning(f'Reranker {use} not found, reranking is disabled')
+            return
+
+        try:
+            reranker_inst = self.reranker_dict[use](ap=self.ap, config=rerank_cfg.get(use, {}) or {})
+            reranker_inst.name = use
+            await reranker_inst.initialize()
+            self.reranker = reranker_inst
+            self.ap.logger.info(f'Initialized reranker {use}, {self.candidates} candidates per retrieval.')
+        except Exception as e:
+            self.ap.logger.error(f'Failed to initialize reranker {use}, reranking is disabled: {e}')
+            self.ap.logger.debug(traceback.format_exc())
+
+    @property
+    def enabled(self) -> bool:
+        return self.reranker is not None
+
+    def fetch_count(self, top_k: int) -> int:
+        """Number of results to fetch from the vector database for a knowledge base with this top_k"""
+        if not self.enabled:
+            return top_k
+        return max(top_k, self.candidates)
+
+    async def rerank(
+        self, query: str, entries: list[retriever_entities.RetrieveResultEntry], top_k: int
+    ) -> list[retriever_entities.RetrieveResultEntry]:
+        """Order entries by reranker score and keep the best top_k.
+        The score is stored in `metadata['rerank_score']`. On reranker errors the vector
+        search order is kept."""
+        if not self.enabled or not entries:
+            return entries[:top_k]
+
+        scores: list[float | None] = [self.score_cache.get((self.reranker.name, query, entry.id)) for entry in entries]
+        missing = [i for i, score in enumerate(scores) if score is None]
+
+        batches = [missing[i : i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+
+        try:
+            batch_scores = await asyncio.gather(
+                *[self.reranker.score(query, [entries[i].metadata.get('text', '') for i in batch]) for batch in batches]
+            )
+        except Exception as e:
+            self.ap.logger.warning(f'Reranker {self.reranker.name} failed, keeping vector search order: {e}')
+            return entries[:top_k]
+
+        for batch, batch_result in zip(batches, batch_scores):
+            for i, score in zip(batch, batch_result):
+                scores[i] = score
+                self.score_cache.put((self.reranker.name, query, entries[i].id), score)
+
+        ranked = sorted(zip(entries, scores), key=lambda item: item[1], reverse=True)[:top_k]
+        for entry, score in ranked:
+            entry.metadata['rerank_score'] = score
+        return [entry for entry, _ in ranked]
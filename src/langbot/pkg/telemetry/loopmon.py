@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import sys
+import threading
+import time
+
+from ..core import app
+from ..utils import constants
+from . import metrics
+
+
+MAX_STACK_DEPTH = 32
+
+
+class SlowCallback:
+    """One stall of the event loop, attributed to the code running on the loop thread while it lasted"""
+
+    __slots__ = ('started_at', 'duration', 'samples', 'module', 'function', 'file', 'line', 'stack')
+
+    def __init__(self, started_at: float):
+        self.started_at = started_at
+        """Wall time the loop stopped responding"""
+        self.duration = 0.0
+        self.samples = 0
+        self.module = ''
+        self.function = ''
+        self.file = ''
+        self.line = 0
+        self.stack: list[str] = []
+        """Most frequently sampled stack, innermost frame last"""
+
+    @property
+    def location(self) -> str:
+        return f'{self.module}:{self.function}'
+
+    def to_dict(self) -> dict:
+        return {
+            'started_at': self.started_at,
+            'duration_ms': round(self.duration * 1000, 1),
+            'samples': self.samples,
+            'location': self.location,
+            'file': self.file,
+            'line': self.line,
+            'stack': self.stack,
+        }
+
+
+class LoopMonitor:
+    """Measure event loop lag continuously and find the callbacks that block it.
+
+    A task sleeps `interval_ms` in a loop and records how late it wakes up. With `capture_stacks`
+    (always on in debug mode), a watchdog thread also samples the loop thread's stack while the
+    loop is stalled for longer than `slow_threshold_ms`. Each stall is attributed to the innermost
+    LangBot frame of the most frequent stack, or to the innermost frame if none is ours.
+    """
+
+    ap: app.Application
+
+    enabled: bool
+
+    interval: float
+
+    slow_threshold: float
+
+    capture_stacks: bool
+
+    sample_interval: float
+    """Seconds between two stack samples taken by the watchdog thread"""
+
+    lag: metrics.HistogramFamily
+
+    current_lag: float
+
+    stall_count: int
+
+    slow_callbacks: collections.deque[SlowCallback]
+    """Most recent stalls, only recorded with `capture_stacks`"""
+
+    def __init__(self, ap: app.Application):
+        self.ap = ap
+        loop_cfg = ap.instance_config.data.get('loop_monitor', {})
+        self.enabled = loop_cfg.get('enable', True)
+        self.interval = loop_cfg.get('interval_ms', 100) / 1000
+        self.slow_threshold = loop_cfg.get('slow_threshold_ms', 100) / 1000
+        self.capture_stacks = loop_cfg.get('capture_stacks', False) or constants.debug_mode
+        self.sample_interval = loop_cfg.get('sample_interval_ms', 10) / 1000
+        self.lag = ap.metrics_mgr.histogram(
+            'langbot_event_loop_lag_seconds',
+            'How late the event loop ran a timer, measured every loop_monitor.interval_ms',
+            (),
+        )
+        self.current_lag = 0.0
+        self.stall_count = 0
+        self.slow_callbacks = collections.deque(maxlen=loop_cfg.get('max_slow_callbacks', 100))
+
+        self._heartbeat = 0.0
+        self._loop_thread_id = 0
+        self._stop = threading.Event()
+
+    async def run(self):
+        if not self.enabled:
+            return
+
+        loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = loop.time()
+
+        watchdog = None
+        if self.capture_stacks:
+            self._stop.clear()
+            watchdog = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+            watchdog.start()
+
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                now = loop.time()
+                lag = max(0.0, now - self._heartbeat - self.interval)
+                self._heartbeat = now
+
+                self.current_lag = lag
+                self.lag.observe(lag)
+                if lag >= self.slow_threshold:
+                    self.stall_count += 1
+                    if not self.capture_stacks:
+                        self.ap.logger.warning(f'Event loop was blocked for {lag * 1000:.0f}ms')
+        finally:
+            if watchdog is not None:
+                self._stop.set()
+                watchdog.join()
+
+    def _watch(self):
+        """Watchdog thread: sample the loop thread's stack while the loop is stalled"""
+        stall: SlowCallback | None = None
+        stall_heartbeat = 0.0
+        stacks: collections.Counter[tuple] = collections.Counter()
+
+        # loop.time() is time.monotonic() on every event loop we run on
+        while not self._stop.wait(self.sample_interval):
+            heartbeat = self._heartbeat
+            blocked = time.monotonic() - heartbeat - self.interval
+
+            if blocked >= self.slow_threshold and (stall is None or heartbeat == stall_heartbeat):
+                if stall is None:
+                    stall = SlowCallback(time.time() - blocked)
+                    stall_heartbeat = heartbeat
+                    stacks.clear()
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is not None:
+                    stacks[self._extract_stack(frame)] += 1
+                stall.duration = blocked
+                continue
+
+            if stall is not None:
+                self._finish(stall, stacks)
+                stall = None
+
+    @staticmethod
+    def _extract_stack(frame) -> tuple[tuple[str, str, str, int], ...]:
+        """(module, function, file, line) of each frame, innermost last"""
+        stack = []
+        while frame is not None and len(stack) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            stack.append((frame.f_globals.get('__name__', ''), code.co_name, code.co_filename, frame.f_lineno))
+            frame = frame.f_back
+        return tuple(reversed(stack))
+
+    def _finish(self, stall: SlowCallback, stacks: collections.Counter):
+        # the loop has measured the exact lag of the stall by now
+        stall.duration = max(stall.duration, self.current_lag)
+        if stacks:
+            stack, _ = stacks.most_common(1)[0]
+            owner = next((f for f in reversed(stack) if f[0].startswith('langbot')), stack[-1])
+            stall.module, stall.function, stall.file, stall.line = owner
+            stall.samples = sum(stacks.values())
+            stall.stack = [f'{module}:{function} ({file}:{line})' for module, function, file, line in stack]
+        self.slow_callbacks.append(stall)
+
+        self.ap.logger.warning(
+            f'Event loop was blocked for {stall.duration * 1000:.0f}ms in {stall.location} ({stall.file}:{stall.line})'
+        )
+
+    def to_dict(self) -> dict:
+        lag = self.lag.series.get(())
+        return {
+            'enabled': self.enabled,
+            'interval_ms': self.interval * 1000,
+            'slow_threshold_ms': self.slow_threshold * 1000,
+            'capture_stacks': self.capture_stacks,
+            'current_lag_ms': round(self.current_lag * 1000, 1),
+            'lag': lag.to_dict() if lag is not None else metrics.Histogram().to_dict(),
+            'stall_count': self.stall_count,
+            'slow_callbacks': [stall.to_dict() for stall in list(self.slow_callbacks)],
+        }
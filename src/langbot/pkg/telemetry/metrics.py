@@ -0,0 +1,358 @@
+from __future__ import annotations
+
+import random
+import typing
+
+from ..core import app
+
+
+SUB_BUCKET_BITS = 3
+"""Each power-of-two range is split into 2^SUB_BUCKET_BITS linear buckets (12.5% relative error)"""
+
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+
+PROMETHEUS_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+"""`le` boundaries in seconds used when exporting histograms to Prometheus"""
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def bucket_index(value: int) -> int:
+    """HDR-style log-linear bucket of a non-negative integer value"""
+    if value < SUB_BUCKET_COUNT:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return ((shift + 1) << SUB_BUCKET_BITS) + (value >> shift) - SUB_BUCKET_COUNT
+
+
+def bucket_upper_bound(index: int) -> int:
+    """Exclusive upper bound of a bucket, inverse of `bucket_index`"""
+    if index < SUB_BUCKET_COUNT:
+        return index + 1
+    shift = (index >> SUB_BUCKET_BITS) - 1
+    return (SUB_BUCKET_COUNT + (index & (SUB_BUCKET_COUNT - 1)) + 1) << shift
+
+
+class Histogram:
+    """Latency histogram with log-linear buckets, values are recorded in microseconds"""
+
+    counts: list[int]
+
+    count: int
+
+    sum: float
+    """Sum of observed values, in seconds"""
+
+    max: float
+    """Largest observed value, in seconds"""
+
+    def __init__(self):
+        self.counts = []
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        index = bucket_index(int(seconds * 1_000_000))
+        if index >= len(self.counts):
+            self.counts.extend([0] * (index + 1 - len(self.counts)))
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket containing the q-quantile, in seconds"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(bucket_upper_bound(index) / 1_000_000, self.max)
+        return self.max
+
+    def cumulative_counts(self, bounds: typing.Iterable[float]) -> list[int]:
+        """Number of observations in buckets that end at or below each bound (seconds)"""
+        result = []
+        index = 0
+        seen = 0
+        for bound in bounds:
+            bound_us = bound * 1_000_000
+            while index < len(self.counts) and bucket_upper_bound(index) <= bound_us:
+                seen += self.counts[index]
+                index += 1
+            result.append(seen)
+        return result
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'max': self.max,
+            **{f'p{int(q * 100)}': self.quantile(q) for q in QUANTILES},
+        }
+
+
+class HistogramFamily:
+    """Histograms of one metric, one per label value combination"""
+
+    name: str
+
+    help: str
+
+    label_names: tuple[str, ...]
+
+    series: dict[tuple[str, ...], Histogram]
+
+    def __init__(self, name: str, help: str, label_names: tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.series = {}
+
+    def observe(self, seconds: float, *label_values: str):
+        histogram = self.series.get(label_values)
+        if histogram is None:
+            histogram = self.series[label_values] = Histogram()
+        histogram.observe(seconds)
+
+    def to_dict(self) -> dict:
+        return {
+            'help': self.help,
+            'type': 'histogram',
+            'labels': list(self.label_names),
+            'series': [
+                {'labels': dict(zip(self.label_names, label_values)), **histogram.to_dict()}
+                for label_values, histogram in self.series.items()
+            ],
+        }
+
+    def to_prometheus(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for label_values, histogram in self.series.items():
+            labels = ','.join(f'{name}="{_escape_label(value)}"' for name, value in zip(self.label_names, label_values))
+            prefix = labels + ',' if labels else ''
+            for bound, count in zip(PROMETHEUS_BUCKETS, histogram.cumulative_counts(PROMETHEUS_BUCKETS)):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {histogram.count}')
+            suffix = '{' + labels + '}' if labels else ''
+            lines.append(f'{self.name}_sum{suffix} {histogram.sum}')
+            lines.append(f'{self.name}_count{suffix} {histogram.count}')
+        return lines
+
+
+class CounterFamily:
+    """Monotonic counters of one metric, one per label value combination"""
+
+    kind: typing.ClassVar[str] = 'counter'
+
+    name: str
+
+    help: str
+
+    label_names: tuple[str, ...]
+
+    series: dict[tuple[str, ...], int]
+
+    def __init__(self, name: str, help: str, label_names: tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.series = {}
+
+    def inc(self, *label_values: str, amount: int = 1):
+        self.series[label_values] = self.series.get(label_values, 0) + amount
+
+    def get(self, *label_values: str) -> int:
+        return self.series.get(label_values, 0)
+
+    def to_dict(self) -> dict:
+        return {
+            'help': self.help,
+            'type': self.kind,
+            'labels': list(self.label_names),
+            'series': [
+                {'labels': dict(zip(self.label_names, label_values)), 'value': value}
+                for label_values, value in self.series.items()
+            ],
+        }
+
+    def to_prometheus(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        for label_values, value in self.series.items():
+            labels = ','.join(f'{name}="{_escape_label(value)}"' for name, value in zip(self.label_names, label_values))
+            suffix = '{' + labels + '}' if labels else ''
+            lines.append(f'{self.name}{suffix} {value}')
+        return lines
+
+
+class GaugeFamily(CounterFamily):
+    """Current values of one metric, e.g. queue depths, one per label value combination"""
+
+    kind: typing.ClassVar[str] = 'gauge'
+
+    def set(self, *label_values: str, value: int | float):
+        self.series[label_values] = value
+
+
+def _escape_label(value: typing.Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsManager:
+    """In-process metrics, exported on `/metrics` (Prometheus) and `/api/v1/stats/pipeline` (JSON).
+
+    Call sites check `should_sample()` before taking timestamps, so with `metrics.sample_rate`
+    below 1 most operations skip instrumentation entirely. Queries are sampled as a whole: every
+    stage and model call of a sampled query is recorded. Counters are cheap and never sampled.
+    """
+
+    ap: app.Application
+
+    enabled: bool
+
+    sample_rate: float
+    """Fraction of queries and operations that are timed"""
+
+    families: dict[str, HistogramFamily | CounterFamily | GaugeFamily]
+
+    stage_duration: HistogramFamily
+
+    plugin_event_duration: HistogramFamily
+
+    llm_ttft: HistogramFamily
+
+    llm_duration: HistogramFamily
+
+    vector_search_duration: HistogramFamily
+
+    db_write_duration: HistogramFamily
+
+    ingress_prefiltered: CounterFamily
+
+    ingress_duplicates: CounterFamily
+
+    outbound_messages: CounterFamily
+
+    outbound_queue_depth: GaugeFamily
+
+    def __init__(self, ap: app.Application):
+        self.ap = ap
+        metrics_cfg = ap.instance_config.data.get('metrics', {})
+        self.enabled = metrics_cfg.get('enable', True)
+        self.sample_rate = float(metrics_cfg.get('sample_rate', 1.0))
+        self.families = {}
+
+        self.stage_duration = self.histogram(
+            'langbot_pipeline_stage_duration_seconds',
+            'Time spent in one pipeline stage invocation',
+            ('pipeline', 'stage', 'bot'),
+        )
+        self.plugin_event_duration = self.histogram(
+            'langbot_plugin_event_duration_seconds',
+            'Round trip of one event emitted to the plugin runtime',
+            ('event',),
+        )
+        self.llm_ttft = self.histogram(
+            'langbot_llm_time_to_first_token_seconds',
+            'Time until the first chunk of a streamed model response',
+            ('model',),
+        )
+        self.llm_duration = self.histogram(
+            'langbot_llm_request_duration_seconds',
+            'Total duration of one model request',
+            ('model', 'stream'),
+        )
+        self.vector_search_duration = self.histogram(
+            'langbot_vector_search_duration_seconds',
+            'Duration of one vector database search',
+            ('knowledge_base',),
+        )
+        self.db_write_duration = self.histogram(
+            'langbot_db_write_duration_seconds',
+            'Duration of one database write statement',
+            ('table',),
+        )
+        self.ingress_prefiltered = self.counter(
+            'langbot_ingress_prefiltered_messages_total',
+            'Group messages dropped by the respond rules before they were queued',
+            ('bot',),
+        )
+        self.ingress_duplicates = self.counter(
+            'langbot_ingress_duplicate_messages_total',
+            'Messages dropped because the platform had delivered them before',
+            ('bot',),
+        )
+        self.outbound_messages = self.counter(
+            'langbot_outbound_messages_total',
+            'Messages handled by the outbound send queue of a bot, by outcome',
+            ('bot', 'outcome'),
+        )
+        self.outbound_queue_depth = self.gauge(
+            'langbot_outbound_queue_depth',
+            'Messages waiting in the outbound send queue of a bot',
+            ('bot',),
+        )
+
+    def histogram(self, name: str, help: str, label_names: tuple[str, ...]) -> HistogramFamily:
+        family = HistogramFamily(name, help, label_names)
+        self.families[name] = family
+        return family
+
+    def counter(self, name: str, help: str, label_names: tuple[str, ...]) -> CounterFamily:
+        family = CounterFamily(name, help, label_names)
+        self.families[name] = family
+        return family
+
+    def gauge(self, name: str, help: str, label_names: tuple[str, ...]) -> GaugeFamily:
+        family = GaugeFamily(name, help, label_names)
+        self.families[name] = family
+        return family
+
+    def should_sample(self, key: int | None = None) -> bool:
+        """Whether to time this operation. Pass the query id to get the same decision for a whole query."""
+        if not self.enabled:
+            return False
+        if self.sample_rate >= 1.0:
+            return True
+        if key is None:
+            return random.random() < self.sample_rate
+        # multiplicative hash, so consecutive query ids are spread evenly
+        return (hash(key) * 2654435761) % 4294967296 < self.sample_rate * 4294967296
+
+    def to_dict(self) -> dict:
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'metrics': {name: family.to_dict() for name, family in self.families.items()},
+        }
+
+    def to_prometheus(self) -> str:
+        lines = [
+            '# HELP langbot_metrics_sample_rate Fraction of operations recorded in the latency histograms',
+            '# TYPE langbot_metrics_sample_rate gauge',
+            f'langbot_metrics_sample_rate {self.sample_rate if self.enabled else 0}',
+        ]
+        for family in self.families.values():
+            lines.extend(family.to_prometheus())
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,345 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import contextvars
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import tempfile
+import time
+import tracemalloc
+import typing
+
+from ..core import app
+
+import langbot_plugin.api.entities.builtin.pipeline.query as pipeline_query
+
+try:
+    import yappi
+except ImportError:  # optional, async-aware profiler
+    yappi = None
+
+
+PROFILE_KEY_PREFIX = 'profiles'
+"""Storage directory of the profile files"""
+
+MAX_PROFILES = 50
+"""Older profiles are deleted from storage beyond this"""
+
+MAX_COUNT = 100
+"""Most queries one arm request may profile"""
+
+TOP_FUNCTIONS = 60
+
+TOP_ALLOCATIONS = 30
+
+TRACEMALLOC_FRAMES = 1
+
+_profile_tag: contextvars.ContextVar[int] = contextvars.ContextVar('_profile_tag', default=0)
+"""yappi tag of the profiled query, inherited by the tasks it creates"""
+
+
+class ProfileRequest:
+    """Profile the next `remaining` queries matching the filters"""
+
+    def __init__(self, count: int, bot_uuid: str | None, pipeline_uuid: str | None, memory: bool):
+        self.id = os.urandom(6).hex()
+        self.remaining = count
+        self.bot_uuid = bot_uuid
+        self.pipeline_uuid = pipeline_uuid
+        self.memory = memory
+        self.created_at = time.time()
+
+    def matches(self, query: pipeline_query.Query, pipeline_uuid: str) -> bool:
+        if self.bot_uuid and query.bot_uuid != self.bot_uuid:
+            return False
+        if self.pipeline_uuid and pipeline_uuid != self.pipeline_uuid:
+            return False
+        return True
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'remaining': self.remaining,
+            'bot_uuid': self.bot_uuid,
+            'pipeline_uuid': self.pipeline_uuid,
+            'memory': self.memory,
+            'created_at': self.created_at,
+        }
+
+
+class Profile:
+    """Result of one profiled query"""
+
+    def __init__(self, request: ProfileRequest, query: pipeline_query.Query, pipeline_uuid: str, backend: str):
+        self.id = os.urandom(6).hex()
+        self.request_id = request.id
+        self.query_id = query.query_id
+        self.bot_uuid = query.bot_uuid
+        self.pipeline_uuid = pipeline_uuid
+        self.backend = backend
+        self.started_at = time.time()
+        self.duration_ms = 0.0
+        self.status = 'running'
+        """`running`, `saving`, `done` or `failed`"""
+        self.error: str | None = None
+        self.files: dict[str, str] = {}
+        """Kind (`txt`, `prof`) to storage key"""
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'request_id': self.request_id,
+            'query_id': self.query_id,
+            'bot_uuid': self.bot_uuid,
+            'pipeline_uuid': self.pipeline_uuid,
+            'backend': self.backend,
+            'started_at': self.started_at,
+            'duration_ms': round(self.duration_ms, 1),
+            'status': self.status,
+            'error': self.error,
+            'files': list(self.files),
+        }
+
+
+class QueryProfiler:
+    """CPU and allocation profiling of single queries, armed at runtime from the admin API.
+
+    `arm` asks for the next N queries matching a bot and/or pipeline to be profiled. The pipeline
+    only checks `armed` before running a query, so there is no cost while nothing is armed.
+    A matched query runs under yappi when it is installed, tagged through a context variable so
+    only the query and the tasks it spawns are counted, otherwise under cProfile, which also sees
+    whatever else the event loop runs meanwhile. With `memory`, a tracemalloc snapshot is taken
+    before and after and the top differences are reported. One query is profiled at a time; the
+    stats (pstats format) and a text report are saved through the storage manager.
+    """
+
+    ap: app.Application
+
+    armed: list[ProfileRequest]
+
+    active: Profile | None
+
+    profiles: collections.OrderedDict[str, Profile]
+    """Recent profiles, oldest first"""
+
+    def __init__(self, ap: app.Application):
+        self.ap = ap
+        self.armed = []
+        self.active = None
+        self.profiles = collections.OrderedDict()
+        self._next_tag = 0
+
+    @property
+    def backend(self) -> str:
+        return 'yappi' if yappi is not None else 'cprofile'
+
+    def arm(
+        self,
+        count: int = 1,
+        bot_uuid: str | None = None,
+        pipeline_uuid: str | None = None,
+        memory: bool = True,
+    ) -> ProfileRequest:
+        if not 1 <= count <= MAX_COUNT:
+            raise ValueError(f'count must be between 1 and {MAX_COUNT}')
+        request = ProfileRequest(count, bot_uuid or None, pipeline_uuid or None, memory)
+        self.armed.append(request)
+        return request
+
+    def disarm(self, request_id: str | None = None):
+        """Cancel one arm request, or all of them"""
+        if request_id is None:
+            self.armed = []
+        else:
+            self.armed = [request for request in self.armed if request.id != request_id]
+
+    def _take(self, query: pipeline_query.Query, pipeline_uuid: str) -> ProfileRequest | None:
+        if self.active is not None:
+            return None
+        for request in self.armed:
+            if request.matches(query, pipeline_uuid):
+                request.remaining -= 1
+                if request.remaining <= 0:
+                    self.armed.remove(request)
+                return request
+        return None
+
+    async def profile(self, query: pipeline_query.Query, pipeline_uuid: str, coro: typing.Awaitable):
+        """Await `coro`, profiling it if an arm request matches the query"""
+        request = self._take(query, pipeline_uuid)
+        if request is None:
+            return await coro
+
+        profile = Profile(request, query, pipeline_uuid, self.backend)
+        self.active = profile
+
+        snapshot_before = None
+        started_tracemalloc = False
+        if request.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+                started_tracemalloc = True
+            tracemalloc.reset_peak()
+            snapshot_before = tracemalloc.take_snapshot()
+
+        if yappi is not None and not yappi.is_running():
+            self._next_tag += 1
+            tag = self._next_tag
+            token = _profile_tag.set(tag)
+            yappi.set_tag_callback(_profile_tag.get)
+            yappi.set_clock_type('cpu')
+            yappi.start()
+            profiler = None
+        else:
+            profile.backend = 'cprofile'
+            tag = token = None
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        start = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            else:
+                yappi.stop()
+                _profile_tag.reset(token)
+            profile.duration_ms = (time.perf_counter() - start) * 1000
+
+            snapshot_after = None
+            peak = 0
+            if snapshot_before is not None:
+                snapshot_after = tracemalloc.take_snapshot()
+                peak = tracemalloc.get_traced_memory()[1]
+                if started_tracemalloc:
+                    tracemalloc.stop()
+
+            if profiler is not None:
+                profiler.create_stats()
+                stats_data = marshal.dumps(profiler.stats)
+            else:
+                stats_data = await asyncio.to_thread(_yappi_pstats, tag)
+                yappi.clear_stats()
+
+            self.active = None
+            profile.status = 'saving'
+            self._remember(profile)
+            self.ap.task_mgr.create_task(
+                self._save(profile, stats_data, snapshot_before, snapshot_after, peak),
+                kind='profile',
+                name=f'profile-{profile.id}',
+            )
+
+    def _remember(self, profile: Profile):
+        self.profiles[profile.id] = profile
+        while len(self.profiles) > MAX_PROFILES:
+            _, old = self.profiles.popitem(last=False)
+            self.ap.task_mgr.create_task(self._delete_files(old), kind='profile', name=f'profile-delete-{old.id}')
+
+    async def _save(
+        self,
+        profile: Profile,
+        stats_data: bytes,
+        snapshot_before: tracemalloc.Snapshot | None,
+        snapshot_after: tracemalloc.Snapshot | None,
+        peak: int,
+    ):
+        try:
+            report = await asyncio.to_thread(_render_report, profile, stats_data, snapshot_before, snapshot_after, peak)
+            storage = self.ap.storage_mgr.storage_provider
+            for kind, data in (('prof', stats_data), ('txt', report.encode('utf-8'))):
+                key = f'{PROFILE_KEY_PREFIX}/{profile.id}.{kind}'
+                await storage.save(key, data)
+                profile.files[kind] = key
+            profile.status = 'done'
+        except Exception as e:
+            profile.status = 'failed'
+            profile.error = str(e)
+            self.ap.logger.warning(f'Failed to save profile {profile.id}: {e}')
+
+    async def load(self, profile_id: str, kind: str) -> bytes | None:
+        profile = self.profiles.get(profile_id)
+        if profile is None or kind not in profile.files:
+            return None
+        return await self.ap.storage_mgr.storage_provider.load(profile.files[kind])
+
+    async def delete(self, profile_id: str) -> bool:
+        profile = self.profiles.pop(profile_id, None)
+        if profile is None:
+            return False
+        await self._delete_files(profile)
+        return True
+
+    async def _delete_files(self, profile: Profile):
+        storage = self.ap.storage_mgr.storage_provider
+        for key in profile.files.values():
+            try:
+                if await storage.exists(key):
+                    await storage.delete(key)
+            except Exception as e:
+                self.ap.logger.warning(f'Failed to delete profile file {key}: {e}')
+
+    def to_dict(self) -> dict:
+        return {
+            'backend': self.backend,
+            'armed': [request.to_dict() for request in self.armed],
+            'active': self.active.to_dict() if self.active is not None else None,
+            'profiles': [profile.to_dict() for profile in reversed(self.profiles.values())],
+        }
+
+
+def _yappi_pstats(tag: int) -> bytes:
+    stats = yappi.get_func_stats(filter={'tag': tag})
+    fd, path = tempfile.mkstemp(suffix='.prof')
+    os.close(fd)
+    try:
+        stats.save(path, type='pstat')
+        with open(path, 'rb') as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+
+def _render_report(
+    profile: Profile,
+    stats_data: bytes,
+    snapshot_before: tracemalloc.Snapshot | None,
+    snapshot_after: tracemalloc.Snapshot | None,
+    peak: int,
+) -> str:
+    out = io.StringIO()
+    out.write(
+        f'Query {profile.query_id}, bot {profile.bot_uuid}, pipeline {profile.pipeline_uuid}\n'
+        f'Started {time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(profile.started_at))}, '
+        f'took {profile.duration_ms:.1f} ms, profiled with {profile.backend}\n'
+    )
+    if profile.backend == 'cprofile':
+        out.write('cProfile is not task-aware, the stats include everything the event loop ran meanwhile\n')
+
+    out.write('\n== CPU, by cumulative time ==\n')
+    fd, path = tempfile.mkstemp(suffix='.prof')
+    os.close(fd)
+    try:
+        with open(path, 'wb') as f:
+            f.write(stats_data)
+        pstats.Stats(path, stream=out).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+    finally:
+        os.remove(path)
+
+    if snapshot_before is not None and snapshot_after is not None:
+        filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        ]
+        diff = snapshot_after.filter_traces(filters).compare_to(snapshot_before.filter_traces(filters), 'lineno')
+        out.write(f'\n== Memory, peak traced {peak / 1024:.1f} KiB, top differences ==\n')
+        for stat in diff[:TOP_ALLOCATIONS]:
+            out.write(f'{stat}\n')
+
+    return out.getvalue()
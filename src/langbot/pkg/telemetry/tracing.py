@@ -0,0 +1,291 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import json
+import os
+import random
+import time
+import typing
+
+import httpx
+
+from ..core import app
+from ..utils import constants
+
+import langbot_plugin.api.entities.builtin.pipeline.query as pipeline_query
+
+
+TRACE_ID_VAR = '_trace_id'
+"""Query variable holding the trace id, set when the message is received"""
+
+TRACEPARENT_VAR = '_traceparent'
+"""Query variable holding a W3C traceparent of the current span, sent to the plugin runtime with every event"""
+
+MAX_ACTIVE_TRACES = 10000
+"""Traces that never finish (e.g. a query dropped before the pipeline) are evicted beyond this"""
+
+
+class Span:
+    """One timed operation of a trace"""
+
+    __slots__ = ('trace_id', 'span_id', 'parent_span_id', 'name', 'start_ns', 'end_ns', 'attributes', 'error')
+
+    def __init__(self, trace_id: str, parent_span_id: str, name: str, attributes: dict[str, typing.Any] | None):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent_span_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes or {}
+        self.error: str | None = None
+
+    def end(self, error: str | None = None):
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = error
+
+    @property
+    def traceparent(self) -> str:
+        return f'00-{self.trace_id}-{self.span_id}-01'
+
+    def to_otlp(self) -> dict:
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': 1,  # SPAN_KIND_INTERNAL
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns or time.time_ns()),
+            'attributes': [{'key': key, 'value': _otlp_value(value)} for key, value in self.attributes.items()],
+            'status': {'code': 2, 'message': self.error} if self.error is not None else {'code': 1},
+        }
+        if self.parent_span_id:
+            span['parentSpanId'] = self.parent_span_id
+        return span
+
+
+def _otlp_value(value: typing.Any) -> dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+class Trace:
+    """Spans of one query, from message receipt to the end of the pipeline"""
+
+    trace_id: str
+
+    root: Span
+
+    spans: list[Span]
+
+    stack: list[Span]
+    """Open spans, new spans are children of the innermost one"""
+
+    error: bool
+
+    enqueued_ns: int
+    """When the query was added to the query pool"""
+
+    def __init__(self, name: str, attributes: dict[str, typing.Any] | None):
+        self.trace_id = os.urandom(16).hex()
+        self.root = Span(self.trace_id, '', name, attributes)
+        self.spans = [self.root]
+        self.stack = [self.root]
+        self.error = False
+        self.enqueued_ns = self.root.start_ns
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.root.end_ns or time.time_ns()) - self.root.start_ns) / 1_000_000
+
+
+class TraceManager:
+    """End-to-end query tracing.
+
+    A trace is started when a message is received and its id travels with the query in
+    `Query.variables`. Spans are recorded in memory and the whole trace is kept or dropped
+    once the query finishes (tail sampling): slow and failed queries are always kept, others
+    with probability `tracing.sample_rate`. Kept traces are exported as OTLP JSON, either
+    appended to a file or posted to an OTLP/HTTP collector.
+    """
+
+    ap: app.Application
+
+    enabled: bool
+
+    slow_threshold_ms: float
+    """Queries slower than this are always kept"""
+
+    sample_rate: float
+    """Fraction of the other queries that are kept"""
+
+    exporter: str
+    """`file` or `otlp-http`"""
+
+    traces: collections.OrderedDict[str, Trace]
+    """Traces of queries in flight"""
+
+    export_queue: asyncio.Queue[Trace]
+
+    def __init__(self, ap: app.Application):
+        self.ap = ap
+        tracing_cfg = ap.instance_config.data.get('tracing', {})
+        self.enabled = tracing_cfg.get('enable', False)
+        self.slow_threshold_ms = tracing_cfg.get('slow_threshold_ms', 5000)
+        self.sample_rate = tracing_cfg.get('sample_rate', 0.01)
+        self.exporter = tracing_cfg.get('exporter', 'file')
+        self.file_path = tracing_cfg.get('file', {}).get('path', 'data/traces/traces.jsonl')
+        self.endpoint = tracing_cfg.get('otlp-http', {}).get('endpoint', 'http://127.0.0.1:4318/v1/traces')
+        self.batch_size = tracing_cfg.get('batch_size', 64)
+        self.flush_interval = tracing_cfg.get('flush_interval', 5)
+        self.traces = collections.OrderedDict()
+        self.export_queue = asyncio.Queue(maxsize=tracing_cfg.get('queue_size', 1024))
+
+    def start_trace(self, name: str, attributes: dict[str, typing.Any] | None = None) -> Trace | None:
+        if not self.enabled:
+            return None
+        trace = Trace(name, attributes)
+        self.traces[trace.trace_id] = trace
+        while len(self.traces) > MAX_ACTIVE_TRACES:
+            self.traces.popitem(last=False)
+        return trace
+
+    def record_span(
+        self,
+        trace: Trace | None,
+        name: str,
+        start_ns: int,
+        end_ns: int | None = None,
+        attributes: dict[str, typing.Any] | None = None,
+    ) -> Span | None:
+        """Add an already finished span under the root span"""
+        if trace is None:
+            return None
+        span = Span(trace.trace_id, trace.root.span_id, name, attributes)
+        span.start_ns = start_ns
+        span.end_ns = end_ns or time.time_ns()
+        trace.spans.append(span)
+        return span
+
+    def get_trace(self, query: pipeline_query.Query | None) -> Trace | None:
+        if not self.enabled or query is None or not query.variables:
+            return None
+        trace_id = query.variables.get(TRACE_ID_VAR)
+        return self.traces.get(trace_id) if trace_id else None
+
+    def start_span(
+        self, query: pipeline_query.Query | None, name: str, attributes: dict[str, typing.Any] | None = None
+    ) -> Span | None:
+        """Open a span as child of the innermost open span of the query's trace, None if the query is not traced"""
+        trace = self.get_trace(query)
+        if trace is None:
+            return None
+        span = Span(trace.trace_id, trace.stack[-1].span_id, name, attributes)
+        trace.spans.append(span)
+        trace.stack.append(span)
+        query.variables[TRACEPARENT_VAR] = span.traceparent
+        return span
+
+    def end_span(self, query: pipeline_query.Query | None, span: Span | None, error: str | None = None):
+        """End the span, nothing is done if it is already ended"""
+        if span is None or span.end_ns:
+            return
+        span.end(error)
+        trace = self.traces.get(span.trace_id)
+        if trace is None:
+            return
+        if span in trace.stack:
+            trace.stack.remove(span)
+        if error is not None:
+            trace.error = True
+        if query is not None and query.variables:
+            query.variables[TRACEPARENT_VAR] = trace.stack[-1].traceparent if trace.stack else span.traceparent
+
+    def set_error(self, query: pipeline_query.Query | None, error: str):
+        """Mark the query's trace as failed, so it is always kept"""
+        trace = self.get_trace(query)
+        if trace is not None:
+            trace.error = True
+            trace.root.error = error
+
+    def finish_trace(self, query: pipeline_query.Query | None, error: str | None = None):
+        """End the root span and make the tail sampling decision"""
+        trace = self.get_trace(query)
+        if trace is None:
+            return
+        self.traces.pop(trace.trace_id, None)
+        trace.root.end(error)
+        if error is not None:
+            trace.error = True
+
+        if not (trace.error or trace.duration_ms >= self.slow_threshold_ms or random.random() < self.sample_rate):
+            return
+
+        try:
+            self.export_queue.put_nowait(trace)
+        except asyncio.QueueFull:
+            self.ap.logger.debug(f'Trace export queue is full, dropping trace {trace.trace_id}')
+
+    def to_otlp(self, traces: list[Trace]) -> dict:
+        """An OTLP ExportTraceServiceRequest in its JSON encoding"""
+        return {
+            'resourceSpans': [
+                {
+                    'resource': {
+                        'attributes': [
+                            {'key': 'service.name', 'value': {'stringValue': 'langbot'}},
+                            {'key': 'service.version', 'value': {'stringValue': constants.semantic_version}},
+                        ]
+                    },
+                    'scopeSpans': [
+                        {
+                            'scope': {'name': 'langbot'},
+                            'spans': [span.to_otlp() for trace in traces for span in trace.spans],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    async def export(self, traces: list[Trace]):
+        payload = self.to_otlp(traces)
+        if self.exporter == 'otlp-http':
+            async with httpx.AsyncClient(timeout=10) as client:
+                resp = await client.post(self.endpoint, json=payload)
+                resp.raise_for_status()
+        else:
+            line = json.dumps(payload, ensure_ascii=False) + '\n'
+            await asyncio.to_thread(self._append_file, line)
+
+    def _append_file(self, line: str):
+        os.makedirs(os.path.dirname(self.file_path) or '.', exist_ok=True)
+        with open(self.file_path, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+    async def run(self):
+        """Export kept traces in batches"""
+        if not self.enabled:
+            return
+        while True:
+            batch = [await self.export_queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.export_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self.export(batch)
+            except Exception as e:
+                self.ap.logger.warning(f'Failed to export {len(batch)} traces: {e}')
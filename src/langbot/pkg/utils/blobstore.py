@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import base64
+import collections
+import hashlib
+import typing
+
+import langbot_plugin.api.entities.builtin.provider.message as provider_message
+
+if typing.TYPE_CHECKING:
+    from ..storage import provider as storage_provider
+
+
+HANDLE_PREFIX = 'blob:'
+
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+
+DEFAULT_MAX_SPILLED_BYTES = 1024 * 1024 * 1024
+
+SPILL_DIR = 'message_blobs'
+"""Storage directory of blobs evicted from memory, emptied on startup"""
+
+
+class BlobNotFoundError(Exception):
+    """The blob was evicted from memory and is not in storage"""
+
+
+def is_handle(value: typing.Any) -> bool:
+    return isinstance(value, str) and value.startswith(HANDLE_PREFIX)
+
+
+class BlobStore:
+    """Binaries of messages kept once as bytes, referred to by content-addressed handles.
+
+    Images received from platforms are put here instead of being base64-encoded into the message,
+    the prompt only carries their handle (`blob:<sha256>`). They are encoded when a request to a
+    model or an event for plugins is built, see `encode_messages` and `encode_dump`. Blobs beyond
+    `max_bytes` are evicted least recently used first, to `storage` when it is set. Spilled blobs
+    beyond `max_spilled_bytes` are deleted from storage, least recently spilled or loaded first.
+    """
+
+    max_bytes: int
+
+    max_spilled_bytes: int
+
+    size: int
+    """Bytes currently in memory"""
+
+    storage: storage_provider.StorageProvider | None
+    """Evicted blobs are saved here when set, otherwise they are gone"""
+
+    _entries: collections.OrderedDict[str, typing.Tuple[bytes, str]]
+
+    _spilled: collections.OrderedDict[str, typing.Tuple[str, int]]
+    """Mime types and sizes of the blobs in storage"""
+
+    spilled_size: int
+    """Bytes currently in storage"""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, max_spilled_bytes: int = DEFAULT_MAX_SPILLED_BYTES):
+        self.max_bytes = max_bytes
+        self.max_spilled_bytes = max_spilled_bytes
+        self.size = 0
+        self.spilled_size = 0
+        self.storage = None
+        self._entries = collections.OrderedDict()
+        self._spilled = collections.OrderedDict()
+
+        self.puts = 0
+        self.deduplicated = 0
+        """Puts of bytes already stored"""
+        self.spills = 0
+        self.loads = 0
+        """Blobs read back from storage"""
+        self.lost = 0
+        """Blobs evicted without storage"""
+        self.pruned = 0
+        """Spilled blobs deleted from storage"""
+        self.encodes = 0
+        self.encoded_bytes = 0
+
+    async def put(self, data: bytes, mime_type: str) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        self.puts += 1
+        if digest in self._entries:
+            self._entries.move_to_end(digest)
+            self.deduplicated += 1
+        elif digest in self._spilled:
+            self.deduplicated += 1
+        else:
+            await self._insert(digest, data, mime_type)
+        return HANDLE_PREFIX + digest
+
+    async def get(self, handle: str) -> typing.Tuple[bytes, str]:
+        """Returns the bytes and mime type of a blob, raises `BlobNotFoundError` if it is gone"""
+        digest = handle[len(HANDLE_PREFIX) :]
+        entry = self._entries.get(digest)
+        if entry is not None:
+            self._entries.move_to_end(digest)
+            return entry
+
+        spilled = self._spilled.get(digest)
+        if spilled is None or self.storage is None:
+            raise BlobNotFoundError(handle)
+        mime_type, _ = spilled
+        try:
+            data = await self.storage.load(f'{SPILL_DIR}/{digest}')
+        except Exception as e:
+            # pruned while it was being read
+            raise BlobNotFoundError(handle) from e
+        if digest in self._spilled:
+            self._spilled.move_to_end(digest)
+        self.loads += 1
+        await self._insert(digest, data, mime_type)
+        return data, mime_type
+
+    async def data_uri(self, handle: str) -> str:
+        data, mime_type = await self.get(handle)
+        self.encodes += 1
+        self.encoded_bytes += len(data)
+        return f'data:{mime_type};base64,{base64.b64encode(data).decode()}'
+
+    async def _insert(self, digest: str, data: bytes, mime_type: str):
+        if digest in self._entries:
+            # inserted by a concurrent put or get meanwhile
+            self._entries.move_to_end(digest)
+            return
+        self._entries[digest] = (data, mime_type)
+        self.size += len(data)
+        while self.size > self.max_bytes and len(self._entries) > 1:
+            evicted, (evicted_data, evicted_mime_type) = next(iter(self._entries.items()))
+            if self.storage is not None and evicted not in self._spilled:
+                # saved before it leaves memory, so a get while it is being written still finds it
+                await self.storage.save(f'{SPILL_DIR}/{evicted}', evicted_data)
+                if evicted not in self._spilled:
+                    self._spilled[evicted] = (evicted_mime_type, len(evicted_data))
+                    self.spilled_size += len(evicted_data)
+                    self.spills += 1
+            if self._entries.pop(evicted, None) is None:
+                # evicted by a concurrent insert meanwhile
+                continue
+            self.size -= len(evicted_data)
+            if self.storage is None:
+                self.lost += 1
+        await self._prune()
+
+    async def _prune(self):
+        while self.spilled_size > self.max_spilled_bytes and self._spilled:
+            digest, (_, size) = self._spilled.popitem(last=False)
+            self.spilled_size -= size
+            self.pruned += 1
+            try:
+                await self.storage.delete(f'{SPILL_DIR}/{digest}')
+            except Exception:
+                pass
+
+    def to_dict(self) -> dict:
+        return {
+            'max_bytes': self.max_bytes,
+            'size': self.size,
+            'entries': len(self._entries),
+            'spilled': len(self._spilled),
+            'spilled_size': self.spilled_size,
+            'spill': self.storage is not None,
+            'puts': self.puts,
+            'deduplicated': self.deduplicated,
+            'spills': self.spills,
+            'loads': self.loads,
+            'lost': self.lost,
+            'pruned': self.pruned,
+            'encodes': self.encodes,
+            'encoded_bytes': self.encoded_bytes,
+        }
+
+
+store = BlobStore()
+
+
+async def read_image(value: str) -> typing.Tuple[bytes, str]:
+    """Bytes and mime type of an image given as a blob handle or a data URI"""
+    if is_handle(value):
+        return await store.get(value)
+    header, _, data = value.partition(',')
+    mime_type = header[len('data:') :].split(';')[0] if header.startswith('data:') else 'image/png'
+    return base64.b64decode(data or header), mime_type
+
+
+async def encode_messages(messages: list[provider_message.Message]) -> list[provider_message.Message]:
+    """The messages with blob handles in their content replaced by data URIs, for a request to a model.
+
+    Messages without handles are returned as they are, the others are copied so the conversation
+    keeps its handles. Images whose blob is gone are left out.
+    """
+    encoded = []
+    for message in messages:
+        if not isinstance(message.content, list) or not any(
+            is_handle(element.image_base64) for element in message.content
+        ):
+            encoded.append(message)
+            continue
+
+        content = []
+        for element in message.content:
+            if is_handle(element.image_base64):
+                try:
+                    element = element.model_copy(update={'image_base64': await store.data_uri(element.image_base64)})
+                except BlobNotFoundError:
+                    continue
+            content.append(element)
+        encoded.append(message.model_copy(update={'content': content}))
+    return encoded
+
+
+async def encode_dump(data: typing.Any) -> typing.Any:
+    """Replace blob handles in a model dump by data URIs in place, for sending it out of the process"""
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if key == 'image_base64' and is_handle(value):
+                try:
+                    data[key] = await store.data_uri(value)
+                except BlobNotFoundError:
+                    data[key] = None
+            elif isinstance(value, (dict, list)):
+                await encode_dump(value)
+    elif isinstance(data, list):
+        for value in data:
+            if isinstance(value, (dict, list)):
+                await encode_dump(value)
+    return data
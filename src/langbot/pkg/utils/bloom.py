@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import time
+
+
+class BloomFilter:
+    """Set membership in `m` bits, with false positives at about `error_rate` once it holds `capacity` keys"""
+
+    __slots__ = ('capacity', 'size', 'bits', 'hashes', 'count')
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+
+    def indexes(self, key: str) -> list[int]:
+        """Bit positions of a key, the same in every filter of the same capacity and error rate"""
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def contains(self, indexes: list[int]) -> bool:
+        bits = self.bits
+        for index in indexes:
+            if not bits[index >> 3] & (1 << (index & 7)):
+                return False
+        return True
+
+    def add(self, indexes: list[int]):
+        bits = self.bits
+        for index in indexes:
+            bits[index >> 3] |= 1 << (index & 7)
+        self.count += 1
+
+
+class RotatingBloomFilter:
+    """Keys seen in the last `window` seconds, in memory that does not grow with the number of keys.
+
+    Keys are added to the current generation and looked up in it and in the previous one. The current
+    generation is retired after `window` seconds, or earlier once it holds `capacity` keys so the false
+    positive rate stays bounded under a flood, which then shortens how long keys are remembered.
+    """
+
+    window: float
+
+    capacity: int
+
+    error_rate: float
+
+    rotations: int
+
+    def __init__(self, window: float, capacity: int, error_rate: float = 1e-6):
+        self.window = window
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rotations = 0
+        self._current = BloomFilter(capacity, error_rate)
+        self._previous: BloomFilter | None = None
+        self._started_at = time.monotonic()
+
+    def _rotate(self, now: float):
+        # after twice the window without keys the previous generation is stale as well
+        self._previous = self._current if now - self._started_at < 2 * self.window else None
+        self._current = BloomFilter(self.capacity, self.error_rate)
+        self._started_at = now
+        self.rotations += 1
+
+    def check_and_add(self, key: str) -> bool:
+        """Whether the key was seen in the window, it is remembered from now on either way"""
+        now = time.monotonic()
+        if now - self._started_at >= self.window or self._current.count >= self.capacity:
+            self._rotate(now)
+
+        indexes = self._current.indexes(key)
+        if self._current.contains(indexes):
+            return True
+        seen = self._previous is not None and self._previous.contains(indexes)
+        self._current.add(indexes)
+        return seen
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self._current.bits) + (len(self._previous.bits) if self._previous is not None else 0)
+
+    def to_dict(self) -> dict:
+        return {
+            'window': self.window,
+            'capacity': self.capacity,
+            'error_rate': self.error_rate,
+            'keys': self._current.count + (self._previous.count if self._previous is not None else 0),
+            'rotations': self.rotations,
+            'memory_bytes': self.memory_bytes,
+        }
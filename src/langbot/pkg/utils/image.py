@@ -19,7 +19,22 @@ async def get_gewechat_image_base64(
     token: str,
     image_type: int = 2,
 ) -> typing.Tuple[str, str]:
-    """从gewechat服务器获取图片并转换为base64格式
+    """从gewechat服务器获取图片并转换为base64格式，返回 (base64编码, 图片格式)"""
+    image_data, mime_type = await get_gewechat_image_bytes(
+        gewechat_url, gewechat_file_url, app_id, xml_content, token, image_type
+    )
+    return base64.b64encode(image_data).decode('utf-8'), mime_type.split('/')[-1]
+
+
+async def get_gewechat_image_bytes(
+    gewechat_url: str,
+    gewechat_file_url: str,
+    app_id: str,
+    xml_content: str,
+    token: str,
+    image_type: int = 2,
+) -> typing.Tuple[bytes, str]:
+    """从gewechat服务器下载图片
 
     Args:
         gewechat_url (str): gewechat服务器地址（用于获取图片URL）
@@ -30,7 +45,7 @@ async def get_gewechat_image_base64(
         image_type (int, optional): 图片类型. Defaults to 2.
 
     Returns:
-        typing.Tuple[str, str]: (base64编码, 图片格式)
+        typing.Tuple[bytes, str]: (图片数据, MIME类型)
 
     Raises:
         aiohttp.ClientTimeout: 请求超时（15秒）或连接超时（2秒）
@@ -83,13 +98,11 @@ async def get_gewechat_image_base64(
 
                     content_type = img_response.headers.get('Content-Type', '')
                     if content_type:
-                        image_format = content_type.split('/')[-1]
+                        mime_type = content_type
                     else:
-                        image_format = file_url.split('.')[-1]
+                        mime_type = f'image/{file_url.split(".")[-1]}'
 
-                    base64_str = base64.b64encode(image_data).decode('utf-8')
-
-                    return base64_str, image_format
+                    return image_data, mime_type
             except asyncio.TimeoutError:
                 raise Exception(f'下载图片超时, URL: {download_url}')
             except aiohttp.ClientError as e:
@@ -104,24 +117,24 @@ async def get_wecom_image_base64(pic_url: str) -> tuple[str, str]:
     :param pic_url: 企业微信图片URL
     :return: (base64_str, image_format)
     """
+    image_data, mime_type = await get_wecom_image_bytes(pic_url)
+    image_format = mime_type.split('/')[-1]  # 例如 'image/jpeg' -> 'jpeg'
+    return base64.b64encode(image_data).decode('utf-8'), image_format
+
+
+async def get_wecom_image_bytes(pic_url: str) -> tuple[bytes, str]:
+    """
+    下载企业微信图片
+    :param pic_url: 企业微信图片URL
+    :return: (image_data, mime_type)
+    """
     async with aiohttp.ClientSession() as session:
         async with session.get(pic_url) as response:
             if response.status != 200:
                 raise Exception(f'Failed to download image: {response.status}')
 
-            # 读取图片数据
             image_data = await response.read()
-
-            # 获取图片格式
-            content_type = response.headers.get('Content-Type', '')
-            image_format = content_type.split('/')[-1]  # 例如 'image/jpeg' -> 'jpeg'
-
-            # 转换为 base64
-            import base64
-
-            image_base64 = base64.b64encode(image_data).decode('utf-8')
-
-            return image_base64, image_format
+            return image_data, response.headers.get('Content-Type', '')
 
 
 async def get_qq_official_image_base64(pic_url: str, content_type: str) -> tuple[str, str]:
@@ -129,13 +142,18 @@ async def get_qq_official_image_base64(pic_url: str, content_type: str) -> tuple
     下载QQ官方图片，
     并且转换为base64格式
     """
+    image_data, _ = await get_qq_official_image_bytes(pic_url, content_type)
+    base64_data = base64.b64encode(image_data).decode('utf-8')
+
+    return f'data:{content_type};base64,{base64_data}'
+
+
+async def get_qq_official_image_bytes(pic_url: str, content_type: str) -> tuple[bytes, str]:
+    """下载QQ官方图片，返回 (图片数据, MIME类型)"""
     async with httpx.AsyncClient() as client:
         response = await client.get(pic_url)
         response.raise_for_status()  # 确保请求成功
-        image_data = response.content
-        base64_data = base64.b64encode(image_data).decode('utf-8')
-
-        return f'data:{content_type};base64,{base64_data}'
+        return response.content, content_type
 
 
 def get_qq_image_downloadable_url(image_url: str) -> tuple[str, dict]:
@@ -176,6 +194,15 @@ async def qq_image_url_to_base64(image_url: str) -> typing.Tuple[str, str]:
     Returns:
         typing.Tuple[str, str]: base64编码和图片格式
     """
+    file_bytes, mime_type = await qq_image_url_to_bytes(image_url)
+
+    base64_str = base64.b64encode(file_bytes).decode()
+
+    return base64_str, mime_type.split('/')[-1]
+
+
+async def qq_image_url_to_bytes(image_url: str) -> typing.Tuple[bytes, str]:
+    """下载QQ图片，返回图片数据和MIME类型"""
     image_url, query = get_qq_image_downloadable_url(image_url)
 
     # Flatten the query dictionary
@@ -183,9 +210,7 @@ async def qq_image_url_to_base64(image_url: str) -> typing.Tuple[str, str]:
 
     file_bytes, image_format = await get_qq_image_bytes(image_url, query)
 
-    base64_str = base64.b64encode(file_bytes).decode()
-
-    return base64_str, image_format
+    return file_bytes, f'image/{image_format}'
 
 
 async def extract_b64_and_format(image_base64_data: str) -> typing.Tuple[str, str]:
@@ -200,13 +225,14 @@ async def extract_b64_and_format(image_base64_data: str) -> typing.Tuple[str, st
 
 
 async def get_slack_image_to_base64(pic_url: str, bot_token: str):
+    file_bytes, mime_type = await get_slack_image_bytes(pic_url, bot_token)
+    base64_str = base64.b64encode(file_bytes).decode('utf-8')
+    return f'data:{mime_type};base64,{base64_str}'
+
+
+async def get_slack_image_bytes(pic_url: str, bot_token: str) -> tuple[bytes, str]:
     headers = {'Authorization': f'Bearer {bot_token}'}
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(pic_url, headers=headers) as resp:
-                mime_type = resp.headers.get('Content-Type', 'application/octet-stream')
-                file_bytes = await resp.read()
-                base64_str = base64.b64encode(file_bytes).decode('utf-8')
-            return f'data:{mime_type};base64,{base64_str}'
-    except Exception as e:
-        raise (e)
+    async with aiohttp.ClientSession() as session:
+        async with session.get(pic_url, headers=headers) as resp:
+            mime_type = resp.headers.get('Content-Type', 'application/octet-stream')
+            return await resp.read(), mime_type
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import collections
+import typing
+
+import pydantic
+
+import langbot_plugin.api.entities.builtin.platform.message as platform_message
+
+from . import blobstore
+
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+Fetcher = typing.Callable[[], typing.Awaitable[typing.Tuple[bytes, str]]]
+"""Downloads an image, returns its bytes and mime type"""
+
+
+class ImageCache:
+    """LRU of fetched images, bounded by their total size in bytes"""
+
+    max_bytes: int
+
+    size: int
+    """Bytes currently cached"""
+
+    _entries: collections.OrderedDict[str, typing.Tuple[bytes, str]]
+
+    _inflight: dict[str, asyncio.Task]
+    """Downloads in progress, owned by the cache so a caller going away does not stop them for the others"""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = collections.OrderedDict()
+        self._inflight = {}
+
+        self.references = 0
+        """Lazy images created"""
+        self.used = 0
+        """Lazy images whose bytes were asked for, the others were never downloaded"""
+        self.fetches = 0
+        self.fetched_bytes = 0
+        self.hits = 0
+        self.evictions = 0
+
+    async def get(self, key: str, fetcher: Fetcher) -> typing.Tuple[bytes, str]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.hits += 1
+        else:
+            task = asyncio.create_task(self._fetch(key, fetcher))
+            # retrieve the error even if every caller was cancelled
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        # a cancelled caller only stops waiting for the download
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: str, fetcher: Fetcher) -> typing.Tuple[bytes, str]:
+        try:
+            entry = await fetcher()
+        finally:
+            del self._inflight[key]
+
+        self.fetches += 1
+        self.fetched_bytes += len(entry[0])
+        self._put(key, entry)
+        return entry
+
+    def _put(self, key: str, entry: typing.Tuple[bytes, str]):
+        size = len(entry[0])
+        if size > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (data, _) = self._entries.popitem(last=False)
+            self.size -= len(data)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def to_dict(self) -> dict:
+        return {
+            'max_bytes': self.max_bytes,
+            'size': self.size,
+            'entries': len(self._entries),
+            'references': self.references,
+            'used': self.used,
+            'fetches': self.fetches,
+            'fetched_bytes': self.fetched_bytes,
+            'hits': self.hits,
+            'evictions': self.evictions,
+        }
+
+
+cache = ImageCache()
+
+
+class LazyImage(platform_message.Image):
+    """An image received from a platform, downloaded only when its bytes are needed.
+
+    Message converters create these instead of downloading every incoming image before the
+    query is queued, which mostly wasted bandwidth on group messages the respond rules drop.
+    Until the image is used `base64` is empty and only `url` or `image_id` tell what it is.
+    `resolve()` fetches it through the shared cache and fills `base64` with a data URI,
+    `get_bytes()` returns the bytes without touching the fields, and `store()` puts them in the
+    blob store and returns the handle the prompt carries instead of the data URI.
+    """
+
+    _key: str = pydantic.PrivateAttr(default='')
+
+    _fetcher: Fetcher | None = pydantic.PrivateAttr(default=None)
+
+    _used: bool = pydantic.PrivateAttr(default=False)
+
+    _blob: str = pydantic.PrivateAttr(default='')
+
+    @classmethod
+    def create(cls, key: str, fetcher: Fetcher, url: str = '', image_id: str = '') -> LazyImage:
+        """`key` identifies the image across messages, e.g. its url or platform file id"""
+        image = cls(url=url, image_id=image_id)
+        image._key = key
+        image._fetcher = fetcher
+        cache.references += 1
+        return image
+
+    @property
+    def key(self) -> str:
+        return self._key
+
+    @property
+    def resolved(self) -> bool:
+        return bool(self.base64)
+
+    @property
+    def blob_handle(self) -> str:
+        """Handle of the image in the blob store, empty until `store()` was called"""
+        return self._blob
+
+    async def get_bytes(self) -> typing.Tuple[bytes, str]:
+        if self._blob:
+            try:
+                return await blobstore.store.get(self._blob)
+            except blobstore.BlobNotFoundError:
+                pass
+        if self.base64 or self._fetcher is None:
+            if self.base64:
+                mime_type, _, data = self.base64[len('data:') :].partition(';base64,')
+                return base64.b64decode(data), mime_type
+            return await super().get_bytes()
+        if not self._used:
+            self._used = True
+            cache.used += 1
+        return await cache.get(self._key, self._fetcher)
+
+    async def resolve(self) -> str:
+        """Fetch the image if needed and return it as a data URI"""
+        if not self.base64:
+            data, mime_type = await self.get_bytes()
+            self.base64 = f'data:{mime_type};base64,{base64.b64encode(data).decode()}'
+        return self.base64
+
+    async def store(self) -> str:
+        """Fetch the image if needed, keep its bytes in the blob store and return the handle"""
+        if not self._blob:
+            data, mime_type = await self.get_bytes()
+            self._blob = await blobstore.store.put(data, mime_type)
+        return self._blob
+
+
+def iter_lazy_images(
+    message_chain: typing.Iterable[platform_message.MessageComponent], resolved: bool = False
+) -> typing.Iterator[LazyImage]:
+    """Unresolved lazy images of a message chain, including quoted messages, all of them if `resolved`"""
+    for component in message_chain:
+        if isinstance(component, LazyImage):
+            if resolved or not component.resolved:
+                yield component
+        elif isinstance(component, platform_message.Quote) and component.origin:
+            yield from iter_lazy_images(component.origin, resolved)
+        elif isinstance(component, platform_message.Forward):
+            for node in component.node_list or []:
+                if node.message_chain:
+                    yield from iter_lazy_images(node.message_chain, resolved)
+
+
+async def resolve_chain(
+    message_chain: typing.Iterable[platform_message.MessageComponent],
+) -> list[BaseException]:
+    """Resolve all lazy images of a message chain concurrently, returns the errors of those that failed"""
+    images = list(iter_lazy_images(message_chain))
+    if not images:
+        return []
+    results = await asyncio.gather(*(image.resolve() for image in images), return_exceptions=True)
+    return [result for result in results if isinstance(result, BaseException)]
+
+
+async def store_chain(
+    message_chain: typing.Iterable[platform_message.MessageComponent],
+) -> list[BaseException]:
+    """Put the lazy images of a message chain in the blob store concurrently, returns the errors of those that failed"""
+    images = [image for image in iter_lazy_images(message_chain, resolved=True) if not image.blob_handle]
+    if not images:
+        return []
+    results = await asyncio.gather(*(image.store() for image in images), return_exceptions=True)
+    return [result for result in results if isinstance(result, BaseException)]
+
+
+def image_content(image: platform_message.Image) -> str:
+    """What the prompt carries for an image: its blob handle if it has one, otherwise its data URI"""
+    if isinstance(image, LazyImage) and image.blob_handle:
+        return image.blob_handle
+    return image.base64
@@ -1,6 +1,8 @@
 import importlib
 import importlib.resources
 import os
+import subprocess
+import sys
 import typing
 
 
@@ -47,3 +49,33 @@ def read_resource_file_bytes(resource_path: str) -> bytes:
 
 def list_resource_files(resource_path: str) -> list[str]:
     return [f.name for f in importlib.resources.files('langbot').joinpath(resource_path).iterdir()]
+
+
+def import_time_report(modules: typing.List[str], limit: int = 30) -> typing.List[typing.Dict[str, typing.Any]]:
+    """Import modules in a fresh interpreter with `-X importtime` and return the slowest imports.
+
+    Each entry has `module`, `self_us` and `cumulative_us`, sorted by cumulative time.
+    The first entry is the total of the top-level imports, named `<total>`.
+    """
+    code = '; '.join(f'import {module}' for module in modules)
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f'Failed to import {modules}: {proc.stderr.strip().splitlines()[-1:]}')
+
+    entries = []
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:') :].split('|')
+        entry = {'module': name.strip(), 'self_us': int(self_us), 'cumulative_us': int(cumulative_us)}
+        if not name[1:].startswith(' '):  # top-level import, the names of nested imports are indented
+            total_us += entry['cumulative_us']
+        entries.append(entry)
+
+    entries.sort(key=lambda entry: entry['cumulative_us'], reverse=True)
+    return [{'module': '<total>', 'self_us': 0, 'cumulative_us': total_us}] + entries[:limit]
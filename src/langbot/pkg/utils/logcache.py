@@ -1,63 +1,57 @@
 from __future__ import annotations
 
+import threading
+
 
 LOG_PAGE_SIZE = 20
 MAX_CACHED_PAGES = 10
 
 
-class LogPage:
-    """日志页"""
-
-    number: int
-    """页码"""
-
-    logs: list[str]
-
-    def __init__(self, number: int):
-        self.number = number
-        self.logs = []
+class LogCache:
+    """由于 logger 是同步的，但实例中的数据库操作是异步的；
+    同时，持久化的日志信息已经写入文件了，故做一个缓存来为前端提供日志查询服务
 
-    def add_log(self, log: str) -> bool:
-        """添加日志
+    日志按序号存放在定长环形列表中，序号为 seq 的日志位于 `seq % capacity`，
+    前端的 (页码, 偏移量) 指针即序号 `页码 * LOG_PAGE_SIZE + 偏移量`，可直接换算为下标。
+    日志由日志线程写入，故读写均加锁。
+    """
 
-        Returns:
-            bool: 是否已满
-        """
-        self.logs.append(log)
-        return len(self.logs) >= LOG_PAGE_SIZE
+    capacity: int
 
+    _ring: list[str | None]
 
-class LogCache:
-    """由于 logger 是同步的，但实例中的数据库操作是异步的；
-    同时，持久化的日志信息已经写入文件了，故做一个缓存来为前端提供日志查询服务"""
+    total: int
+    """已添加的日志总数，即下一条日志的序号"""
 
-    log_pages: list[LogPage] = []
-    """从前到后，越新的日志页越靠后"""
+    def __init__(self, capacity: int = LOG_PAGE_SIZE * MAX_CACHED_PAGES):
+        self.capacity = max(capacity, 1)
+        self._ring = [None] * self.capacity
+        self.total = 0
+        self.lock = threading.Lock()
 
-    def __init__(self):
-        self.log_pages = []
-        self.log_pages.append(LogPage(number=0))
+    @property
+    def logs(self) -> list[str]:
+        """缓存中的日志，从前到后，越新的日志越靠后"""
+        with self.lock:
+            return [self._ring[seq % self.capacity] for seq in range(max(0, self.total - self.capacity), self.total)]
 
     def add_log(self, log: str):
         """添加日志"""
-        if self.log_pages[-1].add_log(log):
-            self.log_pages.append(LogPage(number=self.log_pages[-1].number + 1))
-
-            if len(self.log_pages) > MAX_CACHED_PAGES:
-                self.log_pages.pop(0)
+        with self.lock:
+            self._ring[self.total % self.capacity] = log
+            self.total += 1
 
     def get_log_by_pointer(
         self,
         start_page_number: int,
         start_offset: int,
     ) -> tuple[str, int, int]:
-        """获取指定页码和偏移量的日志"""
-        final_logs_str = ''
+        """获取指定页码和偏移量之后的日志，并返回最新日志之后的页码和偏移量"""
+        start = start_page_number * LOG_PAGE_SIZE + start_offset
 
-        for page in self.log_pages:
-            if page.number == start_page_number:
-                final_logs_str += '\n'.join(page.logs[start_offset:])
-            elif page.number > start_page_number:
-                final_logs_str += '\n'.join(page.logs)
+        with self.lock:
+            total = self.total
+            start = max(start, total - self.capacity, 0)
+            final_logs_str = '\n'.join([self._ring[seq % self.capacity] for seq in range(start, total)])
 
-        return final_logs_str, page.number, len(page.logs)
+        return final_logs_str, total // LOG_PAGE_SIZE, total % LOG_PAGE_SIZE
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import time
+import typing
+
+
+DEFAULT_TTL = 60.0
+"""Seconds a message id is remembered, longer than platforms keep retrying a callback"""
+
+T = typing.TypeVar('T')
+
+
+class _Pending(typing.Generic[T]):
+    __slots__ = ('future', 'attempts', 'expires_at')
+
+    future: asyncio.Future[T]
+
+    attempts: int
+
+    expires_at: float
+
+    def __init__(self, ttl: float):
+        self.future = asyncio.get_running_loop().create_future()
+        self.attempts = 0
+        self.expires_at = time.monotonic() + ttl
+
+
+class PendingReplies(typing.Generic[T]):
+    """Hands the reply the pipeline produced for a message to the callback request waiting for it.
+
+    Platforms such as the WeChat Official Account expect the reply in the response of their callback, and
+    retry the same message id when it takes too long. Each message id gets one future shared by all its
+    callbacks, so they wake as soon as the reply is set, and a reply set while no callback is waiting is
+    kept for the next retry. Message ids are forgotten `ttl` seconds after they are first seen.
+    """
+
+    ttl: float
+
+    _entries: collections.OrderedDict[typing.Hashable, _Pending[T]]
+
+    def __init__(self, ttl: float = DEFAULT_TTL):
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _prune(self):
+        now = time.monotonic()
+        entries = self._entries
+        while entries:
+            key, entry = next(iter(entries.items()))
+            if entry.expires_at > now:
+                break
+            del entries[key]
+
+    def _get(self, key: typing.Hashable) -> _Pending[T]:
+        self._prune()
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _Pending(self.ttl)
+        return entry
+
+    def attempt(self, key: typing.Hashable) -> int:
+        """Record a callback for the message, returns how many have been received including this one"""
+        entry = self._get(key)
+        entry.attempts += 1
+        return entry.attempts
+
+    def attempts(self, key: typing.Hashable) -> int:
+        entry = self._entries.get(key)
+        return entry.attempts if entry is not None else 0
+
+    def set_result(self, key: typing.Hashable, value: T):
+        """Set the reply of the message, replacing one no callback has taken yet"""
+        entry = self._get(key)
+        if entry.future.done():
+            entry.future = asyncio.get_running_loop().create_future()
+        entry.future.set_result(value)
+
+    def take(self, key: typing.Hashable) -> T | None:
+        """Take the reply of the message if it is set, without waiting"""
+        entry = self._entries.get(key)
+        if entry is None or not entry.future.done():
+            return None
+        value = entry.future.result()
+        # keep the message id so later retries are still recognized
+        entry.future = asyncio.get_running_loop().create_future()
+        return value
+
+    async def wait(self, key: typing.Hashable, timeout: float) -> T | None:
+        """Wait up to `timeout` seconds for the reply of the message and take it, None if it did not arrive"""
+        future = self._get(key).future
+        if not future.done():
+            if timeout <= 0:
+                return None
+            try:
+                await asyncio.wait_for(asyncio.shield(future), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self.take(key)
@@ -2,8 +2,6 @@ from __future__ import annotations
 
 from ..core import app
 from .vdb import VectorDatabase
-from .vdbs.chroma import ChromaVectorDatabase
-from .vdbs.qdrant import QdrantVectorDatabase
 
 
 class VectorDBManager:
@@ -14,17 +12,26 @@ class VectorDBManager:
         self.ap = ap
 
     async def initialize(self):
+        # backends are imported here, chromadb and qdrant_client are slow to import and only one is used
         kb_config = self.ap.instance_config.data.get('vdb')
         if kb_config:
             if kb_config.get('use') == 'chroma':
+                from .vdbs.chroma import ChromaVectorDatabase
+
                 self.vector_db = ChromaVectorDatabase(self.ap)
                 self.ap.logger.info('Initialized Chroma vector database backend.')
             elif kb_config.get('use') == 'qdrant':
+                from .vdbs.qdrant import QdrantVectorDatabase
+
                 self.vector_db = QdrantVectorDatabase(self.ap)
                 self.ap.logger.info('Initialized Qdrant vector database backend.')
             else:
+                from .vdbs.chroma import ChromaVectorDatabase
+
                 self.vector_db = ChromaVectorDatabase(self.ap)
                 self.ap.logger.warning('No valid vector database backend configured, defaulting to Chroma.')
         else:
+            from .vdbs.chroma import ChromaVectorDatabase
+
             self.vector_db = ChromaVectorDatabase(self.ap)
             self.ap.logger.warning('No vector database backend configured, defaulting to Chroma.')
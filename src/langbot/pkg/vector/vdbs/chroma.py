@@ -1,6 +1,8 @@
 from __future__ import annotations
 import asyncio
-from typing import Any
+import concurrent.futures
+import functools
+from typing import Any, Callable
 from chromadb import PersistentClient
 from langbot.pkg.vector.vdb import VectorDatabase
 from langbot.pkg.core import app
@@ -13,12 +15,21 @@ class ChromaVectorDatabase(VectorDatabase):
         self.ap = ap
         self.client = PersistentClient(path=base_path)
         self._collections = {}
+        self.batch_size = min(
+            int(self.ap.instance_config.data.get('vdb', {}).get('batch_size', 256)), self.client.get_max_batch_size()
+        )
+        # Chroma's embedded client is synchronous and serialises writes internally; a dedicated
+        # thread keeps it from occupying the default executor shared by the rest of the app
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='chroma')
+
+    async def _run(self, func: Callable, *args, **kwargs) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs)
+        )
 
     async def get_or_create_collection(self, collection: str) -> chromadb.Collection:
         if collection not in self._collections:
-            self._collections[collection] = await asyncio.to_thread(
-                self.client.get_or_create_collection, name=collection
-            )
+            self._collections[collection] = await self._run(self.client.get_or_create_collection, name=collection)
             self.ap.logger.info(f"Chroma collection '{collection}' accessed/created.")
         return self._collections[collection]
 
@@ -30,12 +41,16 @@ class ChromaVectorDatabase(VectorDatabase):
         metadatas: list[dict[str, Any]],
     ) -> None:
         col = await self.get_or_create_collection(collection)
-        await asyncio.to_thread(col.add, embeddings=embeddings_list, ids=ids, metadatas=metadatas)
+        for start in range(0, len(ids), self.batch_size):
+            end = start + self.batch_size
+            await self._run(
+                col.add, embeddings=embeddings_list[start:end], ids=ids[start:end], metadatas=metadatas[start:end]
+            )
         self.ap.logger.info(f"Added {len(ids)} embeddings to Chroma collection '{collection}'.")
 
     async def search(self, collection: str, query_embedding: list[float], k: int = 5) -> dict[str, Any]:
         col = await self.get_or_create_collection(collection)
-        results = await asyncio.to_thread(
+        results = await self._run(
             col.query,
             query_embeddings=query_embedding,
             n_results=k,
@@ -46,7 +61,7 @@ class ChromaVectorDatabase(VectorDatabase):
 
     async def delete_by_file_id(self, collection: str, file_id: str) -> None:
         col = await self.get_or_create_collection(collection)
-        await asyncio.to_thread(col.delete, where={'file_id': file_id})
+        await self._run(col.delete, where={'file_id': file_id})
         self.ap.logger.info(f"Deleted embeddings from Chroma collection '{collection}' with file_id: {file_id}")
 
     async def delete_collection(self, collection: str):
@@ -54,7 +69,7 @@ class ChromaVectorDatabase(VectorDatabase):
             del self._collections[collection]
 
         try:
-            await asyncio.to_thread(self.client.delete_collection, name=collection)
+            await self._run(self.client.delete_collection, name=collection)
         except chromadb.errors.NotFoundError:
             self.ap.logger.warning(f"Chroma collection '{collection}' not found.")
             return
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 from typing import Any, Dict, List
 
 from qdrant_client import AsyncQdrantClient, models
@@ -14,11 +15,18 @@ class QdrantVectorDatabase(VectorDatabase):
         host = self.ap.instance_config.data['vdb']['qdrant']['host']
         port = self.ap.instance_config.data['vdb']['qdrant']['port']
         api_key = self.ap.instance_config.data['vdb']['qdrant']['api_key']
+        prefer_grpc = self.ap.instance_config.data['vdb']['qdrant'].get('prefer_grpc', False)
+        grpc_port = self.ap.instance_config.data['vdb']['qdrant'].get('grpc_port', 6334)
+
+        self.batch_size = int(self.ap.instance_config.data['vdb'].get('batch_size', 256))
+        self.parallel = int(self.ap.instance_config.data['vdb']['qdrant'].get('parallel', 4))
 
         if url:
-            self.client = AsyncQdrantClient(url=url, api_key=api_key)
+            self.client = AsyncQdrantClient(url=url, api_key=api_key, prefer_grpc=prefer_grpc, grpc_port=grpc_port)
         else:
-            self.client = AsyncQdrantClient(host=host, port=int(port), api_key=api_key)
+            self.client = AsyncQdrantClient(
+                host=host, port=int(port), api_key=api_key, prefer_grpc=prefer_grpc, grpc_port=int(grpc_port)
+            )
 
         self._collections: set[str] = set()
 
@@ -54,10 +62,22 @@ class QdrantVectorDatabase(VectorDatabase):
 
         await self._ensure_collection(collection, len(embeddings_list[0]))
 
-        points = [
-            models.PointStruct(id=ids[i], vector=embeddings_list[i], payload=metadatas[i]) for i in range(len(ids))
-        ]
-        await self.client.upsert(collection_name=collection, points=points)
+        # At most `parallel` batches are built and in flight at a time. All but the last batch
+        # return once Qdrant has written them to its WAL (wait=False); the last one waits until
+        # it is applied, and since updates are applied in WAL order, so are all earlier batches.
+        semaphore = asyncio.Semaphore(self.parallel)
+
+        async def upsert_batch(start: int, wait: bool):
+            async with semaphore:
+                points = [
+                    models.PointStruct(id=ids[i], vector=embeddings_list[i], payload=metadatas[i])
+                    for i in range(start, min(start + self.batch_size, len(ids)))
+                ]
+                await self.client.upsert(collection_name=collection, points=points, wait=wait)
+
+        starts = list(range(0, len(ids), self.batch_size))
+        await asyncio.gather(*[upsert_batch(start, wait=False) for start in starts[:-1]])
+        await upsert_batch(starts[-1], wait=True)
         self.ap.logger.info(f"Added {len(ids)} embeddings to Qdrant collection '{collection}'.")
 
     async def search(self, collection: str, query_embedding: list[float], k: int = 5) -> dict[str, Any]:
@@ -0,0 +1,7 @@
+"""
+Load tests of the message pipeline.
+
+A real LangBot application is booted in a temporary data directory, with a fake platform adapter
+injecting messages, a fake OpenAI-compatible server answering model requests and a stub in place
+of the plugin runtime, so no external service is needed. See `__main__.py` for usage.
+"""
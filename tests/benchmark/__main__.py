@@ -0,0 +1,144 @@
+"""
+Benchmark command line.
+
+    python -m tests.benchmark list
+    python -m tests.benchmark run [scenario ...] [--output results.json] [--baseline baseline.json]
+    python -m tests.benchmark compare baseline.json results.json
+
+Each scenario runs in its own process with a fresh data directory, so results do not depend on
+the order they run in. With `--baseline`, or with `compare`, the exit code is 1 when a metric is
+worse than the baseline by more than `--threshold`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from . import harness, report
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def run_in_subprocess(scenario: str, verbose: bool, keep: bool) -> dict:
+    work_dir = tempfile.mkdtemp(prefix='langbot-bench-')
+    result_path = os.path.join(work_dir, 'result.json')
+    command = [sys.executable, '-m', 'tests.benchmark', 'scenario', scenario, work_dir, result_path]
+    if verbose:
+        command.append('--verbose')
+    try:
+        subprocess.run(command, cwd=REPO_ROOT, check=True, stdout=None if verbose else subprocess.DEVNULL)
+        with open(result_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    finally:
+        if not keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def print_comparison(baseline: dict[str, dict], results: list[dict], threshold: float) -> bool:
+    """Print the comparison of every scenario present in both, return whether any metric regressed"""
+    regressed = False
+    for result in results:
+        if result['scenario'] not in baseline:
+            print(f'scenario {result["scenario"]}: not in baseline')
+            continue
+        rows = report.compare(baseline[result['scenario']], result, threshold)
+        print(report.format_comparison(result['scenario'], rows))
+        regressed = regressed or any(row['regression'] for row in rows)
+    return regressed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m tests.benchmark', description='LangBot message pipeline benchmarks'
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('list', help='List bundled scenarios')
+
+    run_parser = commands.add_parser('run', help='Run scenarios, all bundled ones by default')
+    run_parser.add_argument('scenarios', nargs='*', help='Scenario names or paths to scenario files')
+    run_parser.add_argument('--output', help='Write results to this JSON file')
+    run_parser.add_argument('--baseline', help='Compare against results written by an earlier run')
+    run_parser.add_argument('--threshold', type=float, default=0.1, help='Allowed relative regression (0.1 = 10%%)')
+    run_parser.add_argument('--verbose', action='store_true', help='Show LangBot logs')
+    run_parser.add_argument('--keep-work-dir', action='store_true', help='Keep the data directory of each run')
+
+    compare_parser = commands.add_parser('compare', help='Compare two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.1)
+
+    scenario_parser = commands.add_parser('scenario', help=argparse.SUPPRESS)
+    scenario_parser.add_argument('scenario')
+    scenario_parser.add_argument('work_dir')
+    scenario_parser.add_argument('result_path')
+    scenario_parser.add_argument('--verbose', action='store_true')
+
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        for name in harness.list_scenarios():
+            print(f'{name:<12} {harness.load_scenario(name)["description"]}')
+        return 0
+
+    if args.command == 'scenario':
+        # runs in the child process started by `run`
+        result = asyncio.run(harness.run_scenario(harness.load_scenario(args.scenario), args.work_dir, args.verbose))
+        with open(args.result_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        # application tasks are not shut down one by one
+        sys.stdout.flush()
+        os._exit(0)
+
+    if args.command == 'compare':
+        baseline = report.load_results(args.baseline)
+        results = list(report.load_results(args.current).values())
+        return 1 if print_comparison(baseline, results, args.threshold) else 0
+
+    results = []
+    for scenario in args.scenarios or harness.list_scenarios():
+        print(f'running {scenario}...', flush=True)
+        result = run_in_subprocess(scenario, args.verbose, args.keep_work_dir)
+        print(report.format_result(result), flush=True)
+        results.append(result)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(
+                {
+                    'revision': git_revision(),
+                    'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                    'python': platform.python_version(),
+                    'platform': platform.platform(),
+                    'results': results,
+                },
+                f,
+                indent=2,
+            )
+
+    if args.baseline:
+        return 1 if print_comparison(report.load_results(args.baseline), results, args.threshold) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+Memory and serialisation cost of image messages, with images inlined as base64 or kept in the blob store.
+
+    python -m tests.benchmark.blob_payloads [--messages 50] [--image-kb 200] [--turns 10]
+
+Each message is one platform image turned into a prompt the way `PreProcessor` does it, and kept in a
+conversation like the chat handler does.
+
+- inline: the image is resolved to a data URI, the message chain and the prompt carry the base64 string
+- blob: the image bytes are put in the blob store, the prompt carries the handle
+
+`retained_kb_per_message` is the memory still allocated per message once all of them were built.
+`dump_ms` is a `model_dump` and JSON encoding of the conversation's last `--turns` messages plus its message
+chain, as every plugin event does, and `request_ms` builds and encodes the request of the last message to a
+model from its history.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+
+async def build(mode: str, count: int, image_bytes: int) -> list:
+    import langbot_plugin.api.entities.builtin.platform.message as platform_message
+    import langbot_plugin.api.entities.builtin.provider.message as provider_message
+
+    from langbot.pkg.utils import imageref
+
+    conversation = []
+    for index in range(count):
+
+        async def fetch():
+            return os.urandom(image_bytes), 'image/jpeg'
+
+        image = imageref.LazyImage.create(f'bench-{index}', fetch, url=f'https://img/{index}')
+        if mode == 'inline':
+            await image.resolve()
+        else:
+            await image.store()
+        chain = platform_message.MessageChain([platform_message.Plain(text='what is this?'), image])
+        content = [
+            provider_message.ContentElement.from_text('what is this?'),
+            provider_message.ContentElement.from_image_base64(imageref.image_content(image)),
+        ]
+        conversation.append((chain, provider_message.Message(role='user', content=content)))
+    imageref.cache.clear()
+    return conversation
+
+
+async def measure(mode: str, count: int, image_bytes: int, turns: int) -> dict:
+    from langbot.pkg.utils import blobstore, imageref
+
+    blobstore.store = blobstore.BlobStore(max_bytes=count * image_bytes * 2)
+    imageref.cache = imageref.ImageCache(max_bytes=count * image_bytes * 2)
+
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    conversation = await build(mode, count, image_bytes)
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    chain, _ = conversation[-1]
+    history = [message for _, message in conversation[-turns:]]
+
+    started_at = time.perf_counter()
+    dump = {
+        'message_chain': chain.model_dump(),
+        'prompt': [message.model_dump() for message in history],
+    }
+    dump_kb = len(json.dumps(await blobstore.encode_dump(dump))) / 1024
+    dump_s = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    request = [message.model_dump(exclude_none=True) for message in await blobstore.encode_messages(history)]
+    json.dumps(request)
+    request_s = time.perf_counter() - started_at
+
+    return {
+        'mode': mode,
+        'messages': count,
+        'image_kb': image_bytes // 1024,
+        'retained_kb_per_message': round(retained / count / 1024, 1),
+        'dump_ms': round(dump_s * 1000, 2),
+        'dump_kb': round(dump_kb, 1),
+        'request_ms': round(request_s * 1000, 2),
+        'request_images': sum(len(message['content']) - 1 for message in request),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m tests.benchmark.blob_payloads')
+    parser.add_argument('--messages', type=int, default=50)
+    parser.add_argument('--image-kb', type=int, default=200)
+    parser.add_argument('--turns', type=int, default=10)
+    parser.add_argument('--output', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    import langbot.pkg.core.app  # noqa: F401, imports the utils' dependencies in a working order
+
+    results = [
+        asyncio.run(measure(mode, args.messages, args.image_kb * 1024, args.turns)) for mode in ('inline', 'blob')
+    ]
+    for result in results:
+        print(json.dumps(result), flush=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""
+Time to ready of an instance with many bots and models.
+
+    python -m tests.benchmark.boot_time [--bots 50] [--models 100] [--latency-ms 0 30] [--runs 3]
+
+A data directory is seeded with `--bots` Telegram bots and `--models` OpenAI models, then `make_app` is timed in
+fresh processes. The requester of every model makes one GET to a local stub server in `initialize()`, which
+answers after `--latency-ms`, like a requester that checks its endpoint or fetches a token at startup. The imports
+of the application and of the requester module are done before the clock starts.
+
+- graph: the managers are initialised by the boot graph and load their bots and models concurrently
+- sequential: the boot graph steps run one after the other and the models wait for each other's GET, as boot
+  worked before the boot graph
+
+`elapsed_s` is the time `make_app` took, `boot_graph_s` the part spent in the boot graph.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+
+async def seed(bots: int, models: int):
+    import sqlalchemy
+    import yaml
+
+    from langbot.pkg.core import boot
+    from langbot.pkg.core.bootutils import files
+    from langbot.pkg.entity.persistence import bot as persistence_bot
+    from langbot.pkg.entity.persistence import model as persistence_model
+
+    await files.generate_files()
+    with open('data/config.yaml', 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    config['plugin']['enable'] = False
+    with open('data/config.yaml', 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f)
+
+    ap = await boot.make_app(asyncio.get_running_loop())
+    await ap.persistence_mgr.execute_async(
+        sqlalchemy.insert(persistence_bot.Bot).values(
+            [
+                {
+                    'uuid': str(uuid.uuid4()),
+                    'name': f'bench-{index}',
+                    'description': '',
+                    'adapter': 'telegram',
+                    'adapter_config': {'token': f'{100000 + index}:bench', 'markdown_card': False},
+                    'enable': True,
+                }
+                for index in range(bots)
+            ]
+        )
+    )
+    await ap.persistence_mgr.execute_async(
+        sqlalchemy.insert(persistence_model.LLMModel).values(
+            [
+                {
+                    'uuid': str(uuid.uuid4()),
+                    'name': f'bench-{index}',
+                    'description': '',
+                    'requester': 'openai-chat-completions',
+                    'requester_config': {'base_url': 'http://127.0.0.1:1/v1', 'timeout': 120},
+                    'api_keys': ['sk-bench'],
+                }
+                for index in range(models)
+            ]
+        )
+    )
+
+
+async def boot_once(mode: str, latency_ms: int) -> dict:
+    import aiohttp
+    from aiohttp import web
+
+    from langbot.pkg.core import boot, bootgraph
+    from langbot.pkg.provider.modelmgr.requesters import chatcmpl
+
+    async def handle(request: web.Request) -> web.Response:
+        await asyncio.sleep(latency_ms / 1000)
+        return web.json_response({'object': 'list', 'data': []})
+
+    app = web.Application()
+    app.router.add_get('/v1/models', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    stub_url = f'http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/v1/models'
+
+    session = aiohttp.ClientSession()
+    get_lock = asyncio.Lock() if mode == 'sequential' else None
+    requester_initialize = chatcmpl.OpenAIChatCompletions.initialize
+
+    # the requester builds its client with an empty key, which recent openai releases refuse
+    client_class = chatcmpl.openai.AsyncClient
+    chatcmpl.openai.AsyncClient = lambda **kwargs: client_class(
+        **{**kwargs, 'api_key': kwargs['api_key'] or 'sk-bench'}
+    )
+
+    async def initialize(self):
+        await requester_initialize(self)
+        if get_lock is None:
+            async with session.get(stub_url) as resp:
+                await resp.read()
+        else:
+            async with get_lock, session.get(stub_url) as resp:
+                await resp.read()
+
+    chatcmpl.OpenAIChatCompletions.initialize = initialize
+
+    graphs: list[bootgraph.BootGraph] = []
+    graph_run = bootgraph.BootGraph.run
+
+    async def run_sequentially(self):
+        self.check()
+        started_at = time.perf_counter()
+        for step in self.steps.values():
+            step.started_at = time.perf_counter() - started_at
+            await step.func()
+            step.finished_at = time.perf_counter() - started_at
+        self.total = time.perf_counter() - started_at
+
+    async def run(self):
+        graphs.append(self)
+        await (run_sequentially(self) if mode == 'sequential' else graph_run(self))
+
+    bootgraph.BootGraph.run = run
+
+    started_at = time.perf_counter()
+    ap = await boot.make_app(asyncio.get_running_loop())
+    elapsed = time.perf_counter() - started_at
+
+    result = {
+        'mode': mode,
+        'latency_ms': latency_ms,
+        'bots': len(ap.platform_mgr.bots),
+        'models': len(ap.model_mgr.llm_models),
+        'elapsed_s': round(elapsed, 2),
+        'boot_graph_s': round(sum(graph.total for graph in graphs), 2),
+    }
+    await session.close()
+    await runner.cleanup()
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m tests.benchmark.boot_time')
+    parser.add_argument('--bots', type=int, default=50)
+    parser.add_argument('--models', type=int, default=100)
+    parser.add_argument('--latency-ms', type=int, nargs='+', default=[0, 30])
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--mode', choices=['seed', 'graph', 'sequential'], help='Run one step in this process')
+    parser.add_argument('--output', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    if args.mode:
+        import langbot.pkg.core.app  # noqa: F401, imports the application's dependencies in a working order
+
+        logging.disable(logging.WARNING)
+        if args.mode == 'seed':
+            asyncio.run(seed(args.bots, args.models))
+        else:
+            print(json.dumps(asyncio.run(boot_once(args.mode, args.latency_ms[0]))), flush=True)
+        # the application leaves background tasks and threads behind, it is not meant to be torn down
+        sys.stdout.flush()
+        os._exit(0)
+
+    work_dir = tempfile.mkdtemp(prefix='langbot-bench-boot-')
+    repo_dir = os.getcwd()
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [repo_dir, os.environ.get('PYTHONPATH')]))}
+
+    def child(*child_args: str) -> str:
+        return subprocess.run(
+            [sys.executable, '-m', 'tests.benchmark.boot_time', *child_args],
+            cwd=work_dir,
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+
+    results = []
+    try:
+        child('--mode', 'seed', '--bots', str(args.bots), '--models', str(args.models))
+        for latency_ms in args.latency_ms:
+            for mode in ('sequential', 'graph'):
+                runs = [
+                    json.loads(child('--mode', mode, '--latency-ms', str(latency_ms)).strip().splitlines()[-1])
+                    for _ in range(args.runs)
+                ]
+                elapsed = sorted(run['elapsed_s'] for run in runs)
+                result = {
+                    **runs[-1],
+                    'runs': len(runs),
+                    'elapsed_min_s': elapsed[0],
+                    'elapsed_max_s': elapsed[-1],
+                }
+                del result['elapsed_s']
+                results.append(result)
+                print(json.dumps(result), flush=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""
+Image downloads of a busy QQ group, converted by the aiocqhttp message converter.
+
+    python -m tests.benchmark.busy_group [--messages 300] [--interval-ms 5] [--image-kb 150] [--latency-ms 30]
+                                         [--pipeline-ratio 0.1]
+
+`--messages` messages with one image each arrive every `--interval-ms` and are converted as the adapter does.
+The images are served by an HTTP server in another process after `--latency-ms`. One in 1 / `--pipeline-ratio`
+messages passes the respond rules and reaches the pipeline, which needs its image; the others are dropped.
+
+- eager: the converter downloads the images before the query is queued, as converters did before lazy images
+- lazy: the converter builds lazy images, the pipeline downloads the images of the messages that reach it
+
+`converter_*` is the time the converter took per message, `image_ready_*` the time from the arrival of a message
+that reaches the pipeline until its image bytes are available.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+
+from . import report
+
+
+class ImageServer:
+    """Serves the images from its own process, so that serving them takes no CPU from the converter's event loop"""
+
+    def __init__(self, image_kb: int, latency_ms: int):
+        self.image_kb = image_kb
+        self.latency_ms = latency_ms
+        self.process: multiprocessing.Process | None = None
+        self.base_url = ''
+
+    @staticmethod
+    def serve(image_kb: int, latency_ms: int, conn):
+        image = b'\xff\xd8\xff' + bytes(image_kb * 1024 - 3)
+        stats = {'requests': 0, 'sent_bytes': 0}
+
+        async def download(request: web.Request) -> web.Response:
+            stats['requests'] += 1
+            await asyncio.sleep(latency_ms / 1000)
+            stats['sent_bytes'] += len(image)
+            return web.Response(body=image, content_type='image/jpeg')
+
+        async def get_stats(request: web.Request) -> web.Response:
+            return web.json_response(stats)
+
+        async def run():
+            app = web.Application()
+            app.router.add_get('/download/{name}', download)
+            app.router.add_get('/stats', get_stats)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, '127.0.0.1', 0)
+            await site.start()
+            conn.send(site._server.sockets[0].getsockname()[1])
+            await asyncio.Event().wait()
+
+        asyncio.run(run())
+
+    def start(self):
+        parent_conn, child_conn = multiprocessing.get_context('spawn').Pipe()
+        self.process = multiprocessing.get_context('spawn').Process(
+            target=self.serve, args=(self.image_kb, self.latency_ms, child_conn), daemon=True
+        )
+        self.process.start()
+        self.base_url = f'http://127.0.0.1:{parent_conn.recv()}'
+
+    async def stop(self) -> dict:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f'{self.base_url}/stats') as resp:
+                stats = await resp.json()
+        self.process.terminate()
+        return stats
+
+
+async def measure(mode: str, args) -> dict:
+    from langbot.pkg.platform.sources.aiocqhttp import AiocqhttpMessageConverter
+    from langbot.pkg.utils import imageref
+
+    imageref.cache = imageref.ImageCache()
+    server = ImageServer(args.image_kb, args.latency_ms)
+    server.start()
+
+    converter_times: list[float] = []
+    ready_times: list[float] = []
+    every = max(1, round(1 / args.pipeline_ratio))
+
+    async def receive(index: int):
+        received_at = time.perf_counter()
+        message = (
+            f'[CQ:image,file={index}.jpg,url={server.base_url}/download/{index}.jpg?rkey=bench&fileid={index}] '
+            f'look at this {index}'
+        )
+        chain = await AiocqhttpMessageConverter.target2yiri(message, index)
+        if mode == 'eager':
+            await imageref.resolve_chain(chain)
+        converter_times.append(time.perf_counter() - received_at)
+
+        if index % every == 0:
+            errors = await imageref.resolve_chain(chain)
+            assert not errors, errors
+            ready_times.append(time.perf_counter() - received_at)
+
+    tasks = []
+    started_at = time.perf_counter()
+    for index in range(args.messages):
+        tasks.append(asyncio.create_task(receive(index)))
+        await asyncio.sleep(max(0.0, started_at + (index + 1) * args.interval_ms / 1000 - time.perf_counter()))
+    await asyncio.gather(*tasks)
+    stats = await server.stop()
+
+    return {
+        'mode': mode,
+        'messages': args.messages,
+        'reached_pipeline': len(ready_times),
+        'downloads': stats['requests'],
+        'downloaded_mb': round(stats['sent_bytes'] / 1024 / 1024, 1),
+        **report.summarize_latencies('converter', converter_times),
+        **report.summarize_latencies('image_ready', ready_times),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m tests.benchmark.busy_group')
+    parser.add_argument('--messages', type=int, default=300)
+    parser.add_argument('--interval-ms', type=float, default=5)
+    parser.add_argument('--image-kb', type=int, default=150)
+    parser.add_argument('--latency-ms', type=int, default=30)
+    parser.add_argument('--pipeline-ratio', type=float, default=0.1)
+    parser.add_argument('--output', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    import langbot.pkg.core.app  # noqa: F401, imports the adapters' dependencies in a working order
+
+    results = [asyncio.run(measure(mode, args)) for mode in ('eager', 'lazy')]
+    for result in results:
+        print(json.dumps(result), flush=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
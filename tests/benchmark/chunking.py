@@ -0,0 +1,122 @@
+"""
+Throughput of the knowledge base chunker and the size of the chunks it makes, in tokens.
+
+    python -m tests.benchmark.chunking [--pages 200] [--chunk-size 256] [--chunk-overlap 32] [--rounds 5]
+
+Two synthetic documents are chunked section by section, the way `chunk_sections` gets them from the parser:
+
+- en: `--pages` pages of English text, with a heading, a table and a code fence every fifth page
+- cjk: `--pages` sections of Chinese paragraphs
+
+- tokens: the chunker, `--chunk-size` and `--chunk-overlap` in tokens
+- chars: the splitter the chunker replaced, `RecursiveCharacterTextSplitter` with 500 / 50 characters
+
+Chunk sizes are counted with the tokenizer the chunker uses, `tiktoken` or the approximate counter when the
+encoding cannot be loaded (`tokenizer` in the results).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+
+from . import report
+
+
+def english(pages: int) -> list[str]:
+    sections = []
+    for page in range(pages):
+        lines = [
+            f'The bench product ships feature {page * 20 + line}, configured through option {line} and documented '
+            f'in chapter {page}. It is enabled by default and can be turned off per deployment.'
+            for line in range(20)
+        ]
+        if page % 5 == 0:
+            lines = [f'# Chapter {page}', '', *lines[:10], '', 'option | default | description', '--- | --- | ---']
+            lines += [f'option_{i} | {i} | what option {i} does' for i in range(8)]
+            lines += ['', '```python', *(f'config.set("option_{i}", {i})' for i in range(10)), '```', '']
+        sections.append('\n'.join(lines))
+    return sections
+
+
+def chinese(pages: int) -> list[str]:
+    paragraph = '该产品的第{n}项功能通过第{m}个选项进行配置，默认启用，可以在每个部署中单独关闭，详见第{p}章的说明。'
+    return [
+        '\n\n'.join(''.join(paragraph.format(n=page * 6 + i, m=i, p=page) for _ in range(5)) for i in range(6))
+        for page in range(pages)
+    ]
+
+
+def chunk_tokens(sections: list[str], tokenizer, chunk_size: int, chunk_overlap: int) -> list[str]:
+    from langbot.pkg.rag.knowledge.services.chunker import ChunkBuilder
+
+    builder = ChunkBuilder(tokenizer, chunk_size, chunk_overlap)
+    chunks = []
+    for section in sections:
+        chunks.extend(builder.feed(section))
+    return chunks + builder.finish()
+
+
+def chunk_chars(sections: list[str]) -> list[str]:
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50, length_function=len)
+    return splitter.split_text('\n\n'.join(sections))
+
+
+def measure(corpus: str, mode: str, sections: list[str], tokenizer, args) -> dict:
+    size = sum(len(section.encode('utf-8')) for section in sections)
+    started_at = time.perf_counter()
+    for _ in range(args.rounds):
+        if mode == 'tokens':
+            chunks = chunk_tokens(list(sections), tokenizer, args.chunk_size, args.chunk_overlap)
+        else:
+            chunks = chunk_chars(sections)
+    elapsed = (time.perf_counter() - started_at) / args.rounds
+
+    tokens = sorted(tokenizer.count_batch(chunks))
+    return {
+        'corpus': corpus,
+        'mode': mode,
+        'tokenizer': type(tokenizer).__name__,
+        'document_kb': round(size / 1024, 1),
+        'mb_per_s': round(size / elapsed / 1024 / 1024, 2),
+        'chunks': len(chunks),
+        'tokens_p5': report.percentile(tokens, 0.05),
+        'tokens_p50': report.percentile(tokens, 0.50),
+        'tokens_p95': report.percentile(tokens, 0.95),
+        'tokens_max': tokens[-1] if tokens else 0,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m tests.benchmark.chunking')
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--chunk-size', type=int, default=256)
+    parser.add_argument('--chunk-overlap', type=int, default=32)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--output', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    import langbot.pkg.core.app  # noqa: F401, imports the services' dependencies in a working order
+    from langbot.pkg.rag.knowledge.services.chunker import get_tokenizer
+
+    tokenizer = get_tokenizer()
+    results = [
+        measure(corpus, mode, sections, tokenizer, args)
+        for corpus, sections in (('en', english(args.pages)), ('cjk', chinese(args.pages)))
+        for mode in ('tokens', 'chars')
+    ]
+    for result in results:
+        print(json.dumps(result), flush=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,326 @@
+"""
+Messages per second of the cluster mode with a growing number of worker processes.
+
+    python -m tests.benchmark.cluster_scaling [--workers 1 2 4 8] [--messages 2000] [--sessions 200]
+        [--llm-ms 200] [--cpu-ms 2] [--concurrency 8] [--backend redis]
+
+This process is the ingress node, it publishes `--messages` messages of `--sessions` sessions at once to the
+worker processes over the `--backend` queue (`redis` is the broker the ingress node serves over a Unix socket,
+like `langbot --workers N` does, `sql` a SQLite file). The worker processes are run by the `WorkerSupervisor`
+of `langbot --workers N`. Every worker runs the queries it takes with the real `QueryPool`, `Controller` and
+session limits, through a pipeline that spends `--cpu-ms` of CPU and waits `--llm-ms` for a model, at most
+`--concurrency` queries at a time like `concurrency.pipeline`. The `single` row runs the same pipeline in
+this process without the cluster.
+
+Throughput grows with the workers until the CPUs are saturated, so compare `cpu_count` with the worker count.
+`out_of_order` counts replies that arrived before the reply to an earlier message of their session.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import types
+
+import psutil
+
+from . import report
+
+
+READY_TOPIC = 'bench:ready'
+
+
+def make_app(concurrency: int) -> types.SimpleNamespace:
+    from langbot.pkg.core import taskmgr
+    from langbot.pkg.pipeline import pool
+    from langbot.pkg.provider.session import sessionmgr
+
+    ap = types.SimpleNamespace()
+    ap.event_loop = asyncio.get_running_loop()
+    ap.logger = logging.getLogger('cluster-bench')
+    ap.instance_config = types.SimpleNamespace(data={'concurrency': {'pipeline': concurrency, 'session': 1}})
+    ap.trace_mgr = types.SimpleNamespace(get_trace=lambda query: None, finish_trace=lambda query, error=None: None)
+    ap.query_pool = pool.QueryPool()
+    ap.sess_mgr = sessionmgr.SessionManager(ap)
+    ap.task_mgr = taskmgr.AsyncTaskManager(ap)
+    ap.cluster = None
+    return ap
+
+
+class BenchPipeline:
+    """Spends CPU like the pipeline stages, waits like a model request and replies with the message text"""
+
+    def __init__(self, llm_ms: float, cpu_ms: float):
+        self.llm_s = llm_ms / 1000
+        self.cpu_s = cpu_ms / 1000
+
+    async def run(self, query):
+        import langbot_plugin.api.entities.builtin.platform.message as platform_message
+
+        until = time.process_time() + self.cpu_s
+        while time.process_time() < until:
+            pass
+        await asyncio.sleep(self.llm_s)
+        await query.adapter.reply_message(
+            query.message_event, platform_message.MessageChain([platform_message.Plain(text=str(query.message_chain))])
+        )
+
+
+def start_pipelines(ap: types.SimpleNamespace, llm_ms: float, cpu_ms: float):
+    from langbot.pkg.pipeline import controller
+
+    pipeline = BenchPipeline(llm_ms, cpu_ms)
+
+    async def get_pipeline_by_uuid(pipeline_uuid):
+        return pipeline
+
+    ap.pipeline_mgr = types.SimpleNamespace(get_pipeline_by_uuid=get_pipeline_by_uuid)
+    ap.ctrl = controller.Controller(ap)
+    return asyncio.create_task(ap.ctrl.run())
+
+
+async def work(node_id: str, workers: int, backend_name: str, url: str, args: argparse.Namespace):
+    """A worker process"""
+    from langbot.pkg.cluster import backends, node
+
+    ap = make_app(args.concurrency)
+    ap.cluster = node.ClusterNode(
+        ap, node_id, node.ROLE_WORKER, backends.preregistered_backends[backend_name](url), node.worker_ids(workers)
+    )
+    await ap.cluster.initialize()
+    pipelines = start_pipelines(ap, args.llm_ms, args.cpu_ms)
+    await ap.cluster.backend.publish(READY_TOPIC, node_id.encode())
+    await asyncio.gather(pipelines, ap.cluster.run())
+
+
+class Recorder:
+    def __init__(self, messages: int):
+        self.messages = messages
+        self.sent_at: dict[str, float] = {}
+        self.latencies: list[float] = []
+        self.last_seq: dict[str, int] = {}
+        self.out_of_order = 0
+        self.done_at = 0.0
+        self.all_done = asyncio.Event()
+
+    def record(self, text: str):
+        now = time.perf_counter()
+        session, _, seq = text.partition(':')
+        if int(seq) < self.last_seq.get(session, -1):
+            self.out_of_order += 1
+        self.last_seq[session] = max(int(seq), self.last_seq.get(session, -1))
+        self.latencies.append(now - self.sent_at.pop(text))
+        self.done_at = now
+        if len(self.latencies) == self.messages:
+            self.all_done.set()
+
+
+def make_adapter(ap, recorder: Recorder):
+    import langbot_plugin.api.definition.abstract.platform.adapter as abstract_platform_adapter
+
+    from langbot.pkg.platform.logger import EventLogger
+
+    class BenchAdapter(abstract_platform_adapter.AbstractMessagePlatformAdapter):
+        async def reply_message(self, message_source, message, quote_origin=False):
+            recorder.record(str(message))
+
+        async def send_message(self, target_type, target_id, message):
+            pass
+
+        def register_listener(self, event_type, callback):
+            pass
+
+        def unregister_listener(self, event_type, callback):
+            pass
+
+        async def run_async(self):
+            pass
+
+        async def kill(self):
+            return True
+
+    return BenchAdapter(config={}, logger=EventLogger(name='bench', ap=ap))
+
+
+async def send_load(ap, adapter, recorder: Recorder, args: argparse.Namespace) -> float:
+    import langbot_plugin.api.entities.builtin.platform.entities as platform_entities
+    import langbot_plugin.api.entities.builtin.platform.events as platform_events
+    import langbot_plugin.api.entities.builtin.platform.message as platform_message
+    import langbot_plugin.api.entities.builtin.provider.session as provider_session
+
+    started_at = time.perf_counter()
+    for index in range(args.messages):
+        session = index % args.sessions
+        text = f'{session}:{index // args.sessions}'
+        event = platform_events.FriendMessage(
+            sender=platform_entities.Friend(id=session, nickname='user', remark=''),
+            message_chain=platform_message.MessageChain([platform_message.Plain(text=text)]),
+        )
+        recorder.sent_at[text] = time.perf_counter()
+        await ap.query_pool.add_query(
+            bot_uuid='bench-bot',
+            launcher_type=provider_session.LauncherTypes.PERSON,
+            launcher_id=session,
+            sender_id=session,
+            message_event=event,
+            message_chain=event.message_chain,
+            adapter=adapter,
+            pipeline_uuid='bench',
+        )
+    try:
+        await asyncio.wait_for(recorder.all_done.wait(), args.timeout)
+    except asyncio.TimeoutError:
+        pass
+    return started_at
+
+
+def result_row(label: str, recorder: Recorder, started_at: float, cpu_s: float, extra: dict) -> dict:
+    completed = len(recorder.latencies)
+    elapsed = recorder.done_at - started_at
+    return {
+        'workers': label,
+        'messages': recorder.messages,
+        'completed': completed,
+        'throughput_mps': round(completed / elapsed, 1) if elapsed > 0 else 0.0,
+        **report.summarize_latencies('latency', recorder.latencies),
+        'out_of_order': recorder.out_of_order,
+        'cpu_ms_per_message': round(cpu_s / max(completed, 1) * 1000, 3),
+        **extra,
+    }
+
+
+async def run_single(args: argparse.Namespace) -> dict:
+    ap = make_app(args.concurrency)
+    recorder = Recorder(args.messages)
+    adapter = make_adapter(ap, recorder)
+    pipelines = start_pipelines(ap, args.llm_ms, args.cpu_ms)
+
+    cpu_started = time.process_time()
+    started_at = await send_load(ap, adapter, recorder, args)
+    cpu_s = time.process_time() - cpu_started
+    pipelines.cancel()
+    return result_row('single', recorder, started_at, cpu_s, {})
+
+
+async def run_cluster(workers: int, args: argparse.Namespace, work_dir: str) -> dict:
+    from langbot.pkg.cluster import backends, node, supervisor
+
+    if args.backend == 'redis':
+        url = f'unix://{work_dir}/broker-{workers}.sock'
+    else:
+        url = f'sqlite+aiosqlite:///{work_dir}/queue-{workers}.db'
+
+    ap = make_app(args.concurrency)
+    recorder = Recorder(args.messages)
+    adapter = make_adapter(ap, recorder)
+
+    async def reply_to_query(query, message, quote_origin=False):
+        recorder.record(str(message))
+
+    ap.platform_mgr = types.SimpleNamespace(reply_to_query=reply_to_query)
+    ap.cluster = node.ClusterNode(
+        ap,
+        'ingress',
+        node.ROLE_INGRESS,
+        backends.preregistered_backends[args.backend](url),
+        node.worker_ids(workers),
+        broker_url=url if args.backend == 'redis' else '',
+    )
+    ap.query_pool = node.DispatchingQueryPool(ap.cluster)
+    await ap.cluster.initialize()
+    replies = asyncio.create_task(ap.cluster.run())
+
+    workers_supervisor = supervisor.WorkerSupervisor(ap, workers)
+    worker_args = [
+        f'--llm-ms={args.llm_ms}',
+        f'--cpu-ms={args.cpu_ms}',
+        f'--concurrency={args.concurrency}',
+    ]
+    workers_supervisor.command = lambda node_id: [
+        sys.executable,
+        '-m',
+        'tests.benchmark.cluster_scaling',
+        'work',
+        node_id,
+        str(workers),
+        args.backend,
+        url,
+        *worker_args,
+    ]
+    supervising = asyncio.create_task(workers_supervisor.run())
+    try:
+        for _ in range(workers):
+            while await ap.cluster.backend.consume(READY_TOPIC, 1) is None:
+                pass
+
+        processes = [psutil.Process(process.pid) for process in workers_supervisor.processes.values()]
+        cpu_started = time.process_time()
+        worker_cpu_started = [sum(process.cpu_times()[:2]) for process in processes]
+        started_at = await send_load(ap, adapter, recorder, args)
+        cpu_s = time.process_time() - cpu_started
+        cpu_s += sum(sum(process.cpu_times()[:2]) - before for process, before in zip(processes, worker_cpu_started))
+        dispatched = ap.cluster.to_dict()['dispatched']
+        return result_row(
+            str(workers),
+            recorder,
+            started_at,
+            cpu_s,
+            {'queries_per_worker_min': min(dispatched.values()), 'queries_per_worker_max': max(dispatched.values())},
+        )
+    finally:
+        supervising.cancel()
+        await asyncio.wait({supervising})
+        replies.cancel()
+        await asyncio.wait({replies})
+        await ap.cluster.close()
+
+
+async def run_all(args: argparse.Namespace) -> list[dict]:
+    results = [await run_single(args)]
+    print(json.dumps(results[-1]), flush=True)
+    with tempfile.TemporaryDirectory(prefix='langbot-cluster-') as work_dir:
+        for workers in args.workers:
+            results.append(await run_cluster(workers, args, work_dir))
+            print(json.dumps(results[-1]), flush=True)
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m tests.benchmark.cluster_scaling')
+    parser.add_argument('command', nargs='?', default='run', choices=['run', 'work'])
+    parser.add_argument('work_args', nargs='*', help=argparse.SUPPRESS)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--sessions', type=int, default=200)
+    parser.add_argument('--llm-ms', type=float, default=200)
+    parser.add_argument('--cpu-ms', type=float, default=2)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--backend', choices=['redis', 'sql'], default='redis')
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--output', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    import langbot.pkg.core.app  # noqa: F401, imports the pipeline modules' dependencies in a working order
+
+    if args.command == 'work':
+        node_id, workers, backend_name, url = args.work_args
+        asyncio.run(work(node_id, int(workers), backend_name, url, args))
+        return 0
+
+    print(json.dumps({'cpu_count': os.cpu_count(), 'backend': args.backend}), flush=True)
+    results = asyncio.run(run_all(args))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
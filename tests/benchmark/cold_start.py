@@ -0,0 +1,138 @@
+"""
+Import time, peak memory and module count of a cold start.
+
+    python -m tests.benchmark.cold_start [--runs 3] [--adapters webchat telegram] [--requesters openai-chat-completions]
+
+Each run is a fresh interpreter that imports `langbot.pkg.core.boot`, discovers the components of the blueprint
+and resolves the classes a deployment needs:
+
+- lazy: the `--adapters` and `--requesters` classes and the Chroma backend, as the managers resolve them now
+- eager: every adapter, requester and reranker class, both vector database backends, S3 storage and MCP, as
+  the managers imported them before they were lazy
+
+`max_rss_mb` is the peak RSS of the child process.
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import json
+import resource
+import subprocess
+import sys
+import time
+
+EAGER_MODULES = (
+    'langbot.pkg.vector.vdbs.chroma',
+    'langbot.pkg.vector.vdbs.qdrant',
+    'langbot.pkg.storage.providers.s3storage',
+    'mcp',
+)
+"""Backends the eager mode imports besides the components"""
+
+
+def cold_start(mode: str, adapters: list[str], requesters: list[str]) -> dict:
+    started_at = time.perf_counter()
+
+    import logging
+    from unittest.mock import Mock
+
+    import langbot.pkg.core.boot  # noqa: F401
+    from langbot.pkg.discover import engine
+
+    ap = Mock()
+    ap.logger = logging.getLogger('bench')
+    discover = engine.ComponentDiscoveryEngine(ap)
+    discover.discover_blueprint('templates/components.yaml')
+
+    adapter_dict = engine.LazyComponentClassDict(discover.get_components_by_kind('MessagePlatformAdapter'))
+    requester_dict = engine.LazyComponentClassDict(discover.get_components_by_kind('LLMAPIRequester'))
+    reranker_dict = engine.LazyComponentClassDict(discover.get_components_by_kind('Reranker'))
+
+    if mode == 'lazy':
+        for name in adapters:
+            adapter_dict[name]
+        for name in requesters:
+            requester_dict[name]
+        importlib.import_module('langbot.pkg.vector.vdbs.chroma')
+    else:
+        failed = []
+        for classes in (adapter_dict, requester_dict, reranker_dict):
+            for name in classes:
+                try:
+                    classes[name]
+                except Exception:
+                    failed.append(name)
+        for module in EAGER_MODULES:
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                failed.append(module)
+
+    elapsed = time.perf_counter() - started_at
+    result = {
+        'mode': mode,
+        'elapsed_s': round(elapsed, 2),
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'modules': len(sys.modules),
+    }
+    if mode == 'eager' and failed:
+        result['not_importable'] = failed
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m tests.benchmark.cold_start')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--adapters', nargs='+', default=['webchat', 'telegram'])
+    parser.add_argument('--requesters', nargs='+', default=['openai-chat-completions'])
+    parser.add_argument('--mode', choices=['lazy', 'eager'], help='Measure one cold start in this process')
+    parser.add_argument('--output', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(cold_start(args.mode, args.adapters, args.requesters)), flush=True)
+        return 0
+
+    results = []
+    for mode in ('lazy', 'eager'):
+        runs = []
+        for _ in range(args.runs):
+            output = subprocess.run(
+                [
+                    sys.executable,
+                    '-m',
+                    'tests.benchmark.cold_start',
+                    '--mode',
+                    mode,
+                    '--adapters',
+                    *args.adapters,
+                    '--requesters',
+                    *args.requesters,
+                ],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+        elapsed = sorted(run['elapsed_s'] for run in runs)
+        result = {
+            **runs[-1],
+            'runs': len(runs),
+            'elapsed_min_s': elapsed[0],
+            'elapsed_max_s': elapsed[-1],
+            'max_rss_mb': max(run['max_rss_mb'] for run in runs),
+        }
+        del result['elapsed_s']
+        results.append(result)
+        print(json.dumps(result), flush=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
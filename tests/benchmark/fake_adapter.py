@@ -0,0 +1,167 @@
+"""
+Platform adapter that injects synthetic messages and records when replies arrive
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+import typing
+
+import pydantic
+
+import langbot_plugin.api.definition.abstract.platform.adapter as abstract_platform_adapter
+import langbot_plugin.api.entities.builtin.platform.message as platform_message
+import langbot_plugin.api.entities.builtin.platform.events as platform_events
+import langbot_plugin.api.entities.builtin.platform.entities as platform_entities
+import langbot_plugin.api.definition.abstract.platform.event_logger as abstract_platform_logger
+
+
+class MessageTiming:
+    """Timestamps of one injected message, in `time.perf_counter()` seconds"""
+
+    __slots__ = ('sent_at', 'first_reply_at', 'last_reply_at', 'replies', 'done_at')
+
+    def __init__(self, sent_at: float):
+        self.sent_at = sent_at
+        self.first_reply_at: float | None = None
+        self.last_reply_at: float | None = None
+        self.replies = 0
+        self.done_at: float | None = None
+        """When the pipeline finished the query"""
+
+
+class FakeAdapter(abstract_platform_adapter.AbstractMessagePlatformAdapter):
+    """Adapter without a platform: `inject()` emits FriendMessage/GroupMessage events to the bot's
+    listeners and replies are only timestamped."""
+
+    listeners: dict[
+        typing.Type[platform_events.Event],
+        typing.Callable[[platform_events.Event, abstract_platform_adapter.AbstractMessagePlatformAdapter], None],
+    ] = pydantic.Field(default_factory=dict, exclude=True)
+
+    is_stream: bool = pydantic.Field(exclude=True, default=False)
+
+    timings: dict[int, MessageTiming] = pydantic.Field(default_factory=dict, exclude=True)
+    """Message id -> timing"""
+
+    message_id_counter: int = pydantic.Field(exclude=True, default=0)
+
+    def __init__(self, config: dict, logger: abstract_platform_logger.AbstractEventLogger, **kwargs):
+        super().__init__(config=config, logger=logger, **kwargs)
+        self.bot_account_id = 'benchbot'
+
+    def _record_reply(self, message_source: platform_events.MessageEvent):
+        timing = self.timings.get(message_source.message_chain.message_id)
+        if timing is None:
+            return
+        now = time.perf_counter()
+        if timing.first_reply_at is None:
+            timing.first_reply_at = now
+        timing.last_reply_at = now
+        timing.replies += 1
+
+    async def send_message(self, target_type: str, target_id: str, message: platform_message.MessageChain):
+        pass
+
+    async def reply_message(
+        self,
+        message_source: platform_events.MessageEvent,
+        message: platform_message.MessageChain,
+        quote_origin: bool = False,
+    ):
+        self._record_reply(message_source)
+
+    async def reply_message_chunk(
+        self,
+        message_source: platform_events.MessageEvent,
+        bot_message: dict,
+        message: platform_message.MessageChain,
+        quote_origin: bool = False,
+        is_final: bool = False,
+    ):
+        self._record_reply(message_source)
+
+    async def is_stream_output_supported(self) -> bool:
+        return self.is_stream
+
+    def register_listener(
+        self,
+        event_type: typing.Type[platform_events.Event],
+        func: typing.Callable[
+            [platform_events.Event, abstract_platform_adapter.AbstractMessagePlatformAdapter], typing.Awaitable[None]
+        ],
+    ):
+        self.listeners[event_type] = func
+
+    def unregister_listener(
+        self,
+        event_type: typing.Type[platform_events.Event],
+        func: typing.Callable[
+            [platform_events.Event, abstract_platform_adapter.AbstractMessagePlatformAdapter], typing.Awaitable[None]
+        ],
+    ):
+        self.listeners.pop(event_type, None)
+
+    async def run_async(self):
+        while True:
+            await asyncio.sleep(1)
+
+    async def kill(self) -> bool:
+        return True
+
+    def make_event(self, text: str, sender_id: int, group_id: int | None = None) -> platform_events.MessageEvent:
+        self.message_id_counter += 1
+        now = time.time()
+        message_chain = platform_message.MessageChain(
+            [platform_message.Source(id=self.message_id_counter, time=now), platform_message.Plain(text=text)]
+        )
+        if group_id is None:
+            sender = platform_entities.Friend(id=f'user{sender_id}', nickname=f'User {sender_id}', remark='')
+            return platform_events.FriendMessage(sender=sender, message_chain=message_chain, time=now)
+
+        message_chain.insert(1, platform_message.At(target=self.bot_account_id))
+        group = platform_entities.Group(
+            id=f'group{group_id}', name=f'Group {group_id}', permission=platform_entities.Permission.Member
+        )
+        sender = platform_entities.GroupMember(
+            id=f'user{sender_id}',
+            member_name=f'User {sender_id}',
+            group=group,
+            permission=platform_entities.Permission.Member,
+        )
+        return platform_events.GroupMessage(sender=sender, message_chain=message_chain, time=now)
+
+    async def inject(self, event: platform_events.MessageEvent) -> MessageTiming:
+        timing = self.timings[event.message_chain.message_id] = MessageTiming(time.perf_counter())
+        await self.listeners[event.__class__](event, self)
+        return timing
+
+
+async def generate_load(
+    adapter: FakeAdapter,
+    messages: int,
+    rate: float,
+    senders: int,
+    groups: int,
+    group_ratio: float,
+    text: str,
+    seed: int = 0,
+) -> list[MessageTiming]:
+    """Inject `messages` events at `rate` per second (open loop, 0 means as fast as possible)"""
+    rng = random.Random(seed)
+    timings = []
+    started_at = time.perf_counter()
+    for index in range(messages):
+        if rate > 0:
+            delay = started_at + index / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elif index % 50 == 0:
+            await asyncio.sleep(0)
+
+        sender_id = rng.randrange(senders)
+        group_id = rng.randrange(groups) if groups and rng.random() < group_ratio else None
+        timings.append(await adapter.inject(adapter.make_event(text, sender_id, group_id)))
+    return timings
@@ -0,0 +1,194 @@
+"""
+OpenAI-compatible chat completion and embedding server with configurable latency
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import struct
+import time
+import uuid
+
+from aiohttp import web
+
+
+TOOL_NAME = 'get_weather'
+"""Tool the server calls when the request offers tools and the last message is from the user"""
+
+EMBEDDING_DIM = 64
+
+
+class FakeLLMServer:
+    """Answers `/v1/chat/completions` (plain and SSE streaming) and `/v1/embeddings`.
+
+    Every response waits `ttft_ms` before the first token, then emits `output_tokens` tokens at
+    `tokens_per_second` (0 means all at once). With `tool_calls`, a request that offers tools gets
+    a call to `get_weather` first and a text answer once the tool result is sent back.
+    """
+
+    ttft: float
+
+    tokens_per_second: float
+
+    output_tokens: int
+
+    tool_calls: bool
+
+    requests: int
+
+    def __init__(
+        self,
+        ttft_ms: float = 0,
+        tokens_per_second: float = 0,
+        output_tokens: int = 32,
+        tool_calls: bool = False,
+        embedding_latency_ms: float = 0,
+    ):
+        self.ttft = ttft_ms / 1000
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.tool_calls = tool_calls
+        self.embedding_latency = embedding_latency_ms / 1000
+        self.requests = 0
+        self.runner: web.AppRunner | None = None
+        self.port = 0
+
+    @classmethod
+    def from_config(cls, llm_cfg: dict) -> FakeLLMServer:
+        return cls(
+            ttft_ms=llm_cfg.get('ttft_ms', 0),
+            tokens_per_second=llm_cfg.get('tokens_per_second', 0),
+            output_tokens=llm_cfg.get('output_tokens', 32),
+            tool_calls=llm_cfg.get('tool_calls', False),
+            embedding_latency_ms=llm_cfg.get('embedding_latency_ms', 0),
+        )
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.port}/v1'
+
+    async def start(self, port: int = 0):
+        app = web.Application()
+        app.router.add_post('/v1/chat/completions', self.chat_completions)
+        app.router.add_post('/v1/embeddings', self.embeddings)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+    def _tokens(self) -> list[str]:
+        return [f'tok{i} ' for i in range(self.output_tokens)]
+
+    async def _pace(self, index: int, started_at: float):
+        """Sleep until token `index` is due"""
+        if self.tokens_per_second <= 0:
+            return
+        delay = started_at + self.ttft + index / self.tokens_per_second - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _wants_tool_call(self, body: dict) -> bool:
+        messages = body.get('messages', [])
+        return self.tool_calls and bool(body.get('tools')) and bool(messages) and messages[-1].get('role') == 'user'
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        started_at = time.perf_counter()
+        body = await request.json()
+        self.requests += 1
+        completion_id = f'chatcmpl-{uuid.uuid4().hex}'
+        model = body.get('model', 'bench')
+        tool_call = self._wants_tool_call(body)
+
+        if self.ttft:
+            await asyncio.sleep(self.ttft)
+
+        if not body.get('stream'):
+            message = {'role': 'assistant', 'content': None if tool_call else ''.join(self._tokens())}
+            if tool_call:
+                message['tool_calls'] = [self._tool_call()]
+            else:
+                await self._pace(self.output_tokens, started_at)
+            return web.json_response(
+                {
+                    'id': completion_id,
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': model,
+                    'choices': [
+                        {'index': 0, 'message': message, 'finish_reason': 'tool_calls' if tool_call else 'stop'}
+                    ],
+                    'usage': {'prompt_tokens': 0, 'completion_tokens': self.output_tokens, 'total_tokens': 0},
+                }
+            )
+
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'})
+        await response.prepare(request)
+
+        async def send(delta: dict, finish_reason: str | None = None):
+            chunk = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+            }
+            await response.write(f'data: {json.dumps(chunk)}\n\n'.encode())
+
+        if tool_call:
+            await send({'role': 'assistant', 'tool_calls': [{'index': 0, **self._tool_call()}]})
+            await send({}, 'tool_calls')
+        else:
+            for index, token in enumerate(self._tokens()):
+                await self._pace(index, started_at)
+                await send({'role': 'assistant', 'content': token} if index == 0 else {'content': token})
+            await send({}, 'stop')
+
+        await response.write(b'data: [DONE]\n\n')
+        await response.write_eof()
+        return response
+
+    def _tool_call(self) -> dict:
+        return {
+            'id': f'call_{uuid.uuid4().hex[:12]}',
+            'type': 'function',
+            'function': {'name': TOOL_NAME, 'arguments': json.dumps({'city': 'Paris'})},
+        }
+
+    async def embeddings(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.requests += 1
+        inputs = body.get('input', [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        if self.embedding_latency:
+            await asyncio.sleep(self.embedding_latency)
+        return web.json_response(
+            {
+                'object': 'list',
+                'model': body.get('model', 'bench'),
+                'data': [
+                    {'object': 'embedding', 'index': index, 'embedding': embed(text)}
+                    for index, text in enumerate(inputs)
+                ],
+                'usage': {'prompt_tokens': 0, 'total_tokens': 0},
+            }
+        )
+
+
+def embed(text: str) -> list[float]:
+    """Deterministic unit vector derived from the text"""
+    digest = b''
+    counter = 0
+    while len(digest) < EMBEDDING_DIM * 4:
+        digest += hashlib.sha256(f'{counter}:{text}'.encode()).digest()
+        counter += 1
+    values = [v / 2**31 - 1.0 for v in struct.unpack(f'<{EMBEDDING_DIM}I', digest[: EMBEDDING_DIM * 4])]
+    norm = sum(v * v for v in values) ** 0.5 or 1.0
+    return [v / norm for v in values]
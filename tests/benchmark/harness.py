@@ -0,0 +1,327 @@
+"""
+Boot a real LangBot instance against the fakes and drive one scenario through it
+"""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import logging
+import os
+import time
+import uuid
+
+import psutil
+import yaml
+
+from . import fake_adapter, fake_llm, report, stub_runtime
+
+
+SCENARIO_DIR = os.path.join(os.path.dirname(__file__), 'scenarios')
+
+DEFAULT_SCENARIO = {
+    'description': '',
+    'stream': False,
+    'load': {
+        'warmup': 10,
+        'messages': 200,
+        'rate': 20,
+        'senders': 50,
+        'groups': 5,
+        'group_ratio': 0.0,
+        'text': 'Hello, what can you do?',
+        'timeout': 120,
+        'seed': 0,
+    },
+    'llm': {},
+    'plugin': {'latency_ms': 0, 'tools': False},
+    'rag': {'documents': 0, 'top_k': 5, 'chunk_size': 256, 'chunk_overlap': 32},
+    'pipeline': {},
+    'config': {},
+}
+
+
+def deep_merge(base: dict, override: dict) -> dict:
+    merged = copy.deepcopy(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = deep_merge(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+def load_scenario(name_or_path: str) -> dict:
+    """Load a scenario file, a bare name refers to `scenarios/<name>.yaml`"""
+    path = name_or_path
+    if not os.path.exists(path):
+        path = os.path.join(SCENARIO_DIR, f'{name_or_path}.yaml')
+    with open(path, 'r', encoding='utf-8') as f:
+        scenario = deep_merge(DEFAULT_SCENARIO, yaml.safe_load(f) or {})
+    scenario.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+    return scenario
+
+
+def list_scenarios() -> list[str]:
+    return sorted(os.path.splitext(name)[0] for name in os.listdir(SCENARIO_DIR) if name.endswith('.yaml'))
+
+
+class CompletionTracker(dict):
+    """Stands in for `QueryPool.cached_queries`, whose entry is deleted when the pipeline is done with a query"""
+
+    def __init__(self, adapter: fake_adapter.FakeAdapter):
+        super().__init__()
+        self.adapter = adapter
+        self.pending = 0
+        self.all_done = asyncio.Event()
+
+    def __delitem__(self, query_id: int):
+        query = self[query_id]
+        super().__delitem__(query_id)
+        timing = self.adapter.timings.get(query.message_event.message_chain.message_id)
+        if timing is None:
+            return
+        timing.done_at = time.perf_counter()
+        self.pending -= 1
+        if self.pending <= 0:
+            self.all_done.set()
+
+    def expect(self, count: int):
+        self.pending = count
+        self.all_done.clear()
+
+
+class Sampler:
+    """Event loop lag and process RSS, sampled while the load runs"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.lags: list[float] = []
+        self.rss_peak = 0
+        self.process = psutil.Process()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started_at = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - started_at - self.interval))
+            if len(self.lags) % 10 == 0:
+                self.rss_peak = max(self.rss_peak, self.process.memory_info().rss)
+
+
+class BenchmarkHarness:
+    """One LangBot application wired to a fake adapter, fake model server and stub plugin runtime"""
+
+    def __init__(self, scenario: dict, work_dir: str, verbose: bool = False):
+        self.scenario = scenario
+        self.work_dir = work_dir
+        self.verbose = verbose
+        self.ap = None
+        self.llm_server = fake_llm.FakeLLMServer.from_config(scenario['llm'])
+        self.runtime = stub_runtime.StubRuntimeHandler(
+            latency_ms=scenario['plugin']['latency_ms'], tools=scenario['plugin']['tools']
+        )
+        self.adapter: fake_adapter.FakeAdapter | None = None
+        self.tracker: CompletionTracker | None = None
+
+    async def boot(self):
+        os.makedirs(self.work_dir, exist_ok=True)
+        os.chdir(self.work_dir)
+
+        from langbot.pkg.core.bootutils import files
+
+        await files.generate_files()
+
+        with open('data/config.yaml', 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f)
+        config['plugin']['enable'] = False
+        config = deep_merge(config, self.scenario['config'])
+        with open('data/config.yaml', 'w', encoding='utf-8') as f:
+            yaml.safe_dump(config, f)
+
+        from langbot.pkg.core import boot
+
+        self.ap = await boot.make_app(asyncio.get_running_loop())
+        if not self.verbose:
+            self.ap.logger.setLevel(logging.WARNING)
+
+    async def setup(self):
+        ap = self.ap
+        await self.llm_server.start()
+
+        # plugin events and tools go to the stub instead of a runtime process
+        ap.plugin_connector.is_enable_plugin = True
+        ap.plugin_connector.handler = self.runtime
+
+        model_uuid = await ap.llm_model_service.create_llm_model(
+            {
+                'name': 'bench-model',
+                'description': '',
+                'requester': 'openai-chat-completions',
+                'requester_config': {'base_url': self.llm_server.base_url, 'timeout': 120},
+                'api_keys': ['sk-bench'],
+                'abilities': ['func_call'] if self.scenario['plugin']['tools'] else [],
+                'extra_args': {},
+            }
+        )
+
+        kb_uuids = []
+        if self.scenario['rag']['documents'] > 0:
+            kb_uuids.append(await self._setup_knowledge_base())
+
+        pipeline_uuid = await ap.pipeline_service.create_pipeline({'name': 'bench', 'description': ''})
+        pipeline = await ap.pipeline_service.get_pipeline(pipeline_uuid)
+        pipeline_config = pipeline['config']
+        pipeline_config['ai']['local-agent']['model'] = model_uuid
+        pipeline_config['ai']['local-agent']['knowledge-bases'] = kb_uuids
+        pipeline_config['safety']['rate-limit']['limitation'] = 1_000_000
+        pipeline_config = deep_merge(pipeline_config, self.scenario['pipeline'])
+        await ap.pipeline_service.update_pipeline(pipeline_uuid, {'config': pipeline_config})
+
+        from langbot.pkg.core import entities as core_entities
+        from langbot.pkg.entity.persistence import bot as persistence_bot
+        from langbot.pkg.platform import botmgr
+        from langbot.pkg.platform.logger import EventLogger
+
+        logger = EventLogger(name='bench-adapter', ap=ap)
+        self.adapter = fake_adapter.FakeAdapter({}, logger, is_stream=self.scenario['stream'])
+        bot = botmgr.RuntimeBot(
+            ap=ap,
+            bot_entity=persistence_bot.Bot(
+                uuid=str(uuid.uuid4()),
+                name='bench',
+                description='',
+                adapter='bench',
+                adapter_config={},
+                enable=True,
+                use_pipeline_uuid=pipeline_uuid,
+            ),
+            adapter=self.adapter,
+            logger=logger,
+        )
+        await bot.initialize()
+        ap.platform_mgr.bots.append(bot)
+
+        self.tracker = CompletionTracker(self.adapter)
+        ap.query_pool.cached_queries = self.tracker
+
+        ap.task_mgr.create_task(
+            ap.ctrl.run(),
+            name='query-controller',
+            scopes=[core_entities.LifecycleControlScope.APPLICATION],
+        )
+
+    async def _setup_knowledge_base(self) -> str:
+        ap = self.ap
+        rag_cfg = self.scenario['rag']
+        embedding_uuid = await ap.embedding_models_service.create_embedding_model(
+            {
+                'name': 'bench-embedding',
+                'description': '',
+                'requester': 'openai-chat-completions',
+                'requester_config': {'base_url': self.llm_server.base_url, 'timeout': 120},
+                'api_keys': ['sk-bench'],
+                'extra_args': {},
+            }
+        )
+        kb_uuid = await ap.knowledge_service.create_knowledge_base(
+            {
+                'name': 'bench-kb',
+                'description': '',
+                'embedding_model_uuid': embedding_uuid,
+                'top_k': rag_cfg['top_k'],
+                'chunk_size': rag_cfg['chunk_size'],
+                'chunk_overlap': rag_cfg['chunk_overlap'],
+            }
+        )
+
+        task_ids = []
+        for index in range(rag_cfg['documents']):
+            file_id = f'bench_doc_{index}.txt'
+            text = '\n'.join(
+                f'Document {index} section {section}: the bench product ships feature {index * 31 + section} '
+                f'which is configured through option {section} and documented in chapter {index}.'
+                for section in range(40)
+            )
+            await ap.storage_mgr.storage_provider.save(file_id, text.encode('utf-8'))
+            task_ids.append(await ap.knowledge_service.store_file(kb_uuid, file_id))
+
+        for task_id in task_ids:
+            await ap.task_mgr.get_task_by_id(task_id).task
+        return kb_uuid
+
+    async def _run_load(self, messages: int, seed: int) -> list[fake_adapter.MessageTiming]:
+        load = self.scenario['load']
+        self.tracker.expect(messages)
+        timings = await fake_adapter.generate_load(
+            self.adapter,
+            messages=messages,
+            rate=load['rate'],
+            senders=load['senders'],
+            groups=load['groups'],
+            group_ratio=load['group_ratio'],
+            text=load['text'],
+            seed=seed,
+        )
+        try:
+            await asyncio.wait_for(self.tracker.all_done.wait(), load['timeout'])
+        except asyncio.TimeoutError:
+            pass
+        return timings
+
+    async def run(self) -> dict:
+        load = self.scenario['load']
+
+        if load['warmup']:
+            await self._run_load(load['warmup'], load['seed'] + 1)
+
+        self.llm_server.requests = 0
+        self.runtime.calls = {}
+        for family in self.ap.metrics_mgr.families.values():
+            family.series.clear()
+
+        sampler = Sampler()
+        sampler_task = asyncio.create_task(sampler.run())
+        timings = await self._run_load(load['messages'], load['seed'])
+        sampler_task.cancel()
+        sampler.rss_peak = max(sampler.rss_peak, sampler.process.memory_info().rss)
+
+        return self._result(timings, sampler)
+
+    def _result(self, timings: list[fake_adapter.MessageTiming], sampler: Sampler) -> dict:
+        completed = [t for t in timings if t.done_at is not None]
+        replied = [t for t in completed if t.first_reply_at is not None]
+
+        metrics = {'messages': len(timings), 'completed': len(completed), 'unanswered': len(completed) - len(replied)}
+        if completed:
+            elapsed = max(t.done_at for t in completed) - timings[0].sent_at
+            metrics['throughput_mps'] = round(len(completed) / elapsed, 2) if elapsed > 0 else 0.0
+        metrics.update(report.summarize_latencies('latency', [t.done_at - t.sent_at for t in completed]))
+        metrics.update(report.summarize_latencies('ttft', [t.first_reply_at - t.sent_at for t in replied]))
+        metrics['rss_peak_mb'] = round(sampler.rss_peak / 1024 / 1024, 1)
+        lag = report.summarize_latencies('loop_lag', sampler.lags)
+        metrics['loop_lag_p99_ms'] = lag['loop_lag_p99_ms']
+        metrics['loop_lag_max_ms'] = lag['loop_lag_max_ms']
+        metrics['llm_requests'] = self.llm_server.requests
+
+        stages = {}
+        for series in self.ap.metrics_mgr.stage_duration.to_dict()['series']:
+            stages[series['labels']['stage']] = {
+                'p50_ms': round(series['p50'] * 1000, 3),
+                'p99_ms': round(series['p99'] * 1000, 3),
+            }
+
+        return {
+            'scenario': self.scenario['name'],
+            'description': self.scenario['description'],
+            'metrics': metrics,
+            'details': {'plugin_calls': dict(self.runtime.calls), 'stages': stages},
+        }
+
+
+async def run_scenario(scenario: dict, work_dir: str, verbose: bool = False) -> dict:
+    harness = BenchmarkHarness(scenario, work_dir, verbose)
+    await harness.boot()
+    await harness.setup()
+    return await harness.run()
@@ -0,0 +1,126 @@
+"""
+Memory and CPU cost of recognising redelivered messages at a sustained message rate.
+
+    python -m tests.benchmark.ingress_dedup [--messages 1000000] [--hours 1] [--redelivered 0.05]
+
+`--messages` messages with distinct ids arrive evenly over `--hours` hours of simulated time, a fraction
+`--redelivered` of them is delivered again 1 to 30 seconds later. The deduplicator of `ingress_dedup` in the
+default config is compared with a dict of ids to their expiry time, the obvious exact alternative.
+Memory is the size of the structures themselves, sampled every 100k messages for the peak.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import time
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class TTLDict:
+    """Ids with their expiry time, expired ones are swept once per window"""
+
+    def __init__(self, window: float, clock: Clock):
+        self.window = window
+        self.clock = clock
+        self.expiry: dict[str, float] = {}
+        self.swept_at = 0.0
+
+    def check_and_add(self, key: str) -> bool:
+        now = self.clock.monotonic()
+        if now - self.swept_at >= self.window:
+            self.expiry = {k: v for k, v in self.expiry.items() if v > now}
+            self.swept_at = now
+        seen = self.expiry.get(key, 0.0) > now
+        self.expiry[key] = now + self.window
+        return seen
+
+    @property
+    def memory_bytes(self) -> int:
+        return sys.getsizeof(self.expiry) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in self.expiry.items())
+
+
+def run(name: str, make, args: argparse.Namespace, clock: Clock) -> dict:
+    rng = random.Random(0)
+    interval = args.hours * 3600 / args.messages
+    redeliveries: list[tuple[float, str]] = []
+    false_positives = 0
+    detected = 0
+    redelivered = 0
+
+    clock.now = 0.0
+    structure = make()
+    peak_memory = 0
+    cpu_s = 0.0
+    cpu_started_at = time.process_time()
+    for index in range(args.messages):
+        if index % 100_000 == 0:
+            cpu_s += time.process_time() - cpu_started_at
+            peak_memory = max(peak_memory, structure.memory_bytes)
+            cpu_started_at = time.process_time()
+        clock.now = index * interval
+        while redeliveries and redeliveries[0][0] <= clock.now:
+            _, key = redeliveries.pop(0)
+            redelivered += 1
+            detected += structure.check_and_add(key)
+
+        key = f'bot-{index % 50}:group_{rng.randrange(10_000)}:{index}'
+        false_positives += structure.check_and_add(key)
+        if rng.random() < args.redelivered:
+            redeliveries.append((clock.now + rng.uniform(1, 30), key))
+            redeliveries.sort()
+    cpu_s += time.process_time() - cpu_started_at
+    memory = structure.memory_bytes
+
+    return {
+        'structure': name,
+        'messages': args.messages,
+        'hours': args.hours,
+        'memory_mb': round(memory / 1024 / 1024, 2),
+        'peak_memory_mb': round(max(peak_memory, memory) / 1024 / 1024, 2),
+        'us_per_message': round(cpu_s / (args.messages + redelivered) * 1e6, 2),
+        'redelivered': redelivered,
+        'detected': detected,
+        'false_positives': false_positives,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m tests.benchmark.ingress_dedup')
+    parser.add_argument('--messages', type=int, default=1_000_000)
+    parser.add_argument('--hours', type=float, default=1.0)
+    parser.add_argument('--redelivered', type=float, default=0.05)
+    parser.add_argument('--output', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    import langbot.pkg.core.app  # noqa: F401, imports the platform modules' dependencies in a working order
+    from langbot.pkg.platform import ingress
+    from langbot.pkg.utils import bloom
+
+    clock = Clock()
+    bloom.time = clock  # the filter only reads time.monotonic
+
+    results = [
+        run('rotating_bloom', lambda: ingress.MessageDeduplicator().seen, args, clock),
+        run('ttl_dict', lambda: TTLDict(600, clock), args, clock),
+    ]
+    for result in results:
+        print(json.dumps(result), flush=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
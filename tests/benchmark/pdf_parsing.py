@@ -0,0 +1,114 @@
+"""
+Parse throughput of knowledge base PDFs and the event loop lag while they are parsed.
+
+    python -m tests.benchmark.pdf_parsing [--pages 200] [--files 4] [--workers 2]
+
+A synthetic PDF of `--pages` pages of text is parsed `--files` times at once by the `ParserPool`
+of the knowledge base manager, while the event loop's lag is sampled every 10 ms.
+
+- thread: `rag.parser.workers: 0`, the parsers run in the default thread pool and hold the GIL
+- process: `rag.parser.workers: --workers`, the parsers run in worker processes
+
+The workers are started before the measurement, `startup_s` is the time the first parse took.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from . import report
+from .harness import Sampler
+
+
+def build_pdf(pages: int, lines_per_page: int = 40) -> bytes:
+    """A PDF of `pages` pages, each with `lines_per_page` lines of text in Helvetica"""
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>', b'', b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    page_ids = []
+    for page in range(pages):
+        lines = b''.join(
+            b'(Page %d line %d: the bench document describes feature %d and its options.) Tj T* '
+            % (page, line, page * lines_per_page + line)
+            for line in range(lines_per_page)
+        )
+        content = b'BT /F1 10 Tf 12 TL 50 780 Td ' + lines + b'ET'
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(content), content))
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] /Resources << /Font << /F1 3 0 R >> >> '
+            b'/Contents %d 0 R >>' % len(objects)
+        )
+        page_ids.append(len(objects))
+    kids = b' '.join(b'%d 0 R' % page_id for page_id in page_ids)
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, pages)
+
+    pdf = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref_at = len(pdf)
+    pdf += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    pdf += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    pdf += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref_at)
+    return bytes(pdf)
+
+
+async def measure(mode: str, data: bytes, files: int, workers: int) -> dict:
+    from langbot.pkg.rag.knowledge.services.parser import ParserPool
+
+    pool = ParserPool(workers=workers if mode == 'process' else 0, timeout=600)
+    try:
+        started_at = time.perf_counter()
+        sections = await pool.run('pdf', data)
+        startup = time.perf_counter() - started_at
+
+        sampler = Sampler()
+        sampler_task = asyncio.create_task(sampler.run())
+        started_at = time.perf_counter()
+        await asyncio.gather(*(pool.run('pdf', data) for _ in range(files)))
+        elapsed = time.perf_counter() - started_at
+        sampler_task.cancel()
+    finally:
+        pool.shutdown()
+
+    lag = report.summarize_latencies('loop_lag', sampler.lags)
+    return {
+        'mode': mode,
+        'workers': workers if mode == 'process' else 0,
+        'pages': len(sections),
+        'files': files,
+        'pdf_kb': round(len(data) / 1024, 1),
+        'startup_s': round(startup, 3),
+        'parse_s': round(elapsed, 3),
+        'pages_per_s': round(len(sections) * files / elapsed, 1),
+        'loop_lag_p99_ms': lag['loop_lag_p99_ms'],
+        'loop_lag_max_ms': lag['loop_lag_max_ms'],
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m tests.benchmark.pdf_parsing')
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--files', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--output', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    import langbot.pkg.core.app  # noqa: F401, imports the services' dependencies in a working order
+
+    data = build_pdf(args.pages)
+    results = [asyncio.run(measure(mode, data, args.files, args.workers)) for mode in ('thread', 'process')]
+    for result in results:
+        print(json.dumps(result), flush=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
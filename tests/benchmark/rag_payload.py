@@ -0,0 +1,146 @@
+"""
+Disk usage and search latency of a knowledge base with the full and the lean vector payload layout.
+
+    python -m tests.benchmark.rag_payload [--chunks 5000] [--chunk-kb 1] [--dim 384] [--queries 200] [--top-k 5]
+
+`--chunks` chunks of `--chunk-kb` KB are stored by the `Embedder` into embedded Chroma and an SQLite
+database, with random vectors from a fake embedding model, then `--queries` random queries are run through
+the `Retriever`.
+
+- full: `rag.vector_payload: full`, the vectors carry the chunk text
+- lean: `rag.vector_payload: lean`, the vectors carry ids only and the retriever reads the text of the top-k
+  from its chunk cache or the database
+
+`vdb_mb` is the size of the Chroma directory, `search_kb` the size of one search result as JSON. `retrieve_ms`
+is measured with the chunk cache cleared before every query, `retrieve_cached_ms` with the same
+queries again once they are all in the cache.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from unittest.mock import AsyncMock, Mock
+
+
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def make_embedding_model(dim: int) -> Mock:
+    """A model whose vectors are random but the same for the same text"""
+
+    async def invoke_embedding(model, input_text, extra_args):
+        return [[rng.random() for _ in range(dim)] for rng in map(random.Random, input_text)]
+
+    model = Mock()
+    model.model_entity.uuid = 'bench-embedding'
+    model.requester.invoke_embedding = AsyncMock(side_effect=invoke_embedding)
+    return model
+
+
+async def measure(layout: str, args) -> dict:
+    import sqlalchemy.ext.asyncio as sqlalchemy_asyncio
+
+    from langbot.pkg.entity.persistence import rag as persistence_rag
+    from langbot.pkg.persistence import mgr as persistencemgr
+    from langbot.pkg.rag.knowledge.services import embedder, retriever
+    from langbot.pkg.vector.vdbs.chroma import ChromaVectorDatabase
+
+    work_dir = tempfile.mkdtemp(prefix='langbot-bench-rag-')
+    ap = Mock()
+    ap.instance_config.data = {'rag': {'vector_payload': layout}, 'vdb': {}}
+    ap.metrics_mgr.should_sample.return_value = False
+    try:
+        engine = sqlalchemy_asyncio.create_async_engine(f'sqlite+aiosqlite:///{work_dir}/langbot.db')
+        async with engine.begin() as conn:
+            await conn.run_sync(persistence_rag.Chunk.__table__.create)
+        persistence_mgr = persistencemgr.PersistenceManager.__new__(persistencemgr.PersistenceManager)
+        persistence_mgr.ap = ap
+        persistence_mgr.get_db_engine = lambda: engine
+        ap.persistence_mgr = persistence_mgr
+
+        vector_db = ChromaVectorDatabase(ap, base_path=os.path.join(work_dir, 'chroma'))
+        ap.vector_db_mgr.vector_db = vector_db
+        search = vector_db.search
+        search_sizes = []
+        search_times = []
+
+        async def measured_search(*search_args, **search_kwargs):
+            started_at = time.perf_counter()
+            results = await search(*search_args, **search_kwargs)
+            search_times.append(time.perf_counter() - started_at)
+            search_sizes.append(len(json.dumps(results, default=str)))
+            return results
+
+        vector_db.search = measured_search
+
+        model = make_embedding_model(args.dim)
+        store = embedder.Embedder(ap)
+        text = ('The bench chunk describes a feature and its options in some detail. ' * 40)[: args.chunk_kb * 1024]
+        for start in range(0, args.chunks, 1000):
+            chunks = [f'{index} {text}' for index in range(start, min(start + 1000, args.chunks))]
+            await store.embed_and_store('bench', 'bench.pdf', chunks, model)
+
+        retrieve = retriever.Retriever(ap)
+        queries = [f'question {i}' for i in range(args.queries)]
+        started_at = time.perf_counter()
+        for query in queries:
+            retrieve.chunk_cache = retriever.ChunkTextCache()
+            results = await retrieve.retrieve('bench', query, model, k=args.top_k)
+        cold = (time.perf_counter() - started_at) / len(queries)
+
+        for query in queries:
+            await retrieve.retrieve('bench', query, model, k=args.top_k)
+        started_at = time.perf_counter()
+        for query in queries:
+            results = await retrieve.retrieve('bench', query, model, k=args.top_k)
+        warm = (time.perf_counter() - started_at) / len(queries)
+        assert all(result.metadata.get('text') for result in results)
+
+        await engine.dispose()
+        return {
+            'layout': layout,
+            'chunks': args.chunks,
+            'vdb_mb': round(directory_size(os.path.join(work_dir, 'chroma')) / 1024 / 1024, 1),
+            'db_mb': round(os.path.getsize(os.path.join(work_dir, 'langbot.db')) / 1024 / 1024, 1),
+            'search_kb': round(sum(search_sizes) / len(search_sizes) / 1024, 2),
+            'search_ms': round(sum(search_times) / len(search_times) * 1000, 3),
+            'retrieve_ms': round(cold * 1000, 3),
+            'retrieve_cached_ms': round(warm * 1000, 3),
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m tests.benchmark.rag_payload')
+    parser.add_argument('--chunks', type=int, default=5000)
+    parser.add_argument('--chunk-kb', type=int, default=1)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--output', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    import langbot.pkg.core.app  # noqa: F401, imports the services' dependencies in a working order
+
+    results = [asyncio.run(measure(layout, args)) for layout in ('full', 'lean')]
+    for result in results:
+        print(json.dumps(result), flush=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
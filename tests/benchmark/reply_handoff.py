@@ -0,0 +1,124 @@
+"""
+Latency and CPU cost of Official Account callbacks waiting for the pipeline reply to hand back in their response.
+
+    python -m tests.benchmark.reply_handoff [--callbacks 500] [--min-delay 0.2] [--max-delay 2.0]
+
+All callbacks are sent at once through the Quart test client. Each message is answered by a fake pipeline
+after a random delay, `handoff` is how long after the answer the callback returned it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import resource
+import sys
+import time
+import urllib.parse
+
+from . import report
+
+
+TOKEN = 'benchtoken'
+
+AES_KEY = 'b' * 43
+
+APPID = 'wxbench'
+
+MESSAGE_TEMPLATE = """<xml>
+<ToUserName><![CDATA[gh_bench]]></ToUserName>
+<FromUserName><![CDATA[user{index}]]></FromUserName>
+<CreateTime>1700000000</CreateTime>
+<MsgType><![CDATA[text]]></MsgType>
+<Content><![CDATA[Hello, what can you do?]]></Content>
+<MsgId>{index}</MsgId>
+</xml>"""
+
+
+class NullLogger:
+    async def error(self, *args, **kwargs):
+        print(*args, file=sys.stderr)
+
+
+def cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+async def run(args: argparse.Namespace) -> dict:
+    from langbot.libs.official_account_api.api import OAClient
+    from langbot.libs.wecom_api.WXBizMsgCrypt3 import WXBizMsgCrypt
+
+    client = OAClient(TOKEN, AES_KEY, APPID, 'secret', logger=NullLogger())
+    rng = random.Random(0)
+    answered_at: dict[int, float] = {}
+
+    async def answer(msg_id: int, delay: float):
+        await asyncio.sleep(delay)
+        answered_at[msg_id] = time.perf_counter()
+        await client.set_message(msg_id, f'reply {msg_id}')
+
+    @client.on_message('text')
+    async def on_text(event):
+        asyncio.create_task(answer(event.message_id, rng.uniform(args.min_delay, args.max_delay)))
+
+    crypt = WXBizMsgCrypt(TOKEN, AES_KEY, APPID)
+    requests = []
+    for index in range(args.callbacks):
+        _, body = crypt.EncryptMsg(MESSAGE_TEMPLATE.format(index=index), str(index), '1700000000')
+        signature = body.split('<MsgSignature><![CDATA[')[1].split(']]>')[0]
+        query = urllib.parse.urlencode({'msg_signature': signature, 'timestamp': '1700000000', 'nonce': str(index)})
+        requests.append((index, f'/callback/command?{query}', body))
+
+    test_client = client.app.test_client()
+    handoffs = []
+    errors = 0
+
+    async def callback(index: int, url: str, body: str):
+        nonlocal errors
+        response = await test_client.post(url, data=body)
+        returned_at = time.perf_counter()
+        if f'reply {index}'.encode() not in await response.get_data():
+            errors += 1
+            return
+        handoffs.append(returned_at - answered_at[index])
+
+    cpu_before = cpu_seconds()
+    started_at = time.perf_counter()
+    await asyncio.gather(*(callback(*request) for request in requests))
+    elapsed = time.perf_counter() - started_at
+    cpu = cpu_seconds() - cpu_before
+
+    return {
+        'callbacks': args.callbacks,
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'cpu_s': round(cpu, 3),
+        'cpu_share': round(cpu / elapsed, 3),
+        **report.summarize_latencies('handoff', handoffs),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m tests.benchmark.reply_handoff')
+    parser.add_argument('--callbacks', type=int, default=500)
+    parser.add_argument('--min-delay', type=float, default=0.2)
+    parser.add_argument('--max-delay', type=float, default=2.0)
+    parser.add_argument('--output', help='Write the result to this JSON file')
+    args = parser.parse_args()
+
+    import langbot.pkg.core.app  # noqa: F401, imports the libs' dependencies in a working order
+
+    result = asyncio.run(run(args))
+    print(json.dumps(result), flush=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Benchmark result summaries and regression comparison
+"""
+
+from __future__ import annotations
+
+import json
+import typing
+
+
+HIGHER_IS_BETTER = {'throughput_mps'}
+"""Every other compared metric is better when lower"""
+
+COMPARED_METRICS = (
+    'throughput_mps',
+    'latency_p50_ms',
+    'latency_p95_ms',
+    'latency_p99_ms',
+    'ttft_p50_ms',
+    'ttft_p95_ms',
+    'ttft_p99_ms',
+    'rss_peak_mb',
+    'loop_lag_p99_ms',
+)
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, min(len(sorted_values), int(q * len(sorted_values) + 0.999999)))
+    return sorted_values[rank - 1]
+
+
+def summarize_latencies(prefix: str, seconds: typing.Iterable[float]) -> dict[str, float]:
+    values = sorted(seconds)
+    return {
+        f'{prefix}_p50_ms': round(percentile(values, 0.50) * 1000, 2),
+        f'{prefix}_p95_ms': round(percentile(values, 0.95) * 1000, 2),
+        f'{prefix}_p99_ms': round(percentile(values, 0.99) * 1000, 2),
+        f'{prefix}_max_ms': round(values[-1] * 1000, 2) if values else 0.0,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.1) -> list[dict]:
+    """Per-metric change of `current` against `baseline`.
+
+    A metric regresses when it is worse by more than `threshold` (a fraction). Metrics that are
+    zero or missing on either side are skipped.
+    """
+    rows = []
+    for name in COMPARED_METRICS:
+        before = baseline.get('metrics', {}).get(name)
+        after = current.get('metrics', {}).get(name)
+        if not before or after is None:
+            continue
+        change = (after - before) / before
+        worse = -change if name in HIGHER_IS_BETTER else change
+        rows.append(
+            {
+                'metric': name,
+                'baseline': before,
+                'current': after,
+                'change': round(change, 4),
+                'regression': worse > threshold,
+            }
+        )
+    return rows
+
+
+def format_result(result: dict) -> str:
+    metrics = result['metrics']
+    lines = [f'scenario {result["scenario"]}: {metrics["completed"]}/{metrics["messages"]} messages']
+    for name, value in metrics.items():
+        if name not in ('completed', 'messages'):
+            lines.append(f'  {name:<20} {value}')
+    return '\n'.join(lines)
+
+
+def format_comparison(scenario: str, rows: list[dict]) -> str:
+    lines = [f'scenario {scenario}:']
+    for row in rows:
+        flag = '  REGRESSION' if row['regression'] else ''
+        lines.append(
+            f'  {row["metric"]:<20} {row["baseline"]:>10} -> {row["current"]:>10}  {row["change"] * 100:+6.1f}%{flag}'
+        )
+    return '\n'.join(lines)
+
+
+def load_results(path: str) -> dict[str, dict]:
+    """Scenario name -> result, from a file written by `run --output`"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return {result['scenario']: result for result in data['results']}
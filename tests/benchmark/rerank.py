@@ -0,0 +1,119 @@
+"""
+Prompt size and answer latency of knowledge base retrieval with and without the rerank step.
+
+    python -m tests.benchmark.rerank [--queries 20] [--candidates 20] [--top-k 5] [--chunk-kb 1]
+
+Every query retrieves `--candidates` chunks of `--chunk-kb` KB from a fake vector search, one of them holds
+the answer at a random rank. The chunks are put in the prompt of a fake LLM that takes 300 ms plus 0.2 ms per
+prompt token; the fake reranker takes 2 ms per (query, chunk) pair and scores the answer highest.
+
+- wide: no reranker, top_k `--candidates`, as knowledge bases are tuned to not miss the answer
+- narrow: no reranker, top_k `--top-k`
+- rerank: `rag.rerank.use` set, `--candidates` fetched and reranked down to top_k `--top-k`
+
+`answer_rate` is the share of queries whose prompt holds the answer.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from unittest.mock import Mock
+
+from . import report
+
+LLM_LATENCY_S = 0.3
+LLM_LATENCY_PER_TOKEN_S = 0.0002
+RERANK_LATENCY_PER_PAIR_S = 0.002
+
+
+def make_candidates(query: int, count: int, chunk_kb: int, rng: random.Random) -> list:
+    from langbot.pkg.entity.rag.retriever import RetrieveResultEntry
+
+    answer_at = rng.randrange(count)
+    filler = 'The bench chunk describes a feature and its options in some detail. ' * (chunk_kb * 16)
+    return [
+        RetrieveResultEntry(
+            id=f'{query}-{rank}',
+            metadata={
+                'text': (f'ANSWER {query} ' if rank == answer_at else f'chunk {rank} ') + filler[: chunk_kb * 1024]
+            },
+            distance=rank / count,
+        )
+        for rank in range(count)
+    ]
+
+
+async def measure(mode: str, tokenizer, args) -> dict:
+    from langbot.pkg.rag.rerank import reranker, rerankmgr
+
+    class BenchReranker(reranker.Reranker):
+        async def score(self, query: str, texts: list[str]) -> list[float]:
+            await asyncio.sleep(RERANK_LATENCY_PER_PAIR_S * len(texts))
+            return [1.0 if text.startswith('ANSWER') else 0.0 for text in texts]
+
+    ap = Mock()
+    ap.instance_config.data = {'rag': {'rerank': {'use': 'bench', 'candidates': args.candidates}}}
+    rerank_mgr = rerankmgr.RerankManager(ap)
+    if mode == 'rerank':
+        rerank_mgr.reranker = BenchReranker(ap, {})
+        rerank_mgr.reranker.name = 'bench'
+    top_k = args.candidates if mode == 'wide' else args.top_k
+
+    rng = random.Random(0)
+    latencies, rerank_latencies, prompt_tokens, answers = [], [], [], 0
+    for query in range(args.queries):
+        started_at = time.perf_counter()
+        # the vector search ranks the answer at a random place among the candidates
+        candidates = make_candidates(query, args.candidates, args.chunk_kb, rng)[: rerank_mgr.fetch_count(top_k)]
+        reranked_at = time.perf_counter()
+        entries = await rerank_mgr.rerank(f'question {query}', candidates, top_k)
+        rerank_latencies.append(time.perf_counter() - reranked_at)
+
+        prompt = '\n\n'.join(entry.metadata['text'] for entry in entries) + f'\n\nquestion {query}'
+        tokens = tokenizer.count_batch([prompt])[0]
+        await asyncio.sleep(LLM_LATENCY_S + LLM_LATENCY_PER_TOKEN_S * tokens)
+        latencies.append(time.perf_counter() - started_at)
+        prompt_tokens.append(tokens)
+        answers += any(entry.metadata['text'].startswith('ANSWER') for entry in entries)
+
+    return {
+        'mode': mode,
+        'queries': args.queries,
+        'chunks_in_prompt': top_k,
+        'prompt_tokens': round(sum(prompt_tokens) / len(prompt_tokens)),
+        'answer_rate': round(answers / args.queries, 2),
+        **report.summarize_latencies('rerank', rerank_latencies),
+        **report.summarize_latencies('latency', latencies),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m tests.benchmark.rerank')
+    parser.add_argument('--queries', type=int, default=20)
+    parser.add_argument('--candidates', type=int, default=20)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--chunk-kb', type=int, default=1)
+    parser.add_argument('--output', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    import langbot.pkg.core.app  # noqa: F401, imports the services' dependencies in a working order
+    from langbot.pkg.rag.knowledge.services.chunker import get_tokenizer
+
+    tokenizer = get_tokenizer()
+    results = [asyncio.run(measure(mode, tokenizer, args)) for mode in ('wide', 'narrow', 'rerank')]
+    for result in results:
+        print(json.dumps(result), flush=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+In-process stand-in for the plugin runtime connection
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import typing
+
+from . import fake_llm
+
+
+WEATHER_TOOL = {
+    'owner': 'bench/weather',
+    'rel_path': 'components/tools/weather.yaml',
+    'manifest': {
+        'apiVersion': 'v1',
+        'kind': 'Tool',
+        'metadata': {
+            'name': fake_llm.TOOL_NAME,
+            'label': {'en_US': 'Weather'},
+            'description': {'en_US': 'Get the weather of a city'},
+        },
+        'spec': {
+            'llm_prompt': 'Get the current weather of a city',
+            'parameters': {
+                'type': 'object',
+                'properties': {'city': {'type': 'string', 'description': 'City name'}},
+                'required': ['city'],
+            },
+        },
+    },
+}
+
+
+class StubRuntimeHandler:
+    """Replaces `PluginRuntimeConnector.handler`.
+
+    Payloads go through a JSON round trip like they do on the real connection, and every call
+    waits `latency_ms`. Events are returned unchanged, as if no plugin handled them.
+    """
+
+    latency: float
+
+    tools: list[dict]
+
+    calls: dict[str, int]
+
+    def __init__(self, latency_ms: float = 0, tools: bool = False):
+        self.latency = latency_ms / 1000
+        self.tools = [WEATHER_TOOL] if tools else []
+        self.calls = {}
+
+    async def _action(self, name: str, payload: typing.Any) -> typing.Any:
+        self.calls[name] = self.calls.get(name, 0) + 1
+        data = json.loads(json.dumps(payload, ensure_ascii=False))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return data
+
+    async def ping(self) -> dict:
+        return await self._action('ping', {})
+
+    async def emit_event(self, event_context: dict, include_plugins: list[str] | None = None) -> dict:
+        return {'event_context': await self._action('emit_event', event_context)}
+
+    async def list_tools(self, include_plugins: list[str] | None = None) -> list[dict]:
+        return await self._action('list_tools', self.tools)
+
+    async def call_tool(
+        self, tool_name: str, parameters: dict[str, typing.Any], include_plugins: list[str] | None = None
+    ) -> dict[str, typing.Any]:
+        parameters = await self._action('call_tool', parameters)
+        return {'city': parameters.get('city', ''), 'weather': 'sunny', 'temperature': 22}
+
+    async def list_commands(self, include_plugins: list[str] | None = None) -> list[dict]:
+        return await self._action('list_commands', [])
+
+    async def list_plugins(self) -> list[dict]:
+        return await self._action('list_plugins', [])
+
+    async def execute_command(
+        self, command_context: dict, include_plugins: list[str] | None = None
+    ) -> typing.AsyncGenerator[dict, None]:
+        await self._action('execute_command', command_context)
+        return
+        yield
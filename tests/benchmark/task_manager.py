@@ -0,0 +1,145 @@
+"""
+Memory kept and lookup time of the async task manager over many short query tasks.
+
+    python -m tests.benchmark.task_manager [--tasks 1000000] [--in-flight 100] [--fail-every 1000] [--lookups 100]
+
+`--tasks` query tasks are run through `AsyncTaskManager.create_task`, `--in-flight` at a time, and one in
+`--fail-every` raises. Then `get_task_by_id` is called for `--lookups` random task ids.
+
+- bounded: the task manager, finished tasks are dropped or kept in its per-kind history
+- unbounded: the task manager before the history, which kept every task in a list and scanned it for lookups
+
+Each mode runs in its own process, `rss_growth_mb` is the growth of its RSS over the run.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+from unittest.mock import Mock
+
+import psutil
+
+
+def make_unbounded_manager(ap):
+    from langbot.pkg.core import taskmgr
+
+    class UnboundedTaskManager(taskmgr.AsyncTaskManager):
+        """Every task in one list, as the task manager kept them before it was bounded"""
+
+        def __init__(self, ap):
+            super().__init__(ap)
+            self.tasks = []
+
+        def create_task(self, coro, task_type='system', kind='system-task', name='', label='', context=None, **kwargs):
+            wrapper = taskmgr.TaskWrapper(self.ap, coro, task_type, kind, name, label, context)
+            self.tasks.append(wrapper)
+            return wrapper
+
+        def get_task_by_id(self, id: int):
+            for t in self.tasks:
+                if t.id == id:
+                    return t
+            return None
+
+    return UnboundedTaskManager(ap)
+
+
+async def query(index: int, fail_every: int):
+    await asyncio.sleep(0)
+    if index % fail_every == fail_every - 1:
+        raise ValueError(f'query {index} failed')
+
+
+async def measure(mode: str, args) -> dict:
+    from langbot.pkg.core import taskmgr
+
+    ap = Mock()
+    ap.event_loop = asyncio.get_running_loop()
+    manager = taskmgr.AsyncTaskManager(ap) if mode == 'bounded' else make_unbounded_manager(ap)
+    process = psutil.Process()
+    rss_before = process.memory_info().rss
+
+    first_id = taskmgr.TaskWrapper._id_index
+    started_at = time.perf_counter()
+    for start in range(0, args.tasks, args.in_flight):
+        wrappers = [
+            manager.create_task(query(index, args.fail_every), kind='query', name=f'query-{index}')
+            for index in range(start, min(start + args.in_flight, args.tasks))
+        ]
+        await asyncio.gather(*(wrapper.task for wrapper in wrappers), return_exceptions=True)
+    elapsed = time.perf_counter() - started_at
+    rss_growth = process.memory_info().rss - rss_before
+
+    rng = random.Random(0)
+    ids = [rng.randrange(first_id, first_id + args.tasks) for _ in range(args.lookups)]
+    started_at = time.perf_counter()
+    for task_id in ids:
+        manager.get_task_by_id(task_id)
+    lookup = (time.perf_counter() - started_at) / len(ids)
+
+    kept = len(manager.tasks) + len(getattr(manager, 'finished_index', {}))
+    return {
+        'mode': mode,
+        'tasks': args.tasks,
+        'wrappers_kept': kept,
+        'rss_growth_mb': round(rss_growth / 1024 / 1024, 1),
+        'get_task_by_id_us': round(lookup * 1_000_000, 2),
+        'create_and_run_us': round(elapsed / args.tasks * 1_000_000, 2),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m tests.benchmark.task_manager')
+    parser.add_argument('--tasks', type=int, default=1_000_000)
+    parser.add_argument('--in-flight', type=int, default=100)
+    parser.add_argument('--fail-every', type=int, default=1000)
+    parser.add_argument('--lookups', type=int, default=100)
+    parser.add_argument('--mode', choices=['bounded', 'unbounded'], help='Run one mode in this process')
+    parser.add_argument('--output', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    if args.mode:
+        import langbot.pkg.core.app  # noqa: F401, imports the task manager's dependencies in a working order
+
+        print(json.dumps(asyncio.run(measure(args.mode, args))), flush=True)
+        return 0
+
+    results = []
+    for mode in ('bounded', 'unbounded'):
+        output = subprocess.run(
+            [
+                sys.executable,
+                '-m',
+                'tests.benchmark.task_manager',
+                '--mode',
+                mode,
+                '--tasks',
+                str(args.tasks),
+                '--in-flight',
+                str(args.in_flight),
+                '--fail-every',
+                str(args.fail_every),
+                '--lookups',
+                str(args.lookups),
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+        print(json.dumps(results[-1]), flush=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
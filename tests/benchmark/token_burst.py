@@ -0,0 +1,149 @@
+"""
+Requests to the WeCom token endpoint made by `WecomClient` when many messages are sent at once.
+
+    python -m tests.benchmark.token_burst [--burst 500] [--senders 200] [--duration 8] [--token-lifetime 3]
+
+The WeCom API is replaced by an in-process httpx transport: `gettoken` answers after 50 ms with a token
+that lives `--token-lifetime` seconds, `message/send` answers after 5 ms and rejects expired tokens with
+errcode 42001 like the real one.
+
+- burst: `--burst` messages sent at the same moment by a client without a token
+- steady: `--senders` concurrent senders, each sending a message every 20 ms for `--duration` seconds,
+  so tokens expire during the run
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+import urllib.parse
+
+import httpx
+
+
+class FakeWecom:
+    def __init__(self, lifetime: float):
+        self.lifetime = lifetime
+        self.issued: dict[str, float] = {}
+        self.token_requests = 0
+        self.rejected = 0
+        self.sent = 0
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        query = urllib.parse.parse_qs(request.url.query.decode())
+        if request.url.path.endswith('/gettoken'):
+            self.token_requests += 1
+            await asyncio.sleep(0.05)
+            token = f'token-{self.token_requests}'
+            self.issued[token] = time.monotonic() + self.lifetime
+            return httpx.Response(200, json={'errcode': 0, 'access_token': token, 'expires_in': self.lifetime})
+
+        await asyncio.sleep(0.005)
+        expires_at = self.issued.get(query.get('access_token', [''])[0])
+        if expires_at is None or time.monotonic() > expires_at:
+            self.rejected += 1
+            return httpx.Response(200, json={'errcode': 42001, 'errmsg': 'access_token expired'})
+        self.sent += 1
+        return httpx.Response(200, json={'errcode': 0})
+
+
+class NullLogger:
+    async def error(self, *args, **kwargs):
+        pass
+
+
+ORIGINAL_ASYNC_CLIENT = httpx.AsyncClient
+
+
+def install(fake: FakeWecom):
+    class MockedAsyncClient(ORIGINAL_ASYNC_CLIENT):
+        def __init__(self, *args, **kwargs):
+            kwargs['transport'] = httpx.MockTransport(fake.handle)
+            super().__init__(*args, **kwargs)
+
+    httpx.AsyncClient = MockedAsyncClient
+
+
+def make_client(corpid: str):
+    from langbot.libs.wecom_api.api import WecomClient
+
+    return WecomClient(corpid, 'secret', 'token', 'a' * 43, 'contacts', NullLogger())
+
+
+async def burst(count: int, lifetime: float) -> dict:
+    fake = FakeWecom(lifetime)
+    install(fake)
+    client = make_client('wwburst')
+
+    started_at = time.perf_counter()
+    results = await asyncio.gather(
+        *(client.send_private_msg(f'user{i}', 1000002, 'hello') for i in range(count)), return_exceptions=True
+    )
+    return {
+        'scenario': 'burst',
+        'messages': count,
+        'token_requests': fake.token_requests,
+        'rejected': fake.rejected,
+        'errors': sum(isinstance(result, BaseException) for result in results),
+        'elapsed_s': round(time.perf_counter() - started_at, 3),
+    }
+
+
+async def steady(senders: int, duration: float, lifetime: float) -> dict:
+    fake = FakeWecom(lifetime)
+    install(fake)
+    client = make_client('wwsteady')
+    errors = 0
+    deadline = time.monotonic() + duration
+
+    async def sender(index: int):
+        nonlocal errors
+        while time.monotonic() < deadline:
+            try:
+                await client.send_private_msg(f'user{index}', 1000002, 'hello')
+            except Exception:
+                errors += 1
+            await asyncio.sleep(0.02)
+
+    await asyncio.gather(*(sender(i) for i in range(senders)))
+    return {
+        'scenario': 'steady',
+        'senders': senders,
+        'duration_s': duration,
+        'token_lifetime_s': lifetime,
+        'sent': fake.sent,
+        'token_requests': fake.token_requests,
+        'rejected': fake.rejected,
+        'errors': errors,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m tests.benchmark.token_burst')
+    parser.add_argument('--burst', type=int, default=500)
+    parser.add_argument('--senders', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=8.0)
+    parser.add_argument('--token-lifetime', type=float, default=3.0)
+    parser.add_argument('--output', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    import langbot.pkg.core.app  # noqa: F401, imports the libs' dependencies in a working order
+
+    results = [
+        asyncio.run(burst(args.burst, args.token_lifetime)),
+        asyncio.run(steady(args.senders, args.duration, args.token_lifetime)),
+    ]
+    for result in results:
+        print(json.dumps(result), flush=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
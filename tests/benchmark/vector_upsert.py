@@ -0,0 +1,115 @@
+"""
+Vectors per second stored by the vector database backends of the knowledge bases.
+
+    python -m tests.benchmark.vector_upsert [--vectors 20000] [--dim 384] [--batch-size 256] [--parallel 4]
+
+`--vectors` random vectors with a small metadata payload are added to a new collection with
+`add_embeddings`, as the embedder does for one file.
+
+- qdrant: `QdrantVectorDatabase` on the in-process `:memory:` Qdrant of qdrant-client
+- chroma: `ChromaVectorDatabase`, embedded Chroma in a temporary directory
+
+- batched: `vdb.batch_size: --batch-size` (and `vdb.qdrant.parallel: --parallel`)
+- single: the whole file in one call, as before batching; Chroma refuses more vectors than its maximum
+  batch size in one call, such runs are reported as failed
+
+The in-process Qdrant has no network round trips, so it cannot show the gain of batches in flight in parallel.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from unittest.mock import Mock
+
+
+def make_ap(batch_size: int, parallel: int) -> Mock:
+    ap = Mock()
+    ap.instance_config.data = {
+        'vdb': {
+            'batch_size': batch_size,
+            'qdrant': {'url': '', 'host': 'localhost', 'port': 6333, 'api_key': None, 'parallel': parallel},
+        }
+    }
+    return ap
+
+
+def make_file(count: int, dim: int, seed: int = 0) -> tuple[list[str], list[list[float]], list[dict]]:
+    rng = random.Random(seed)
+    ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(count)]
+    embeddings = [[rng.random() for _ in range(dim)] for _ in range(count)]
+    metadatas = [{'file_id': 'bench.pdf', 'uuid': chunk_id} for chunk_id in ids]
+    return ids, embeddings, metadatas
+
+
+async def measure(backend: str, mode: str, vectors: tuple, args) -> dict:
+    ids, embeddings, metadatas = vectors
+    batch_size = args.batch_size if mode == 'batched' else len(ids)
+    ap = make_ap(batch_size, args.parallel if mode == 'batched' else 1)
+    work_dir = tempfile.mkdtemp(prefix='langbot-bench-vdb-')
+    try:
+        if backend == 'qdrant':
+            from qdrant_client import AsyncQdrantClient
+
+            from langbot.pkg.vector.vdbs import qdrant
+
+            # the backend builds a client of a Qdrant server from the config, it gets the in-process one instead
+            qdrant.AsyncQdrantClient = lambda **kwargs: AsyncQdrantClient(location=':memory:')
+            db = qdrant.QdrantVectorDatabase(ap)
+        else:
+            from langbot.pkg.vector.vdbs.chroma import ChromaVectorDatabase
+
+            db = ChromaVectorDatabase(ap, base_path=work_dir)
+            if mode == 'single':
+                # bypass the cap the backend puts on its batches, like the single call it replaced
+                db.batch_size = len(ids)
+
+        result = {'backend': backend, 'mode': mode, 'vectors': len(ids), 'batch_size': batch_size}
+        started_at = time.perf_counter()
+        try:
+            await db.add_embeddings('bench', ids, embeddings, metadatas)
+        except Exception as e:
+            result['error'] = f'{type(e).__name__}: {e}'[:200]
+            return result
+        elapsed = time.perf_counter() - started_at
+        result['elapsed_s'] = round(elapsed, 3)
+        result['vectors_per_s'] = round(len(ids) / elapsed)
+        return result
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m tests.benchmark.vector_upsert')
+    parser.add_argument('--vectors', type=int, default=20000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--parallel', type=int, default=4)
+    parser.add_argument('--backend', choices=['qdrant', 'chroma'], nargs='+', default=['qdrant', 'chroma'])
+    parser.add_argument('--output', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    import langbot.pkg.core.app  # noqa: F401, imports the backends' dependencies in a working order
+
+    vectors = make_file(args.vectors, args.dim)
+    results = [
+        asyncio.run(measure(backend, mode, vectors, args)) for backend in args.backend for mode in ('single', 'batched')
+    ]
+    for result in results:
+        print(json.dumps(result), flush=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
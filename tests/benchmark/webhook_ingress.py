@@ -0,0 +1,255 @@
+"""
+Requests per second of WeCom callbacks delivered to many bots, through the unified ingress on one port
+(`/bots/{bot_uuid}/callback`) or to one server per bot on its own port.
+
+    python -m tests.benchmark.webhook_ingress [--bots 50] [--requests 5000] [--concurrency 64] [--mode both]
+
+The bots run in a child process, the load generator in this one. Every request carries a distinct encrypted
+text message that the bot decrypts, parses and hands to its listener.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import types
+import urllib.parse
+
+import aiohttp
+import psutil
+
+from . import report
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CORPID = 'wwbench'
+
+TOKEN = 'benchtoken'
+
+MESSAGE_TEMPLATE = """<xml>
+<ToUserName><![CDATA[{corpid}]]></ToUserName>
+<FromUserName><![CDATA[user{index}]]></FromUserName>
+<CreateTime>{time}</CreateTime>
+<MsgType><![CDATA[text]]></MsgType>
+<Content><![CDATA[Hello, what can you do?]]></Content>
+<MsgId>{index}</MsgId>
+<AgentID>1000002</AgentID>
+</xml>"""
+
+
+def aes_key(bot_index: int) -> str:
+    """A distinct 43 character EncodingAESKey per bot"""
+    return base64.b64encode(hashlib.sha256(f'bot-{bot_index}'.encode()).digest()).decode()[:43]
+
+
+def bot_uuid(bot_index: int) -> str:
+    return f'bench-bot-{bot_index}'
+
+
+def adapter_config(bot_index: int, port: int) -> dict:
+    return {
+        'host': '127.0.0.1',
+        'port': port,
+        'corpid': CORPID,
+        'secret': 'secret',
+        'token': TOKEN,
+        'EncodingAESKey': aes_key(bot_index),
+        'contacts_secret': 'secret',
+    }
+
+
+class NullLogger:
+    async def info(self, *args, **kwargs):
+        pass
+
+    async def debug(self, *args, **kwargs):
+        pass
+
+    async def warning(self, *args, **kwargs):
+        pass
+
+    async def error(self, *args, **kwargs):
+        print(*args, file=sys.stderr)
+
+
+async def serve(mode: str, bots: int, port: int):
+    """Start the bots and run until killed"""
+    import langbot_plugin.api.definition.abstract.platform.event_logger as abstract_platform_logger
+    import langbot_plugin.api.entities.builtin.platform.events as platform_events
+
+    import langbot.pkg.core.app  # noqa: F401, imports the adapters' dependencies in a working order
+    from langbot.pkg.platform.sources import wecom
+
+    abstract_platform_logger.AbstractEventLogger.register(NullLogger)
+
+    received = 0
+
+    async def on_message(event, adapter):
+        nonlocal received
+        received += 1
+
+    adapters = []
+    for index in range(bots):
+        adapter = wecom.WecomAdapter(adapter_config(index, port + index), NullLogger())
+        adapter.register_listener(platform_events.FriendMessage, on_message)
+        adapters.append(adapter)
+
+    if mode == 'ports':
+        await asyncio.gather(*(adapter.run_async() for adapter in adapters))
+        return
+
+    import quart
+
+    from langbot.pkg.api.http.controller.groups.platform import callbacks
+    from langbot.pkg.platform import botmgr
+
+    ap = types.SimpleNamespace(instance_config=types.SimpleNamespace(data={}))
+    runtime_bots = {}
+    for index, adapter in enumerate(adapters):
+        bot_entity = types.SimpleNamespace(uuid=bot_uuid(index), adapter='wecom', enable=True)
+        runtime_bots[bot_entity.uuid] = botmgr.RuntimeBot(ap=ap, bot_entity=bot_entity, adapter=adapter, logger=None)
+
+    async def get_bot_by_uuid(uuid: str):
+        return runtime_bots.get(uuid)
+
+    ap.platform_mgr = types.SimpleNamespace(get_bot_by_uuid=get_bot_by_uuid)
+
+    app = quart.Quart(__name__)
+    await callbacks.BotCallbacksRouterGroup(ap, app).initialize()
+
+    async def shutdown_trigger_placeholder():
+        while True:
+            await asyncio.sleep(1)
+
+    await app.run_task(host='127.0.0.1', port=port, shutdown_trigger=shutdown_trigger_placeholder)
+
+
+def build_requests(mode: str, bots: int, port: int, count: int) -> list[tuple[str, bytes]]:
+    from langbot.libs.wecom_api.WXBizMsgCrypt3 import WXBizMsgCrypt
+
+    crypts = [WXBizMsgCrypt(TOKEN, aes_key(index), CORPID) for index in range(bots)]
+    requests = []
+    for index in range(count):
+        bot_index = index % bots
+        nonce = str(index)
+        timestamp = str(int(time.time()))
+        message = MESSAGE_TEMPLATE.format(corpid=CORPID, index=index, time=timestamp)
+        _, body = crypts[bot_index].EncryptMsg(message, nonce, timestamp)
+        signature = body.split('<MsgSignature><![CDATA[')[1].split(']]>')[0]
+        query = urllib.parse.urlencode({'msg_signature': signature, 'timestamp': timestamp, 'nonce': nonce})
+        if mode == 'ports':
+            url = f'http://127.0.0.1:{port + bot_index}/callback/command?{query}'
+        else:
+            url = f'http://127.0.0.1:{port}/bots/{bot_uuid(bot_index)}/callback?{query}'
+        requests.append((url, body.encode()))
+    return requests
+
+
+def wait_for_ports(ports: list[int], timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    for port in ports:
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f'port {port} did not open')
+                time.sleep(0.1)
+
+
+async def drive(requests: list[tuple[str, bytes]], concurrency: int) -> tuple[list[float], int, float]:
+    latencies = []
+    errors = 0
+    position = 0
+
+    async def worker(session: aiohttp.ClientSession):
+        nonlocal position, errors
+        while position < len(requests):
+            url, body = requests[position]
+            position += 1
+            started_at = time.perf_counter()
+            async with session.post(url, data=body) as response:
+                await response.read()
+                if response.status != 200:
+                    errors += 1
+            latencies.append(time.perf_counter() - started_at)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started_at = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started_at
+    return latencies, errors, elapsed
+
+
+def run_mode(mode: str, args: argparse.Namespace) -> dict:
+    command = [sys.executable, '-m', 'tests.benchmark.webhook_ingress', 'serve', mode, str(args.bots), str(args.port)]
+    server = subprocess.Popen(command, cwd=REPO_ROOT)
+    try:
+        ports = [args.port + index for index in range(args.bots)] if mode == 'ports' else [args.port]
+        wait_for_ports(ports)
+        process = psutil.Process(server.pid)
+
+        asyncio.run(drive(build_requests(mode, args.bots, args.port, args.bots * 2), args.concurrency))  # warmup
+        latencies, errors, elapsed = asyncio.run(
+            drive(build_requests(mode, args.bots, args.port, args.requests), args.concurrency)
+        )
+
+        return {
+            'mode': mode,
+            'bots': args.bots,
+            'listening_ports': len(ports),
+            'requests': len(latencies),
+            'errors': errors,
+            'rps': round(len(latencies) / elapsed, 1),
+            **report.summarize_latencies('latency', latencies),
+            'server_rss_mb': round(process.memory_info().rss / 1024 / 1024, 1),
+            'server_threads': process.num_threads(),
+        }
+    finally:
+        server.kill()
+        server.wait()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m tests.benchmark.webhook_ingress')
+    parser.add_argument('command', nargs='?', default='run', choices=['run', 'serve'])
+    parser.add_argument('serve_args', nargs='*', help=argparse.SUPPRESS)
+    parser.add_argument('--bots', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--port', type=int, default=23000)
+    parser.add_argument('--mode', choices=['unified', 'ports', 'both'], default='both')
+    parser.add_argument('--output', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        mode, bots, port = args.serve_args
+        asyncio.run(serve(mode, int(bots), int(port)))
+        return 0
+
+    modes = ['unified', 'ports'] if args.mode == 'both' else [args.mode]
+    results = []
+    for mode in modes:
+        result = run_mode(mode, args)
+        print(json.dumps(result), flush=True)
+        results.append(result)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+Tests for the benchmark fakes and the regression comparison
+"""
+
+import httpx
+import pytest
+
+from tests.benchmark import fake_llm, harness, report
+
+
+def test_percentiles():
+    """Test nearest-rank percentiles of latency samples"""
+    values = [i / 1000 for i in range(1, 101)]
+
+    summary = report.summarize_latencies('latency', values)
+
+    assert summary == {'latency_p50_ms': 50.0, 'latency_p95_ms': 95.0, 'latency_p99_ms': 99.0, 'latency_max_ms': 100.0}
+    assert report.percentile([], 0.5) == 0.0
+
+
+def test_compare_flags_regressions():
+    """Test that only metrics worse than the threshold are regressions, in the right direction"""
+    baseline = {'metrics': {'throughput_mps': 100.0, 'latency_p99_ms': 200.0, 'rss_peak_mb': 300.0, 'ttft_p50_ms': 0}}
+    current = {'metrics': {'throughput_mps': 85.0, 'latency_p99_ms': 150.0, 'rss_peak_mb': 320.0, 'ttft_p50_ms': 10}}
+
+    rows = {row['metric']: row for row in report.compare(baseline, current, threshold=0.1)}
+
+    assert rows['throughput_mps']['regression']
+    assert not rows['latency_p99_ms']['regression']
+    assert not rows['rss_peak_mb']['regression']
+    assert 'ttft_p50_ms' not in rows
+
+
+def test_bundled_scenarios_load():
+    """Test that every bundled scenario file is complete after merging the defaults"""
+    names = harness.list_scenarios()
+
+    assert {'chat', 'stream', 'rag', 'tool_call'} <= set(names)
+    for name in names:
+        scenario = harness.load_scenario(name)
+        assert scenario['name'] == name
+        assert scenario['load']['messages'] > 0
+
+
+@pytest.mark.asyncio
+async def test_fake_llm_streams_and_calls_tools():
+    """Test the fake server's streaming output and tool call turn"""
+    server = fake_llm.FakeLLMServer(output_tokens=3, tool_calls=True)
+    await server.start()
+    try:
+        async with httpx.AsyncClient(base_url=server.base_url) as client:
+            resp = await client.post(
+                '/chat/completions',
+                json={'model': 'm', 'stream': True, 'messages': [{'role': 'user', 'content': 'hi'}]},
+            )
+            events = [line for line in resp.text.split('\n\n') if line]
+            assert events[-1] == 'data: [DONE]'
+            assert len(events) == 5
+
+            resp = await client.post(
+                '/chat/completions',
+                json={'model': 'm', 'tools': [{}], 'messages': [{'role': 'user', 'content': 'weather?'}]},
+            )
+            message = resp.json()['choices'][0]['message']
+            assert message['tool_calls'][0]['function']['name'] == fake_llm.TOOL_NAME
+
+            resp = await client.post('/embeddings', json={'model': 'm', 'input': ['a', 'a', 'b']})
+            vectors = [item['embedding'] for item in resp.json()['data']]
+            assert vectors[0] == vectors[1] != vectors[2]
+            assert abs(sum(v * v for v in vectors[0]) - 1.0) < 1e-9
+    finally:
+        await server.stop()
+
+    assert server.requests == 3
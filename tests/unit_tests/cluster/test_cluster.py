@@ -0,0 +1,220 @@
+"""
+Tests for running pipelines on worker processes of a cluster
+"""
+
+import asyncio
+import datetime
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+import langbot_plugin.api.entities.builtin.platform.entities as platform_entities
+import langbot_plugin.api.entities.builtin.platform.events as platform_events
+import langbot_plugin.api.entities.builtin.platform.message as platform_message
+import langbot_plugin.api.entities.builtin.provider.session as provider_session
+import langbot_plugin.api.definition.abstract.platform.adapter as abstract_platform_adapter
+
+from langbot.pkg.cluster import backends, node, resp, ring
+from langbot.pkg.pipeline import pool
+from langbot.pkg.utils import imageref
+
+
+def test_hash_ring_moves_few_sessions():
+    """Test that sessions stay on their worker, and adding a worker moves only about its share of them"""
+    keys = [f'person_{i}' for i in range(4000)]
+    four = ring.HashRing(node.worker_ids(4))
+    before = {key: four.node_for(key) for key in keys}
+
+    again = ring.HashRing(node.worker_ids(4))
+    assert before == {key: again.node_for(key) for key in keys}
+    assert min(list(before.values()).count(worker) for worker in four.nodes) > 600
+
+    four.add('worker-5')
+    moved = [key for key in keys if four.node_for(key) != before[key]]
+    assert 500 < len(moved) < 1200
+    assert all(four.node_for(key) == 'worker-5' for key in moved)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('backend_name', ['memory', 'sql', 'redis'])
+async def test_backends_keep_order(backend_name, tmp_path):
+    """Test that every backend hands a topic's messages out once and in order, and times out when empty"""
+    broker = None
+    if backend_name == 'sql':
+        backend = backends.SQLQueueBackend(f'sqlite+aiosqlite:///{tmp_path}/queue.db')
+    elif backend_name == 'redis':
+        url = f'unix://{tmp_path}/broker.sock'
+        broker = resp.LocalBroker()
+        await broker.start(url)
+        backend = backends.RESPQueueBackend(url)
+    else:
+        backend = backends.MemoryQueueBackend()
+    await backend.initialize()
+
+    try:
+        for index in range(5):
+            await backend.publish('a', b'message-%d' % index)
+        await backend.publish('b', b'other')
+
+        assert [await backend.consume('a', 1) for _ in range(5)] == [b'message-%d' % i for i in range(5)]
+        assert await backend.consume('a', 0.05) is None
+        assert await backend.consume('b', 1) == b'other'
+    finally:
+        await backend.close()
+        if broker is not None:
+            await broker.stop()
+
+
+@pytest.mark.asyncio
+async def test_broker_keeps_message_of_disconnected_consumer(tmp_path):
+    """Test that a message pushed after a blocked consumer went away goes to the next consumer"""
+    url = f'unix://{tmp_path}/broker.sock'
+    broker = resp.LocalBroker()
+    await broker.start(url)
+
+    gone = resp.RESPConnection(url)
+    blocked = asyncio.create_task(gone.execute('BLPOP', 'q', 0))
+    await asyncio.sleep(0.05)
+    blocked.cancel()
+    await asyncio.sleep(0.05)
+
+    client = resp.RESPConnection(url)
+    await client.execute('RPUSH', 'q', 'hello')
+    assert await client.execute('BLPOP', 'q', 1) == [b'q', b'hello']
+
+    await client.close()
+    await broker.stop()
+
+
+def make_app(query_pool: pool.QueryPool) -> Mock:
+    ap = Mock()
+    ap.instance_config.data = {}
+    ap.query_pool = query_pool
+    ap.platform_mgr.reply_to_query = AsyncMock()
+    return ap
+
+
+@pytest.mark.asyncio
+async def test_replies_routed_back_to_ingress():
+    """Test that a query runs on the worker of its session and its replies are sent by the ingress node, in order"""
+    backend = backends.MemoryQueueBackend()
+    workers = node.worker_ids(3)
+    ingress_ap = make_app(None)
+    ingress = node.ClusterNode(ingress_ap, 'ingress', node.ROLE_INGRESS, backend, workers)
+    ingress_ap.query_pool = node.DispatchingQueryPool(ingress)
+    owner = ingress.ring.node_for('person_42')
+    worker_ap = make_app(pool.QueryPool())
+    worker = node.ClusterNode(worker_ap, owner, node.ROLE_WORKER, backend, workers)
+
+    adapter = Mock(spec=abstract_platform_adapter.AbstractMessagePlatformAdapter)
+    adapter.bot_account_id = 'bot'
+    adapter.is_stream_output_supported = AsyncMock(return_value=False)
+    event = platform_events.FriendMessage(
+        sender=platform_entities.Friend(id=42, nickname='user', remark=''),
+        message_chain=platform_message.MessageChain(
+            [platform_message.Source(id=7, time=datetime.datetime.now()), platform_message.Plain(text='hi')]
+        ),
+        source_platform_object=object(),
+    )
+    query = await ingress_ap.query_pool.add_query(
+        bot_uuid='bot-1',
+        launcher_type=provider_session.LauncherTypes.PERSON,
+        launcher_id=42,
+        sender_id=42,
+        message_event=event,
+        message_chain=event.message_chain,
+        adapter=adapter,
+        pipeline_uuid='pipeline-1',
+    )
+    assert ingress.dispatched == {owner: 1}
+
+    tasks = [asyncio.create_task(worker.run()), asyncio.create_task(ingress.run())]
+    try:
+        for _ in range(100):
+            if worker_ap.query_pool.queries:
+                break
+            await asyncio.sleep(0.01)
+        remote = worker_ap.query_pool.queries[0]
+        assert remote.launcher_id == 42 and str(remote.message_chain) == 'hi'
+        assert remote.message_chain.message_id == 7
+
+        await remote.adapter.reply_message(
+            remote.message_event, platform_message.MessageChain([platform_message.Plain(text='one')])
+        )
+        await remote.adapter.reply_message(
+            remote.message_event, platform_message.MessageChain([platform_message.Plain(text='two')])
+        )
+        await worker.finish_query(remote)
+        for _ in range(100):
+            if not ingress.pending:
+                break
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.01)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    calls = ingress_ap.platform_mgr.reply_to_query.await_args_list
+    assert [str(call.args[1]) for call in calls] == ['one', 'two']
+    assert all(call.args[0] is query for call in calls)
+    assert ingress.counts['done'] == 1 and not ingress.pending
+
+
+@pytest.mark.asyncio
+async def test_images_downloaded_by_ingress_on_demand(monkeypatch):
+    """Test that images are not downloaded to dispatch a query, and a worker gets one from the ingress node"""
+    monkeypatch.setattr(imageref, 'cache', imageref.ImageCache())
+    backend = backends.MemoryQueueBackend()
+    workers = node.worker_ids(1)
+    ingress_ap = make_app(None)
+    ingress = node.ClusterNode(ingress_ap, 'ingress', node.ROLE_INGRESS, backend, workers)
+    ingress_ap.query_pool = node.DispatchingQueryPool(ingress)
+    worker_ap = make_app(pool.QueryPool())
+    worker = node.ClusterNode(worker_ap, 'worker-1', node.ROLE_WORKER, backend, workers)
+
+    downloads = []
+
+    async def download():
+        downloads.append('img')
+        return b'png-bytes', 'image/png'
+
+    image = imageref.LazyImage.create('img-key', download, url='http://platform/img')
+    quoted = platform_message.Quote(origin=platform_message.MessageChain([image]))
+    event = platform_events.FriendMessage(
+        sender=platform_entities.Friend(id=42, nickname='user', remark=''),
+        message_chain=platform_message.MessageChain(
+            [platform_message.Image(url='http://other/img'), quoted, platform_message.Plain(text='look')]
+        ),
+    )
+    adapter = Mock(spec=abstract_platform_adapter.AbstractMessagePlatformAdapter)
+    adapter.bot_account_id = 'bot'
+    adapter.is_stream_output_supported = AsyncMock(return_value=False)
+    await ingress_ap.query_pool.add_query(
+        bot_uuid='bot-1',
+        launcher_type=provider_session.LauncherTypes.PERSON,
+        launcher_id=42,
+        sender_id=42,
+        message_event=event,
+        message_chain=event.message_chain,
+        adapter=adapter,
+        pipeline_uuid='pipeline-1',
+    )
+    assert downloads == []
+
+    tasks = [asyncio.create_task(worker.run()), asyncio.create_task(ingress.run())]
+    try:
+        for _ in range(100):
+            if worker_ap.query_pool.queries:
+                break
+            await asyncio.sleep(0.01)
+        remote = worker_ap.query_pool.queries[0].message_chain
+        assert not isinstance(remote[0], imageref.LazyImage)
+        remote_image = remote[1].origin[0]
+        assert isinstance(remote_image, imageref.LazyImage) and not remote_image.resolved
+        assert remote_image.url == 'http://platform/img'
+
+        assert await asyncio.wait_for(remote_image.get_bytes(), 5) == (b'png-bytes', 'image/png')
+        assert downloads == ['img']
+    finally:
+        for task in tasks:
+            task.cancel()
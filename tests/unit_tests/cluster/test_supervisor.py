@@ -0,0 +1,103 @@
+"""
+Tests for the worker processes of `langbot --workers N`
+"""
+
+import asyncio
+import sys
+from unittest.mock import Mock
+
+import pytest
+
+from langbot.pkg.cluster import node, supervisor
+
+
+def test_local_cluster_config(monkeypatch):
+    """Test that `--workers` makes the ingress and its workers share a broker and keeps the other cluster keys"""
+    file_cfg = {'enable': False, 'backend': 'sql', 'prefetch': 20}
+    assert supervisor.local_cluster_config(file_cfg) is file_cfg
+
+    monkeypatch.setattr(supervisor, 'local_workers', 4)
+    ingress = supervisor.local_cluster_config(file_cfg)
+    assert ingress['enable'] and ingress['role'] == node.ROLE_INGRESS and ingress['local_broker']
+    assert ingress['backend'] == 'redis' and ingress['url'].startswith('unix:///')
+    assert ingress['workers'] == 4 and ingress['prefetch'] == 20
+
+    monkeypatch.setattr(supervisor, 'local_worker_id', 'worker-3')
+    worker = supervisor.local_cluster_config(file_cfg)
+    assert worker['role'] == node.ROLE_WORKER and worker['node_id'] == 'worker-3'
+    assert worker['url'] == ingress['url']
+
+
+@pytest.mark.asyncio
+async def test_supervisor_restarts_exited_workers():
+    """Test that a worker process that exits is started again, and stopping the supervisor stops the workers"""
+    workers = supervisor.WorkerSupervisor(Mock(), 2, restart_delay=0.01)
+    assert workers.command('worker-2')[-4:] == ['--workers', '2', '--cluster-worker', 'worker-2']
+
+    # worker-1 exits at once, worker-2 keeps running
+    workers.command = lambda node_id: [
+        sys.executable,
+        '-c',
+        'import time; time.sleep(0 if "1" in "%s" else 60)' % node_id,
+    ]
+    task = asyncio.create_task(workers.run())
+    for _ in range(500):
+        if workers.restarts['worker-1'] >= 2:
+            break
+        await asyncio.sleep(0.01)
+    assert workers.restarts['worker-1'] >= 2 and workers.restarts['worker-2'] == 0
+    running = workers.processes['worker-2']
+    assert workers.to_dict()['worker-2']['running']
+
+    task.cancel()
+    await asyncio.wait({task})
+    assert running.returncode is not None
+
+
+def test_plugin_runtime_per_process(monkeypatch):
+    """Test that `--workers` refuses a plugin runtime the processes would have to share"""
+    ap = Mock()
+    ap.instance_config.data = {}
+    monkeypatch.setattr(supervisor.platform, 'get_platform', lambda: 'linux')
+    supervisor.check_plugin_runtime(ap)
+
+    monkeypatch.setattr(supervisor.platform, 'standalone_runtime', True)
+    with pytest.raises(ValueError):
+        supervisor.check_plugin_runtime(ap)
+
+    ap.instance_config.data = {'plugin': {'enable': False}}
+    supervisor.check_plugin_runtime(ap)
+
+
+@pytest.mark.parametrize(
+    'cluster_cfg, workers, worker_id, dispatching, supervised',
+    [
+        ({}, 0, '', False, False),
+        ({'enable': True, 'backend': 'memory', 'role': 'ingress'}, 0, '', True, False),
+        ({'enable': True, 'backend': 'memory', 'role': 'worker', 'node_id': 'worker-1'}, 0, '', False, False),
+        ({}, 2, '', True, True),
+        ({}, 2, 'worker-1', False, False),
+    ],
+    ids=['no-cluster', 'config-ingress', 'config-worker', 'workers-ingress', 'workers-worker'],
+)
+def test_query_pool_of_each_role(monkeypatch, cluster_cfg, workers, worker_id, dispatching, supervised):
+    """Test that only an ingress node dispatches its queries and every other process runs them in a local pool"""
+    from langbot.pkg.core.stages import build_app
+    from langbot.pkg.pipeline import pool
+
+    monkeypatch.setattr(supervisor, 'local_workers', workers)
+    monkeypatch.setattr(supervisor, 'local_worker_id', worker_id)
+    monkeypatch.setattr(supervisor, 'check_plugin_runtime', Mock())
+    ap = Mock()
+    ap.instance_config.data = {'cluster': cluster_cfg}
+    ap.cluster_workers = None
+
+    build_app.BuildAppStage().init_cluster(ap)
+
+    assert (ap.cluster is None) == (not cluster_cfg and not workers)
+    if dispatching:
+        assert isinstance(ap.query_pool, node.DispatchingQueryPool)
+    else:
+        assert type(ap.query_pool) is pool.QueryPool
+    assert isinstance(ap.cluster_workers, supervisor.WorkerSupervisor) == supervised
+    assert supervisor.check_plugin_runtime.called == (workers > 0)
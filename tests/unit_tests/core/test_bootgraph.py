@@ -0,0 +1,88 @@
+"""
+Tests for the dependency-aware boot graph
+"""
+
+import asyncio
+
+import pytest
+
+from langbot.pkg.core.bootgraph import BootGraph
+
+
+@pytest.mark.asyncio
+async def test_steps_wait_for_dependencies_only():
+    """Test that independent steps overlap and dependent steps start after their dependencies"""
+    events = []
+    graph = BootGraph()
+
+    def step(name: str, delay: float):
+        async def run():
+            events.append(f'{name} start')
+            await asyncio.sleep(delay)
+            events.append(f'{name} end')
+
+        return run
+
+    graph.add('persistence', step('persistence', 0.02))
+    graph.add('vector_db', step('vector_db', 0.02))
+    graph.add('models', step('models', 0.01), deps=['persistence'])
+    graph.add('rag', step('rag', 0), deps=['models', 'vector_db'])
+
+    await graph.run()
+
+    assert events.index('vector_db start') < events.index('persistence end')
+    assert events.index('models start') > events.index('persistence end')
+    assert events.index('rag start') > max(events.index('models end'), events.index('vector_db end'))
+    assert graph.critical_path() == ['persistence', 'models', 'rag']
+    assert 'rag' in graph.report()
+
+
+def test_invalid_graphs():
+    """Test that unknown dependencies and cycles are rejected before anything runs"""
+
+    async def noop():
+        pass
+
+    graph = BootGraph()
+    graph.add('a', noop, deps=['missing'])
+    with pytest.raises(ValueError, match='unknown step missing'):
+        graph.check()
+
+    graph = BootGraph()
+    graph.add('a', noop, deps=['b'])
+    graph.add('b', noop, deps=['a'])
+    with pytest.raises(ValueError, match='cycle'):
+        graph.check()
+
+    with pytest.raises(ValueError, match='already defined'):
+        graph.add('a', noop)
+
+
+@pytest.mark.asyncio
+async def test_failure_cancels_running_steps():
+    """Test that a failing step aborts the boot and cancels the others"""
+    cancelled = asyncio.Event()
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def broken():
+        raise RuntimeError('boom')
+
+    async def after_broken():
+        pass
+
+    graph = BootGraph()
+    graph.add('slow', slow)
+    graph.add('broken', broken)
+    graph.add('after_broken', after_broken, deps=['broken'])
+
+    with pytest.raises(RuntimeError, match='boom'):
+        await graph.run()
+
+    assert cancelled.is_set()
+    assert graph.steps['after_broken'].started_at is None
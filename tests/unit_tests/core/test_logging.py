@@ -0,0 +1,93 @@
+"""
+Tests for the logging pipeline and the web UI log cache
+"""
+
+import json
+import logging
+import queue
+
+from langbot.pkg.core.bootutils import log
+from langbot.pkg.utils import logcache
+
+
+def make_record(msg: str, level: int = logging.INFO, lineno: int = 10, created: float = 1000.0, **extra):
+    record = logging.LogRecord('langbot', level, '/app/chat.py', lineno, msg, None, None)
+    record.created = created
+    record.__dict__.update(extra)
+    return record
+
+
+def test_log_cache_pointer():
+    """Test that the (page, offset) pointer returns only newer logs"""
+    cache = logcache.LogCache()
+    for i in range(25):
+        cache.add_log(f'log {i}')
+
+    logs, page, offset = cache.get_log_by_pointer(0, 0)
+    assert logs.split('\n') == [f'log {i}' for i in range(25)]
+    assert (page, offset) == (1, 5)
+
+    cache.add_log('log 25')
+    logs, page, offset = cache.get_log_by_pointer(page, offset)
+    assert logs == 'log 25'
+    assert (page, offset) == (1, 6)
+
+    assert cache.get_log_by_pointer(page, offset) == ('', 1, 6)
+
+
+def test_log_cache_evicts_old_logs():
+    """Test that a stale pointer gets the logs still cached"""
+    cache = logcache.LogCache(capacity=10)
+    for i in range(30):
+        cache.add_log(f'log {i}')
+
+    logs, page, offset = cache.get_log_by_pointer(0, 3)
+    assert logs.split('\n') == [f'log {i}' for i in range(20, 30)]
+    assert (page, offset) == (1, 10)
+
+    logs, _, _ = cache.get_log_by_pointer(1, 5)
+    assert logs.split('\n') == [f'log {i}' for i in range(25, 30)]
+    assert cache.logs == [f'log {i}' for i in range(20, 30)]
+
+
+def test_rate_limit_per_call_site():
+    """Test that one call site is limited while others and warnings still pass"""
+    rate_filter = log.RateLimitFilter(rate=1, burst=2)
+
+    passed = [rate_filter.filter(make_record(f'chunk {i}')) for i in range(5)]
+    assert passed == [True, True, False, False, False]
+
+    assert rate_filter.filter(make_record('other line', lineno=20))
+    assert rate_filter.filter(make_record('warning', level=logging.WARNING))
+
+    record = make_record('chunk 5', created=1001.0)
+    assert rate_filter.filter(record)
+    assert record.getMessage() == 'chunk 5 (3 similar messages suppressed)'
+
+
+def test_json_formatter():
+    """Test that JSON records carry the message and extra fields"""
+    data = json.loads(log.JsonFormatter().format(make_record('hello %s', query_id=42)))
+
+    assert data['level'] == 'INFO'
+    assert data['msg'] == 'hello %s'
+    assert data['line'] == 10
+    assert data['query_id'] == 42
+
+
+def test_queue_handler_drops_when_full():
+    """Test that a full queue drops records and reports how many"""
+    log_queue = queue.Queue(maxsize=2)
+    handler = log.DroppingQueueHandler(log_queue)
+
+    for i in range(4):
+        handler.emit(make_record(f'line {i}'))
+    assert handler.dropped == 2
+
+    log_queue.get_nowait()
+    log_queue.get_nowait()
+    handler.emit(make_record('line 4', created=1002.0))
+
+    assert log_queue.get_nowait().getMessage() == 'line 4'
+    assert log_queue.get_nowait().getMessage() == '2 log records dropped, log queue full'
+    assert handler.dropped == 0
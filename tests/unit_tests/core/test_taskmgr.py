@@ -0,0 +1,119 @@
+"""
+Tests for the async task manager
+"""
+
+import asyncio
+
+import pytest
+from unittest.mock import Mock
+
+from langbot.pkg.core import taskmgr
+from langbot.pkg.core import entities as core_entities
+
+
+def make_manager(history_size: int = 100) -> taskmgr.AsyncTaskManager:
+    mock_app = Mock()
+    mock_app.event_loop = asyncio.get_running_loop()
+    return taskmgr.AsyncTaskManager(mock_app, history_size=history_size)
+
+
+async def settle():
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+async def succeed():
+    return 'ok'
+
+
+async def fail():
+    raise ValueError('boom')
+
+
+@pytest.mark.asyncio
+async def test_successful_query_tasks_are_dropped():
+    """Test that completed query tasks are not kept unless they failed"""
+    mgr = make_manager()
+
+    ok = mgr.create_task(succeed(), kind='query', name='query-ok')
+    failed = mgr.create_task(fail(), kind='query', name='query-failed')
+    await settle()
+
+    assert mgr.get_task_by_id(ok.id) is None
+    assert mgr.get_task_by_id(failed.id) is failed
+    assert mgr.tasks == {}
+
+
+@pytest.mark.asyncio
+async def test_cancelled_tasks_are_unindexed():
+    """Test that cancelling a task runs its done callback cleanly and moves it out of the running tasks"""
+    mgr = make_manager()
+    loop_errors = []
+    asyncio.get_running_loop().set_exception_handler(lambda loop, context: loop_errors.append(context))
+
+    query = mgr.create_task(asyncio.sleep(10), kind='query', name='query-cancelled')
+    system = mgr.create_task(asyncio.sleep(10), kind='system-task')
+    query.cancel()
+    system.cancel()
+    await settle()
+
+    assert loop_errors == []
+    assert mgr.tasks == {}
+    assert mgr.get_task_by_id(query.id) is None
+    assert mgr.get_task_by_id(system.id) is system
+    assert system.to_dict()['runtime']['exception'] is None
+
+
+@pytest.mark.asyncio
+async def test_finished_tasks_ring_buffer_per_kind():
+    """Test that finished tasks are bounded per kind"""
+    mgr = make_manager(history_size=2)
+
+    wrappers = [mgr.create_task(succeed(), kind='system-task') for _ in range(3)]
+    other = mgr.create_task(succeed(), kind='plugin-operation')
+    await settle()
+
+    assert mgr.get_task_by_id(wrappers[0].id) is None
+    assert mgr.get_task_by_id(wrappers[2].id) is wrappers[2]
+    assert mgr.get_task_by_id(other.id) is other
+    assert len(mgr.get_all_tasks()) == 3
+
+
+@pytest.mark.asyncio
+async def test_cancel_by_scope_uses_index():
+    """Test that only running tasks of the scope are cancelled and then unindexed"""
+    mgr = make_manager()
+
+    platform_task = mgr.create_task(
+        asyncio.sleep(10), kind='system-task', scopes=[core_entities.LifecycleControlScope.PLATFORM]
+    )
+    app_task = mgr.create_task(asyncio.sleep(10), kind='system-task')
+
+    mgr.cancel_by_scope(core_entities.LifecycleControlScope.PLATFORM)
+    await settle()
+
+    assert platform_task.task.cancelled()
+    assert not app_task.task.done()
+    assert mgr.scope_index[core_entities.LifecycleControlScope.PLATFORM] == {}
+
+    mgr.cancel_task(app_task.id)
+    await settle()
+    assert app_task.task.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_tasks_dict_pagination():
+    """Test newest-first paging of the task list"""
+    mgr = make_manager()
+
+    wrappers = [mgr.create_user_task(asyncio.sleep(10), kind='user-task') for _ in range(5)]
+
+    data = mgr.get_tasks_dict('user', page=2, page_size=2)
+
+    assert data['total'] == 5
+    assert [t['id'] for t in data['tasks']] == [wrappers[2].id, wrappers[1].id]
+    assert len(mgr.get_tasks_dict('user')['tasks']) == 5
+
+    for wrapper in wrappers:
+        wrapper.cancel()
+    await settle()
@@ -0,0 +1,38 @@
+"""
+Tests for lazily imported component classes
+"""
+
+from unittest.mock import Mock
+
+from langbot.pkg.discover import engine
+
+
+def make_component(name: str) -> Mock:
+    component = Mock()
+    component.metadata.name = name
+    component.get_python_component_class = Mock(return_value=type(name, (), {}))
+    return component
+
+
+def test_classes_are_imported_on_first_access():
+    """Test that only accessed components are imported, and only once"""
+    webchat = make_component('webchat')
+    telegram = make_component('telegram')
+    classes = engine.LazyComponentClassDict([webchat, telegram])
+
+    assert 'telegram' in classes
+    assert list(classes) == ['webchat', 'telegram']
+    telegram.get_python_component_class.assert_not_called()
+
+    assert classes['webchat'] is classes['webchat']
+    webchat.get_python_component_class.assert_called_once()
+    telegram.get_python_component_class.assert_not_called()
+    assert classes.is_loaded('webchat') and not classes.is_loaded('telegram')
+
+
+def test_unknown_component():
+    """Test that unknown names behave like a missing dict key"""
+    classes = engine.LazyComponentClassDict([make_component('webchat')])
+
+    assert 'discord' not in classes
+    assert classes.get('discord') is None
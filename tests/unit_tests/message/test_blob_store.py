@@ -0,0 +1,146 @@
+"""
+Tests for the blob store holding image bytes of messages
+"""
+
+import asyncio
+import base64
+
+import pytest
+
+import langbot_plugin.api.entities.builtin.provider.message as provider_message
+
+from langbot.pkg.utils import blobstore, imageref
+
+
+class MemoryStorage:
+    def __init__(self):
+        self.files = {}
+
+    async def save(self, key, value):
+        self.files[key] = value
+
+    async def load(self, key):
+        return self.files[key]
+
+    async def delete(self, key):
+        del self.files[key]
+
+
+class SlowStorage(MemoryStorage):
+    def __init__(self):
+        super().__init__()
+        self.saving = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def save(self, key, value):
+        self.saving.set()
+        await self.release.wait()
+        await super().save(key, value)
+
+
+def data_uri(data: bytes) -> str:
+    return f'data:image/png;base64,{base64.b64encode(data).decode()}'
+
+
+@pytest.mark.asyncio
+async def test_prompt_carries_handle_until_request(monkeypatch):
+    """Test that a stored image is referred to by handle and encoded only for the request, once per copy"""
+    monkeypatch.setattr(blobstore, 'store', blobstore.BlobStore())
+    monkeypatch.setattr(imageref, 'cache', imageref.ImageCache())
+
+    async def fetch():
+        return b'png-bytes', 'image/png'
+
+    image = imageref.LazyImage.create('img-1', fetch, url='http://img/1')
+    assert await imageref.store_chain([image]) == []
+    handle = imageref.image_content(image)
+    assert blobstore.is_handle(handle) and not image.base64
+
+    message = provider_message.Message(
+        role='user',
+        content=[
+            provider_message.ContentElement.from_text('look'),
+            provider_message.ContentElement.from_image_base64(handle),
+        ],
+    )
+    text_only = provider_message.Message(role='assistant', content='ok')
+
+    encoded = await blobstore.encode_messages([message, text_only])
+
+    assert encoded[0].content[1].image_base64 == data_uri(b'png-bytes')
+    assert message.content[1].image_base64 == handle
+    assert encoded[1] is text_only
+    assert await blobstore.store.put(b'png-bytes', 'image/png') == handle
+    assert blobstore.store.to_dict()['deduplicated'] == 1
+
+
+@pytest.mark.asyncio
+async def test_evicted_blobs_spill_to_storage():
+    """Test that blobs beyond the byte budget are saved to storage and read back, or dropped without storage"""
+    store = blobstore.BlobStore(max_bytes=10)
+    store.storage = MemoryStorage()
+
+    first = await store.put(b'aaaaaa', 'image/png')
+    second = await store.put(b'bbbbbb', 'image/jpeg')
+
+    assert store.size == 6 and store.spills == 1
+    assert await store.get(first) == (b'aaaaaa', 'image/png')
+    assert await store.get(second) == (b'bbbbbb', 'image/jpeg')
+    assert store.loads == 2
+
+    without_storage = blobstore.BlobStore(max_bytes=10)
+    first = await without_storage.put(b'aaaaaa', 'image/png')
+    await without_storage.put(b'bbbbbb', 'image/png')
+    with pytest.raises(blobstore.BlobNotFoundError):
+        await without_storage.get(first)
+    assert without_storage.lost == 1
+
+
+@pytest.mark.asyncio
+async def test_blob_found_while_being_spilled():
+    """Test that a blob being written to storage can still be read from memory"""
+    store = blobstore.BlobStore(max_bytes=10)
+    store.storage = SlowStorage()
+    first = await store.put(b'aaaaaa', 'image/png')
+
+    putting = asyncio.create_task(store.put(b'bbbbbb', 'image/png'))
+    await store.storage.saving.wait()
+    assert await store.get(first) == (b'aaaaaa', 'image/png')
+
+    store.storage.release.set()
+    await putting
+    assert store.size == 6 and store.spills == 1
+    assert await store.get(first) == (b'aaaaaa', 'image/png')
+
+
+@pytest.mark.asyncio
+async def test_spilled_blobs_pruned_beyond_budget():
+    """Test that the oldest spilled blobs are deleted from storage once the spill budget is exceeded"""
+    store = blobstore.BlobStore(max_bytes=10, max_spilled_bytes=12)
+    store.storage = MemoryStorage()
+
+    handles = [await store.put(data * 6, 'image/png') for data in (b'a', b'b', b'c', b'd')]
+
+    assert store.spills == 3 and store.pruned == 1
+    assert store.spilled_size == 12 and len(store.storage.files) == 2
+    with pytest.raises(blobstore.BlobNotFoundError):
+        await store.get(handles[0])
+    assert await store.get(handles[1]) == (b'bbbbbb', 'image/png')
+
+
+@pytest.mark.asyncio
+async def test_encode_dump_replaces_nested_handles(monkeypatch):
+    """Test that handles anywhere in an event dump become data URIs before it leaves the process"""
+    monkeypatch.setattr(blobstore, 'store', blobstore.BlobStore())
+    handle = await blobstore.store.put(b'xyz', 'image/png')
+    dump = {
+        'event': {
+            'prompt': [{'role': 'user', 'content': [{'type': 'image_base64', 'image_base64': handle}]}],
+            'query': {'message_chain': [{'type': 'Image', 'base64': 'data:image/png;base64,AAAA'}]},
+        }
+    }
+
+    await blobstore.encode_dump(dump)
+
+    assert dump['event']['prompt'][0]['content'][0]['image_base64'] == data_uri(b'xyz')
+    assert dump['event']['query']['message_chain'][0]['base64'] == 'data:image/png;base64,AAAA'
@@ -32,6 +32,10 @@ class MockApplication:
         self.query_pool = self._create_mock_query_pool()
         self.instance_config = self._create_mock_instance_config()
         self.task_mgr = self._create_mock_task_manager()
+        self.metrics_mgr = self._create_mock_metrics_manager()
+        self.trace_mgr = self._create_mock_trace_manager()
+        self.query_profiler = self._create_mock_query_profiler()
+        self.platform_mgr = self._create_mock_platform_manager()
 
     def _create_mock_logger(self):
         logger = Mock()
@@ -87,6 +91,33 @@ class MockApplication:
         task_mgr.create_task = Mock()
         return task_mgr
 
+    def _create_mock_metrics_manager(self):
+        metrics_mgr = Mock()
+        metrics_mgr.should_sample = Mock(return_value=False)
+        return metrics_mgr
+
+    def _create_mock_trace_manager(self):
+        trace_mgr = Mock()
+        trace_mgr.get_trace = Mock(return_value=None)
+        trace_mgr.start_span = Mock(return_value=None)
+        return trace_mgr
+
+    def _create_mock_query_profiler(self):
+        query_profiler = Mock()
+        query_profiler.armed = []
+        return query_profiler
+
+    def _create_mock_platform_manager(self):
+        async def reply_to_query(query, message, quote_origin=False):
+            # bots without a send queue reply through the query's adapter
+            await query.adapter.reply_message(
+                message_source=query.message_event, message=message, quote_origin=quote_origin
+            )
+
+        platform_mgr = Mock()
+        platform_mgr.reply_to_query = AsyncMock(side_effect=reply_to_query)
+        return platform_mgr
+
 
 @pytest.fixture
 def mock_app():
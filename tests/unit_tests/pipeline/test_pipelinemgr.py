@@ -168,3 +168,63 @@ async def test_runtime_pipeline_execute(mock_app, sample_query):
 
     # Verify stage was called
     mock_stage.process.assert_called_once()
+
+
+def make_traced_pipeline(mock_app, sample_query, stage_inst):
+    """A pipeline of one stage whose query is traced"""
+    from langbot.pkg.telemetry import tracing
+
+    pipelinemgr = get_pipelinemgr_module()
+    persistence_pipeline = get_persistence_pipeline_module()
+
+    mock_app.instance_config.data = {'tracing': {'enable': True}}
+    mock_app.trace_mgr = tracing.TraceManager(mock_app)
+    trace = mock_app.trace_mgr.start_trace('query')
+    sample_query.variables = {tracing.TRACE_ID_VAR: trace.trace_id}
+
+    pipeline_entity = Mock(spec=persistence_pipeline.LegacyPipeline)
+    pipeline_entity.config = sample_query.pipeline_config
+    pipeline_entity.extensions_preferences = {'plugins': []}
+    stage_container = pipelinemgr.StageInstContainer(inst_name='TestStage', inst=stage_inst)
+    return pipelinemgr.RuntimePipeline(mock_app, pipeline_entity, [stage_container]), trace
+
+
+@pytest.mark.asyncio
+async def test_failed_stage_span_ends_with_error(mock_app, sample_query):
+    """Test that a stage raising ends its span as failed and takes it off the trace's stack"""
+    stage_inst = Mock()
+    stage_inst.process = AsyncMock(side_effect=RuntimeError('boom'))
+    runtime_pipeline, trace = make_traced_pipeline(mock_app, sample_query, stage_inst)
+
+    with pytest.raises(RuntimeError):
+        await runtime_pipeline._execute_from_stage(0, sample_query)
+
+    stage_span = trace.spans[-1]
+    assert stage_span.name == 'stage TestStage'
+    assert stage_span.end_ns and stage_span.error == 'boom'
+    assert trace.stack == [trace.root] and trace.error
+
+
+@pytest.mark.asyncio
+async def test_interrupting_generator_ends_span_once(mock_app, sample_query, monkeypatch):
+    """Test that the span of a generator stage that interrupts the query is not ended a second time"""
+    from langbot.pkg.telemetry import tracing
+
+    entities = get_entities_module()
+
+    async def process(query, stage_inst_name):
+        yield entities.StageProcessResult.model_construct(
+            result_type=entities.ResultType.INTERRUPT, new_query=query, user_notice=[]
+        )
+
+    stage_inst = Mock()
+    stage_inst.process = process
+    runtime_pipeline, trace = make_traced_pipeline(mock_app, sample_query, stage_inst)
+    ended = []
+    span_end = tracing.Span.end
+    monkeypatch.setattr(tracing.Span, 'end', lambda span, error=None: (ended.append(span), span_end(span, error)))
+
+    await runtime_pipeline._execute_from_stage(0, sample_query)
+
+    assert ended == [trace.spans[-1]]
+    assert trace.stack == [trace.root]
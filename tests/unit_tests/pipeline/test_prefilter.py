@@ -0,0 +1,95 @@
+"""
+Tests for the ingress filter that checks group respond rules before messages are queued
+"""
+
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+import langbot_plugin.api.entities.builtin.platform.entities as platform_entities
+import langbot_plugin.api.entities.builtin.platform.events as platform_events
+import langbot_plugin.api.entities.builtin.platform.message as platform_message
+
+from langbot.pkg.pipeline.resprule import prefilter
+from langbot.pkg.telemetry import metrics
+
+
+def make_chain(*components) -> platform_message.MessageChain:
+    return platform_message.MessageChain(list(components))
+
+
+def make_filter(**rules) -> prefilter.IngressFilter:
+    return prefilter.IngressFilter.from_pipeline_config(
+        {'trigger': {'group-respond-rules': {'at': True, 'prefix': [], 'regexp': [], 'random': 0.0, **rules}}}
+    )
+
+
+def test_rules_match_like_the_stage():
+    """Test that mentions, prefixes and regexps pass and everything else is rejected"""
+    ingress_filter = make_filter(prefix=['/ai'], regexp=['.*weather'])
+
+    assert ingress_filter.check(make_chain(platform_message.At(target=999), platform_message.Plain(text='hi')), '999')
+    assert ingress_filter.check(make_chain(platform_message.Plain(text='/ai hello')), '999')
+    assert ingress_filter.check(make_chain(platform_message.Plain(text="what's the weather")), '999')
+    assert (
+        ingress_filter.check(make_chain(platform_message.At(target=1), platform_message.Plain(text='hi')), '999')
+        is False
+    )
+    assert ingress_filter.check(make_chain(platform_message.Plain(text='hello /ai')), '999') is False
+
+
+def test_random_and_broken_configs():
+    """Test that the random rule passes as None and configs the filter cannot handle disable it"""
+    assert make_filter(random=1.0).check(make_chain(platform_message.Plain(text='hi')), '999') is None
+    assert make_filter(regexp=['(']) is None
+    assert prefilter.IngressFilter.from_pipeline_config({}) is None
+
+
+def make_bot(pipeline_config: dict, bound_plugins: list[str]):
+    from langbot.pkg.platform import botmgr
+
+    ap = Mock()
+    ap.instance_config.data = {}
+    ap.metrics_mgr = metrics.MetricsManager(ap)
+    ap.plugin_connector.is_enable_plugin = True
+    ap.trace_mgr.start_trace = Mock(return_value=None)
+    ap.webhook_pusher = None
+    ap.query_pool.add_query = AsyncMock()
+    pipeline = Mock()
+    pipeline.bound_plugins = bound_plugins
+    pipeline.ingress_filter = prefilter.IngressFilter.from_pipeline_config(pipeline_config)
+    ap.pipeline_mgr.get_pipeline_by_uuid = AsyncMock(return_value=pipeline)
+
+    adapter = Mock()
+    adapter.bot_account_id = '999'
+    bot_entity = Mock()
+    bot_entity.uuid = 'bot-1'
+    bot_entity.use_pipeline_uuid = 'pipeline-1'
+    logger = Mock()
+    logger.info = AsyncMock()
+    return botmgr.RuntimeBot(ap=ap, bot_entity=bot_entity, adapter=adapter, logger=logger)
+
+
+def make_group_message(text: str) -> platform_events.GroupMessage:
+    group = platform_entities.Group(id=1, name='group', permission=platform_entities.Permission.Member)
+    sender = platform_entities.GroupMember(
+        id=2, member_name='user', group=group, permission=platform_entities.Permission.Member
+    )
+    return platform_events.GroupMessage(sender=sender, message_chain=make_chain(platform_message.Plain(text=text)))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('bound_plugins, queued', [([], 1), (['author/plugin'], 2)])
+async def test_group_messages_dropped_before_queueing(bound_plugins, queued):
+    """Test that unmatched group messages are counted and not queued, unless bound plugins may want them"""
+    bot = make_bot({'trigger': {'group-respond-rules': {'prefix': ['/ai']}}}, bound_plugins)
+    await bot.initialize()
+    listeners = {call.args[0]: call.args[1] for call in bot.adapter.register_listener.call_args_list}
+    on_group_message = listeners[platform_events.GroupMessage]
+
+    await on_group_message(make_group_message('/ai hello'), bot.adapter)
+    await on_group_message(make_group_message('chatting'), bot.adapter)
+
+    assert bot.ap.query_pool.add_query.await_count == queued
+    assert bot.logger.info.await_count == queued
+    assert bot.ap.metrics_mgr.ingress_prefiltered.get('bot-1') == 2 - queued
@@ -0,0 +1,133 @@
+"""
+Tests for the bot event log ring buffer
+"""
+
+import base64
+from importlib import import_module
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+import langbot_plugin.api.entities.builtin.platform.message as platform_message
+
+
+def get_module():
+    """Lazy import to avoid circular imports through the application module"""
+    import_module('langbot.pkg.core.app')
+    return import_module('langbot.pkg.platform.logger')
+
+
+def make_logger(event_log_cfg: dict | None = None):
+    ap = Mock()
+    ap.instance_config.data = {'event_log': event_log_cfg or {}}
+    ap.storage_mgr.storage_provider.save = AsyncMock()
+    ap.storage_mgr.storage_provider.delete = AsyncMock()
+    return get_module().EventLogger('test', ap)
+
+
+@pytest.mark.asyncio
+async def test_get_logs_by_seq_id():
+    """Test that get_logs returns the max_count logs ending at from_seq_id"""
+    logger = make_logger({'capacity': 10})
+    for i in range(25):
+        await logger.info(f'log {i}')
+
+    logs, total = await logger.get_logs(-1, 3)
+    assert [log.seq_id for log in logs] == [22, 23, 24]
+    assert total == 10
+
+    logs, _ = await logger.get_logs(17, 100)
+    assert [log.seq_id for log in logs] == list(range(15, 18))
+
+    assert (await logger.get_logs(14, 5))[0] == []  # evicted
+    assert (await logger.get_logs(40, 5))[0] == []  # not written yet
+    assert [log.seq_id for log in logger.logs] == list(range(15, 25))
+
+
+@pytest.mark.asyncio
+async def test_images_are_saved_in_background_and_deleted_on_eviction():
+    """Test that images are stored after logging and removed with the evicted log"""
+    logger = make_logger({'capacity': 2})
+    image = platform_message.Image(base64='data:image/png;base64,' + base64.b64encode(b'png').decode())
+
+    await logger.info('with image', images=[image], message_session_id='person_1')
+    log = logger.logs[0]
+    assert log.images == []
+
+    await logger.flush()
+    assert len(log.images) == 1
+    assert log.images[0].startswith('bot_log_images/person_1-') and log.images[0].endswith('.png')
+    logger.ap.storage_mgr.storage_provider.save.assert_awaited_once()
+
+    image_key = log.images[0]
+    await logger.info('second')
+    await logger.info('third')
+    await logger.flush()
+
+    logger.ap.storage_mgr.storage_provider.delete.assert_awaited_once_with(image_key)
+
+
+@pytest.mark.asyncio
+async def test_spilled_logs_are_readable(tmp_path):
+    """Test that logs evicted from memory are served from the disk segments"""
+    logger = make_logger(
+        {
+            'capacity': 5,
+            'spill': {'enable': True, 'path': str(tmp_path), 'max_segment_bytes': 400, 'max_segments': 100},
+        }
+    )
+    for i in range(30):
+        await logger.info(f'log {i}')
+    assert logger.spill.count < 25  # written in the background
+
+    await logger.flush()
+    assert len(logger.spill.segments) > 1
+
+    logs, total = await logger.get_logs(7, 6)
+    assert [log.seq_id for log in logs] == list(range(2, 8))
+    assert [log.text for log in logs] == [f'log {i}' for i in range(2, 8)]
+    assert total == 30
+
+    logs, _ = await logger.get_logs(27, 5)  # across disk and memory
+    assert [log.seq_id for log in logs] == list(range(23, 28))
+
+    logger.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_get_logs_waits_for_spill_writes(tmp_path):
+    """Test that logs evicted but not written yet are not missing from get_logs"""
+    logger = make_logger({'capacity': 2, 'spill': {'enable': True, 'path': str(tmp_path)}})
+    for i in range(10):
+        await logger.info(f'log {i}')
+
+    logs, total = await logger.get_logs(-1, 10)
+    assert [log.seq_id for log in logs] == list(range(10))
+    assert total == 10
+    logger.close()
+
+
+def test_spill_drops_oldest_segment(tmp_path):
+    """Test that the spill keeps at most max_segments files"""
+    logger_module = get_module()
+    spill = logger_module.EventLogSpill(str(tmp_path / 'bot'), max_segment_bytes=1, max_segments=2)
+    for i in range(4):
+        spill.append(logger_module.EventLog(seq_id=i, timestamp=0, level=logger_module.EventLogLevel.INFO, text=str(i)))
+
+    assert spill.first_seq_id == 2
+    assert [log.seq_id for log in spill.read(0, 10)] == [2, 3]
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+def test_startup_cleanup_keeps_other_files(tmp_path):
+    """Test that only the spill segment files of a previous run are deleted from the spill directory"""
+    logger_module = get_module()
+    spill = logger_module.EventLogSpill(str(tmp_path / 'bot_1-0a1b2c3d'))
+    spill.append(logger_module.EventLog(seq_id=0, timestamp=0, level=logger_module.EventLogLevel.INFO, text='x'))
+    (tmp_path / 'langbot-2026-10-19.log').write_text('app log')
+    (tmp_path / 'notes.jsonl').write_text('{}')
+
+    assert logger_module.remove_spilled_segments(str(tmp_path)) == 1
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['langbot-2026-10-19.log', 'notes.jsonl']
+    assert logger_module.remove_spilled_segments(str(tmp_path / 'missing')) == 0
@@ -0,0 +1,110 @@
+"""
+Tests for dropping messages a platform delivered more than once
+"""
+
+import datetime
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+import langbot_plugin.api.entities.builtin.platform.entities as platform_entities
+import langbot_plugin.api.entities.builtin.platform.events as platform_events
+import langbot_plugin.api.entities.builtin.platform.message as platform_message
+
+from langbot.pkg.platform import ingress
+from langbot.pkg.telemetry import metrics
+from langbot.pkg.utils import bloom
+
+
+def make_message(message_id, sender_id: int = 2, text: str = 'hello') -> platform_events.FriendMessage:
+    components = [platform_message.Plain(text=text)]
+    if message_id is not None:
+        components.insert(0, platform_message.Source(id=message_id, time=datetime.datetime.now()))
+    return platform_events.FriendMessage(
+        sender=platform_entities.Friend(id=sender_id, nickname='user', remark=''),
+        message_chain=platform_message.MessageChain(components),
+    )
+
+
+async def make_bot(bot_uuid: str, adapter_name: str):
+    """An app, a bot of the adapter and the bot's listener of friend messages"""
+    from langbot.pkg.platform import botmgr
+
+    ap = Mock()
+    ap.instance_config.data = {}
+    ap.metrics_mgr = metrics.MetricsManager(ap)
+    ap.trace_mgr.start_trace = Mock(return_value=None)
+    ap.webhook_pusher = None
+    ap.query_pool.add_query = AsyncMock()
+    bot_entity = Mock()
+    bot_entity.uuid = bot_uuid
+    bot_entity.adapter = adapter_name
+    logger = Mock()
+    logger.info = AsyncMock()
+    bot = botmgr.RuntimeBot(ap=ap, bot_entity=bot_entity, adapter=Mock(), logger=logger)
+    await bot.initialize()
+    listeners = {call.args[0]: call.args[1] for call in bot.adapter.register_listener.call_args_list}
+    return ap, bot, listeners[platform_events.FriendMessage]
+
+
+@pytest.mark.asyncio
+async def test_redelivered_message_not_queued(monkeypatch):
+    """Test that a message delivered twice is queued once and counted, and other messages are unaffected"""
+    monkeypatch.setattr(ingress, 'dedup', ingress.MessageDeduplicator())
+    ap, bot, on_friend_message = await make_bot('bot-1', 'telegram')
+
+    events = [
+        make_message(101),
+        make_message(101),
+        make_message(101, sender_id=3),
+        make_message(None),
+        make_message(None),
+    ]
+    for event in events:
+        await on_friend_message(event, bot.adapter)
+
+    assert ap.query_pool.add_query.await_count == 4
+    assert ap.metrics_mgr.ingress_duplicates.get('bot-1') == 1
+    assert ingress.dedup.to_dict()['duplicates'] == 1
+
+
+@pytest.mark.asyncio
+async def test_webchat_messages_not_deduplicated(monkeypatch):
+    """Test that WebChat debug messages to different pipelines, numbered from 1 for each, are all queued"""
+    monkeypatch.setattr(ingress, 'dedup', ingress.MessageDeduplicator())
+    ap, bot, on_friend_message = await make_bot('webchat-proxy-bot', 'webchat')
+
+    # the first message of the debug chats of pipeline A and pipeline B
+    await on_friend_message(make_message(1, text='to pipeline A'), bot.adapter)
+    await on_friend_message(make_message(1, text='to pipeline B'), bot.adapter)
+
+    assert ap.query_pool.add_query.await_count == 2
+    assert ingress.dedup.to_dict()['duplicates'] == 0
+
+
+def test_ids_forgotten_after_two_windows(monkeypatch):
+    """Test that ids are remembered for at least one window and dropped once two have passed"""
+    now = [1000.0]
+    monkeypatch.setattr(bloom.time, 'monotonic', lambda: now[0])
+    seen = bloom.RotatingBloomFilter(window=60, capacity=1000)
+
+    assert seen.check_and_add('a') is False
+    now[0] += 59
+    assert seen.check_and_add('a') is True
+    now[0] += 2
+    assert seen.check_and_add('b') is False
+    assert seen.check_and_add('a') is True
+    now[0] += 125
+    assert seen.check_and_add('a') is False
+
+
+def test_memory_bounded_under_flood():
+    """Test that generations rotate at capacity, so memory stays fixed and false positives rare"""
+    seen = bloom.RotatingBloomFilter(window=3600, capacity=10_000, error_rate=1e-4)
+    memory = seen.memory_bytes
+
+    false_positives = sum(seen.check_and_add(f'bot:person_1:{i}') for i in range(50_000))
+
+    assert seen.rotations == 4
+    assert seen.memory_bytes == 2 * memory
+    assert false_positives <= 10
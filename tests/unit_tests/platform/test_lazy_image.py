@@ -0,0 +1,98 @@
+"""
+Tests for lazily downloaded platform images and their cache
+"""
+
+import asyncio
+import base64
+
+import pytest
+
+import langbot_plugin.api.entities.builtin.platform.message as platform_message
+
+from langbot.pkg.utils import imageref
+
+
+def make_fetcher(data: bytes, calls: list, delay: float = 0):
+    async def fetch():
+        calls.append(data)
+        await asyncio.sleep(delay)
+        return data, 'image/png'
+
+    return fetch
+
+
+@pytest.mark.asyncio
+async def test_lazy_image_is_fetched_once_on_demand(monkeypatch):
+    """Test that nothing is downloaded until asked, and concurrent requests share one download"""
+    monkeypatch.setattr(imageref, 'cache', imageref.ImageCache())
+    calls = []
+    first = imageref.LazyImage.create('img-1', make_fetcher(b'abc', calls, delay=0.01), url='http://img/1')
+    second = imageref.LazyImage.create('img-1', make_fetcher(b'abc', calls), url='http://img/1')
+    chain = platform_message.MessageChain([platform_message.Plain(text='look'), first])
+
+    assert calls == []
+    assert isinstance(chain[1], platform_message.Image)
+    assert chain.model_dump()[1]['url'] == 'http://img/1'
+
+    uris = await asyncio.gather(first.resolve(), second.resolve())
+
+    assert uris[0] == uris[1] == f'data:image/png;base64,{base64.b64encode(b"abc").decode()}'
+    assert len(calls) == 1
+    assert await first.get_bytes() == (b'abc', 'image/png')
+    stats = imageref.cache.to_dict()
+    assert stats['references'] == 2 and stats['used'] == 2 and stats['fetches'] == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_is_bounded_by_bytes(monkeypatch):
+    """Test that the least recently used images are evicted once the byte budget is exceeded"""
+    cache = imageref.ImageCache(max_bytes=10)
+    calls = []
+
+    await cache.get('a', make_fetcher(b'aaaa', calls))
+    await cache.get('b', make_fetcher(b'bbbb', calls))
+    await cache.get('a', make_fetcher(b'aaaa', calls))
+    await cache.get('c', make_fetcher(b'cccc', calls))
+    await cache.get('big', make_fetcher(b'x' * 11, calls))
+
+    assert cache.size == 8
+    assert list(cache._entries) == ['a', 'c']
+    assert cache.evictions == 1
+    assert cache.hits == 1
+
+
+@pytest.mark.asyncio
+async def test_resolve_chain_reports_failures(monkeypatch):
+    """Test that images in quotes are resolved too and a failed download does not stop the others"""
+    monkeypatch.setattr(imageref, 'cache', imageref.ImageCache())
+
+    async def broken():
+        raise ConnectionError('gone')
+
+    ok = imageref.LazyImage.create('ok', make_fetcher(b'ok', []))
+    failed = imageref.LazyImage.create('failed', broken)
+    quote = platform_message.Quote(origin=platform_message.MessageChain([ok]))
+    chain = platform_message.MessageChain([quote, failed])
+
+    errors = await imageref.resolve_chain(chain)
+
+    assert [str(e) for e in errors] == ['gone']
+    assert ok.resolved and not failed.resolved
+    assert list(imageref.iter_lazy_images(chain)) == [failed]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_fail_others():
+    """Test that cancelling the query that started a download leaves it running for the others waiting on it"""
+    cache = imageref.ImageCache()
+    calls = []
+    first = asyncio.create_task(cache.get('img', make_fetcher(b'abc', calls, delay=0.05)))
+    await asyncio.sleep(0.01)
+    second = asyncio.create_task(cache.get('img', make_fetcher(b'abc', calls)))
+    await asyncio.sleep(0.01)
+
+    first.cancel()
+
+    assert await second == (b'abc', 'image/png')
+    assert first.cancelled()
+    assert len(calls) == 1 and cache.fetches == 1
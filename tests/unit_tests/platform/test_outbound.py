@@ -0,0 +1,143 @@
+"""
+Tests for the outbound send queue of bots
+"""
+
+import asyncio
+
+import pytest
+
+import langbot_plugin.api.entities.builtin.platform.message as platform_message
+
+from langbot.pkg.platform import outbound
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__('Flood control exceeded')
+        self.retry_after = retry_after
+
+
+class RecordingAdapter:
+    def __init__(self, delay: float = 0.0, fail: list[Exception] | None = None):
+        self.delay = delay
+        self.fail = list(fail or [])
+        self.sent: list[tuple[str, str, str]] = []
+
+    async def send_message(self, target_type: str, target_id: str, message: platform_message.MessageChain):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise self.fail.pop(0)
+        self.sent.append((target_type, target_id, str(message)))
+
+
+def make_dispatcher(adapter, **limits) -> outbound.OutboundDispatcher:
+    cfg = {'rate': 100, 'burst': 100, 'chat_rate': 100, 'chat_burst': 100, **limits}
+    return outbound.OutboundDispatcher(adapter, outbound.PlatformLimits(cfg), backoff_base=0.01)
+
+
+def text(value: str) -> platform_message.MessageChain:
+    return platform_message.MessageChain([platform_message.Plain(text=value)])
+
+
+@pytest.mark.asyncio
+async def test_chat_rate_limit_spaces_sends():
+    """Test that messages to one chat beyond its burst wait for the chat's bucket to refill"""
+    adapter = RecordingAdapter()
+    dispatcher = make_dispatcher(adapter, chat_rate=20, chat_burst=2)
+
+    loop = asyncio.get_running_loop()
+    started_at = loop.time()
+    await asyncio.gather(*(dispatcher.send('person', '1', text(str(i))) for i in range(4)))
+
+    assert [message for _, _, message in adapter.sent] == ['0', '1', '2', '3']
+    assert loop.time() - started_at >= 0.09
+    await dispatcher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_replies_sent_before_proactive_messages():
+    """Test that replies waiting for the bot's bucket go out before proactive messages queued earlier"""
+    adapter = RecordingAdapter()
+    dispatcher = make_dispatcher(adapter, rate=50, burst=1)
+
+    async def reply_message(message_source, message, quote_origin=False):
+        adapter.sent.append(('person', str(message_source.sender.id), str(message)))
+
+    adapter.reply_message = reply_message
+    source = type('Event', (), {'sender': type('Sender', (), {'id': 'r'})()})()
+
+    sends = [dispatcher.send('person', str(i), text(f'send {i}')) for i in range(3)]
+    await asyncio.gather(*sends, dispatcher.reply(source, text('reply')))
+
+    assert [message for _, _, message in adapter.sent] == ['reply', 'send 0', 'send 1', 'send 2']
+    await dispatcher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_short_messages_coalesced():
+    """Test that short text messages waiting for the same chat are sent as one, up to coalesce_max_chars"""
+    adapter = RecordingAdapter(delay=0.02)
+    dispatcher = make_dispatcher(adapter, coalesce=True, coalesce_max_chars=20)
+
+    await asyncio.gather(*(dispatcher.send('group', 'g', text(f'line {i}')) for i in range(4)))
+
+    assert [message for _, _, message in adapter.sent] == ['line 0\nline 1\nline 2', 'line 3']
+    assert dispatcher.counts['sent'] == 4
+    assert dispatcher.counts['coalesced'] == 2
+    await dispatcher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_send_retried_in_order():
+    """Test that a send rejected as rate limited is retried before the chat's later messages"""
+    adapter = RecordingAdapter(fail=[RateLimited(0.05)])
+    dispatcher = make_dispatcher(adapter)
+
+    await asyncio.gather(*(dispatcher.send('person', '1', text(str(i))) for i in range(3)))
+
+    assert [message for _, _, message in adapter.sent] == ['0', '1', '2']
+    assert dispatcher.counts['retried'] == 1
+
+
+@pytest.mark.asyncio
+async def test_queue_full_drops_message():
+    """Test that messages beyond max_pending fail instead of waiting"""
+    adapter = RecordingAdapter(delay=0.05)
+    dispatcher = make_dispatcher(adapter)
+    dispatcher.max_pending = 2
+
+    results = await asyncio.gather(
+        *(dispatcher.send('person', '1', text(str(i))) for i in range(3)), return_exceptions=True
+    )
+
+    assert sum(isinstance(result, outbound.OutboundQueueFullError) for result in results) == 1
+    assert dispatcher.counts['dropped'] == 1
+    await dispatcher.shutdown()
+
+
+def test_rate_limits_recognized_by_status_and_errcode():
+    """Test that only structured status codes and errcodes are taken as rate limits, not the error text"""
+    from langbot.libs.wecom_api.api import WecomAPIError
+
+    assert outbound.rate_limit_delay(RateLimited(2)) == 2.0
+    assert outbound.rate_limit_delay(WecomAPIError('Failed', {'errcode': 45009})) == 0.0
+    assert outbound.rate_limit_delay(WecomAPIError('Failed', {'errcode': 40014})) is None
+    assert outbound.rate_limit_delay(Exception('Failed to send message: msgid 4290045009')) is None
+    assert outbound.rate_limit_delay(Exception('429 Too Many Requests')) is None
+
+
+@pytest.mark.asyncio
+async def test_shutdown_cancels_sends_in_flight():
+    """Test that shutdown cancels the sends in progress and fails their messages"""
+    adapter = RecordingAdapter(delay=60)
+    dispatcher = make_dispatcher(adapter)
+
+    sending = asyncio.create_task(dispatcher.send('person', '1', text('hello')))
+    await asyncio.sleep(0.05)
+    assert len(dispatcher._sending) == 1
+
+    await dispatcher.shutdown()
+
+    with pytest.raises(asyncio.CancelledError):
+        await sending
+    assert not dispatcher._sending and dispatcher._worker is None
@@ -0,0 +1,73 @@
+"""
+Tests for handing pipeline replies to the callback requests waiting for them
+"""
+
+import asyncio
+import time
+import urllib.parse
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from langbot.libs.official_account_api.api import OAClient
+from langbot.libs.wecom_api.WXBizMsgCrypt3 import WXBizMsgCrypt
+from langbot.pkg.utils import pending
+
+AES_KEY = 'a' * 43
+
+MESSAGE = """<xml>
+<ToUserName><![CDATA[gh_bot]]></ToUserName>
+<FromUserName><![CDATA[user1]]></FromUserName>
+<CreateTime>1700000000</CreateTime>
+<MsgType><![CDATA[text]]></MsgType>
+<Content><![CDATA[hello]]></Content>
+<MsgId>42</MsgId>
+</xml>"""
+
+
+@pytest.mark.asyncio
+async def test_reply_kept_for_retry_and_expired():
+    """Test that a reply set while nobody waits is taken by the next callback and old message ids are forgotten"""
+    replies = pending.PendingReplies(ttl=0.05)
+
+    assert replies.attempt('m1') == 1
+    assert await replies.wait('m1', 0.01) is None
+    replies.set_result('m1', 'first')
+    replies.set_result('m1', 'second')
+    assert replies.attempt('m1') == 2
+    assert await replies.wait('m1', 0) == 'second'
+    assert replies.take('m1') is None
+
+    await asyncio.sleep(0.06)
+    replies.attempt('m2')
+    assert len(replies) == 1
+    assert replies.attempts('m1') == 0
+
+
+@pytest.mark.asyncio
+async def test_official_account_callback_wakes_on_reply():
+    """Test that the callback returns as soon as the reply is set and retries do not run the pipeline again"""
+    client = OAClient('token', AES_KEY, 'appid', 'secret', logger=Mock(error=AsyncMock()))
+    handled = []
+
+    @client.on_message('text')
+    async def on_text(event):
+        handled.append(event.message_id)
+        asyncio.get_running_loop().call_later(0.05, asyncio.ensure_future, client.set_message(42, 'hi there'))
+
+    _, body = WXBizMsgCrypt('token', AES_KEY, 'appid').EncryptMsg(MESSAGE, 'nonce', '1700000000')
+    signature = body.split('<MsgSignature><![CDATA[')[1].split(']]>')[0]
+    query = urllib.parse.urlencode({'msg_signature': signature, 'timestamp': '1700000000', 'nonce': 'nonce'})
+    test_client = client.app.test_client()
+
+    started_at = time.perf_counter()
+    response = await test_client.post(f'/callback/command?{query}', data=body)
+    elapsed = time.perf_counter() - started_at
+
+    assert b'hi there' in await response.get_data()
+    assert elapsed < 1
+    await client.set_message(42, 'again')
+    retry = await test_client.post(f'/callback/command?{query}', data=body)
+    assert b'again' in await retry.get_data()
+    assert handled == [42]
+    assert client.replies.attempts(42) == 2
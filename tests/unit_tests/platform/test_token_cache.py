@@ -0,0 +1,93 @@
+"""
+Tests for the access token cache shared by platform API clients
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from langbot.pkg.platform import tokens
+
+
+def make_fetcher(lifetime: float = 7200, delay: float = 0.01):
+    calls = []
+
+    async def fetch() -> tuple[str, float]:
+        calls.append(time.time())
+        await asyncio.sleep(delay)
+        return f'token-{len(calls)}', lifetime
+
+    return fetch, calls
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_fetch():
+    """Test that a burst of callers without a token causes one request to the token endpoint"""
+    cache = tokens.TokenCache()
+    fetch, calls = make_fetcher()
+
+    values = await asyncio.gather(*(cache.get('wecom:corp:a', fetch) for _ in range(100)))
+
+    assert set(values) == {'token-1'}
+    assert len(calls) == 1
+    assert cache.to_dict()['fetches'] == 1
+
+
+@pytest.mark.asyncio
+async def test_refreshed_in_background_before_expiry():
+    """Test that a token close to expiry is still returned while a new one is fetched"""
+    cache = tokens.TokenCache(refresh_before=0.5)
+    fetch, calls = make_fetcher(lifetime=1.0)
+
+    assert await cache.get('k', fetch) == 'token-1'
+    await asyncio.sleep(0.5)
+    assert await cache.get('k', fetch) == 'token-1'
+    await asyncio.sleep(0.05)
+    assert await cache.get('k', fetch) == 'token-2'
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_rejected_token_replaced_once():
+    """Test that requests rejected with 42001 retry with one new token however many fail together"""
+    cache = tokens.TokenCache()
+    fetch, calls = make_fetcher()
+    await cache.get('k', fetch)
+
+    async def request(value: str) -> dict:
+        await asyncio.sleep(0)
+        return {'errcode': 42001} if value == 'token-1' else {'errcode': 0, 'token': value}
+
+    results = await asyncio.gather(*(cache.call('k', fetch, request) for _ in range(20)))
+
+    assert {result['token'] for result in results} == {'token-2'}
+    assert len(calls) == 2
+    assert cache.invalidations == 1
+
+
+class MemoryStore:
+    def __init__(self):
+        self.tokens = {}
+
+    async def load(self, key):
+        return self.tokens.get(key)
+
+    async def save(self, key, token, expires_at):
+        self.tokens[key] = (token, expires_at)
+
+
+@pytest.mark.asyncio
+async def test_restored_from_store():
+    """Test that a stored token that is still fresh is used instead of fetching one after a restart"""
+    store = MemoryStore()
+    fetch, calls = make_fetcher()
+    before_restart = tokens.TokenCache()
+    before_restart.store = store
+    await before_restart.get('k', fetch)
+
+    after_restart = tokens.TokenCache()
+    after_restart.store = store
+
+    assert await after_restart.get('k', fetch) == 'token-1'
+    assert len(calls) == 1
@@ -0,0 +1,131 @@
+"""
+Tests for platform callbacks received on the main HTTP server
+"""
+
+import asyncio
+import types
+import urllib.parse
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+import quart
+
+import langbot_plugin.api.definition.abstract.platform.event_logger as abstract_platform_logger
+import langbot_plugin.api.entities.builtin.platform.events as platform_events
+
+import langbot.pkg.core.app  # noqa: F401
+from langbot.libs.wecom_api.WXBizMsgCrypt3 import WXBizMsgCrypt
+from langbot.pkg.api.http.controller.groups.platform import callbacks
+from langbot.pkg.platform import botmgr, ingress
+from langbot.pkg.platform.sources import wecom
+
+AES_KEY = 'a' * 43
+
+MESSAGE = """<xml>
+<ToUserName><![CDATA[corp]]></ToUserName>
+<FromUserName><![CDATA[user1]]></FromUserName>
+<CreateTime>1700000000</CreateTime>
+<MsgType><![CDATA[text]]></MsgType>
+<Content><![CDATA[hello]]></Content>
+<MsgId>{msg_id}</MsgId>
+<AgentID>1000002</AgentID>
+</xml>"""
+
+
+async def make_app(bots: dict) -> quart.Quart:
+    ap = Mock()
+    ap.platform_mgr.get_bot_by_uuid = AsyncMock(side_effect=lambda uuid: bots.get(uuid))
+    app = quart.Quart(__name__)
+    await callbacks.BotCallbacksRouterGroup(ap, app).initialize()
+    return app
+
+
+def make_wecom_bot(received: list) -> botmgr.RuntimeBot:
+    logger = Mock(spec=abstract_platform_logger.AbstractEventLogger)
+    logger.error = AsyncMock()
+    adapter = wecom.WecomAdapter(
+        {
+            'host': '0.0.0.0',
+            'port': 2290,
+            'corpid': 'corp',
+            'secret': 's',
+            'token': 'token',
+            'EncodingAESKey': AES_KEY,
+            'contacts_secret': 's',
+        },
+        logger,
+    )
+
+    async def on_message(event, adapter):
+        received.append(event)
+
+    adapter.register_listener(platform_events.FriendMessage, on_message)
+    ap = Mock()
+    ap.instance_config.data = {}
+    return botmgr.RuntimeBot(
+        ap=ap,
+        bot_entity=types.SimpleNamespace(uuid='bot-1', adapter='wecom', enable=True),
+        adapter=adapter,
+        logger=logger,
+    )
+
+
+def encrypt(msg_id: int) -> tuple[str, bytes]:
+    _, body = WXBizMsgCrypt('token', AES_KEY, 'corp').EncryptMsg(MESSAGE.format(msg_id=msg_id), 'nonce', '1700000000')
+    signature = body.split('<MsgSignature><![CDATA[')[1].split(']]>')[0]
+    query = urllib.parse.urlencode({'msg_signature': signature, 'timestamp': '1700000000', 'nonce': 'nonce'})
+    return query, body.encode()
+
+
+@pytest.mark.asyncio
+async def test_wecom_callback_routed_by_bot_uuid():
+    """Test that a WeCom callback on the shared path reaches the bot and the crypto context is reused"""
+    received = []
+    bot = make_wecom_bot(received)
+    client = (await make_app({'bot-1': bot})).test_client()
+
+    responses = []
+    for msg_id in (1, 2):
+        query, body = encrypt(msg_id)
+        responses.append(await client.post(f'/bots/bot-1/callback?{query}', data=body))
+    responses.append(await client.post(f'/bots/bot-2/callback?{query}', data=body))
+    first, second, unknown = responses
+
+    assert first.status_code == second.status_code == 200
+    assert unknown.status_code == 404
+    assert [event.message_chain.message_id for event in received] == [1, 2]
+    assert bot.adapter.bot.wxcpt is not None
+    assert bot.callback_limiter.handled == 2
+
+
+@pytest.mark.asyncio
+async def test_limiter_refuses_beyond_pending():
+    """Test that callbacks beyond the concurrency and pending limits are refused"""
+    limiter = ingress.CallbackLimiter(max_concurrency=1, max_pending=1)
+    release = asyncio.Event()
+
+    async def handler():
+        await release.wait()
+        return 'ok'
+
+    running = asyncio.create_task(limiter.run(handler))
+    waiting = asyncio.create_task(limiter.run(handler))
+    await asyncio.sleep(0)
+
+    with pytest.raises(ingress.CallbackBusyError):
+        await limiter.run(handler)
+
+    release.set()
+    assert await asyncio.gather(running, waiting) == ['ok', 'ok']
+    assert limiter.to_dict()['rejected'] == 1
+    assert limiter.active == 0
+
+
+def test_webhook_adapter_requires_handler():
+    """Test that a webhook adapter without a callback handler cannot be created"""
+
+    class NoHandler(ingress.WebhookAdapter):
+        pass
+
+    with pytest.raises(TypeError):
+        NoHandler()
@@ -0,0 +1,114 @@
+"""
+Tests for the token-aware, structure-aware chunker
+"""
+
+import pytest
+import tiktoken
+from unittest.mock import Mock
+
+from langbot.pkg.rag.knowledge.services import chunker as chunker_module
+from langbot.pkg.rag.knowledge.services.chunker import (
+    ApproximateTokenizer,
+    ChunkBuilder,
+    Chunker,
+    TiktokenTokenizer,
+    Tokenizer,
+    iter_blocks,
+)
+
+
+def make_builder(chunk_size: int, chunk_overlap: int = 0) -> ChunkBuilder:
+    return ChunkBuilder(ApproximateTokenizer(), chunk_size, chunk_overlap)
+
+
+def test_approximate_tokenizer_counts_cjk_per_character():
+    """Test that CJK text is counted per character and latin text per four characters"""
+    tokenizer = ApproximateTokenizer()
+
+    assert tokenizer.count_batch(['你好世界', 'abcdefgh']) == [4, 2]
+
+
+def test_tiktoken_split_keeps_multibyte_characters():
+    """Test that token windows never cut a character of several UTF-8 bytes in half"""
+    # one token per byte, so every CJK character spans three tokens
+    encoding = tiktoken.Encoding(
+        name='bytes', pat_str=r'\S+|\s+', mergeable_ranks={bytes([i]): i for i in range(256)}, special_tokens={}
+    )
+    tokenizer = TiktokenTokenizer(encoding)
+
+    windows = tokenizer.split('你好世界', size=4, overlap=1)
+
+    assert windows and all('\ufffd' not in window for window in windows)
+    assert ''.join(dict.fromkeys(''.join(windows))) == '你好世界'
+    with pytest.raises(TypeError):
+        Tokenizer()
+
+
+def test_tokenizer_fallback_is_retried(monkeypatch):
+    """Test that a failure to load the encoding is not kept after the retry interval"""
+    monkeypatch.setattr(chunker_module, '_tokenizers', {})
+    monkeypatch.setattr(chunker_module, '_failed_at', {})
+    encodings = {}
+    monkeypatch.setattr(tiktoken, 'get_encoding', lambda name: encodings[name])
+
+    assert isinstance(chunker_module.get_tokenizer('test'), ApproximateTokenizer)
+    encodings['test'] = Mock()
+    assert isinstance(chunker_module.get_tokenizer('test'), ApproximateTokenizer)
+
+    monkeypatch.setattr(chunker_module, 'TOKENIZER_RETRY_INTERVAL', 0)
+    tokenizer = chunker_module.get_tokenizer('test')
+    assert isinstance(tokenizer, TiktokenTokenizer)
+    assert chunker_module.get_tokenizer('test') is tokenizer
+
+
+def test_iter_blocks_keeps_code_and_tables_together():
+    """Test that code fences and tables are emitted as single blocks"""
+    text = '# Title\n\nintro\n\n```\nline 1\n\nline 2\n```\n\na | b\n--- | ---\n1 | 2\nafter'
+
+    blocks = list(iter_blocks(text))
+
+    assert [kind for kind, _ in blocks] == ['heading', 'text', 'code', 'table', 'text']
+    assert blocks[2][1] == '```\nline 1\n\nline 2\n```'
+    assert blocks[3][1] == 'a | b\n--- | ---\n1 | 2'
+
+
+def test_heading_starts_new_chunk():
+    """Test that a heading flushes the current chunk even if there is room left"""
+    builder = make_builder(chunk_size=100)
+
+    chunks = builder.feed('# A\n\nalpha\n\n# B\n\nbeta') + builder.finish()
+
+    assert chunks == ['# A\n\nalpha', '# B\n\nbeta']
+
+
+def test_chunks_respect_token_budget():
+    """Test that no chunk exceeds the chunk size, including oversized paragraphs"""
+    builder = make_builder(chunk_size=20, chunk_overlap=5)
+    text = '\n\n'.join(['word ' * 10] * 5 + ['x' * 400])
+
+    chunks = builder.feed(text) + builder.finish()
+    tokenizer = ApproximateTokenizer()
+
+    assert len(chunks) > 5
+    assert max(tokenizer.count_batch(chunks)) <= 20
+
+
+def test_overlap_carries_trailing_blocks():
+    """Test that trailing blocks within the overlap budget are repeated in the next chunk"""
+    builder = make_builder(chunk_size=10, chunk_overlap=3)
+
+    chunks = builder.feed('aaaaaaaa\n\nbbbbbbbb\n\ncccccccc\n\ndddddddd') + builder.finish()
+
+    assert chunks[0] == 'aaaaaaaa\n\nbbbbbbbb\n\ncccccccc'
+    assert chunks[1] == 'cccccccc\n\ndddddddd'
+
+
+@pytest.mark.asyncio
+async def test_chunker_reads_sizes_of_sections(monkeypatch):
+    """Test the async entry point with a stubbed tokenizer"""
+    monkeypatch.setattr(chunker_module, 'get_tokenizer', lambda name: ApproximateTokenizer())
+    chunker = Chunker(Mock(), chunk_size=8, chunk_overlap=0)
+
+    chunks = await chunker.chunk_sections(['page one text', 'page two text'])
+
+    assert chunks == ['page one text', 'page two text']
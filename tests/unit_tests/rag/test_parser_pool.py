@@ -0,0 +1,144 @@
+"""
+Tests for the process-pool document parser and the section chunker
+"""
+
+import asyncio
+import time
+
+import pytest
+from unittest.mock import Mock
+
+from langbot.pkg.rag.knowledge.services import parse_worker
+from langbot.pkg.rag.knowledge.services.parser import ParserPool
+from langbot.pkg.rag.knowledge.services.chunker import Chunker
+
+
+MARKDOWN_DOC = b"""# Title
+
+Intro paragraph.
+
+## Section A
+
+Alpha text.
+
+```
+code block
+```
+
+## Section B
+
+| a | b |
+|---|---|
+| 1 | 2 |
+"""
+
+
+def test_markdown_is_split_at_headings():
+    """Test that markdown sections start at every heading and keep code and tables"""
+    sections = parse_worker.parse_md(MARKDOWN_DOC)
+
+    assert len(sections) == 3
+    assert sections[0].startswith('# Title')
+    assert sections[1].startswith('## Section A')
+    assert '```\ncode block\n```' in sections[1]
+    assert sections[2].startswith('## Section B')
+    assert '1 | 2' in sections[2]
+
+
+def test_pool_from_config_defaults():
+    """Test that missing config falls back to defaults"""
+    pool = ParserPool.from_config({})
+
+    assert pool.workers == 2
+    assert pool.max_cpu_seconds == 60
+    assert pool.timeout == 120
+
+
+@pytest.mark.asyncio
+async def test_thread_fallback_when_no_workers():
+    """Test that workers=0 parses in the thread pool without spawning processes"""
+    pool = ParserPool(workers=0)
+
+    sections = await pool.run('txt', 'hello world'.encode('utf-8'))
+
+    assert sections == ['hello world']
+    assert pool._executors == set()
+
+
+@pytest.mark.asyncio
+async def test_process_pool_parse():
+    """Test parsing in a worker process"""
+    pool = ParserPool(workers=1)
+    try:
+        sections = await pool.run('md', MARKDOWN_DOC)
+    finally:
+        pool.shutdown()
+
+    assert len(sections) == 3
+
+
+def parse_slowly(data: bytes) -> list[str]:
+    """A parser taking `data` seconds, run in the pool's worker processes"""
+    time.sleep(float(data))
+    return ['parsed']
+
+
+@pytest.mark.asyncio
+async def test_timeout_only_recycles_its_worker(monkeypatch):
+    """Test that a parse timing out kills its own worker while a parse in another worker finishes"""
+    monkeypatch.setitem(parse_worker.parsers, 'slow', parse_slowly)
+    pool = ParserPool(workers=2, timeout=30)
+    try:
+        # start both workers
+        await asyncio.gather(pool.run('slow', b'0'), pool.run('slow', b'0'))
+        assert len(pool._executors) == 2
+
+        pool.timeout = 3
+        stuck = asyncio.create_task(pool.run('slow', b'60'))
+        await asyncio.sleep(2)
+        # in flight when the stuck parse is given up on
+        running = asyncio.create_task(pool.run('slow', b'2'))
+
+        with pytest.raises(TimeoutError):
+            await stuck
+        assert await running == ['parsed']
+        assert len(pool._executors) == 1
+
+        pool.timeout = 30
+        assert await pool.run('slow', b'0') == ['parsed']
+        assert len(pool._executors) == 2
+    finally:
+        pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_parse_recycles_its_worker(monkeypatch):
+    """Test that the worker of a cancelled parse is not handed to the next caller while still busy"""
+    monkeypatch.setitem(parse_worker.parsers, 'slow', parse_slowly)
+    pool = ParserPool(workers=1, timeout=30)
+    try:
+        await pool.run('slow', b'0')
+        (busy,) = pool._executors
+
+        abandoned = asyncio.create_task(pool.run('slow', b'60'))
+        await asyncio.sleep(0.5)
+        abandoned.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await abandoned
+        assert pool._executors == set()
+
+        pool.timeout = 20
+        assert await pool.run('slow', b'0') == ['parsed']
+        assert busy not in pool._executors
+    finally:
+        pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_chunk_sections_spans_section_boundaries():
+    """Test that the chunker merges short sections into one chunk"""
+    chunker = Chunker(Mock(), chunk_size=100, chunk_overlap=0)
+
+    chunks = await chunker.chunk_sections([f'section {i}' for i in range(4)])
+
+    assert chunks == ['section 0\n\nsection 1\n\nsection 2\n\nsection 3']
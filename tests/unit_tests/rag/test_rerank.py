@@ -0,0 +1,118 @@
+"""
+Tests for the optional rerank step
+"""
+
+import pytest
+from importlib import import_module
+from unittest.mock import Mock
+
+
+def get_modules():
+    """Lazy import to avoid circular imports through the application module"""
+    import_module('langbot.pkg.core.app')
+    rerankmgr = import_module('langbot.pkg.rag.rerank.rerankmgr')
+    reranker = import_module('langbot.pkg.rag.rerank.reranker')
+    retriever_entities = import_module('langbot.pkg.entity.rag.retriever')
+    return rerankmgr, reranker, retriever_entities
+
+
+def make_app(rerank_cfg: dict) -> Mock:
+    mock_app = Mock()
+    mock_app.logger = Mock()
+    mock_app.instance_config.data = {'rag': {'rerank': rerank_cfg}}
+    return mock_app
+
+
+def make_fake_reranker_class(reranker):
+    class LengthReranker(reranker.Reranker):
+        """Scores longer texts higher and records every batch it sees"""
+
+        calls: list[list[str]]
+
+        async def initialize(self):
+            self.calls = []
+
+        async def score(self, query: str, texts: list[str]) -> list[float]:
+            self.calls.append(texts)
+            return [float(len(text)) for text in texts]
+
+    return LengthReranker
+
+
+async def make_manager(rerank_cfg: dict):
+    rerankmgr, reranker, retriever_entities = get_modules()
+    mock_app = make_app(rerank_cfg)
+    component = Mock()
+    component.metadata.name = 'length'
+    component.get_python_component_class = Mock(return_value=make_fake_reranker_class(reranker))
+    mock_app.discover.get_components_by_kind = Mock(return_value=[component])
+
+    mgr = rerankmgr.RerankManager(mock_app)
+    await mgr.initialize()
+    return mgr, retriever_entities
+
+
+def make_entries(retriever_entities, texts: list[str]):
+    return [
+        retriever_entities.RetrieveResultEntry(id=f'c{i}', metadata={'text': text}, distance=float(i))
+        for i, text in enumerate(texts)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_disabled_by_default():
+    """Test that without `use` the manager keeps top_k and the vector order"""
+    mgr, retriever_entities = await make_manager({})
+
+    entries = make_entries(retriever_entities, ['a', 'bbb', 'cc'])
+
+    assert not mgr.enabled
+    assert mgr.fetch_count(5) == 5
+    assert [e.id for e in await mgr.rerank('q', entries, 2)] == ['c0', 'c1']
+
+
+@pytest.mark.asyncio
+async def test_rerank_orders_batches_and_caches():
+    """Test over-fetching, batched scoring, ordering and the score cache"""
+    mgr, retriever_entities = await make_manager({'use': 'length', 'candidates': 10, 'batch_size': 2})
+
+    entries = make_entries(retriever_entities, ['a', 'bbbb', 'cc', 'ddd', 'e'])
+
+    assert mgr.fetch_count(3) == 10
+
+    result = await mgr.rerank('q', entries, 3)
+
+    assert [e.id for e in result] == ['c1', 'c3', 'c2']
+    assert result[0].metadata['rerank_score'] == 4.0
+    assert [len(batch) for batch in mgr.reranker.calls] == [2, 2, 1]
+
+    # same query again is served from the cache
+    await mgr.rerank('q', make_entries(retriever_entities, ['a', 'bbbb', 'cc', 'ddd', 'e']), 3)
+    assert len(mgr.reranker.calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_reranker_failure_keeps_vector_order():
+    """Test that a failing reranker falls back to the vector search order"""
+    mgr, retriever_entities = await make_manager({'use': 'length'})
+
+    async def broken_score(query, texts):
+        raise RuntimeError('model unavailable')
+
+    mgr.reranker.score = broken_score
+
+    entries = make_entries(retriever_entities, ['a', 'bbbb', 'cc'])
+    result = await mgr.rerank('q', entries, 2)
+
+    assert [e.id for e in result] == ['c0', 'c1']
+
+
+def test_llm_reranker_parses_scores():
+    """Test parsing of the LLM reranker reply"""
+    get_modules()
+    llmreranker = import_module('langbot.pkg.rag.rerank.rerankers.llmreranker')
+    inst = llmreranker.LLMReranker(Mock(), {'model_uuid': 'm'})
+
+    assert inst._parse_scores('Scores: [3, 9.5, 0]', 3) == [3.0, 9.5, 0.0]
+    with pytest.raises(ValueError):
+        inst._parse_scores('[1, 2]', 3)
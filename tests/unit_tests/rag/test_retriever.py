@@ -0,0 +1,85 @@
+"""
+Tests for retriever hydration of lean vector payloads
+"""
+
+import pytest
+from importlib import import_module
+from unittest.mock import AsyncMock, Mock
+
+
+def get_retriever_module():
+    """Lazy import to avoid circular imports through the application module"""
+    import_module('langbot.pkg.core.app')
+    return import_module('langbot.pkg.rag.knowledge.services.retriever')
+
+
+def make_app(search_result: dict, db_rows: list[tuple[str, str]]) -> Mock:
+    mock_app = Mock()
+    mock_app.logger = Mock()
+    mock_app.vector_db_mgr.vector_db.search = AsyncMock(return_value=search_result)
+    db_result = Mock()
+    db_result.all = Mock(return_value=db_rows)
+    mock_app.persistence_mgr.execute_async = AsyncMock(return_value=db_result)
+    return mock_app
+
+
+def make_embedding_model() -> Mock:
+    model = Mock()
+    model.model_entity.uuid = 'embedding-model'
+    model.requester.invoke_embedding = AsyncMock(return_value=[[0.1, 0.2]])
+    return model
+
+
+@pytest.mark.asyncio
+async def test_lean_results_are_hydrated_with_one_query():
+    """Test that results without text are filled in by a single batched select"""
+    retriever_module = get_retriever_module()
+    search_result = {
+        'ids': [['c1', 'c2']],
+        'metadatas': [[{'uuid': 'c1', 'file_id': 'f'}, {'uuid': 'c2', 'file_id': 'f'}]],
+        'distances': [[0.1, 0.2]],
+    }
+    mock_app = make_app(search_result, [('c1', 'text one'), ('c2', 'text two')])
+    retriever = retriever_module.Retriever(mock_app)
+
+    results = await retriever.retrieve('kb', 'query', make_embedding_model(), k=2)
+
+    assert [r.metadata['text'] for r in results] == ['text one', 'text two']
+    mock_app.persistence_mgr.execute_async.assert_called_once()
+
+    # second search is served from the chunk cache
+    await retriever.retrieve('kb', 'query', make_embedding_model(), k=2)
+    mock_app.persistence_mgr.execute_async.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_full_results_skip_database():
+    """Test that results carrying their text do not touch the database"""
+    retriever_module = get_retriever_module()
+    search_result = {
+        'ids': [['c1']],
+        'metadatas': [[{'uuid': 'c1', 'file_id': 'f', 'text': 'inline text'}]],
+        'distances': [[0.1]],
+    }
+    mock_app = make_app(search_result, [])
+    retriever = retriever_module.Retriever(mock_app)
+
+    results = await retriever.retrieve('kb', 'query', make_embedding_model(), k=1)
+
+    assert results[0].metadata['text'] == 'inline text'
+    mock_app.persistence_mgr.execute_async.assert_not_called()
+
+
+def test_chunk_cache_evicts_least_recently_used():
+    """Test that the chunk cache stays within its capacity"""
+    retriever_module = get_retriever_module()
+    cache = retriever_module.ChunkTextCache(capacity=2)
+
+    cache.put('a', '1')
+    cache.put('b', '2')
+    cache.get('a')
+    cache.put('c', '3')
+
+    assert cache.get('b') is None
+    assert cache.get('a') == '1'
+    assert cache.get('c') == '3'
@@ -0,0 +1,62 @@
+"""
+Tests for the event loop lag monitor
+"""
+
+import asyncio
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from langbot.pkg.telemetry import loopmon, metrics
+
+
+def make_monitor(**loop_cfg) -> loopmon.LoopMonitor:
+    ap = Mock()
+    ap.instance_config.data = {'loop_monitor': {'interval_ms': 10, 'slow_threshold_ms': 50, **loop_cfg}}
+    ap.metrics_mgr = metrics.MetricsManager(ap)
+    return loopmon.LoopMonitor(ap)
+
+
+def blocking_call():
+    time.sleep(0.2)
+
+
+async def run_blocking(monitor: loopmon.LoopMonitor):
+    task = asyncio.create_task(monitor.run())
+    await asyncio.sleep(0.05)
+    blocking_call()
+    await asyncio.sleep(0.1)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+@pytest.mark.asyncio
+async def test_lag_is_measured():
+    """Test that a blocking call shows up in the lag histogram and is logged"""
+    monitor = make_monitor()
+
+    await run_blocking(monitor)
+
+    data = monitor.to_dict()
+    assert data['stall_count'] == 1
+    assert data['lag']['max'] >= 0.15
+    assert data['slow_callbacks'] == []
+    assert 'langbot_event_loop_lag_seconds_count' in monitor.ap.metrics_mgr.to_prometheus()
+    monitor.ap.logger.warning.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_slow_callback_is_attributed():
+    """Test that the watchdog names the function that blocked the loop"""
+    monitor = make_monitor(capture_stacks=True)
+
+    await run_blocking(monitor)
+
+    assert len(monitor.slow_callbacks) == 1
+    stall = monitor.slow_callbacks[0]
+    assert stall.location == f'{__name__}:blocking_call'
+    assert stall.duration >= 0.15
+    assert stall.samples > 1
+    assert 'blocking_call' in monitor.ap.logger.warning.call_args[0][0]
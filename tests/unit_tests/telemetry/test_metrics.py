@@ -0,0 +1,77 @@
+"""
+Tests for latency histograms and their exports
+"""
+
+import pytest
+from unittest.mock import Mock
+
+from langbot.pkg.telemetry import metrics
+
+
+def make_manager(config: dict | None = None) -> metrics.MetricsManager:
+    mock_app = Mock()
+    mock_app.instance_config.data = {'metrics': config or {}}
+    return metrics.MetricsManager(mock_app)
+
+
+def test_bucket_bounds_are_contiguous():
+    """Test that every value falls in the bucket whose upper bound is the first one above it"""
+    for value in range(0, 5000):
+        index = metrics.bucket_index(value)
+        assert value < metrics.bucket_upper_bound(index)
+        if index > 0:
+            assert value >= metrics.bucket_upper_bound(index - 1)
+
+
+def test_histogram_quantiles_within_bucket_error():
+    """Test that quantiles are within the 12.5% relative bucket error"""
+    histogram = metrics.Histogram()
+    for ms in range(1, 1001):
+        histogram.observe(ms / 1000)
+
+    assert histogram.count == 1000
+    assert histogram.quantile(0.5) == pytest.approx(0.5, rel=0.125)
+    assert histogram.quantile(0.99) == pytest.approx(0.99, rel=0.125)
+    assert histogram.quantile(1.0) == 1.0
+
+
+def test_prometheus_export():
+    """Test the Prometheus text format of a labelled histogram"""
+    mgr = make_manager()
+    mgr.stage_duration.observe(0.003, 'pipeline-1', 'ContentFilterStage', 'bot-1')
+    mgr.stage_duration.observe(0.2, 'pipeline-1', 'ContentFilterStage', 'bot-1')
+
+    text = mgr.to_prometheus()
+
+    labels = 'pipeline="pipeline-1",stage="ContentFilterStage",bot="bot-1"'
+    assert '# TYPE langbot_pipeline_stage_duration_seconds histogram' in text
+    assert f'langbot_pipeline_stage_duration_seconds_bucket{{{labels},le="0.001"}} 0' in text
+    assert f'langbot_pipeline_stage_duration_seconds_bucket{{{labels},le="0.005"}} 1' in text
+    assert f'langbot_pipeline_stage_duration_seconds_bucket{{{labels},le="+Inf"}} 2' in text
+    assert f'langbot_pipeline_stage_duration_seconds_count{{{labels}}} 2' in text
+
+
+def test_sampling():
+    """Test sampled mode decisions"""
+    assert make_manager().should_sample(1)
+    assert not make_manager({'enable': False}).should_sample(1)
+
+    mgr = make_manager({'sample_rate': 0.1})
+    decisions = [mgr.should_sample(query_id) for query_id in range(10000)]
+
+    # the same query always gets the same decision
+    assert decisions == [mgr.should_sample(query_id) for query_id in range(10000)]
+    assert 800 < sum(decisions) < 1200
+
+
+def test_counter_exports():
+    """Test that counters are exported as Prometheus counters and in the JSON stats"""
+    mgr = make_manager()
+    mgr.ingress_prefiltered.inc('bot-1')
+    mgr.ingress_prefiltered.inc('bot-1', amount=2)
+
+    assert mgr.ingress_prefiltered.get('bot-1') == 3
+    assert '# TYPE langbot_ingress_prefiltered_messages_total counter' in mgr.to_prometheus()
+    assert 'langbot_ingress_prefiltered_messages_total{bot="bot-1"} 3' in mgr.to_prometheus()
+    series = mgr.to_dict()['metrics']['langbot_ingress_prefiltered_messages_total']['series']
+    assert series == [{'labels': {'bot': 'bot-1'}, 'value': 3}]
@@ -0,0 +1,91 @@
+"""
+Tests for the per-query profiler
+"""
+
+import asyncio
+from unittest.mock import Mock
+
+import pytest
+
+from langbot.pkg.telemetry import profiler
+
+
+class MemoryStorage:
+    def __init__(self):
+        self.files = {}
+
+    async def save(self, key, value):
+        self.files[key] = value
+
+    async def load(self, key):
+        return self.files[key]
+
+    async def exists(self, key):
+        return key in self.files
+
+    async def delete(self, key):
+        del self.files[key]
+
+
+def make_profiler() -> tuple[profiler.QueryProfiler, list]:
+    ap = Mock()
+    ap.storage_mgr.storage_provider = MemoryStorage()
+    tasks = []
+    ap.task_mgr.create_task = Mock(side_effect=lambda coro, **kwargs: tasks.append(asyncio.create_task(coro)))
+    return profiler.QueryProfiler(ap), tasks
+
+
+def make_query(bot_uuid: str) -> Mock:
+    query = Mock()
+    query.query_id = 1
+    query.bot_uuid = bot_uuid
+    return query
+
+
+def busy_stage():
+    return [str(i) * 10 for i in range(20000)]
+
+
+async def process():
+    await asyncio.sleep(0)
+    return len(busy_stage())
+
+
+@pytest.mark.asyncio
+async def test_profiles_matching_queries_only():
+    """Test that only the armed number of matching queries is profiled and the report is stored"""
+    query_profiler, tasks = make_profiler()
+    query_profiler.arm(count=1, pipeline_uuid='p1', memory=True)
+
+    assert await query_profiler.profile(make_query('b1'), 'p2', process()) == 20000
+    assert not query_profiler.profiles
+
+    assert await query_profiler.profile(make_query('b1'), 'p1', process()) == 20000
+    await asyncio.gather(*tasks)
+
+    assert query_profiler.armed == []
+    (profile,) = query_profiler.profiles.values()
+    assert profile.status == 'done'
+    assert profile.pipeline_uuid == 'p1'
+    report = (await query_profiler.load(profile.id, 'txt')).decode()
+    assert 'busy_stage' in report
+    assert 'Memory' in report
+    assert await query_profiler.load(profile.id, 'prof')
+
+    await query_profiler.profile(make_query('b1'), 'p1', process())
+    assert len(query_profiler.profiles) == 1
+
+
+def test_arm_validation_and_disarm():
+    """Test the count bounds and cancelling arm requests"""
+    query_profiler, _ = make_profiler()
+
+    with pytest.raises(ValueError):
+        query_profiler.arm(count=0)
+
+    request = query_profiler.arm(count=2, bot_uuid='b1')
+    query_profiler.arm(count=1)
+    query_profiler.disarm(request.id)
+    assert len(query_profiler.armed) == 1
+    query_profiler.disarm()
+    assert query_profiler.armed == []
@@ -0,0 +1,112 @@
+"""
+Tests for query tracing and tail sampling
+"""
+
+import pytest
+from unittest.mock import Mock
+
+from langbot.pkg.telemetry import tracing
+
+
+def make_trace_mgr(**tracing_cfg) -> tracing.TraceManager:
+    ap = Mock()
+    ap.instance_config.data = {'tracing': {'enable': True, **tracing_cfg}}
+    return tracing.TraceManager(ap)
+
+
+def make_query(trace: tracing.Trace) -> Mock:
+    query = Mock()
+    query.variables = {tracing.TRACE_ID_VAR: trace.trace_id}
+    return query
+
+
+def test_disabled_by_default():
+    """Test that nothing is recorded without tracing.enable"""
+    ap = Mock()
+    ap.instance_config.data = {}
+    trace_mgr = tracing.TraceManager(ap)
+
+    assert trace_mgr.start_trace('query') is None
+    assert trace_mgr.start_span(Mock(variables={}), 'stage') is None
+
+
+def test_spans_nest_under_innermost_open_span():
+    """Test span parenting and the traceparent handed to the plugin runtime"""
+    trace_mgr = make_trace_mgr()
+    trace = trace_mgr.start_trace('query')
+    query = make_query(trace)
+
+    pipeline_span = trace_mgr.start_span(query, 'pipeline')
+    stage_span = trace_mgr.start_span(query, 'stage')
+
+    assert pipeline_span.parent_span_id == trace.root.span_id
+    assert stage_span.parent_span_id == pipeline_span.span_id
+    assert query.variables[tracing.TRACEPARENT_VAR] == f'00-{trace.trace_id}-{stage_span.span_id}-01'
+
+    trace_mgr.end_span(query, stage_span)
+
+    assert query.variables[tracing.TRACEPARENT_VAR] == pipeline_span.traceparent
+    assert stage_span.end_ns >= stage_span.start_ns
+
+
+def test_fast_traces_are_dropped():
+    """Test that successful fast queries are not exported at sample_rate 0"""
+    trace_mgr = make_trace_mgr(sample_rate=0)
+    trace = trace_mgr.start_trace('query')
+
+    trace_mgr.finish_trace(make_query(trace))
+
+    assert trace_mgr.export_queue.empty()
+    assert trace.trace_id not in trace_mgr.traces
+
+
+def test_failed_and_slow_traces_are_kept():
+    """Test that tail sampling keeps failed and slow queries"""
+    trace_mgr = make_trace_mgr(sample_rate=0, slow_threshold_ms=1000)
+
+    failed = trace_mgr.start_trace('query')
+    failed_query = make_query(failed)
+    trace_mgr.set_error(failed_query, 'boom')
+    trace_mgr.finish_trace(failed_query)
+
+    slow = trace_mgr.start_trace('query')
+    slow.root.start_ns -= 2_000_000_000
+    trace_mgr.finish_trace(make_query(slow))
+
+    assert trace_mgr.export_queue.qsize() == 2
+    assert failed.root.error == 'boom'
+
+
+def test_otlp_payload():
+    """Test the OTLP JSON structure of exported traces"""
+    trace_mgr = make_trace_mgr()
+    trace = trace_mgr.start_trace('query', {'bot.uuid': 'bot-1'})
+    query = make_query(trace)
+    span = trace_mgr.start_span(query, 'llm', {'llm.stream': True})
+    trace_mgr.end_span(query, span, 'timeout')
+    trace_mgr.finish_trace(query)
+
+    payload = trace_mgr.to_otlp([trace])
+    spans = payload['resourceSpans'][0]['scopeSpans'][0]['spans']
+
+    assert [s['name'] for s in spans] == ['query', 'llm']
+    assert 'parentSpanId' not in spans[0]
+    assert spans[1]['parentSpanId'] == spans[0]['spanId']
+    assert spans[0]['attributes'] == [{'key': 'bot.uuid', 'value': {'stringValue': 'bot-1'}}]
+    assert spans[1]['attributes'] == [{'key': 'llm.stream', 'value': {'boolValue': True}}]
+    assert spans[1]['status'] == {'code': 2, 'message': 'timeout'}
+    assert len(spans[0]['traceId']) == 32 and len(spans[0]['spanId']) == 16
+
+
+@pytest.mark.asyncio
+async def test_file_export(tmp_path):
+    """Test that the file exporter appends one OTLP payload per batch"""
+    path = tmp_path / 'traces.jsonl'
+    trace_mgr = make_trace_mgr(file={'path': str(path)})
+    trace = trace_mgr.start_trace('query')
+    trace_mgr.finish_trace(make_query(trace))
+
+    await trace_mgr.export([trace])
+    await trace_mgr.export([trace])
+
+    assert len(path.read_text().splitlines()) == 2
@@ -0,0 +1,64 @@
+"""
+Tests for batched upserts in the vector database backends
+"""
+
+import pytest
+from importlib import import_module
+from unittest.mock import AsyncMock, Mock, patch
+
+
+def get_modules():
+    """Lazy import to avoid circular imports through the application module"""
+    import_module('langbot.pkg.core.app')
+    qdrant = import_module('langbot.pkg.vector.vdbs.qdrant')
+    chroma = import_module('langbot.pkg.vector.vdbs.chroma')
+    return qdrant, chroma
+
+
+def make_app(vdb_config: dict) -> Mock:
+    mock_app = Mock()
+    mock_app.instance_config = Mock()
+    mock_app.instance_config.data = {'vdb': vdb_config}
+    mock_app.logger = Mock()
+    return mock_app
+
+
+@pytest.mark.asyncio
+async def test_qdrant_upserts_in_batches_and_waits_for_last():
+    """Test that Qdrant vectors are split into batches and only the last batch waits"""
+    qdrant, _ = get_modules()
+    mock_app = make_app(
+        {
+            'batch_size': 4,
+            'qdrant': {'url': '', 'host': 'localhost', 'port': 6333, 'api_key': '', 'parallel': 2},
+        }
+    )
+
+    with patch('langbot.pkg.vector.vdbs.qdrant.AsyncQdrantClient') as client_cls:
+        client = client_cls.return_value
+        client.collection_exists = AsyncMock(return_value=True)
+        client.upsert = AsyncMock()
+
+        vdb = qdrant.QdrantVectorDatabase(mock_app)
+        ids = [f'id-{i}' for i in range(10)]
+        await vdb.add_embeddings('kb', ids, [[0.1, 0.2]] * 10, [{'file_id': 'f'}] * 10)
+
+    calls = client.upsert.call_args_list
+    assert [len(call.kwargs['points']) for call in calls] == [4, 4, 2]
+    assert [call.kwargs['wait'] for call in calls] == [False, False, True]
+
+
+@pytest.mark.asyncio
+async def test_chroma_adds_in_batches(tmp_path):
+    """Test that Chroma receives batches no larger than the configured batch size"""
+    _, chroma = get_modules()
+    mock_app = make_app({'batch_size': 3})
+    vdb = chroma.ChromaVectorDatabase(mock_app, base_path=str(tmp_path))
+
+    collection = Mock()
+    vdb._collections['kb'] = collection
+
+    ids = [f'id-{i}' for i in range(7)]
+    await vdb.add_embeddings('kb', ids, [[0.1, 0.2]] * 7, [{'file_id': 'f'}] * 7)
+
+    assert [len(call.kwargs['ids']) for call in collection.add.call_args_list] == [3, 3, 1]
@@ -19,6 +19,7 @@ import {
 import PipelineFormComponent from './components/pipeline-form/PipelineFormComponent';
 import DebugDialog from './components/debug-dialog/DebugDialog';
 import PipelineExtension from './components/pipeline-extensions/PipelineExtension';
+import PipelineProfiling from './components/pipeline-profiling/PipelineProfiling';
 
 interface PipelineDialogProps {
   open: boolean;
@@ -32,7 +33,7 @@ interface PipelineDialogProps {
   onCancel: () => void;
 }
 
-type DialogMode = 'config' | 'debug' | 'extensions';
+type DialogMode = 'config' | 'debug' | 'extensions' | 'profiling';
 
 export default function PipelineDialog({
   open,
@@ -107,6 +108,19 @@ export default function PipelineDialog({
         </svg>
       ),
     },
+    {
+      key: 'profiling',
+      label: t('pipelines.profiling.title'),
+      icon: (
+        <svg
+          xmlns="http://www.w3.org/2000/svg"
+          viewBox="0 0 24 24"
+          fill="currentColor"
+        >
+          <path d="M3 12H7V21H3V12ZM17 8H21V21H17V8ZM10 2H14V21H10V2Z"></path>
+        </svg>
+      ),
+    },
   ];
 
   const getDialogTitle = () => {
@@ -118,6 +132,9 @@ export default function PipelineDialog({
     if (currentMode === 'extensions') {
       return t('pipelines.extensions.title');
     }
+    if (currentMode === 'profiling') {
+      return t('pipelines.profiling.title');
+    }
     return t('pipelines.debugDialog.title');
   };
 
@@ -212,6 +229,10 @@ export default function PipelineDialog({
                 <PipelineExtension pipelineId={pipelineId} />
               )}
 
+              {currentMode === 'profiling' && pipelineId && (
+                <PipelineProfiling pipelineId={pipelineId} />
+              )}
+
               {currentMode === 'debug' && pipelineId && (
                 <DebugDialog
                   open={true}
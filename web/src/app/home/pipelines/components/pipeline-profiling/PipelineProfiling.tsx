@@ -0,0 +1,203 @@
+'use client';
+
+import { useEffect, useState } from 'react';
+import { useTranslation } from 'react-i18next';
+import { backendClient } from '@/app/infra/http';
+import { Button } from '@/components/ui/button';
+import { Input } from '@/components/ui/input';
+import { Switch } from '@/components/ui/switch';
+import { Badge } from '@/components/ui/badge';
+import { toast } from 'sonner';
+import { Download, X } from 'lucide-react';
+import { ProfileRequest, QueryProfile } from '@/app/infra/entities/api';
+
+const REFRESH_INTERVAL_MS = 3000;
+
+export default function PipelineProfiling({
+  pipelineId,
+}: {
+  pipelineId: string;
+}) {
+  const { t } = useTranslation();
+  const [count, setCount] = useState(1);
+  const [memory, setMemory] = useState(true);
+  const [armed, setArmed] = useState<ProfileRequest[]>([]);
+  const [profiles, setProfiles] = useState<QueryProfile[]>([]);
+  const [backend, setBackend] = useState('');
+
+  useEffect(() => {
+    loadProfiling();
+    const timer = setInterval(loadProfiling, REFRESH_INTERVAL_MS);
+    return () => clearInterval(timer);
+  }, [pipelineId]);
+
+  const loadProfiling = async () => {
+    try {
+      const data = await backendClient.getProfiling();
+      setBackend(data.backend);
+      setArmed(data.armed.filter((r) => r.pipeline_uuid === pipelineId));
+      setProfiles(
+        data.profiles.filter((p) => p.pipeline_uuid === pipelineId),
+      );
+    } catch (error) {
+      console.error('Failed to load profiling status:', error);
+    }
+  };
+
+  const handleArm = async () => {
+    try {
+      await backendClient.armProfiling({
+        count,
+        pipeline_uuid: pipelineId,
+        memory,
+      });
+      toast.success(t('pipelines.profiling.armSuccess'));
+      loadProfiling();
+    } catch (error) {
+      toast.error(
+        t('pipelines.profiling.armError') + (error as Error).message,
+      );
+    }
+  };
+
+  const handleDisarm = async (requestId: string) => {
+    await backendClient.disarmProfiling(requestId);
+    loadProfiling();
+  };
+
+  const handleDelete = async (profileId: string) => {
+    await backendClient.deleteProfile(profileId);
+    loadProfiling();
+  };
+
+  const handleDownload = async (profileId: string, kind: 'txt' | 'prof') => {
+    try {
+      const blob = await backendClient.downloadProfile(profileId, kind);
+      const url = URL.createObjectURL(blob);
+      const link = document.createElement('a');
+      link.href = url;
+      link.download = `profile-${profileId}.${kind}`;
+      link.click();
+      URL.revokeObjectURL(url);
+    } catch (error) {
+      toast.error(
+        t('pipelines.profiling.downloadError') + (error as Error).message,
+      );
+    }
+  };
+
+  return (
+    <div className="space-y-6">
+      <div className="space-y-3">
+        <p className="text-sm text-muted-foreground">
+          {t('pipelines.profiling.description')}
+        </p>
+        <div className="flex items-center gap-3">
+          <span className="text-sm">{t('pipelines.profiling.count')}</span>
+          <Input
+            type="number"
+            min={1}
+            max={100}
+            value={count}
+            onChange={(e) => setCount(Number(e.target.value) || 1)}
+            className="w-24"
+          />
+          <Switch checked={memory} onCheckedChange={setMemory} />
+          <span className="text-sm">{t('pipelines.profiling.memory')}</span>
+          <Button onClick={handleArm} className="ml-auto">
+            {t('pipelines.profiling.arm')}
+          </Button>
+        </div>
+        {armed.map((request) => (
+          <div
+            key={request.id}
+            className="flex items-center justify-between rounded-lg border p-3"
+          >
+            <span className="text-sm">
+              {t('pipelines.profiling.waiting', {
+                count: request.remaining,
+              })}
+            </span>
+            <Button
+              variant="ghost"
+              size="icon"
+              onClick={() => handleDisarm(request.id)}
+            >
+              <X className="h-4 w-4" />
+            </Button>
+          </div>
+        ))}
+      </div>
+
+      <div className="space-y-3">
+        <h3 className="text-sm font-semibold text-foreground">
+          {t('pipelines.profiling.profiles')}
+          {backend && (
+            <Badge variant="secondary" className="ml-2">
+              {backend}
+            </Badge>
+          )}
+        </h3>
+        {profiles.length === 0 ? (
+          <div className="flex h-32 items-center justify-center rounded-lg border-2 border-dashed border-border">
+            <p className="text-sm text-muted-foreground">
+              {t('pipelines.profiling.noProfiles')}
+            </p>
+          </div>
+        ) : (
+          <div className="space-y-2">
+            {profiles.map((profile) => (
+              <div
+                key={profile.id}
+                className="flex items-center justify-between rounded-lg border p-3 hover:bg-accent"
+              >
+                <div className="flex-1">
+                  <div className="font-medium">
+                    {t('pipelines.profiling.query', { id: profile.query_id })}
+                    <span className="ml-2 text-sm text-muted-foreground">
+                      {profile.duration_ms} ms
+                    </span>
+                  </div>
+                  <div className="text-sm text-muted-foreground">
+                    {new Date(profile.started_at * 1000).toLocaleString()}
+                    {profile.error && ` • ${profile.error}`}
+                  </div>
+                </div>
+                {profile.status !== 'done' && (
+                  <Badge variant="secondary">{profile.status}</Badge>
+                )}
+                {profile.files.includes('txt') && (
+                  <Button
+                    variant="ghost"
+                    size="sm"
+                    onClick={() => handleDownload(profile.id, 'txt')}
+                  >
+                    <Download className="mr-1 h-4 w-4" />
+                    {t('pipelines.profiling.report')}
+                  </Button>
+                )}
+                {profile.files.includes('prof') && (
+                  <Button
+                    variant="ghost"
+                    size="sm"
+                    onClick={() => handleDownload(profile.id, 'prof')}
+                  >
+                    <Download className="mr-1 h-4 w-4" />
+                    {t('pipelines.profiling.stats')}
+                  </Button>
+                )}
+                <Button
+                  variant="ghost"
+                  size="icon"
+                  onClick={() => handleDelete(profile.id)}
+                >
+                  <X className="h-4 w-4" />
+                </Button>
+              </div>
+            ))}
+          </div>
+        )}
+      </div>
+    </div>
+  );
+}
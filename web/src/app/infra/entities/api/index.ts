@@ -355,3 +355,33 @@ export interface MCPTool {
   description: string;
   parameters?: object;
 }
+
+export interface ProfileRequest {
+  id: string;
+  remaining: number;
+  bot_uuid: string | null;
+  pipeline_uuid: string | null;
+  memory: boolean;
+  created_at: number;
+}
+
+export interface QueryProfile {
+  id: string;
+  request_id: string;
+  query_id: number;
+  bot_uuid: string | null;
+  pipeline_uuid: string;
+  backend: 'yappi' | 'cprofile';
+  started_at: number;
+  duration_ms: number;
+  status: 'running' | 'saving' | 'done' | 'failed';
+  error: string | null;
+  files: Array<'txt' | 'prof'>;
+}
+
+export interface ApiRespProfiling {
+  backend: 'yappi' | 'cprofile';
+  armed: ProfileRequest[];
+  active: QueryProfile | null;
+  profiles: QueryProfile[];
+}
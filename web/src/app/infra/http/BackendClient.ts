@@ -36,6 +36,8 @@ import {
   ApiRespMCPServers,
   ApiRespMCPServer,
   MCPServer,
+  ApiRespProfiling,
+  ProfileRequest,
 } from '@/app/infra/entities/api';
 import { Plugin } from '@/app/infra/entities/plugin';
 import { GetBotLogsRequest } from '@/app/infra/http/requestParam/bots/GetBotLogsRequest';
@@ -190,6 +192,35 @@ export class BackendClient extends BaseHttpClient {
     });
   }
 
+  // ============ Profiling API ============
+  public getProfiling(): Promise<ApiRespProfiling> {
+    return this.get('/api/v1/profiling');
+  }
+
+  public armProfiling(params: {
+    count: number;
+    pipeline_uuid?: string;
+    bot_uuid?: string;
+    memory: boolean;
+  }): Promise<{ request: ProfileRequest }> {
+    return this.post('/api/v1/profiling/arm', params);
+  }
+
+  public disarmProfiling(requestId: string): Promise<object> {
+    return this.delete(`/api/v1/profiling/arm/${requestId}`);
+  }
+
+  public deleteProfile(profileId: string): Promise<object> {
+    return this.delete(`/api/v1/profiling/profiles/${profileId}`);
+  }
+
+  public downloadProfile(
+    profileId: string,
+    kind: 'txt' | 'prof',
+  ): Promise<Blob> {
+    return this.getBlob(`/api/v1/profiling/profiles/${profileId}/${kind}`);
+  }
+
   // ============ Debug WebChat API ============
 
   // ============ Debug WebChat API ============
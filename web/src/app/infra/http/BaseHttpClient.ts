@@ -193,6 +193,20 @@ export abstract class BaseHttpClient {
     return this.request<T>({ method: 'delete', url, ...config });
   }
 
+  public async getBlob(url: string, config?: RequestConfig): Promise<Blob> {
+    try {
+      const response = await this.instance.request<Blob>({
+        method: 'get',
+        url,
+        responseType: 'blob',
+        ...config,
+      });
+      return response.data;
+    } catch (error) {
+      return this.handleError(error as object);
+    }
+  }
+
   public postFile<T = unknown>(
     url: string,
     formData: FormData,
@@ -486,6 +486,23 @@ const enUS = {
       noMCPServersConfigured: 'No configured MCP servers',
       selectAll: 'Select All',
     },
+    profiling: {
+      title: 'Profiling',
+      description:
+        'Profile the next queries handled by this pipeline: CPU time per function and, optionally, memory allocations. Profiles can be downloaded as a text report or as pstats data (e.g. for snakeviz).',
+      count: 'Queries',
+      memory: 'Memory',
+      arm: 'Start',
+      armSuccess: 'Waiting for the next queries',
+      armError: 'Failed to start profiling: ',
+      downloadError: 'Download failed: ',
+      waiting: 'Waiting for {{count}} more queries',
+      profiles: 'Profiles',
+      noProfiles: 'No profiles yet',
+      query: 'Query #{{id}}',
+      report: 'Report',
+      stats: 'Stats',
+    },
     debugDialog: {
       title: 'Pipeline Chat',
       selectPipeline: 'Select Pipeline',
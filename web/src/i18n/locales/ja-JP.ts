@@ -489,6 +489,23 @@ const jaJP = {
       noMCPServersConfigured: '設定されているMCPサーバーがありません',
       selectAll: 'すべて選択',
     },
+    profiling: {
+      title: 'プロファイリング',
+      description:
+        'このパイプラインが次に処理するクエリをプロファイリングします：関数ごとの CPU 時間と、必要に応じてメモリ割り当て。結果はテキストレポートまたは pstats データ（snakeviz などで表示可能）としてダウンロードできます。',
+      count: 'クエリ数',
+      memory: 'メモリ',
+      arm: '開始',
+      armSuccess: '次のクエリを待機しています',
+      armError: 'プロファイリングの開始に失敗しました：',
+      downloadError: 'ダウンロードに失敗しました：',
+      waiting: 'あと {{count}} 件のクエリを待機中',
+      profiles: 'プロファイル',
+      noProfiles: 'プロファイルはまだありません',
+      query: 'クエリ #{{id}}',
+      report: 'レポート',
+      stats: '統計データ',
+    },
     debugDialog: {
       title: 'パイプラインのチャット',
       selectPipeline: 'パイプラインを選択',
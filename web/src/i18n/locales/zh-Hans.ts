@@ -468,6 +468,23 @@ const zhHans = {
       noMCPServersConfigured: '无已配置的 MCP 服务器',
       selectAll: '全选',
     },
+    profiling: {
+      title: '性能分析',
+      description:
+        '对该流水线接下来处理的请求进行性能分析：统计各函数的 CPU 耗时，并可选记录内存分配。结果可下载为文本报告或 pstats 数据（可用 snakeviz 等工具查看）。',
+      count: '请求数',
+      memory: '内存',
+      arm: '开始',
+      armSuccess: '正在等待后续请求',
+      armError: '开始性能分析失败：',
+      downloadError: '下载失败：',
+      waiting: '还需等待 {{count}} 个请求',
+      profiles: '分析结果',
+      noProfiles: '暂无分析结果',
+      query: '请求 #{{id}}',
+      report: '报告',
+      stats: '统计数据',
+    },
     debugDialog: {
       title: '流水线对话',
       selectPipeline: '选择流水线',
@@ -466,6 +466,23 @@ const zhHant = {
       noMCPServersConfigured: '無已配置的 MCP 伺服器',
       selectAll: '全選',
     },
+    profiling: {
+      title: '效能分析',
+      description:
+        '對該流程線接下來處理的請求進行效能分析：統計各函式的 CPU 耗時，並可選記錄記憶體分配。結果可下載為文字報告或 pstats 資料（可用 snakeviz 等工具查看）。',
+      count: '請求數',
+      memory: '記憶體',
+      arm: '開始',
+      armSuccess: '正在等待後續請求',
+      armError: '開始效能分析失敗：',
+      downloadError: '下載失敗：',
+      waiting: '還需等待 {{count}} 個請求',
+      profiles: '分析結果',
+      noProfiles: '暫無分析結果',
+      query: '請求 #{{id}}',
+      report: '報告',
+      stats: '統計資料',
+    },
     debugDialog: {
       title: '流程線對話',
       selectPipeline: '選擇流程線',